@@ -1,7 +1,5 @@
 import os,sys
-import lantern_photon
-from lantern_photon.sampledefs import get_sample_info
-from lantern_photon.fileutils.bookfile_parser import make_dict_from_file
+from lantern_ana.fileutils.event_index import SampleEventIndex
 
 if __name__ == "__main__":
     import argparse
@@ -13,27 +11,41 @@ if __name__ == "__main__":
     parser.add_argument('-e','--event',default=None,type=int)
     parser.add_argument('-fid','--fileid',default=None,type=int)
     parser.add_argument('--prefix',default=None,help='if provided, we prepend this path to the booking file path')
+    parser.add_argument('--db',default=None,help='event index file (default: in the lantern_ana cache directory)')
     parser.add_argument('-o','--out',default=None,help='if provided, put names of files into this text file')
-                        
+
     args = parser.parse_args()
 
-    sample_info = get_sample_info( args.data_sample )
-    bookfile = sample_info[ 'bookfile' ]
-    bookfile_path = f"bookkeep/{bookfile}"
+    # the bookkeeping file is parsed into the event index of the sample,
+    # again only when it changed (size or modification time)
+    index = SampleEventIndex.open( args.data_sample, args.db )
+    bookfile_path = f"bookkeep/{index.sample_info['bookfile']}"
     if args.prefix is not None:
         bookfile_path = args.prefix + "/" + bookfile_path
-    bookdict = make_dict_from_file( bookfile_path )
-    
+    index.update_bookfile( bookfile_path )
+
+    fileinfo = None
     if args.fileid is not None:
-        basename = bookdict[args.fileid]['fname']
-        zfileid = "%06d"%(args.fileid)
-        dlmerged_path = sample_info['dlmerged_data_dir']+"/%s/%s"%(zfileid[:2],zfileid[2:4])+"/"+basename
-        print("dlmerged path: ",dlmerged_path)
-
-        recofilename = basename.replace("merged_dlreco","larflowreco_fileid%04d"%(args.fileid)).replace(".root","_kpsrecomanagerana.root")
-        reco_path = sample_info['reco_dir']+"/%03d"%(args.fileid/100)+"/"+recofilename
-        print("reco filename: ",reco_path)
-
-        if args.out is not None and os.path.exists(args.out)==False:
-            with open( args.out, 'w' ) as fout:
-                print(dlmerged_path," ",reco_path,file=fout)
+        fileinfo = index.lookup_fileid( args.fileid )
+    elif args.run is not None and args.subrun is not None and args.event is not None:
+        fileinfo = index.lookup( [args.run], [args.subrun], [args.event] )[0]
+        if fileinfo is not None and fileinfo['match']=='ntuple':
+            print("ntuple: ",fileinfo['ntuple']," entry: ",fileinfo['entry'])
+        elif fileinfo is not None:
+            # only the min/max of run, subrun and event of each file are known: the event may be in another file
+            print("WARNING: event not in an indexed ntuple. Matched from the bookkeeping run/subrun/event ranges,")
+            print("         which may not hold this event. Files whose ranges contain it: ",fileinfo['candidate_fileids'])
+    else:
+        parser.error("give --fileid or --run, --subrun and --event")
+
+    if fileinfo is None:
+        print("file not found in the bookkeeping of sample ",args.data_sample)
+        sys.exit(1)
+
+    print("fileid: ",fileinfo['fileid'])
+    print("dlmerged path: ",fileinfo['dlmerged_path'])
+    print("reco filename: ",fileinfo['reco_path'])
+
+    if args.out is not None and os.path.exists(args.out)==False:
+        with open( args.out, 'w' ) as fout:
+            print(fileinfo['dlmerged_path']," ",fileinfo['reco_path'],file=fout)
@@ -0,0 +1,246 @@
+"""
+Benchmark the LanternAna event loop on a synthetic ntuple, and compare with a stored baseline.
+
+The runner:
+  1. writes a synthetic ntuple (see synthetic_ntuple.py), or reuses one already written
+  2. runs LanternAna with benchmark_config.yaml (or another configuration) on it
+  3. reports events/sec for the full event loop, and for each producer and cut
+     (number of calls / time spent in it, from the producer and cut statistics)
+     With --column-read-chunks, also the entries/sec of read_column_batches (columnar mode)
+     for each chunk size, and the fixed cost of each chunk (one RDataFrame over its entries).
+  4. saves the results as json and, if a baseline is given, flags every rate that
+     dropped by more than the tolerance. The exit code is 1 if any did.
+
+Baselines depend on the machine, so make them on the machine that runs the comparison.
+
+Example:
+    # make a baseline
+    python -m lantern_ana.benchmarks.run_benchmarks --workdir /tmp/lantern_bench --save-baseline baseline.json
+    # after a change
+    python -m lantern_ana.benchmarks.run_benchmarks --workdir /tmp/lantern_bench --baseline baseline.json
+"""
+
+import os
+import sys
+import json
+import yaml
+from typing import Any, Dict, List, Optional
+
+from lantern_ana.benchmarks.synthetic_ntuple import write_synthetic_ntuple, event_branch_names
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_config.yaml")
+
+# name of the dataset in the benchmark configuration
+DATASET_NAME = "synthetic"
+
+
+def prepare_ntuple(workdir: str, num_events: int, seed: int = 0) -> str:
+    """Path of the synthetic ntuple with num_events events in workdir, written if missing."""
+    path = os.path.join(workdir, f"synthetic_gen2ntuple_{num_events}_seed{seed}.root")
+    if not os.path.exists(path):
+        write_synthetic_ntuple(path, num_events=num_events, seed=seed)
+    return path
+
+
+def make_config(base_config: str, ntuple_path: str, workdir: str, execution_mode: str = 'event') -> str:
+    """
+    Write the configuration of the benchmark job: base_config with the synthetic dataset added.
+
+    Returns:
+        Path of the written configuration
+    """
+    with open(base_config) as f:
+        config = yaml.safe_load(f)
+    config['output_dir'] = os.path.join(workdir, "output")
+    config['execution_mode'] = execution_mode
+    config['datasets'] = {
+        DATASET_NAME: {
+            'type': 'RootDataset',
+            'tree': 'EventTree',
+            'ismc': True,
+            'filepaths': [ntuple_path],
+            'friendtrees': {'FlashPredictionTree': ntuple_path}
+        }
+    }
+    path = os.path.join(workdir, "benchmark_job.yaml")
+    with open(path, 'w') as f:
+        yaml.dump(config, f)
+    return path
+
+
+def run_benchmark(config_file: str) -> Dict[str, Any]:
+    """
+    Run LanternAna on the benchmark dataset.
+
+    Returns:
+        Dictionary with the events/sec of the full loop ('full_loop'), of each producer
+        ('producers') and of each cut ('cuts'), and the number of events
+    """
+    from lantern_ana.lantern_ana_class import LanternAna
+
+    analysis = LanternAna(config_file, log_level="WARNING")
+    analysis.run([DATASET_NAME])
+    stats = analysis.stats[DATASET_NAME]
+
+    def _rate(num_calls, total_time):
+        return num_calls/total_time if total_time > 0 else 0.0
+
+    results = {
+        'num_events': stats['total'],
+        'full_loop': _rate(stats['total'], stats['processing_time']),
+        'producers': {},
+        'cuts': {}
+    }
+    for name, producer_stats in analysis.producer_manager.producer_statistics.items():
+        results['producers'][name] = _rate(producer_stats['num_calls'], producer_stats['total_time'])
+    for name, cut_stats in analysis.cut_factory.cut_statistics.items():
+        results['cuts'][name] = _rate(cut_stats['pass']+cut_stats['fail'], cut_stats['total_time'])
+    return results
+
+
+def benchmark_column_reads(ntuple_path: str, chunk_sizes: List[int],
+                           branches: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Time read_column_batches over the whole EventTree for several chunk sizes.
+
+    Each chunk is read by a new RDataFrame limited to the entries of the chunk, so a pass has a
+    fixed cost per chunk (opening the files, starting the event loop) on top of the cost per entry.
+    It is estimated from the smallest and the largest chunk size:
+        time = num_entries*per_entry + num_chunks*per_chunk
+    The C++ code of the reads is compiled once per process. This is done by a first read of one
+    chunk before the timing, so that it is not counted as a cost of the smallest chunk size.
+
+    Returns:
+        Dictionary with the entries/sec for each chunk size ('rates') and the estimated
+        seconds per chunk ('seconds_per_chunk', None with a single chunk size)
+    """
+    import time
+    import ROOT
+    from lantern_ana.io.columnar import read_column_batches
+
+    if branches is None:
+        branches = event_branch_names()
+    rfile = ROOT.TFile.Open(ntuple_path)
+    tree = rfile.Get("EventTree")
+    nentries = tree.GetEntries()
+    for _ in read_column_batches(tree, branches, chunk_size=min(chunk_sizes), stop=min(min(chunk_sizes), nentries)):
+        pass
+    times = {}
+    for chunk_size in sorted(set(chunk_sizes)):
+        tstart = time.perf_counter()
+        for _ in read_column_batches(tree, branches, chunk_size=chunk_size):
+            pass
+        times[chunk_size] = time.perf_counter()-tstart
+    rfile.Close()
+
+    results = {'rates': {str(chunk_size): nentries/t if t > 0 else 0.0 for chunk_size, t in times.items()},
+               'seconds_per_chunk': None}
+    smallest, largest = min(times), max(times)
+    nchunks_small = -(-nentries//smallest)
+    nchunks_large = -(-nentries//largest)
+    if nchunks_small > nchunks_large:
+        results['seconds_per_chunk'] = (times[smallest]-times[largest])/(nchunks_small-nchunks_large)
+    return results
+
+
+def flatten_rates(results: Dict[str, Any]) -> Dict[str, float]:
+    """
+    The rates of a result dictionary by 'full_loop', 'producers/<name>', 'cuts/<name>'
+    and 'column_reads/chunk<size>'.
+    """
+    rates = {'full_loop': results['full_loop']}
+    for section in ['producers', 'cuts']:
+        for name, rate in results[section].items():
+            rates[f"{section}/{name}"] = rate
+    if results.get('column_reads') is not None:
+        for chunk_size, rate in results['column_reads']['rates'].items():
+            rates[f"column_reads/chunk{chunk_size}"] = rate
+    return rates
+
+
+def compare_to_baseline(results: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """
+    Find the rates that dropped below (1-tolerance) times their baseline.
+
+    Returns:
+        Descriptions of the regressions (empty if none)
+    """
+    current = flatten_rates(results)
+    regressions = []
+    for key, base_rate in flatten_rates(baseline).items():
+        if key not in current or base_rate <= 0:
+            continue
+        ratio = current[key]/base_rate
+        if ratio < 1.0 - tolerance:
+            regressions.append(f"{key}: {current[key]:.1f} events/sec, baseline {base_rate:.1f} ({(ratio-1)*100:+.1f}%)")
+    return regressions
+
+
+def print_results(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None):
+    """Print the rates, with the change from the baseline if given."""
+    base_rates = flatten_rates(baseline) if baseline is not None else {}
+    print(f"\nBenchmark on {results['num_events']} synthetic events (events/sec):")
+    print(f"{'':<50} {'current':>12} {'baseline':>12} {'change':>8}")
+    for key, rate in flatten_rates(results).items():
+        line = f"{key:<50} {rate:>12.1f}"
+        if key in base_rates and base_rates[key] > 0:
+            line += f" {base_rates[key]:>12.1f} {(rate/base_rates[key]-1)*100:>+7.1f}%"
+        print(line)
+    if results.get('column_reads') is not None and results['column_reads']['seconds_per_chunk'] is not None:
+        print(f"read_column_batches: {results['column_reads']['seconds_per_chunk']*1e3:.2f} ms per chunk")
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark the LanternAna event loop on a synthetic ntuple")
+    parser.add_argument('--workdir', default='./lantern_benchmark', help='Directory for the ntuple, job configuration and results')
+    parser.add_argument('--nevents', type=int, default=10000, help='Number of synthetic events')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the synthetic ntuple')
+    parser.add_argument('--ntuple', default=None, help='Use this ntuple instead of a synthetic one')
+    parser.add_argument('--config', default=DEFAULT_CONFIG, help='Configuration with the producers and cuts to run')
+    parser.add_argument('--execution-mode', default='event', choices=['event', 'columnar'])
+    parser.add_argument('--column-read-chunks', type=int, nargs='*', default=[],
+                        help='Also time read_column_batches over the ntuple with these chunk sizes')
+    parser.add_argument('--baseline', default=None, help='Compare with the results in this json file')
+    parser.add_argument('--save-baseline', default=None, help='Save the results to this json file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Flag rates that are lower than the baseline by more than this fraction')
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    ntuple_path = args.ntuple if args.ntuple is not None else prepare_ntuple(args.workdir, args.nevents, args.seed)
+    config_file = make_config(args.config, ntuple_path, args.workdir, args.execution_mode)
+
+    results = run_benchmark(config_file)
+    if len(args.column_read_chunks) > 0:
+        results['column_reads'] = benchmark_column_reads(ntuple_path, args.column_read_chunks)
+
+    baseline = None
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+
+    results_file = os.path.join(args.workdir, "benchmark_results.json")
+    with open(results_file, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {results_file}")
+    if args.save_baseline is not None:
+        with open(args.save_baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}")
+
+    if baseline is not None:
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions (more than {args.tolerance*100:.0f}% slower than the baseline):")
+            for regression in regressions:
+                print(f"  {regression}")
+            return 1
+        print("\nNo regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Write synthetic gen2 ntuples, to benchmark the event loop without real MicroBooNE files.
+
+The file has the trees an analysis job reads:
+  - EventTree: the reco and truth branches read by the producers, cuts and tags, with
+    per-event arrays sized by nTracks, nShowers, nTrueSimParts and nTruePrimParts
+  - FlashPredictionTree: the flash-prediction branches (std::vector per event), to be
+    added as a friend tree, as for the real flash-prediction files
+  - potTree: one entry per subrun with totGoodPOT
+
+The values are random but have the structure the code expects: particle scores are
+log-probabilities whose maximum gives the PID, track/shower truth IDs point to
+existing trueSimPart entries, positions are inside the TPC and one flash-prediction
+vertex matches the reco vertex. They are not physics: only use the files for timing.
+
+Example:
+    write_synthetic_ntuple("synthetic.root", num_events=20000, seed=1)
+
+or from the command line:
+    python -m lantern_ana.benchmarks.synthetic_ntuple synthetic.root --nevents 20000
+"""
+
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# maximum number of entries in the per-event arrays
+MAX_PARTICLES = 100
+
+# TPC active volume (cm)
+_TPC_MIN = np.array([0.0, -116.5, 0.0])
+_TPC_MAX = np.array([256.4, 116.5, 1036.8])
+
+# (branch name, leaf type, array size branch or fixed size or None)
+_EVENT_BRANCHES: List[Tuple[str, str, object]] = (
+    [(name, 'I', None) for name in ['run', 'subrun', 'event', 'fileid']]
+    # truth
+    + [('trueNuE', 'F', None), ('trueNuPDG', 'I', None), ('trueNuCCNC', 'I', None),
+       ('trueVtxX', 'F', None), ('trueVtxY', 'F', None), ('trueVtxZ', 'F', None),
+       ('nTrueSimParts', 'I', None), ('nTruePrimParts', 'I', None)]
+    + [(name, 'I', 'nTrueSimParts') for name in
+       ['trueSimPartTID', 'trueSimPartMID', 'trueSimPartPDG', 'trueSimPartProcess', 'trueSimPartContained']]
+    + [(name, 'F', 'nTrueSimParts') for name in
+       ['trueSimPartE', 'trueSimPartPx', 'trueSimPartPy', 'trueSimPartPz',
+        'trueSimPartX', 'trueSimPartY', 'trueSimPartZ',
+        'trueSimPartEDepX', 'trueSimPartEDepY', 'trueSimPartEDepZ',
+        'trueSimPartEndX', 'trueSimPartEndY', 'trueSimPartEndZ',
+        'trueSimPartPixelSumUplane', 'trueSimPartPixelSumVplane', 'trueSimPartPixelSumYplane']]
+    + [('truePrimPartPDG', 'I', 'nTruePrimParts')]
+    + [(name, 'F', 'nTruePrimParts') for name in
+       ['truePrimPartE', 'truePrimPartPx', 'truePrimPartPy', 'truePrimPartPz']]
+    # vertex
+    + [('foundVertex', 'I', None), ('vtxIsFiducial', 'I', None), ('vtxContainment', 'I', None),
+       ('vtxKPtype', 'I', None), ('vtxX', 'F', None), ('vtxY', 'F', None), ('vtxZ', 'F', None),
+       ('vtxScore', 'F', None), ('vtxKPscore', 'F', None), ('vtxMaxIntimePixelSum', 'F', None),
+       ('vtxFracHitsOnCosmic', 'F', None), ('vtxDistToTrue', 'F', None), ('recoNuE', 'F', None),
+       ('fracUnrecoIntimePixels', 'F', 3), ('fracRecoOuttimePixels', 'F', 3),
+       ('predictedPEtotal', 'F', None), ('observedPEtotal', 'F', None), ('fracerrPE', 'F', None),
+       ('nTracks', 'I', None), ('nShowers', 'I', None)]
+)
+
+# per-particle reco branches, for prefix 'track' (nTracks) and 'shower' (nShowers)
+_RECO_INT_VARS = ['IsSecondary', 'Classified', 'PID', 'TruePID', 'TrueTID', 'Process', 'Size']
+_RECO_FLOAT_VARS = ['RecoE', 'Charge', 'Comp', 'Purity', 'TrueComp', 'TruePurity', 'CosTheta', 'DistToVtx',
+                    'StartPosX', 'StartPosY', 'StartPosZ', 'StartDirX', 'StartDirY', 'StartDirZ',
+                    'ElScore', 'PhScore', 'MuScore', 'PiScore', 'PrScore',
+                    'PrimaryScore', 'FromNeutralScore', 'FromChargedScore']
+for _prefix, _counter in [('track', 'nTracks'), ('shower', 'nShowers')]:
+    _EVENT_BRANCHES += [(_prefix+var, 'I', _counter) for var in _RECO_INT_VARS]
+    _EVENT_BRANCHES += [(_prefix+var, 'F', _counter) for var in _RECO_FLOAT_VARS]
+_EVENT_BRANCHES += [('trackEndPosX', 'F', 'nTracks'), ('trackEndPosY', 'F', 'nTracks'), ('trackEndPosZ', 'F', 'nTracks'),
+                    ('showerNHits', 'I', 'nShowers')]
+
+# flash-prediction branches: float or std::vector<float> (or vector<vector<float>>, vector<int>)
+_FLASH_SCALARS = ['obs_total_pe', 'sinkhorn_div']
+_FLASH_VECTORS = ['reco_vertex_x', 'reco_vertex_y', 'reco_vertex_z', 'pred_total_pe_all']
+_FLASH_INT_VECTORS = ['n_tracks_all', 'n_showers_all']
+_FLASH_NESTED_VECTORS = ['sinkhorn_div_all']
+
+# particle classes of the reco scores, in score order
+_SCORE_PIDS = np.array([11, 22, 13, 211, 2212])
+_SIM_PDGS = np.array([13, 2212, 211, -211, 111, 22, 11, 2112])
+_SIM_PDG_PROBS = np.array([0.15, 0.3, 0.1, 0.05, 0.05, 0.2, 0.05, 0.1])
+
+
+def event_branch_names() -> List[str]:
+    """Names of all EventTree branches written."""
+    return [name for name, _, _ in _EVENT_BRANCHES]
+
+
+def flash_branch_names() -> List[str]:
+    """Names of all FlashPredictionTree branches written."""
+    return _FLASH_SCALARS + _FLASH_VECTORS + _FLASH_INT_VECTORS + _FLASH_NESTED_VECTORS
+
+
+def _log_softmax(rng, nrows: int, ncols: int) -> np.ndarray:
+    logits = rng.normal(0.0, 2.0, size=(nrows, ncols))
+    logits -= logits.max(axis=1, keepdims=True)
+    return logits - np.log(np.exp(logits).sum(axis=1, keepdims=True))
+
+
+def _unit_vectors(rng, n: int) -> np.ndarray:
+    v = rng.normal(size=(n, 3))
+    return v / np.maximum(np.linalg.norm(v, axis=1, keepdims=True), 1e-6)
+
+
+def _positions(rng, n: int) -> np.ndarray:
+    return _TPC_MIN + rng.random((n, 3))*(_TPC_MAX-_TPC_MIN)
+
+
+def generate_event(rng, ievent: int, events_per_subrun: int = 100) -> Tuple[Dict[str, object], Dict[str, object]]:
+    """
+    Make the values of one event.
+
+    Returns:
+        (EventTree values, FlashPredictionTree values), by branch name
+    """
+    ev = {}
+    ev['run'] = 1
+    ev['subrun'] = ievent // events_per_subrun
+    ev['event'] = ievent
+    ev['fileid'] = 0
+
+    # truth: neutrino and simulated particles
+    ev['trueNuE'] = float(rng.gamma(2.0, 0.4))
+    ev['trueNuPDG'] = int(rng.choice([14, 12, -14, -12], p=[0.9, 0.05, 0.04, 0.01]))
+    ev['trueNuCCNC'] = int(rng.random() < 0.3)
+    true_vtx = _positions(rng, 1)[0]
+    ev['trueVtxX'], ev['trueVtxY'], ev['trueVtxZ'] = true_vtx
+
+    nsim = min(MAX_PARTICLES, 1 + rng.poisson(8))
+    nprim = min(nsim, 1 + rng.poisson(2))
+    ev['nTrueSimParts'] = nsim
+    ev['trueSimPartTID'] = np.arange(1, nsim+1)
+    mids = np.zeros(nsim, dtype=np.int64)
+    if nsim > nprim:
+        mids[nprim:] = rng.integers(1, np.arange(nprim, nsim)+1)
+    ev['trueSimPartMID'] = mids
+    sim_pdg = rng.choice(_SIM_PDGS, size=nsim, p=_SIM_PDG_PROBS)
+    ev['trueSimPartPDG'] = sim_pdg
+    ev['trueSimPartProcess'] = np.where(mids == 0, 0, rng.integers(1, 5, size=nsim))
+    ev['trueSimPartContained'] = (rng.random(nsim) < 0.8).astype(np.int64)
+    sim_ke = rng.exponential(150.0, size=nsim)
+    sim_dir = _unit_vectors(rng, nsim)
+    ev['trueSimPartE'] = sim_ke + np.where(np.abs(sim_pdg) == 13, 105.7, np.where(sim_pdg == 2212, 938.3, 0.0))
+    for i, axis in enumerate('xyz'):
+        ev['trueSimPartP'+axis] = sim_dir[:, i]*sim_ke
+    start = true_vtx + rng.normal(0.0, 2.0, size=(nsim, 3))
+    end = start + sim_dir*sim_ke[:, None]*0.3
+    for i, axis in enumerate('XYZ'):
+        ev['trueSimPart'+axis] = start[:, i]
+        ev['trueSimPartEDep'+axis] = start[:, i]
+        ev['trueSimPartEnd'+axis] = end[:, i]
+    for plane in 'UVY':
+        ev[f'trueSimPartPixelSum{plane}plane'] = sim_ke*rng.uniform(50.0, 150.0, size=nsim)
+
+    ev['nTruePrimParts'] = nprim
+    ev['truePrimPartPDG'] = sim_pdg[:nprim]
+    ev['truePrimPartE'] = ev['trueSimPartE'][:nprim]
+    for axis in 'xyz':
+        ev['truePrimPartP'+axis] = ev['trueSimPartP'+axis][:nprim]
+
+    # reco vertex
+    found = rng.random() < 0.9
+    vtx = true_vtx + rng.normal(0.0, 1.0, size=3)
+    ev['foundVertex'] = int(found)
+    ev['vtxIsFiducial'] = int(found and rng.random() < 0.8)
+    ev['vtxContainment'] = int(found and rng.random() < 0.7)
+    ev['vtxKPtype'] = int(rng.integers(0, 3))
+    ev['vtxX'], ev['vtxY'], ev['vtxZ'] = vtx
+    ev['vtxScore'] = float(rng.random())
+    ev['vtxKPscore'] = float(rng.random())
+    ev['vtxMaxIntimePixelSum'] = float(rng.exponential(5000.0))
+    ev['vtxFracHitsOnCosmic'] = float(rng.beta(1.0, 8.0))
+    ev['vtxDistToTrue'] = float(np.linalg.norm(vtx-true_vtx))
+    ev['fracUnrecoIntimePixels'] = rng.beta(1.0, 5.0, size=3)
+    ev['fracRecoOuttimePixels'] = rng.beta(1.0, 5.0, size=3)
+    obs_pe = float(rng.exponential(800.0))
+    ev['observedPEtotal'] = obs_pe
+    ev['predictedPEtotal'] = obs_pe*float(rng.normal(1.0, 0.2))
+    ev['fracerrPE'] = (ev['predictedPEtotal']-obs_pe)/(0.1+obs_pe)
+
+    # reco tracks and showers
+    ntracks = min(MAX_PARTICLES, rng.poisson(3)) if found else 0
+    nshowers = min(MAX_PARTICLES, rng.poisson(2)) if found else 0
+    ev['nTracks'] = ntracks
+    ev['nShowers'] = nshowers
+    total_reco_e = 0.0
+    for prefix, n in [('track', ntracks), ('shower', nshowers)]:
+        scores = _log_softmax(rng, n, 5)
+        origin = _log_softmax(rng, n, 3)
+        truth = rng.integers(0, nsim, size=n)
+        direction = _unit_vectors(rng, n)
+        startpos = vtx + rng.normal(0.0, 0.5 if prefix == 'track' else 10.0, size=(n, 3))
+        reco_e = rng.exponential(150.0, size=n)
+        total_reco_e += float(reco_e.sum())
+        ev[prefix+'IsSecondary'] = (rng.random(n) < 0.3).astype(np.int64)
+        ev[prefix+'Classified'] = (rng.random(n) < 0.9).astype(np.int64)
+        ev[prefix+'PID'] = _SCORE_PIDS[np.argmax(scores, axis=1)] if n > 0 else np.zeros(0, dtype=np.int64)
+        for i, score in enumerate(['El', 'Ph', 'Mu', 'Pi', 'Pr']):
+            ev[prefix+score+'Score'] = scores[:, i]
+        ev[prefix+'PrimaryScore'] = origin[:, 0]
+        ev[prefix+'FromNeutralScore'] = origin[:, 1]
+        ev[prefix+'FromChargedScore'] = origin[:, 2]
+        ev[prefix+'TrueTID'] = truth+1
+        ev[prefix+'TruePID'] = sim_pdg[truth]
+        ev[prefix+'Process'] = ev['trueSimPartProcess'][truth]
+        ev[prefix+'Size'] = rng.integers(10, 2000, size=n)
+        ev[prefix+'RecoE'] = reco_e
+        ev[prefix+'Charge'] = reco_e*rng.uniform(50.0, 150.0, size=n)
+        for var in ['Comp', 'Purity', 'TrueComp', 'TruePurity']:
+            ev[prefix+var] = rng.beta(5.0, 1.5, size=n)
+        ev[prefix+'CosTheta'] = direction[:, 2]
+        ev[prefix+'DistToVtx'] = np.linalg.norm(startpos-vtx, axis=1)
+        for i, axis in enumerate('XYZ'):
+            ev[prefix+'StartPos'+axis] = startpos[:, i]
+            ev[prefix+'StartDir'+axis] = direction[:, i]
+    endpos = np.column_stack([ev['trackStartPos'+axis] for axis in 'XYZ']) \
+        + np.column_stack([ev['trackStartDir'+axis] for axis in 'XYZ'])*ev['trackRecoE'][:, None]*0.3
+    for i, axis in enumerate('XYZ'):
+        ev['trackEndPos'+axis] = endpos[:, i]
+    ev['showerNHits'] = ev['showerSize']
+    ev['recoNuE'] = total_reco_e
+
+    # flash prediction: one entry per candidate vertex, the first one is the saved vertex
+    nflash = 1 + rng.poisson(2) if found else 0
+    flash_vtx = _positions(rng, nflash)
+    if nflash > 0:
+        flash_vtx[0] = vtx
+    flash = {
+        'obs_total_pe': obs_pe,
+        'sinkhorn_div': float(rng.exponential(20.0)),
+        'reco_vertex_x': flash_vtx[:, 0],
+        'reco_vertex_y': flash_vtx[:, 1],
+        'reco_vertex_z': flash_vtx[:, 2],
+        'pred_total_pe_all': obs_pe*rng.normal(0.5, 0.1, size=nflash),
+        'n_tracks_all': rng.poisson(2.0, size=nflash),
+        'n_showers_all': rng.poisson(1.0, size=nflash),
+        'sinkhorn_div_all': rng.exponential(20.0, size=(nflash, 3)),
+    }
+    if nflash > 0:
+        flash['n_tracks_all'][0] = ev['nTracks']
+        flash['n_showers_all'][0] = ev['nShowers']
+    return ev, flash
+
+
+def write_synthetic_ntuple(filepath: str, num_events: int = 10000, seed: Optional[int] = 0,
+                           events_per_subrun: int = 100, pot_per_subrun: float = 1.0e17) -> None:
+    """
+    Write a synthetic ntuple file with EventTree, FlashPredictionTree and potTree.
+
+    Args:
+        filepath: Output ROOT file
+        num_events: Number of events
+        seed: Seed of the random numbers (same seed, same file contents)
+        events_per_subrun: Events per subrun (one potTree entry per subrun)
+        pot_per_subrun: totGoodPOT of each potTree entry
+    """
+    import ROOT as rt
+
+    rng = np.random.default_rng(seed)
+    rfile = rt.TFile(filepath, "RECREATE")
+
+    event_tree = rt.TTree("EventTree", "Synthetic gen2 ntuple")
+    buffers = {}
+    dtypes = {'I': np.int32, 'F': np.float32}
+    for name, leaftype, size in _EVENT_BRANCHES:
+        if size is None:
+            buffers[name] = np.zeros(1, dtype=dtypes[leaftype])
+            event_tree.Branch(name, buffers[name], f"{name}/{leaftype}")
+        elif isinstance(size, int):
+            buffers[name] = np.zeros(size, dtype=dtypes[leaftype])
+            event_tree.Branch(name, buffers[name], f"{name}[{size}]/{leaftype}")
+        else:
+            buffers[name] = np.zeros(MAX_PARTICLES, dtype=dtypes[leaftype])
+            event_tree.Branch(name, buffers[name], f"{name}[{size}]/{leaftype}")
+
+    flash_tree = rt.TTree("FlashPredictionTree", "Synthetic flash prediction")
+    flash_buffers = {}
+    for name in _FLASH_SCALARS:
+        flash_buffers[name] = np.zeros(1, dtype=np.float32)
+        flash_tree.Branch(name, flash_buffers[name], f"{name}/F")
+    for name in _FLASH_VECTORS:
+        flash_buffers[name] = rt.std.vector('float')()
+        flash_tree.Branch(name, flash_buffers[name])
+    for name in _FLASH_INT_VECTORS:
+        flash_buffers[name] = rt.std.vector('int')()
+        flash_tree.Branch(name, flash_buffers[name])
+    for name in _FLASH_NESTED_VECTORS:
+        flash_buffers[name] = rt.std.vector('std::vector<float>')()
+        flash_tree.Branch(name, flash_buffers[name])
+
+    for ievent in range(num_events):
+        ev, flash = generate_event(rng, ievent, events_per_subrun)
+        for name, leaftype, size in _EVENT_BRANCHES:
+            if size is None:
+                buffers[name][0] = ev[name]
+            else:
+                values = ev[name]
+                buffers[name][:len(values)] = values
+        event_tree.Fill()
+
+        for name in _FLASH_SCALARS:
+            flash_buffers[name][0] = flash[name]
+        for name in _FLASH_VECTORS:
+            vec = flash_buffers[name]
+            vec.clear()
+            for value in flash[name]:
+                vec.push_back(float(value))
+        for name in _FLASH_INT_VECTORS:
+            vec = flash_buffers[name]
+            vec.clear()
+            for value in flash[name]:
+                vec.push_back(int(value))
+        for name in _FLASH_NESTED_VECTORS:
+            vec = flash_buffers[name]
+            vec.clear()
+            for row in flash[name]:
+                inner = rt.std.vector('float')()
+                for value in row:
+                    inner.push_back(float(value))
+                vec.push_back(inner)
+        flash_tree.Fill()
+
+    pot_tree = rt.TTree("potTree", "POT per subrun")
+    run = np.zeros(1, dtype=np.int32)
+    subrun = np.zeros(1, dtype=np.int32)
+    pot = np.zeros(1, dtype=np.float32)
+    pot_tree.Branch("run", run, "run/I")
+    pot_tree.Branch("subrun", subrun, "subrun/I")
+    pot_tree.Branch("totGoodPOT", pot, "totGoodPOT/F")
+    num_subruns = (num_events + events_per_subrun - 1) // events_per_subrun
+    for isubrun in range(num_subruns):
+        run[0] = 1
+        subrun[0] = isubrun
+        pot[0] = pot_per_subrun
+        pot_tree.Fill()
+
+    rfile.cd()
+    event_tree.Write()
+    flash_tree.Write()
+    pot_tree.Write()
+    rfile.Close()
+    print(f"Wrote {num_events} synthetic events to {filepath}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write a synthetic gen2 ntuple for benchmarks")
+    parser.add_argument('output', help='Output ROOT file')
+    parser.add_argument('--nevents', type=int, default=10000, help='Number of events')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed')
+    args = parser.parse_args()
+
+    write_synthetic_ntuple(args.output, num_events=args.nevents, seed=args.seed)
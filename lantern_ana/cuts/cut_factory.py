@@ -27,29 +27,100 @@ from collections import defaultdict
 from typing import Dict, List, Any, Optional, Tuple
 from datetime import datetime
 
+from lantern_ana.cuts.cut_logic import CompiledCutLogic
+
 # Dictionary to store all registered cut functions
 # This is like a phone book - it maps cut names to the actual cut functions
 _REGISTERED_CUTS = {}
 
-def register_cut(func):
+# Ntuple branches read by each registered cut, for cuts that declare them.
+# Maps cut name -> list of branch names (wildcards like "track*" are allowed)
+_CUT_BRANCHES = {}
+
+# Producers whose outputs each registered cut reads (params['producer_outputs']),
+# for cuts that declare them. Maps cut name -> list of producer names.
+_CUT_PRODUCERS = {}
+
+def register_cut(func=None, *, branches: Optional[List[str]] = None,
+                 producers: Optional[List[str]] = None):
     """
     A decorator that registers a cut function so it can be used by the factory.
     
     What this does:
     - Takes a function that implements a cut
     - Adds it to our registry so we can find it later by name
+    - Optionally records which ntuple branches the cut reads
+    - Optionally records which producers' outputs the cut reads
     - Returns the function unchanged
     
+    Declaring the branches lets LanternAna read only the branches the analysis
+    needs (see the prune_branches option). Cuts that do not declare them
+    turn the pruning off, as we cannot know what they read.
+
+    Declaring the producers lets LanternAna run only those producers before the
+    cuts, and the others only for events that pass (see the lazy_producers option).
+    Producers are named as in the configuration; a cut configured with a
+    'required_producers' parameter uses that list instead.
+
     Example:
         @register_cut
         def my_cut(ntuple, params):
             return ntuple.energy > 100  # Keep events with energy > 100 MeV
+
+        @register_cut(branches=['energy'], producers=[])
+        def my_declared_cut(ntuple, params):
+            return ntuple.energy > 100
+
+        @register_cut(branches=[], producers=['vertex_properties'])
+        def my_vertex_cut(ntuple, params):
+            return params['producer_outputs']['vertex_properties']['found'] == 1
     """
-    if func.__name__ in _REGISTERED_CUTS:
-        raise ValueError(f"Cut function '{func.__name__}' is already registered!")
+    def decorator(func):
+        if func.__name__ in _REGISTERED_CUTS:
+            raise ValueError(f"Cut function '{func.__name__}' is already registered!")
 
-    _REGISTERED_CUTS[func.__name__] = func
-    return func
+        _REGISTERED_CUTS[func.__name__] = func
+        if branches is not None:
+            _CUT_BRANCHES[func.__name__] = list(branches)
+        if producers is not None:
+            _CUT_PRODUCERS[func.__name__] = list(producers)
+        return func
+
+    if func is None:
+        # used as @register_cut(branches=[...])
+        return decorator
+    return decorator(func)
+
+# Vectorized versions of registered cuts, used by the columnar execution mode.
+# Maps cut name -> {'function': batch function, 'branches': list of ntuple branches it reads}
+_REGISTERED_BATCH_CUTS = {}
+
+def register_batch_cut(cut_name: str, branches: Optional[List[str]] = None):
+    """
+    A decorator that registers a vectorized version of a cut.
+
+    The batch function receives a ColumnBatch (see lantern_ana.io.columnar) instead of
+    the ntuple, and must return a boolean NumPy array with one value per event in the batch.
+    The regular cut must be registered with @register_cut under the same name.
+
+    Args:
+        cut_name: Name of the regular cut function this implements
+        branches: Names of the ntuple branches the batch function reads
+
+    Example:
+        @register_batch_cut('my_cut', branches=['energy'])
+        def my_cut_batch(batch, params):
+            return batch.energy > 100
+    """
+    def decorator(func):
+        if cut_name in _REGISTERED_BATCH_CUTS:
+            raise ValueError(f"Batch version of cut '{cut_name}' is already registered!")
+        _REGISTERED_BATCH_CUTS[cut_name] = {
+            'function': func,
+            'branches': list(branches) if branches is not None else []
+        }
+        return func
+    return decorator
 
 class CutFactory:
     """
@@ -81,11 +152,16 @@ class CutFactory:
         # Storage for our cuts and configuration
         self.cuts = []  # List of cuts to apply
         self.cut_logic: Optional[str] = None  # How to combine cut results (e.g., "cut1 and cut2")
+        self._compiled_logic: Optional[CompiledCutLogic] = None  # cut_logic parsed once by set_cut_logic
+        self._cuts_by_name = {}  # cut name -> entry in self.cuts
         
         # Statistics tracking - these count how often things happen
         self.cut_statistics = defaultdict(lambda: {"pass": 0, "fail": 0, "total_time": 0.0})
         self.total_events_processed = 0
         self.total_events_passed = 0
+
+        # Detailed timing of every cut call (see lantern_ana.profiler). None: profiling off.
+        self.profiler = None
         
         # Set up logging - this is like keeping a detailed diary of what happens
         self.logger = self._setup_logging(log_level, log_file)
@@ -232,11 +308,13 @@ class CutFactory:
             params = {}
         
         # Add to our list
-        self.cuts.append({
+        cut_info = {
             'name': name,
             'function': _REGISTERED_CUTS[name],
             'params': params
-        })
+        }
+        self.cuts.append(cut_info)
+        self._cuts_by_name[name] = cut_info
         
         self.logger.info(f"Added cut '{name}' with parameters: {params}")
     
@@ -246,17 +324,26 @@ class CutFactory:
         
         What this does:
         - Takes a logical expression that describes how to combine cuts
-        - Stores it for use when applying cuts to events
+        - Parses it once into a CompiledCutLogic (see cut_logic.py), so nothing
+          has to be re-parsed for each event
+        - Cuts that are not in the expression do not change the outcome. They are still
+          run for their statistics, except with return_on_fail (lazy_cuts)
         
         Args:
-            logic_expression: Boolean expression using cut names
+            logic_expression: Boolean expression using cut names, written as {cut_name} or cut_name
         
         Examples:
-            factory.set_cut_logic("cut1 and cut2")  # Both must pass
-            factory.set_cut_logic("cut1 or cut2")   # Either can pass
-            factory.set_cut_logic("cut1 and (cut2 or cut3)")  # Complex logic
+            factory.set_cut_logic("{cut1} and {cut2}")  # Both must pass
+            factory.set_cut_logic("{cut1} or {cut2}")   # Either can pass
+            factory.set_cut_logic("{cut1} and ({cut2} or not {cut3})")  # Complex logic
         """
+        compiled = CompiledCutLogic(logic_expression)
+        unknown = [name for name in compiled.cut_names if name not in _REGISTERED_CUTS]
+        if unknown:
+            raise ValueError(f"Cut logic '{logic_expression}' uses cuts that are not registered: {unknown}")
+
         self.cut_logic = logic_expression
+        self._compiled_logic = compiled
         self.logger.info(f"Set cut logic: {logic_expression}")
         
         # Validate that all cuts in the expression are actually added
@@ -275,41 +362,129 @@ class CutFactory:
             return
         
         # Find which cuts are mentioned in the logic
-        cut_names = [cut['name'] for cut in self.cuts]
-        unused_cuts = []
-        
-        for cut_name in cut_names:
-            if cut_name not in self.cut_logic:
-                unused_cuts.append(cut_name)
+        used_cuts = self._compiled_logic.cut_names
+        unused_cuts = [cut['name'] for cut in self.cuts if cut['name'] not in used_cuts]
         
         if unused_cuts:
-            self.logger.warning(f"Cuts added but not used in logic: {unused_cuts}")
+            self.logger.warning(f"Cuts added but not used in logic (only run for their statistics, "
+                                f"and skipped with lazy_cuts): {unused_cuts}")
+
+        missing_cuts = [name for name in used_cuts if name not in self._cuts_by_name]
+        if missing_cuts:
+            self.logger.warning(f"Cuts used in logic but not added yet: {missing_cuts}")
     
+    @staticmethod
+    def _call_params(cut_info: Dict[str, Any], ismc: bool, data_name: str,
+                     producer_outputs: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Parameters handed to a cut function: its configured parameters plus the standard
+        ones. A new dictionary for each call, so a cut that writes into its parameters
+        does not change them for the other events.
+        """
+        cut_params = dict(cut_info['params'])
+        cut_params['ismc'] = ismc
+        cut_params['data_name'] = data_name
+        if producer_outputs is not None:
+            cut_params['producer_outputs'] = producer_outputs
+        return cut_params
+
+    def _run_cut(self, cut_info: Dict[str, Any], ntuple: Any, cut_params: Dict[str, Any],
+                 results: Dict[str, Any], cutdata: Dict[str, Any], debug: bool = False) -> bool:
+        """
+        Run one cut on the current event and record its result and statistics.
+
+        cut_params: Parameters for the cut function (from _call_params)
+        debug: If True, log the result (checked once per event by apply_cuts).
+        Returns True if the cut ran without error (its result is in results[cut name]).
+        """
+        cut_name = cut_info['name']
+        
+        # Time how long this cut takes
+        cut_start_time = time.perf_counter_ns()
+        
+        try:
+            # Actually run the cut
+            cut_result = cut_info['function'](ntuple, cut_params)
+            
+            # Handle different types of results
+            if isinstance(cut_result, bool):
+                # Simple True/False result
+                results[cut_name] = cut_result
+                cutdata[f'cutdata_{cut_name}'] = {}
+                
+            elif isinstance(cut_result, tuple) and len(cut_result) == 2:
+                # Cut returned (True/False, additional_data)
+                if not isinstance(cut_result[0], bool):
+                    raise ValueError(f"Cut '{cut_name}': First return value must be boolean")
+                if not isinstance(cut_result[1], dict):
+                    raise ValueError(f"Cut '{cut_name}': Second return value must be dictionary")
+                
+                results[cut_name] = cut_result[0]
+                cutdata[f'cutdata_{cut_name}'] = cut_result[1]
+                
+            else:
+                raise ValueError(f"Cut '{cut_name}': Must return bool or (bool, dict)")
+            
+        except Exception as e:
+            # Something went wrong with this cut
+            self.logger.error(f"Error in cut '{cut_name}': {e}")
+            results[cut_name] = False
+            cutdata[f'cutdata_{cut_name}'] = {}
+            return False
+        
+        # Record timing and statistics
+        cut_ns = time.perf_counter_ns() - cut_start_time
+        self.cut_statistics[cut_name]["total_time"] += cut_ns*1e-9
+        if self.profiler is not None:
+            self.profiler.add('cuts', cut_name, cut_ns)
+        
+        if results[cut_name]:
+            self.cut_statistics[cut_name]["pass"] += 1
+        else:
+            self.cut_statistics[cut_name]["fail"] += 1
+        if debug:
+            self.logger.debug(f"Cut '{cut_name}' {'PASSED' if results[cut_name] else 'FAILED'} (took {cut_ns*1e-9:.4f}s)")
+        
+        return True
+
     def apply_cuts(self, ntuple: Any, data_name: str, return_on_fail: bool = True, 
                   ismc: bool = False, producer_outputs: Optional[Dict[str, Any]] = None) -> Tuple[bool, Dict[str, Any], Dict[str, Any]]:
         """
         Apply all configured cuts to a single event.
         
         What this does:
-        - Takes an event (ntuple) and runs all cuts on it
+        - Takes an event (ntuple) and runs the cuts on it
         - Times how long each cut takes
         - Logs detailed information about what happens
         - Returns whether the event passes and detailed results
         
+        Which cuts run:
+        - Without cut logic, all cuts are combined with AND.
+          With return_on_fail, we stop at the first failed cut.
+        - With cut logic, the cuts named in the expression decide the outcome. The other
+          cuts are run afterwards for their statistics.
+          With return_on_fail, the expression is evaluated lazily: a cut only runs if its
+          result can still change the outcome (e.g. for "{a} and {b}", b is skipped if a fails),
+          and the cuts not in the expression are not run.
+          Skipped cuts are missing from the returned results.
+        
         Args:
             ntuple: The event data to analyze
             data_name: Name of the dataset (for logging)
-            return_on_fail: If True, stop at first failed cut (faster)
+            return_on_fail: If True, skip cuts that can no longer change the outcome (faster)
             ismc: Whether this is Monte Carlo (simulated) data
             producer_outputs: Additional calculated quantities to use
         
         Returns:
             Tuple of:
-            - passes: True if event passes all cuts
+            - passes: True if event passes the selection
             - results: Dictionary with each cut's result (True/False)
             - cutdata: Dictionary with additional data from cuts
         """
-        start_time = time.time()
+        # checked once per event, so the debug messages cost nothing when debug logging is off
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            start_time = time.perf_counter_ns()
         
         # Increment our event counter
         self.total_events_processed += 1
@@ -319,106 +494,201 @@ class CutFactory:
         cutdata = {}      # Additional data from cuts
         overall_passes = True
         
-        self.logger.debug(f"Processing event {self.total_events_processed} from {data_name}")
-        
-        # Prepare cut logic expression if we have one
-        cut_expression = self.cut_logic
+        if debug:
+            self.logger.debug(f"Processing event {self.total_events_processed} from {data_name}")
         
-        # Apply each cut one by one
-        for cut_info in self.cuts:
-            cut_name = cut_info['name']
-            cut_function = cut_info['function']
-            cut_params = cut_info['params'].copy()  # Copy to avoid modifying original
-            
-            # Add standard parameters that all cuts might need
-            cut_params['ismc'] = ismc
-            cut_params['data_name'] = data_name
-            
-            # Add producer outputs if available
-            if producer_outputs is not None:
-                cut_params['producer_outputs'] = producer_outputs
+        def run_cut(cut_info):
+            cut_params = self._call_params(cut_info, ismc, data_name, producer_outputs)
+            return self._run_cut(cut_info, ntuple, cut_params, results, cutdata, debug)
+
+        if self._compiled_logic is None:
+            # No logic expression - use simple AND of all cuts
+            for cut_info in self.cuts:
+                ok = run_cut(cut_info)
+                if not ok or not results[cut_info['name']]:
+                    overall_passes = False
+                    if return_on_fail:
+                        if debug:
+                            self.logger.debug(f"Stopping early after cut '{cut_info['name']}' failed")
+                        break
+        else:
+            errors = []
             
-            # Time how long this cut takes
-            cut_start_time = time.time()
+            def get_result(cut_name):
+                # run the cut the first time its result is needed
+                if cut_name not in results:
+                    cut_info = self._cuts_by_name.get(cut_name)
+                    if cut_info is None:
+                        raise ValueError(f"Cut '{cut_name}' is used in the cut logic but was not added")
+                    if not run_cut(cut_info):
+                        errors.append(cut_name)
+                return results[cut_name]
             
             try:
-                # Actually run the cut
-                self.logger.debug(f"Applying cut '{cut_name}'")
-                cut_result = cut_function(ntuple, cut_params)
-                
-                # Handle different types of results
-                if isinstance(cut_result, bool):
-                    # Simple True/False result
-                    results[cut_name] = cut_result
-                    cutdata[f'cutdata_{cut_name}'] = {}
-                    
-                elif isinstance(cut_result, tuple) and len(cut_result) == 2:
-                    # Cut returned (True/False, additional_data)
-                    if not isinstance(cut_result[0], bool):
-                        raise ValueError(f"Cut '{cut_name}': First return value must be boolean")
-                    if not isinstance(cut_result[1], dict):
-                        raise ValueError(f"Cut '{cut_name}': Second return value must be dictionary")
-                    
-                    results[cut_name] = cut_result[0]
-                    cutdata[f'cutdata_{cut_name}'] = cut_result[1]
-                    
-                else:
-                    raise ValueError(f"Cut '{cut_name}': Must return bool or (bool, dict)")
-                
-                # Record timing and statistics
-                cut_time = time.time() - cut_start_time
-                self.cut_statistics[cut_name]["total_time"] += cut_time
-                
-                if results[cut_name]:
-                    self.cut_statistics[cut_name]["pass"] += 1
-                    self.logger.debug(f"Cut '{cut_name}' PASSED (took {cut_time:.4f}s)")
-                else:
-                    self.cut_statistics[cut_name]["fail"] += 1
-                    self.logger.debug(f"Cut '{cut_name}' FAILED (took {cut_time:.4f}s)")
-                
-                # Handle cut logic
-                if cut_expression is None:
-                    # No logic expression - use simple AND of all cuts
-                    if not results[cut_name]:
-                        overall_passes = False
-                        if return_on_fail:
-                            self.logger.debug(f"Stopping early after cut '{cut_name}' failed")
-                            break
-                else:
-                    # Replace cut name in expression with result
-                    placeholder = f"{{{cut_name}}}"
-                    cut_expression = cut_expression.replace(placeholder, str(results[cut_name]))
-                
-            except Exception as e:
-                # Something went wrong with this cut
-                self.logger.error(f"Error in cut '{cut_name}': {e}")
-                results[cut_name] = False
-                cutdata[f'cutdata_{cut_name}'] = {}
-                overall_passes = False
-                
-                if return_on_fail:
-                    break
-        
-        # Evaluate final cut expression if we have complex logic
-        if cut_expression is not None and self.cut_logic is not None:
-            try:
-                overall_passes = eval(cut_expression)
-                self.logger.debug(f"Cut logic '{self.cut_logic}' evaluated to: {overall_passes}")
+                if not return_on_fail:
+                    # run every cut in the expression so all results are reported
+                    for cut_name in self._compiled_logic.cut_names:
+                        get_result(cut_name)
+                overall_passes = self._compiled_logic.evaluate(get_result) and not errors
+                if debug:
+                    self.logger.debug(f"Cut logic '{self.cut_logic}' evaluated to: {overall_passes}")
             except Exception as e:
                 self.logger.error(f"Error evaluating cut logic '{self.cut_logic}': {e}")
                 overall_passes = False
+
+            if not return_on_fail:
+                # cuts not in the expression do not change the outcome: run them for their statistics
+                for cut_info in self.cuts:
+                    if cut_info['name'] not in results:
+                        run_cut(cut_info)
         
         # Update overall statistics
         if overall_passes:
             self.total_events_passed += 1
         
         # Log summary for this event
-        total_time = time.time() - start_time
-        self.logger.debug(f"Event {self.total_events_processed}: {'PASSED' if overall_passes else 'FAILED'} "
-                         f"(total time: {total_time:.4f}s)")
+        if debug:
+            total_time = (time.perf_counter_ns() - start_time)*1e-9
+            self.logger.debug(f"Event {self.total_events_processed}: {'PASSED' if overall_passes else 'FAILED'} "
+                             f"(total time: {total_time:.4f}s)")
         
         return overall_passes, results, cutdata
     
+    def _get_cuts_to_run(self) -> List[Dict[str, Any]]:
+        """
+        Get the cuts that are run on every event: all cuts. With cut logic, the ones it uses
+        come first, followed by the others, which are run for their statistics.
+        """
+        if self._compiled_logic is None:
+            return self.cuts
+        missing = [name for name in self._compiled_logic.cut_names if name not in self._cuts_by_name]
+        if missing:
+            raise ValueError(f"Cuts used in the cut logic were not added: {missing}")
+        used = [self._cuts_by_name[name] for name in self._compiled_logic.cut_names]
+        return used + [cut for cut in self.cuts if cut['name'] not in self._compiled_logic.cut_names]
+
+    def supports_batch(self) -> bool:
+        """
+        Check if every cut that will run has a vectorized version for the columnar execution mode.
+        """
+        return all(cut['name'] in _REGISTERED_BATCH_CUTS for cut in self._get_cuts_to_run())
+
+    def get_batch_branches(self) -> List[str]:
+        """
+        Get the union of ntuple branches read by the vectorized versions of the configured cuts.
+        """
+        branches = []
+        for cut in self._get_cuts_to_run():
+            batch_info = _REGISTERED_BATCH_CUTS.get(cut['name'])
+            if batch_info is None:
+                continue
+            for branch in batch_info['branches']:
+                if branch not in branches:
+                    branches.append(branch)
+        return branches
+
+    def get_required_branches(self) -> Optional[List[str]]:
+        """
+        Get the union of ntuple branches read by the cuts that run on every event.
+
+        Returns:
+            List of branch names (may contain wildcards), or None if one of these
+            cuts has not declared its branches with @register_cut(branches=[...])
+        """
+        branches = []
+        undeclared = []
+        for cut in self._get_cuts_to_run():
+            cut_branches = _CUT_BRANCHES.get(cut['name'])
+            if cut_branches is None:
+                undeclared.append(cut['name'])
+                continue
+            for branch in cut_branches:
+                if branch not in branches:
+                    branches.append(branch)
+        if undeclared:
+            self.logger.warning(f"Cuts {undeclared} do not declare the ntuple branches they read")
+            return None
+        return branches
+
+    def get_producer_requirements(self) -> Optional[Dict[str, List[str]]]:
+        """
+        Get the producers whose outputs each cut that runs on every event reads.
+
+        A 'required_producers' entry in the parameters of a cut replaces what
+        the cut declared with @register_cut(producers=[...]).
+
+        Returns:
+            Dictionary mapping cut names to lists of producer names, or None if one of
+            these cuts has not declared the producers it reads
+        """
+        requirements = {}
+        undeclared = []
+        for cut in self._get_cuts_to_run():
+            cut_producers = cut['params'].get('required_producers', _CUT_PRODUCERS.get(cut['name']))
+            if cut_producers is None:
+                undeclared.append(cut['name'])
+                continue
+            requirements[cut['name']] = list(cut_producers)
+        if undeclared:
+            self.logger.warning(f"Cuts {undeclared} do not declare the producers they read")
+            return None
+        return requirements
+
+    def apply_cuts_batch(self, batch: Any, data_name: str, ismc: bool = False,
+                         producer_outputs: Optional[Dict[str, Any]] = None) -> Tuple[Any, Dict[str, Any]]:
+        """
+        Apply all configured cuts to a chunk of events at once (columnar execution mode).
+
+        Requires supports_batch() to be True.
+
+        Args:
+            batch: ColumnBatch with the branches from get_batch_branches()
+            data_name: Name of the dataset
+            ismc: Whether this is Monte Carlo (simulated) data
+            producer_outputs: Batch outputs of the producers (producer name -> dict of arrays)
+
+        Returns:
+            Tuple of:
+            - passes: Boolean array, True for events passing the selection
+            - results: Dictionary with each cut's boolean array
+        """
+        import numpy as np
+
+        nevents = batch.size
+        self.total_events_processed += nevents
+
+        results = {}
+        for cut_info in self._get_cuts_to_run():
+            cut_name = cut_info['name']
+            batch_function = _REGISTERED_BATCH_CUTS[cut_name]['function']
+            cut_params = self._call_params(cut_info, ismc, data_name, producer_outputs)
+
+            cut_start_time = time.perf_counter_ns()
+            result = np.asarray(batch_function(batch, cut_params), dtype=bool)
+            if result.shape != (nevents,):
+                raise ValueError(f"Batch cut '{cut_name}' must return one boolean per event. "
+                                 f"Got shape {result.shape} for {nevents} events.")
+            results[cut_name] = result
+
+            npass = int(np.count_nonzero(result))
+            cut_ns = time.perf_counter_ns() - cut_start_time
+            self.cut_statistics[cut_name]["total_time"] += cut_ns*1e-9
+            if self.profiler is not None:
+                self.profiler.add('cut_batches', cut_name, cut_ns)
+            self.cut_statistics[cut_name]["pass"] += npass
+            self.cut_statistics[cut_name]["fail"] += nevents - npass
+
+        if self._compiled_logic is None:
+            passes = np.ones(nevents, dtype=bool)
+            for result in results.values():
+                passes &= result
+        else:
+            passes = self._compiled_logic.evaluate_arrays(results, nevents)
+
+        self.total_events_passed += int(np.count_nonzero(passes))
+
+        return passes, results
+
     def print_statistics(self):
         """
         Print a detailed summary of cut performance and efficiency.
@@ -507,6 +777,25 @@ class CutFactory:
         self.total_events_passed = 0
         self.logger.info("Statistics reset to zero")
     
+    def get_checkpoint_state(self) -> Dict[str, Any]:
+        """
+        Get the statistics so far, for a checkpoint of the event loop.
+        """
+        return {
+            'total_events_processed': self.total_events_processed,
+            'total_events_passed': self.total_events_passed,
+            'cut_statistics': {name: dict(stats) for name, stats in self.cut_statistics.items()}
+        }
+
+    def restore_checkpoint_state(self, state: Dict[str, Any]):
+        """
+        Restore the statistics saved by get_checkpoint_state, when resuming a job.
+        """
+        self.total_events_processed = state['total_events_processed']
+        self.total_events_passed = state['total_events_passed']
+        for name, stats in state['cut_statistics'].items():
+            self.cut_statistics[name].update(stats)
+
     def get_efficiency_report(self) -> Dict[str, float]:
         """
         Get a simple efficiency report for all cuts.
@@ -0,0 +1,146 @@
+"""
+Compiled cut logic expressions.
+
+The cut_logic option combines the results of the configured cuts, e.g.
+
+    cut_logic: "{fiducial_cut} and ({nue_cut} or not {numu_cut})"
+
+The expression is parsed once into a CompiledCutLogic. It can then be evaluated
+for a single event, asking for cut results only as they are needed (so cuts on
+the unused side of an 'and'/'or' never run), or over boolean NumPy arrays with
+one entry per event (columnar execution mode).
+
+Allowed in an expression: cut names (written as {cut_name} or bare cut_name),
+'and', 'or', 'not', parentheses, True and False.
+"""
+
+import ast
+import re
+from typing import Callable, Dict, List, Any
+
+# {cut_name} placeholders
+_PLACEHOLDER = re.compile(r"\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}")
+
+
+class CompiledCutLogic:
+    """
+    A cut logic expression parsed once into nested Python closures.
+
+    Example:
+        logic = CompiledCutLogic("{cut1} and ({cut2} or {cut3})")
+        logic.cut_names                     # ['cut1', 'cut2', 'cut3']
+        logic.evaluate(lambda name: results[name])
+        logic.evaluate_arrays({'cut1': a1, 'cut2': a2, 'cut3': a3})
+    """
+
+    def __init__(self, expression: str):
+        self.expression = expression
+        self.cut_names: List[str] = []
+
+        try:
+            tree = ast.parse(_PLACEHOLDER.sub(r"\1", expression).strip(), mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Cannot parse cut logic '{expression}': {e.msg}")
+
+        self._scalar = self._compile_scalar(tree.body)
+        self._vector = self._compile_vector(tree.body)
+
+    def _check_node(self, node):
+        if isinstance(node, ast.Name):
+            if node.id not in self.cut_names:
+                self.cut_names.append(node.id)
+        elif isinstance(node, ast.Constant):
+            if not isinstance(node.value, bool):
+                raise ValueError(f"Cut logic '{self.expression}' may only contain True/False constants. "
+                                 f"Found: {node.value!r}")
+        elif isinstance(node, ast.BoolOp):
+            pass
+        elif isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Not):
+            pass
+        else:
+            raise ValueError(f"Cut logic '{self.expression}' contains an unsupported element "
+                             f"({type(node).__name__}). Use cut names with and/or/not.")
+
+    def _compile_scalar(self, node) -> Callable[[Callable[[str], bool]], bool]:
+        """Build a function get_result -> bool for one event, with short-circuiting."""
+        self._check_node(node)
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            return lambda get_result: bool(get_result(name))
+
+        if isinstance(node, ast.Constant):
+            value = node.value
+            return lambda get_result: value
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile_scalar(node.operand)
+            return lambda get_result: not operand(get_result)
+
+        parts = [self._compile_scalar(value) for value in node.values]
+        if isinstance(node.op, ast.And):
+            def evaluate_and(get_result):
+                for part in parts:
+                    if not part(get_result):
+                        return False
+                return True
+            return evaluate_and
+
+        def evaluate_or(get_result):
+            for part in parts:
+                if part(get_result):
+                    return True
+            return False
+        return evaluate_or
+
+    def _compile_vector(self, node) -> Callable[[Dict[str, Any], int], Any]:
+        """Build a function (results, nevents) -> boolean array. Node types were checked by _compile_scalar."""
+        import numpy as np
+
+        if isinstance(node, ast.Name):
+            name = node.id
+            return lambda results, nevents: np.asarray(results[name], dtype=bool)
+
+        if isinstance(node, ast.Constant):
+            value = node.value
+            return lambda results, nevents: np.full(nevents, value, dtype=bool)
+
+        if isinstance(node, ast.UnaryOp):
+            operand = self._compile_vector(node.operand)
+            return lambda results, nevents: ~operand(results, nevents)
+
+        parts = [self._compile_vector(value) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+
+        def evaluate_boolop(results, nevents):
+            out = parts[0](results, nevents).copy()
+            for part in parts[1:]:
+                combine(out, part(results, nevents), out=out)
+            return out
+        return evaluate_boolop
+
+    def evaluate(self, get_result: Callable[[str], bool]) -> bool:
+        """
+        Evaluate the expression for one event.
+
+        Args:
+            get_result: Function returning the result of a cut given its name.
+                        It is only called for cuts needed to decide the outcome.
+        """
+        return self._scalar(get_result)
+
+    def evaluate_arrays(self, results: Dict[str, Any], nevents: int):
+        """
+        Evaluate the expression for many events at once.
+
+        Args:
+            results: Dictionary mapping cut names to boolean arrays (one value per event)
+            nevents: Number of events
+
+        Returns:
+            Boolean NumPy array with the outcome for each event
+        """
+        return self._vector(results, nevents)
+
+    def __repr__(self) -> str:
+        return f"CompiledCutLogic({self.expression!r})"
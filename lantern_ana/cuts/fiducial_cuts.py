@@ -1,8 +1,11 @@
 # lantern_ana/cuts/fiducial_cuts_new.py
 from lantern_ana.cuts.cut_factory import register_cut
-from lantern_ana.utils import is_inside_tpc, apply_sce_correction, get_uboone_tpc_bounds
+from lantern_ana.utils import is_inside_tpc, apply_sce_correction, apply_sce_correction_array, get_uboone_tpc_bounds
 from typing import Dict, Any, List, Union, Tuple
 
+# ntuple branches read by fiducial_cut (reco or true vertex, depending on its params)
+FIDUCIAL_CUT_BRANCHES = ['foundVertex', 'vtxX', 'vtxY', 'vtxZ', 'vtxIsFiducial',
+                         'trueVtxX', 'trueVtxY', 'trueVtxZ']
 
 def fiducial_cut(ntuple, params):
     """
@@ -15,6 +18,8 @@ def fiducial_cut(ntuple, params):
         - 'apply_scc': Apply Space Charge Correction (default: True)
         - 'usetruevtx': Use true vertex variable (default: False)
         - 'useWCvolume': Use Wire Cell fiducial volume definition (default: False)
+        - 'sce_grid': Interpolate the correction from this SCE grid file instead of using the
+                      larlite SCE tool. True for the default grid (see lantern_ana.utils.make_sce_grid)
         
     Returns:
     - True if the vertex is inside the fiducial volume, False otherwise
@@ -24,6 +29,7 @@ def fiducial_cut(ntuple, params):
     apply_scc = params.get('apply_scc', True)
     use_true_vtx = params.get('usetruevtx', False)
     use_wc_volume = params.get('useWCvolume', False)
+    sce_grid = params.get('sce_grid', None)
     
     # Use the inside WireCell Volume check run when the lantern ntuple is made
     if use_wc_volume:
@@ -48,7 +54,10 @@ def fiducial_cut(ntuple, params):
         return False
 
     # Apply space charge correction if requested
-    if apply_scc:
+    if apply_scc and sce_grid:
+        grid_file = sce_grid if isinstance(sce_grid, str) else None
+        corrected_pos = apply_sce_correction_array(pos, grid_file)[0]
+    elif apply_scc:
         corrected_pos = apply_sce_correction(pos)
     else:
         corrected_pos = pos
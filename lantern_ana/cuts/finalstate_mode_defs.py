@@ -1,8 +1,9 @@
 from lantern_ana.cuts.cut_factory import register_cut
 from lantern_ana.utils import KE_from_fourmom
 from lantern_ana.utils import get_true_primary_particle_counts
+from lantern_ana.utils.true_particle_counts import TRUE_PARTICLE_COUNT_BRANCHES
 
-@register_cut
+@register_cut(branches=TRUE_PARTICLE_COUNT_BRANCHES, producers=[])
 def isFS_true_CCmu0p0pi(ntuple,params):
     """
     Use the truth to tag the final state as numu CC with primary mu + 0 proton + 0 charged pion + 0 gamma + 0 X
@@ -28,7 +29,7 @@ def isFS_true_CCmu0p0pi(ntuple,params):
         return False
 
 
-@register_cut
+@register_cut(branches=TRUE_PARTICLE_COUNT_BRANCHES, producers=[])
 def isFS_true_CCmu1p0pi(ntuple,params):
     """
     Use the truth to tag the final state as numu CC with primary mu + 0 proton + 0 charged pion + 0 gamma + 0 X
@@ -53,7 +54,7 @@ def isFS_true_CCmu1p0pi(ntuple,params):
     else:
         return False
 
-@register_cut
+@register_cut(branches=TRUE_PARTICLE_COUNT_BRANCHES, producers=[])
 def isFS_true_CCmuMp0pi(ntuple,params):
     """
     Use the truth to tag the final state as numu CC with primary mu + 0 proton + 0 charged pion + 0 gamma + 0 X
@@ -78,7 +79,7 @@ def isFS_true_CCmuMp0pi(ntuple,params):
     else:
         return False
 
-@register_cut
+@register_cut(branches=TRUE_PARTICLE_COUNT_BRANCHES, producers=[])
 def isFS_true_CCmu0p1pi(ntuple,params):
     """
     Use the truth to tag the final state as numu CC with primary mu + 0 proton + 0 charged pion + 0 gamma + 0 X
@@ -1,6 +1,10 @@
 from lantern_ana.cuts.cut_factory import register_cut
 
-@register_cut
+@register_cut(branches=['foundVertex',
+                       'nShowers', 'showerNHits', 'showerIsSecondary', 'showerClassified', 'showerPID',
+                       'showerElScore', 'showerPhScore', 'showerPiScore', 'showerCharge',
+                       'showerProcess', 'showerCosTheta', 'showerDistToVtx',
+                       'nTracks', 'trackClassified', 'trackPID', 'trackRecoE', 'trackIsSecondary'], producers=[])
 def has_primary_electron(ntuple, params):
     """
     Cut that requires at least one reconstructed primary electron or track be classified as an electron
@@ -1,7 +1,7 @@
 # lantern_ana/cuts/muon_track_cuts.py
 from lantern_ana.cuts.cut_factory import register_cut
 
-@register_cut
+@register_cut(branches=['foundVertex', 'nTracks', 'trackClassified', 'trackPID', 'trackRecoE', 'trackIsSecondary'], producers=[])
 def has_muon_track(ntuple, params):
     """
     Cut that requires at least one reconstructed primary track identified as a muon
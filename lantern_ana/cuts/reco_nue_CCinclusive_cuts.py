@@ -1,7 +1,7 @@
 from lantern_ana.cuts.cut_factory import register_cut
-from lantern_ana.cuts.fiducial_cuts import fiducial_cut
+from lantern_ana.cuts.fiducial_cuts import fiducial_cut, FIDUCIAL_CUT_BRANCHES
 
-@register_cut
+@register_cut(branches=FIDUCIAL_CUT_BRANCHES+['fileid', 'run', 'subrun', 'event'], producers=['vertex_properties', 'recoElectron', 'recoMuonTrack'])
 def reco_nue_CCinc(ntuple, params):
     """
     Signal definition for reconstructed nue CC inclusive events.
@@ -27,7 +27,7 @@ def reco_nue_CCinc(ntuple, params):
     muon_data = producer_data.get('recoMuonTrack', {})
     
     # Get cut parameters
-    fv_params = params.get('fv_params', {'width': 10.0, 'apply_scc': True, 'usetruevtx': False})
+    fv_params = dict(params.get('fv_params', {'width': 10.0, 'apply_scc': True, 'usetruevtx': False}))
     fv_params['usetruevtx'] = False
     
     elconfidence_cut = params.get('min_electron_confidence', 0.0)
@@ -101,7 +101,7 @@ def reco_nue_CCinc(ntuple, params):
     return pass_event
 
 
-@register_cut
+@register_cut(branches=[], producers=['vertex_properties', 'recoElectron', 'recoMuonTrack'])
 def reco_nue_ccinclusive_gen2val_cuts(ntuple, params):
     """
     Matthew Rosenberg's nue inclusive cc selection.
@@ -1,11 +1,11 @@
 # lantern_ana/cuts/muon_track_cuts.py
 from lantern_ana.cuts.cut_factory import register_cut
-from lantern_ana.cuts.fiducial_cuts import fiducial_cut
+from lantern_ana.cuts.fiducial_cuts import fiducial_cut, FIDUCIAL_CUT_BRANCHES
 from lantern_ana.cuts.reco_muon_cuts import has_muon_track
-from lantern_ana.utils.get_primary_electron_candidates import get_primary_electron_candidates
+from lantern_ana.utils.get_primary_electron_candidates import get_primary_electron_candidates, ELECTRON_CANDIDATE_BRANCHES
 from math import exp,sqrt
 
-@register_cut
+@register_cut(branches=[], producers=['vertex_properties', 'recoElectron', 'recoMuonTrack'])
 def reco_numu_CCinc(ntuple, params):
     """
     Matthew Rosenberg's numu inclusive cc selection.
@@ -34,7 +34,9 @@ def reco_numu_CCinc(ntuple, params):
     return False
     
 
-@register_cut
+@register_cut(branches=FIDUCIAL_CUT_BRANCHES+ELECTRON_CANDIDATE_BRANCHES+[
+    'vtxFracHitsOnCosmic', 'vtxDistToTrue',
+    'nTracks', 'trackIsSecondary', 'trackClassified', 'trackPID', 'trackMuScore', 'trackCharge'], producers=[])
 def reco_numu_CCinc_deprecated(ntuple, params):
     """
     Signal definition for candidated reconstructed numu CC inclusive events
@@ -49,7 +51,7 @@ def reco_numu_CCinc_deprecated(ntuple, params):
     - True if all conditions satisfied
     """
     # Get parameters for subcuts
-    fv_params  = params.get('fiducial_cut',{'width':10.0,'apply_scc':True,'usetruevtx':False,'useWCvolume':False})
+    fv_params  = dict(params.get('fiducial_cut',{'width':10.0,'apply_scc':True,'usetruevtx':False,'useWCvolume':False}))
     fv_params['usetruevtx'] = False
     reco_mu_params = params.get('has_muon_track',{})
     apply_goodvertex_truthcut = params.get('apply_goodvertex_truthcut', False)
@@ -1,6 +1,7 @@
-from lantern_ana.cuts.cut_factory import register_cut
+import numpy as np
+from lantern_ana.cuts.cut_factory import register_cut, register_batch_cut
 
-@register_cut
+@register_cut(branches=['trueNuCCNC', 'trueNuPDG'], producers=[])
 def remove_true_nue_cc(ntuple, params):
     """
     we have to remove true nue cc events from bnb nu MC files in order to get the proper prediction.
@@ -24,4 +25,22 @@ def remove_true_nue_cc(ntuple, params):
         if ntuple.trueNuCCNC==0 and abs(ntuple.trueNuPDG)==12:
             return True # remove
 
-    return False # do no remove
\ No newline at end of file
+    return False # do no remove
+
+
+@register_batch_cut('remove_true_nue_cc', branches=['trueNuCCNC', 'trueNuPDG'])
+def remove_true_nue_cc_batch(batch, params):
+    """
+    Vectorized version of remove_true_nue_cc for the columnar execution mode.
+    """
+    if not params['ismc']:
+        return np.zeros(batch.size, dtype=bool)
+
+    apply_to_data = params.get('applyto')
+    if type(apply_to_data) is not list:
+        raise ValueError('applyto paramter for remove_true_nue_cc cut needs to be a list of strings')
+
+    if params['data_name'] not in apply_to_data:
+        return np.zeros(batch.size, dtype=bool)
+
+    return (batch.trueNuCCNC==0) & (np.abs(batch.trueNuPDG)==12)
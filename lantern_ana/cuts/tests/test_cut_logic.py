@@ -0,0 +1,227 @@
+"""
+Tests of CompiledCutLogic: the compiled expression must give the same result as
+eval of the cut_logic string with the cut results filled in, which is what
+CutFactory did before the expression was compiled. Also tests of how CutFactory
+runs the cuts with a cut logic: cuts not in the expression are still run for their
+statistics, and each cut call gets its own parameters.
+"""
+
+import itertools
+import re
+
+import numpy as np
+import pytest
+
+from lantern_ana.cuts.cut_factory import CutFactory, register_batch_cut, register_cut
+from lantern_ana.cuts.cut_logic import CompiledCutLogic
+
+EXPRESSIONS = [
+    "{a}",
+    "not {a}",
+    "{a} and {b}",
+    "{a} or {b}",
+    "{a} or {b} and {c}",
+    "({a} or {b}) and {c}",
+    "not {a} and {b}",
+    "not ({a} and {b}) or {c}",
+    "{a} and not {b} or not {c}",
+    "{a} and ({b} or not {c}) and True",
+    "False or {a}",
+    "a and (b or c)",
+]
+
+
+def eval_expression(expression, results):
+    """Evaluate the cut logic as a string, as the cut factory did with eval."""
+    text = expression
+    for name, value in results.items():
+        text = re.sub(r"\{\s*%s\s*\}|\b%s\b" % (name, name), str(value), text)
+    return eval(text)
+
+
+def all_results(names):
+    for values in itertools.product([False, True], repeat=len(names)):
+        yield dict(zip(names, values))
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_scalar_matches_eval(expression):
+    logic = CompiledCutLogic(expression)
+    for results in all_results(['a', 'b', 'c']):
+        assert logic.evaluate(lambda name: results[name]) == eval_expression(expression, results)
+
+
+@pytest.mark.parametrize("expression", EXPRESSIONS)
+def test_arrays_match_eval(expression):
+    logic = CompiledCutLogic(expression)
+    combinations = list(all_results(['a', 'b', 'c']))
+    arrays = {name: np.array([results[name] for results in combinations]) for name in ['a', 'b', 'c']}
+    expected = np.array([eval_expression(expression, results) for results in combinations])
+    out = logic.evaluate_arrays(arrays, len(combinations))
+    assert out.dtype == bool
+    np.testing.assert_array_equal(out, expected)
+
+
+def test_arrays_do_not_modify_inputs():
+    logic = CompiledCutLogic("{a} or {b}")
+    a = np.array([True, False, False])
+    b = np.array([False, False, True])
+    logic.evaluate_arrays({'a': a, 'b': b}, 3)
+    np.testing.assert_array_equal(a, [True, False, False])
+
+
+def test_cut_names_in_order_of_appearance():
+    logic = CompiledCutLogic("{fv} and ({nue} or not {fv}) and numu")
+    assert logic.cut_names == ['fv', 'nue', 'numu']
+
+
+@pytest.mark.parametrize("expression, results, expected_calls", [
+    ("{a} and {b} and {c}", {'a': False, 'b': True, 'c': True}, ['a']),
+    ("{a} and {b} and {c}", {'a': True, 'b': False, 'c': True}, ['a', 'b']),
+    ("{a} or {b} or {c}", {'a': True, 'b': False, 'c': False}, ['a']),
+    ("{a} or {b} and {c}", {'a': False, 'b': False, 'c': True}, ['a', 'b']),
+    ("({a} or {b}) and {c}", {'a': True, 'b': True, 'c': False}, ['a', 'c']),
+    ("not {a} and {b}", {'a': True, 'b': True}, ['a']),
+])
+def test_short_circuit(expression, results, expected_calls):
+    logic = CompiledCutLogic(expression)
+    calls = []
+
+    def get_result(name):
+        calls.append(name)
+        return results[name]
+
+    assert logic.evaluate(get_result) == eval_expression(expression, results)
+    assert calls == expected_calls
+
+
+@pytest.mark.parametrize("expression", [
+    "{a} and",
+    "{a} + {b}",
+    "{a} == {b}",
+    "{a} and 1",
+    "f({a})",
+    "{a}.x",
+])
+def test_invalid_expressions_raise(expression):
+    with pytest.raises(ValueError):
+        CompiledCutLogic(expression)
+
+
+def test_missing_result_raises():
+    logic = CompiledCutLogic("{a} and {b}")
+    with pytest.raises(KeyError):
+        logic.evaluate_arrays({'a': np.ones(2, dtype=bool)}, 2)
+
+
+def test_unknown_cut_name_raises():
+    factory = CutFactory(log_level="WARNING")
+    with pytest.raises(ValueError, match="no_such_cut_name"):
+        factory.set_cut_logic("{fiducial_cut} and {no_such_cut_name}")
+
+
+class Event:
+    def __init__(self, energy):
+        self.energy = energy
+
+
+@register_cut
+def cutlogic_test_high_energy(ntuple, params):
+    return ntuple.energy > params.get('min_energy', 100.0)
+
+
+@register_cut
+def cutlogic_test_low_energy(ntuple, params):
+    return ntuple.energy < params.get('max_energy', 50.0)
+
+
+@register_cut
+def cutlogic_test_writes_params(ntuple, params):
+    """Writes into its parameters, like the CC inclusive cuts do."""
+    assert 'seen' not in params
+    params['seen'] = True
+    params['data_name'] = "changed"
+    return ntuple.energy > 10.0
+
+
+@register_batch_cut('cutlogic_test_high_energy')
+def cutlogic_test_high_energy_batch(batch, params):
+    return np.asarray(batch.energy) > params.get('min_energy', 100.0)
+
+
+@register_batch_cut('cutlogic_test_low_energy')
+def cutlogic_test_low_energy_batch(batch, params):
+    return np.asarray(batch.energy) < params.get('max_energy', 50.0)
+
+
+ENERGIES = [5.0, 20.0, 70.0, 150.0, 300.0]
+
+
+def make_factory(cut_logic):
+    factory = CutFactory(log_level="WARNING")
+    factory.add_cut('cutlogic_test_high_energy', {'min_energy': 100.0})
+    factory.add_cut('cutlogic_test_low_energy', {'max_energy': 50.0})
+    factory.add_cut('cutlogic_test_writes_params', {})
+    factory.set_cut_logic(cut_logic)
+    return factory
+
+
+def test_cuts_not_in_logic_run_for_statistics():
+    factory = make_factory("{cutlogic_test_high_energy}")
+    for energy in ENERGIES:
+        passes, results, _ = factory.apply_cuts(Event(energy), "mc", return_on_fail=False)
+        assert passes == (energy > 100.0)
+        assert results['cutlogic_test_low_energy'] == (energy < 50.0)
+        assert results['cutlogic_test_writes_params'] == (energy > 10.0)
+    stats = factory.cut_statistics
+    assert (stats['cutlogic_test_high_energy']['pass'], stats['cutlogic_test_high_energy']['fail']) == (2, 3)
+    assert (stats['cutlogic_test_low_energy']['pass'], stats['cutlogic_test_low_energy']['fail']) == (2, 3)
+    assert (stats['cutlogic_test_writes_params']['pass'], stats['cutlogic_test_writes_params']['fail']) == (4, 1)
+    assert factory.total_events_passed == 2
+
+
+def test_cuts_not_in_logic_skipped_with_return_on_fail():
+    factory = make_factory("{cutlogic_test_high_energy}")
+    for energy in ENERGIES:
+        passes, results, _ = factory.apply_cuts(Event(energy), "mc", return_on_fail=True)
+        assert passes == (energy > 100.0)
+        assert list(results) == ['cutlogic_test_high_energy']
+    assert 'cutlogic_test_low_energy' not in factory.cut_statistics
+
+
+def test_cuts_to_run_include_cuts_not_in_logic():
+    factory = make_factory("{cutlogic_test_low_energy}")
+    assert [cut['name'] for cut in factory._get_cuts_to_run()] == [
+        'cutlogic_test_low_energy', 'cutlogic_test_high_energy', 'cutlogic_test_writes_params']
+
+
+def test_each_call_gets_its_own_params():
+    factory = make_factory("{cutlogic_test_writes_params} and {cutlogic_test_high_energy}")
+    for energy in ENERGIES:
+        passes, results, _ = factory.apply_cuts(Event(energy), "mc", return_on_fail=False)
+        # an error in the cut (the assert on params) would make it fail
+        assert results['cutlogic_test_writes_params'] == (energy > 10.0)
+        assert passes == (energy > 100.0)
+    assert factory.cuts[2]['params'] == {}
+
+    # without cut logic too
+    factory = CutFactory(log_level="WARNING")
+    factory.add_cut('cutlogic_test_writes_params', {'threshold': 1.0})
+    for energy in ENERGIES:
+        assert factory.apply_cuts(Event(energy), "mc", return_on_fail=False)[0] == (energy > 10.0)
+    assert factory.cuts[0]['params'] == {'threshold': 1.0}
+
+
+def test_batch_cuts_not_in_logic_run_for_statistics():
+    from lantern_ana.io.columnar import ColumnBatch
+
+    factory = CutFactory(log_level="WARNING")
+    factory.add_cut('cutlogic_test_high_energy', {'min_energy': 100.0})
+    factory.add_cut('cutlogic_test_low_energy', {'max_energy': 50.0})
+    factory.set_cut_logic("not {cutlogic_test_high_energy}")
+    assert factory.supports_batch()
+    batch = ColumnBatch(0, len(ENERGIES), {'energy': np.array(ENERGIES)})
+    passes, results = factory.apply_cuts_batch(batch, "mc")
+    np.testing.assert_array_equal(passes, np.array(ENERGIES) <= 100.0)
+    np.testing.assert_array_equal(results['cutlogic_test_low_energy'], np.array(ENERGIES) < 50.0)
+    assert factory.cut_statistics['cutlogic_test_low_energy']['pass'] == 2
@@ -1,8 +1,9 @@
 from lantern_ana.cuts.cut_factory import register_cut
-from lantern_ana.cuts.fiducial_cuts import fiducial_cut
+from lantern_ana.cuts.fiducial_cuts import fiducial_cut, FIDUCIAL_CUT_BRANCHES
 from lantern_ana.utils import get_true_primary_particle_counts 
+from lantern_ana.utils.true_particle_counts import TRUE_PARTICLE_COUNT_BRANCHES
 
-@register_cut
+@register_cut(branches=['trueNuCCNC', 'trueNuPDG']+FIDUCIAL_CUT_BRANCHES+TRUE_PARTICLE_COUNT_BRANCHES, producers=[])
 def true_nue_CCinc(ntuple, params):
     """
     Signal definition for true numu CC inclusive event
@@ -37,7 +38,7 @@ def true_nue_CCinc(ntuple, params):
     true_part_cfg['gKE']  = params.get('gKE',10.0)
     true_part_cfg['xKE']  = params.get('xKE',60.0)
     part_count_params = params.get('part_count_params',true_part_cfg)
-    fv_params  = params.get('fv_params',{'width':10.0,'apply_scc':False})
+    fv_params  = dict(params.get('fv_params',{'width':10.0,'apply_scc':False}))
     fv_params['usetruevtx'] = True
     
     pass_fv = fiducial_cut(ntuple,fv_params)
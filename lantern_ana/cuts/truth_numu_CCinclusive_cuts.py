@@ -1,9 +1,10 @@
 # lantern_ana/cuts/muon_track_cuts.py
 from lantern_ana.cuts.cut_factory import register_cut
-from lantern_ana.cuts.fiducial_cuts import fiducial_cut
+from lantern_ana.cuts.fiducial_cuts import fiducial_cut, FIDUCIAL_CUT_BRANCHES
 from lantern_ana.utils import get_true_primary_particle_counts 
+from lantern_ana.utils.true_particle_counts import TRUE_PARTICLE_COUNT_BRANCHES
 
-@register_cut
+@register_cut(branches=FIDUCIAL_CUT_BRANCHES+TRUE_PARTICLE_COUNT_BRANCHES, producers=[])
 def true_numu_CCinc(ntuple, params):
     """
     Signal definition for true numu CC inclusive event
@@ -23,7 +24,7 @@ def true_numu_CCinc(ntuple, params):
 
     # Get threshold
     part_count_params = params.get('part_count_params',{})
-    fv_params  = params.get('fv_params',{'width':10.0,'apply_scc':False})
+    fv_params  = dict(params.get('fv_params',{'width':10.0,'apply_scc':False}))
     fv_params['usetruevtx'] = True
     
     pass_fv = fiducial_cut(ntuple,fv_params)
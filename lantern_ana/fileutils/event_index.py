@@ -0,0 +1,344 @@
+"""
+Persistent run/subrun/event index of a sample, for bookkeeping and event scanning.
+
+Finding the files of an event used to mean parsing the bookkeeping text file again
+(get_file_from_rse.py) and looping over the ntuple entries. SampleEventIndex stores,
+in one sqlite file per sample:
+
+  - files:   one row per fileid from bookkeep/<bookfile>: number of events, run/subrun/event
+             ranges, file name, and the dlmerged and reco paths of the file
+  - ntuples: the ntuple files that were indexed, with their size and modification time
+  - events:  (run, subrun, event) -> fileid, ntuple file and entry, read from the ntuples
+  - bookfiles: the bookkeeping files that were indexed, with their size and modification
+             time, and the fileids each of them listed (bookfile_files)
+
+It is built once, then lookups of many events are a single sqlite query.
+update_bookfile indexes a bookkeeping file again only if it changed since it was indexed.
+Events that are not in any indexed ntuple are matched to a file from the run/subrun/event
+ranges of the bookkeeping file instead (without an ntuple entry). The bookkeeping file only
+gives the min and max of each of run, subrun and event, so such a match is approximate:
+it is marked with match='range', and every file whose ranges contain the event is listed.
+
+Example:
+    index = SampleEventIndex.open("run3_bnbnu")
+    index.add_bookfile("bookkeep/fileinfo_mcc9_v40a_dl_run3b_bnb_nu_overlay_500k_CV.txt")
+    index.add_ntuples(["ntuple_run3b_bnb_nu_overlay.root"])
+    rows = index.lookup(runs, subruns, events)
+
+Command line:
+    python -m lantern_ana.fileutils.event_index build -d run3_bnbnu --ntuples ntuple_*.root
+    python -m lantern_ana.fileutils.event_index lookup -d run3_bnbnu --event-list events.txt --out files.txt
+"""
+
+import os
+import sys
+import time
+import sqlite3
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from lantern_ana.utils.cache import get_cache_dir, file_signature
+from lantern_ana.fileutils.bookfile_parser import make_dict_from_file
+
+# columns returned by lookup
+# match: 'ntuple' if the event was found in an indexed ntuple,
+#        'range' if it is only inside the run/subrun/event ranges of the file (approximate)
+LOOKUP_COLUMNS = ['run', 'subrun', 'event', 'fileid', 'dlmerged_path', 'reco_path', 'ntuple', 'entry', 'match']
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    fileid INTEGER PRIMARY KEY,
+    nevents INTEGER,
+    run_min INTEGER, run_max INTEGER,
+    subrun_min INTEGER, subrun_max INTEGER,
+    event_min INTEGER, event_max INTEGER,
+    fname TEXT,
+    dlmerged_path TEXT,
+    reco_path TEXT
+);
+CREATE TABLE IF NOT EXISTS ntuples (
+    ntuple_id INTEGER PRIMARY KEY,
+    path TEXT UNIQUE,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS bookfiles (
+    path TEXT PRIMARY KEY,
+    size INTEGER,
+    mtime_ns INTEGER
+);
+CREATE TABLE IF NOT EXISTS bookfile_files (
+    path TEXT,
+    fileid INTEGER
+);
+CREATE TABLE IF NOT EXISTS events (
+    run INTEGER, subrun INTEGER, event INTEGER,
+    fileid INTEGER,
+    ntuple_id INTEGER,
+    entry INTEGER
+);
+CREATE INDEX IF NOT EXISTS events_rse ON events (run, subrun, event);
+CREATE INDEX IF NOT EXISTS files_run ON files (run_min, run_max);
+"""
+
+
+def sample_file_paths(sample_info: Dict[str, Any], fileid: int, fname: str) -> Dict[str, str]:
+    """
+    Paths of the dlmerged and larflow reco files of a fileid, following the layout of the sample directories.
+
+    Args:
+        sample_info: Sample definition (see lantern_ana.sampledefs)
+        fileid: File id from the bookkeeping file
+        fname: Name of the dlmerged file from the bookkeeping file
+    """
+    zfileid = "%06d"%(fileid)
+    dlmerged_path = sample_info['dlmerged_data_dir']+"/%s/%s"%(zfileid[:2],zfileid[2:4])+"/"+fname
+    recofilename = fname.replace("merged_dlreco","larflowreco_fileid%04d"%(fileid)).replace(".root","_kpsrecomanagerana.root")
+    reco_path = sample_info['reco_dir']+"/%03d"%(fileid//100)+"/"+recofilename
+    return {'dlmerged_path': dlmerged_path, 'reco_path': reco_path}
+
+
+def default_index_path(sample_name: str) -> str:
+    """Path of the index of a sample in the lantern_ana cache directory."""
+    return os.path.join(get_cache_dir('event_index'), f"{sample_name}.sqlite")
+
+
+class SampleEventIndex:
+    """
+    sqlite index of the files and events of one sample (see the module documentation).
+    """
+
+    def __init__(self, db_path: str, sample_info: Optional[Dict[str, Any]] = None):
+        """
+        Args:
+            db_path: sqlite file, created if missing
+            sample_info: Sample definition, used to make the dlmerged and reco paths in add_bookfile
+        """
+        self.db_path = db_path
+        self.sample_info = sample_info
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(_SCHEMA)
+
+    @classmethod
+    def open(cls, sample_name: str, db_path: Optional[str] = None) -> "SampleEventIndex":
+        """Open the index of a sample defined in lantern_ana.sampledefs."""
+        from lantern_ana.sampledefs import get_sample_info
+        if db_path is None:
+            db_path = default_index_path(sample_name)
+        return cls(db_path, get_sample_info(sample_name))
+
+    def close(self):
+        self.conn.close()
+
+    def add_bookfile(self, bookfile: str):
+        """
+        Add (or replace) the files listed in a bookkeeping file.
+        Files listed by a previous version of the same bookkeeping file are removed.
+        """
+        signature = file_signature(bookfile)
+        bookdict = make_dict_from_file(bookfile)
+        rows = []
+        for fileid, info in bookdict.items():
+            paths = {'dlmerged_path': None, 'reco_path': None}
+            if self.sample_info is not None:
+                paths = sample_file_paths(self.sample_info, fileid, info['fname'])
+            rows.append((fileid, info['nevents'], *info['run_range'], *info['subrun_range'], *info['event_range'],
+                         info['fname'], paths['dlmerged_path'], paths['reco_path']))
+        with self.conn:
+            self.conn.execute("DELETE FROM files WHERE fileid IN (SELECT fileid FROM bookfile_files WHERE path=?)",
+                              (signature['path'],))
+            self.conn.execute("DELETE FROM bookfile_files WHERE path=?", (signature['path'],))
+            self.conn.executemany("INSERT OR REPLACE INTO files VALUES (?,?,?,?,?,?,?,?,?,?,?)", rows)
+            self.conn.executemany("INSERT INTO bookfile_files VALUES (?,?)",
+                                  [(signature['path'], fileid) for fileid in bookdict])
+            self.conn.execute("INSERT OR REPLACE INTO bookfiles VALUES (?,?,?)",
+                              (signature['path'], signature['size'], signature['mtime_ns']))
+        print(f"Event index: added {len(rows)} files from {bookfile}")
+
+    def update_bookfile(self, bookfile: str) -> bool:
+        """
+        Add the files of a bookkeeping file if it was not indexed yet, or if its size or
+        modification time changed since it was indexed.
+
+        Returns:
+            True if the bookkeeping file was (re)indexed
+        """
+        signature = file_signature(bookfile)
+        row = self.conn.execute("SELECT size, mtime_ns FROM bookfiles WHERE path=?",
+                                (signature['path'],)).fetchone()
+        if row is not None and row[0] == signature['size'] and row[1] == signature['mtime_ns']:
+            return False
+        self.add_bookfile(bookfile)
+        return True
+
+    def add_ntuples(self, ntuple_files: List[str], treename: str = "EventTree"):
+        """
+        Add the events of ntuple files, read in bulk from their run, subrun, event and fileid branches.
+        Files already indexed with the same size and modification time are skipped.
+        """
+        import ROOT as rt
+        for path in ntuple_files:
+            signature = file_signature(path)
+            row = self.conn.execute("SELECT ntuple_id, size, mtime_ns FROM ntuples WHERE path=?",
+                                    (signature['path'],)).fetchone()
+            if row is not None and row[1] == signature['size'] and row[2] == signature['mtime_ns']:
+                print(f"Event index: {path} is already indexed")
+                continue
+
+            tstart = time.time()
+            chain = rt.TChain(treename)
+            chain.Add(path)
+            nentries = chain.GetEntries()
+            if nentries > 0:
+                arrays = rt.RDataFrame(chain).AsNumpy(['run', 'subrun', 'event', 'fileid'])
+            else:
+                arrays = {name: np.zeros(0, dtype=np.int64) for name in ['run', 'subrun', 'event', 'fileid']}
+
+            with self.conn:
+                if row is not None:
+                    self.conn.execute("DELETE FROM events WHERE ntuple_id=?", (row[0],))
+                    self.conn.execute("DELETE FROM ntuples WHERE ntuple_id=?", (row[0],))
+                cursor = self.conn.execute("INSERT INTO ntuples (path, size, mtime_ns) VALUES (?,?,?)",
+                                           (signature['path'], signature['size'], signature['mtime_ns']))
+                ntuple_id = cursor.lastrowid
+                columns = [np.asarray(arrays[name], dtype=np.int64).tolist() for name in ['run', 'subrun', 'event', 'fileid']]
+                self.conn.executemany("INSERT INTO events VALUES (?,?,?,?,?,?)",
+                                      zip(*columns, [ntuple_id]*nentries, range(nentries)))
+            print(f"Event index: added {nentries} events from {path} in {time.time()-tstart:.2f} secs")
+
+    def lookup(self, run, subrun, event) -> List[Optional[Dict[str, Any]]]:
+        """
+        Find the files of many events at once.
+
+        Args:
+            run, subrun, event: Arrays (or lists) with the RSE of the events to find
+
+        Returns:
+            One dictionary per event with the LOOKUP_COLUMNS, or None if the event was not found.
+            Events only found in the bookkeeping ranges have match='range', ntuple and entry None,
+            and 'candidate_fileids': all the files whose ranges contain the event (fileid is the first).
+        """
+        query = list(zip(*[np.atleast_1d(np.asarray(v, dtype=np.int64)).tolist() for v in (run, subrun, event)]))
+        results: List[Optional[Dict[str, Any]]] = [None]*len(query)
+        with self.conn:
+            self.conn.execute("CREATE TEMP TABLE IF NOT EXISTS query (i INTEGER, run INTEGER, subrun INTEGER, event INTEGER)")
+            self.conn.execute("DELETE FROM query")
+            self.conn.executemany("INSERT INTO query VALUES (?,?,?,?)",
+                                  [(i, r, s, e) for i, (r, s, e) in enumerate(query)])
+
+            # events indexed from the ntuples
+            rows = self.conn.execute("""
+                SELECT q.i, q.run, q.subrun, q.event, ev.fileid, f.dlmerged_path, f.reco_path, n.path, ev.entry, 'ntuple'
+                FROM query q
+                JOIN events ev ON ev.run=q.run AND ev.subrun=q.subrun AND ev.event=q.event
+                JOIN ntuples n ON n.ntuple_id=ev.ntuple_id
+                LEFT JOIN files f ON f.fileid=ev.fileid
+                ORDER BY q.i, ev.ntuple_id, ev.entry""").fetchall()
+            for row in rows:
+                if results[row[0]] is None:
+                    results[row[0]] = dict(zip(LOOKUP_COLUMNS, row[1:]))
+
+            # the others, from the run/subrun/event ranges of the bookkeeping file
+            rows = self.conn.execute("""
+                SELECT q.i, q.run, q.subrun, q.event, f.fileid, f.dlmerged_path, f.reco_path, NULL, NULL, 'range'
+                FROM query q
+                JOIN files f ON q.run BETWEEN f.run_min AND f.run_max
+                            AND q.subrun BETWEEN f.subrun_min AND f.subrun_max
+                            AND q.event BETWEEN f.event_min AND f.event_max
+                ORDER BY q.i, f.fileid""").fetchall()
+            for row in rows:
+                result = results[row[0]]
+                if result is None:
+                    result = results[row[0]] = dict(zip(LOOKUP_COLUMNS, row[1:]))
+                    result['candidate_fileids'] = []
+                if result['match'] == 'range':
+                    result['candidate_fileids'].append(row[4])
+        return results
+
+    def lookup_fileid(self, fileid: int) -> Optional[Dict[str, Any]]:
+        """The bookkeeping information and paths of one fileid, or None."""
+        cursor = self.conn.execute("SELECT * FROM files WHERE fileid=?", (fileid,))
+        row = cursor.fetchone()
+        if row is None:
+            return None
+        return dict(zip([col[0] for col in cursor.description], row))
+
+    def num_events(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+    def num_files(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+
+def read_event_list(filepath: str) -> np.ndarray:
+    """
+    Read (run, subrun, event) from the first three columns of a text file, one event per line.
+    """
+    rse = []
+    with open(filepath) as f:
+        for line in f:
+            info = line.split()
+            if len(info) < 3 or info[0].startswith('#'):
+                continue
+            rse.append([int(info[0]), int(info[1]), int(info[2])])
+    return np.array(rse, dtype=np.int64).reshape(-1, 3)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build or query the run/subrun/event index of a sample")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build = subparsers.add_parser('build', help='Index the bookkeeping file and ntuples of a sample')
+    build.add_argument('-d', '--data-sample', required=True, help='Sample name in lantern_ana.sampledefs')
+    build.add_argument('--db', default=None, help='Index file (default: in the lantern_ana cache directory)')
+    build.add_argument('--bookkeep-dir', default='bookkeep', help='Directory with the bookkeeping files')
+    build.add_argument('--ntuples', nargs='*', default=[], help='Ntuple files of the sample')
+    build.add_argument('--tree', default='EventTree', help='Tree in the ntuple files')
+
+    lookup = subparsers.add_parser('lookup', help='Find the files of events')
+    lookup.add_argument('-d', '--data-sample', required=True, help='Sample name in lantern_ana.sampledefs')
+    lookup.add_argument('--db', default=None, help='Index file (default: in the lantern_ana cache directory)')
+    lookup.add_argument('--rse', nargs=3, type=int, action='append', default=[], metavar=('RUN', 'SUBRUN', 'EVENT'))
+    lookup.add_argument('--event-list', default=None, help='Text file with run subrun event in the first columns')
+    lookup.add_argument('-o', '--out', default=None, help='Write the results to this text file')
+    args = parser.parse_args(argv)
+
+    index = SampleEventIndex.open(args.data_sample, args.db)
+    if args.command == 'build':
+        index.add_bookfile(os.path.join(args.bookkeep_dir, index.sample_info['bookfile']))
+        index.add_ntuples(args.ntuples, args.tree)
+        print(f"Event index {index.db_path}: {index.num_files()} files, {index.num_events()} events")
+        return 0
+
+    rse = np.array(args.rse, dtype=np.int64).reshape(-1, 3)
+    if args.event_list is not None:
+        rse = np.concatenate([rse, read_event_list(args.event_list)])
+    results = index.lookup(rse[:, 0], rse[:, 1], rse[:, 2])
+
+    fout = open(args.out, 'w') if args.out is not None else sys.stdout
+    nmissing = 0
+    napprox = 0
+    for (run, subrun, event), result in zip(rse.tolist(), results):
+        if result is None:
+            nmissing += 1
+            print(f"# not found: {run} {subrun} {event}", file=fout)
+            continue
+        if result['match'] == 'range':
+            napprox += 1
+            print(f"# approximate: {run} {subrun} {event} is only inside the bookkeeping ranges of fileids "
+                  f"{result['candidate_fileids']}", file=fout)
+        print(" ".join(str(result[col]) for col in LOOKUP_COLUMNS), file=fout)
+    if fout is not sys.stdout:
+        fout.close()
+    if napprox > 0:
+        print(f"{napprox} of {len(rse)} events matched to a file from the bookkeeping ranges only (match=range): "
+              f"index the ntuples with these events for exact matches", file=sys.stderr)
+    if nmissing > 0:
+        print(f"{nmissing} of {len(rse)} events not found", file=sys.stderr)
+    return 0 if nmissing == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
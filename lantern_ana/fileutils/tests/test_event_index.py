@@ -0,0 +1,61 @@
+"""
+Tests of the bookkeeping part of SampleEventIndex: update_bookfile indexes a bookkeeping
+file once, and again only when it changes, replacing the files of its previous version.
+"""
+
+import os
+
+from lantern_ana.fileutils.event_index import SampleEventIndex
+
+BOOKFILE_LINES = [
+    "0   7   5121   5121   3  3   166   194   merged_dlreco_a.root",
+    "1   18   5121   5121   4  5   201   299   merged_dlreco_b.root",
+    "2   23   5121   5121   6  7   304   394   merged_dlreco_c.root",
+]
+
+
+def write_bookfile(path, lines, mtime_ns=None):
+    with open(path, 'w') as f:
+        f.write("\n".join(lines) + "\n")
+    if mtime_ns is not None:
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+
+
+def test_update_bookfile(tmp_path):
+    bookfile = str(tmp_path / "fileinfo.txt")
+    write_bookfile(bookfile, BOOKFILE_LINES, mtime_ns=1_000_000_000)
+    index = SampleEventIndex(str(tmp_path / "index.sqlite"))
+
+    assert index.update_bookfile(bookfile)
+    assert index.num_files() == 3
+    assert index.lookup([5121], [4], [250])[0]['fileid'] == 1
+    # unchanged: not parsed again
+    assert not index.update_bookfile(bookfile)
+    index.close()
+
+    # a new version of the bookkeeping file, with the same size: fileid 1 covers other
+    # events, and fileid 2 was removed. The index is rebuilt in the next job.
+    lines = [BOOKFILE_LINES[0], BOOKFILE_LINES[1].replace("201   299", "501   599")]
+    write_bookfile(bookfile, lines, mtime_ns=2_000_000_000)
+    index = SampleEventIndex(str(tmp_path / "index.sqlite"))
+    assert index.update_bookfile(bookfile)
+    assert index.num_files() == 2
+    assert index.lookup_fileid(2) is None
+    assert index.lookup([5121], [4], [250])[0] is None
+    assert index.lookup([5121], [4], [550])[0]['fileid'] == 1
+    assert not index.update_bookfile(bookfile)
+
+
+def test_bookfiles_are_replaced_separately(tmp_path):
+    first = str(tmp_path / "first.txt")
+    second = str(tmp_path / "second.txt")
+    write_bookfile(first, BOOKFILE_LINES[:2], mtime_ns=1_000_000_000)
+    write_bookfile(second, [BOOKFILE_LINES[2]], mtime_ns=1_000_000_000)
+    index = SampleEventIndex(str(tmp_path / "index.sqlite"))
+    assert index.update_bookfile(first)
+    assert index.update_bookfile(second)
+    assert index.num_files() == 3
+
+    write_bookfile(first, BOOKFILE_LINES[:1], mtime_ns=2_000_000_000)
+    assert index.update_bookfile(first)
+    assert sorted(row[0] for row in index.conn.execute("SELECT fileid FROM files")) == [0, 2]
@@ -10,6 +10,7 @@ from math import acos as acos
 from math import pi
 import ctypes
 import os
+import numpy as np
 
 
 def getFiles(mdlTag, kpsfiles, mdlfiles):
@@ -45,6 +46,21 @@ def isFiducialBig(p):
 def isInDetector(p):
   return (inRange(p.X(),detCrds[0]) and inRange(p.Y(),detCrds[1]) and inRange(p.Z(),detCrds[2]))
 
+def inRangeArray(pos, bnds):
+  # pos: (N,3) array of points. returns a boolean array with the points inside the box bnds
+  pos = np.asarray(pos, dtype=np.float64).reshape(-1,3)
+  bnds = np.asarray(bnds, dtype=np.float64)
+  return np.all((pos >= bnds[:,0]) & (pos <= bnds[:,1]), axis=1)
+
+def isFiducialArray(pos):
+  return inRangeArray(pos, fidCrds)
+
+def isFiducialBigArray(pos):
+  return inRangeArray(pos, fidCrdsBig)
+
+def isInDetectorArray(pos):
+  return inRangeArray(pos, detCrds)
+
 class WCFiducial(ctypes.Structure):
   pass
 libpath = os.path.dirname(os.path.realpath(__file__))
@@ -53,11 +69,32 @@ libwc.WCFiducial_new.argtypes = ()
 libwc.WCFiducial_new.restype = ctypes.POINTER(WCFiducial)
 libwc.WCFiducial_insideFV.argtypes = ctypes.POINTER(WCFiducial), ctypes.c_double, ctypes.c_double, ctypes.c_double
 libwc.WCFiducial_insideFV.restype = ctypes.c_bool
+# libraries built before WCFiducial_insideFV_array was added do not have it:
+# isFiducialWCSCEArray then calls WCFiducial_insideFV for each point
+hasWCFiducialArray = hasattr(libwc, 'WCFiducial_insideFV_array')
+if hasWCFiducialArray:
+  libwc.WCFiducial_insideFV_array.argtypes = ctypes.POINTER(WCFiducial), ctypes.POINTER(ctypes.c_double), ctypes.c_int, ctypes.POINTER(ctypes.c_ubyte)
+  libwc.WCFiducial_insideFV_array.restype = None
+else:
+  print("WARNING: %s/lib_wirecell_fiducial_volume.so has no WCFiducial_insideFV_array, isFiducialWCSCEArray tests points one at a time."%libpath)
+  print("         Rebuild it with compile_wirecell_fiducial_volume.sh for the faster version.")
 WCFiducialClass = libwc.WCFiducial_new()
 
 def isFiducialWCSCE(p):
   return libwc.WCFiducial_insideFV(WCFiducialClass, p.X(), p.Y(), p.Z())
 
+def isFiducialWCSCEArray(pos):
+  # pos: (N,3) array of points. one call into the library for all of them (if it has WCFiducial_insideFV_array)
+  pos = np.ascontiguousarray(pos, dtype=np.float64).reshape(-1,3)
+  inside = np.zeros(pos.shape[0], dtype=np.uint8)
+  if not hasWCFiducialArray:
+    for i in range(pos.shape[0]):
+      inside[i] = libwc.WCFiducial_insideFV(WCFiducialClass, pos[i,0], pos[i,1], pos[i,2])
+  elif pos.shape[0] > 0:
+    libwc.WCFiducial_insideFV_array(WCFiducialClass, pos.ctypes.data_as(ctypes.POINTER(ctypes.c_double)),
+                                    pos.shape[0], inside.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte)))
+  return inside.astype(bool)
+
 def getVertexDistance(pos3v, recoVtx):
   xdiffSq = (pos3v.X() - recoVtx.pos[0])**2
   ydiffSq = (pos3v.Y() - recoVtx.pos[1])**2
@@ -1,5 +1,27 @@
+"""
+Make histograms from ntuples.
+
+Histograms are added with either:
+
+  addHist: the functions take the tree and is_mc, and are called for every entry
+  addColumnarHist: the functions take a ColumnBatch (lantern_ana.io.columnar) and is_mc,
+     and return arrays with one value per entry of the chunk. The variable function can
+     return a tuple (x,y) of arrays for a TH2.
+
+Columnar histograms are filled from chunks of entries holding only the branches they declare.
+A function used by several histograms (e.g. a shared selection) is called once per chunk.
+With runloop(workers=N), the entries are split across N processes and the histograms
+are added afterwards. The processes are started with 'spawn', so the functions must be
+defined at module level (not lambdas), in a script protected by if __name__=="__main__".
+"""
+
 import os,sys
+import numpy as np
 import ROOT as rt
+from lantern_ana.io.pot import get_file_pot
+from lantern_ana.io.columnar import read_column_batches
+from lantern_ana.utils.hist_filler import Histogram
+from lantern_ana.sharding import make_shards
 
 class PlotMaker:
 
@@ -11,6 +33,7 @@ class PlotMaker:
         # need special extbnb ntuple
         self.extbnb = None
         self.hist_v = {}
+        self.columnar_hist_v = {}
         self.targetpot = targetpot
 
     def load_ntuples(self):
@@ -19,34 +42,62 @@ class PlotMaker:
         self.pot = {}
         self.rfile = {}
         self.nentries = {}
+        self.filepath = {}
         print("Load ntuples: ---------------------------")
         for name in self.mcntuple_paths:
-            self.rfile[name] = rt.TFile( self.mcntuple_paths[name], "open" )
+            self.filepath[name] = os.path.expanduser(self.mcntuple_paths[name])
+            self.rfile[name] = rt.TFile( self.filepath[name], "open" )
             self.tree[name] = self.rfile[name].Get("EventTree")
             self.is_mc[name] = True
             self.nentries[name] = self.tree[name].GetEntries()
-            pottree = self.rfile[name].Get("potTree")
-            pot = 0.0
-            for i in range(pottree.GetEntries()):
-                pottree.GetEntry(i)
-                pot += pottree.totGoodPOT
-            print("[",name,"] nentries=",self.nentries[name]," pot=",pot)
-            self.pot[name] = pot
+        # POT: one column sum per file, or the total saved in the cache by an earlier job
+        for name in self.mcntuple_paths:
+            self.pot[name] = get_file_pot( self.filepath[name], "potTree" )
+            print("[",name,"] nentries=",self.nentries[name]," pot=",self.pot[name])
 
     def addHist( self, name, hist_template, fill_var_fn, selection_fn, get_weight_fn ):
         self.hist_v[name] = {"hist":hist_template,
                              "var_fn":fill_var_fn,
                              "select_fn":selection_fn,
                              "weight_fn":get_weight_fn}
-        
 
-    def runloop(self):
+    def addColumnarHist( self, name, hist_template, fill_var_fn, selection_fn, get_weight_fn, branches ):
         """
-        
-        to get variables, 
+        Add a histogram filled from chunks of entries.
 
+        Args:
+            name: name of the histogram
+            hist_template: TH1/TH2 giving the name prefix and binning
+            fill_var_fn: fn(batch, is_mc) -> array of values, or tuple (x,y) of arrays for a TH2
+            selection_fn: fn(batch, is_mc) -> boolean array, or None to keep all entries
+            get_weight_fn: fn(batch, is_mc) -> array (or number) of weights, or None for weight 1
+            branches: the branches of EventTree the functions read
         """
-        
+        self.columnar_hist_v[name] = {"hist":hist_template,
+                                      "edges":Histogram.from_root(hist_template).edges,
+                                      "var_fn":fill_var_fn,
+                                      "select_fn":selection_fn,
+                                      "weight_fn":get_weight_fn,
+                                      "branches":list(branches)}
+
+    def columnarBranches(self):
+        """All the branches read by the columnar histograms."""
+        branches = []
+        for hinfo in self.columnar_hist_v.values():
+            for branch in hinfo["branches"]:
+                if branch not in branches:
+                    branches.append(branch)
+        return branches
+
+    def runloop(self, workers=1, chunk_size=50000):
+        """
+        Fill the histograms for each tree, scale MC to the target POT, and write them.
+
+        Args:
+            workers: number of processes filling the columnar histograms
+            chunk_size: number of entries per chunk for the columnar histograms
+        """
+
         for treename in self.tree:
 
             hist_v = {}
@@ -58,26 +109,18 @@ class PlotMaker:
                 hist_v[varname] = hist
 
             tree = self.tree[treename]
-            for ientry in range(self.nentries[treename]):
-                if ientry>0 and ientry%1000==0:
-                    print("running entry[",ientry,"] of ",self.nentries[treename])
-                tree.GetEntry(ientry)
-
-                for varname in self.hist_v:
-                    var_fn = self.hist_v[varname]["var_fn"]
-                    select_fn = self.hist_v[varname]["select_fn"]
-                    cutresult = select_fn( tree, self.is_mc[treename] )
-                    if not cutresult:
-                        continue
-                    weight_fn = self.hist_v[varname]["weight_fn"]
-                    out = var_fn( tree, self.is_mc[treename] )
-                    w = weight_fn( tree, self.is_mc[treename] )
-                    if out is not tuple:
-                        hist_v[varname].Fill( out, w )
-                    elif len(out)==1:
-                        hist_v[varname].Fill( out[0], w )
-                    else:
-                        raise ValueError("cannot support output with ",len(out)," outputs")
+            if len(self.hist_v)>0:
+                self._fill_event_loop( treename, tree, hist_v )
+
+            if len(self.columnar_hist_v)>0:
+                filled = self._fill_columnar( treename, workers, chunk_size )
+                for varname, hfilled in filled.items():
+                    htemplate = self.columnar_hist_v[varname]["hist"]
+                    hist = htemplate.Clone(htemplate.GetName() +"__"+treename)
+                    hist.Reset()
+                    hfilled.copy_to_root( hist )
+                    hist_v[varname] = hist
+
             # scale
             for hname in hist_v:
                 if self.is_mc[treename]:
@@ -85,5 +128,94 @@ class PlotMaker:
                     hist_v[hname].Scale(scale)
                 hist_v[hname].Write()
 
-                
-        
+    def _fill_event_loop(self, treename, tree, hist_v):
+        for ientry in range(self.nentries[treename]):
+            if ientry>0 and ientry%1000==0:
+                print("running entry[",ientry,"] of ",self.nentries[treename])
+            tree.GetEntry(ientry)
+
+            for varname in self.hist_v:
+                var_fn = self.hist_v[varname]["var_fn"]
+                select_fn = self.hist_v[varname]["select_fn"]
+                cutresult = select_fn( tree, self.is_mc[treename] )
+                if not cutresult:
+                    continue
+                weight_fn = self.hist_v[varname]["weight_fn"]
+                out = var_fn( tree, self.is_mc[treename] )
+                w = weight_fn( tree, self.is_mc[treename] )
+                if out is not tuple:
+                    hist_v[varname].Fill( out, w )
+                elif len(out)==1:
+                    hist_v[varname].Fill( out[0], w )
+                else:
+                    raise ValueError("cannot support output with ",len(out)," outputs")
+
+    def _fill_columnar(self, treename, workers, chunk_size):
+        """Fill the columnar histograms of one tree, in this process or in worker processes."""
+        hist_defs = {name:{key:hinfo[key] for key in ["edges","var_fn","select_fn","weight_fn"]}
+                     for name,hinfo in self.columnar_hist_v.items()}
+        branches = self.columnarBranches()
+        nentries = self.nentries[treename]
+        is_mc = self.is_mc[treename]
+
+        if workers<=1:
+            return fill_columnar_hists( self.tree[treename], hist_defs, branches, is_mc,
+                                        0, nentries, chunk_size )
+
+        import multiprocessing
+        jobs = [ (self.filepath[treename], "EventTree", hist_defs, branches, is_mc, start, stop, chunk_size)
+                 for start, stop in make_shards(nentries, workers) ]
+        print("[",treename,"] filling columnar histograms with ",len(jobs)," workers")
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes=len(jobs)) as pool:
+            results = pool.starmap(fill_columnar_hists_from_file, jobs)
+        # add the histograms of the workers
+        filled = results[0]
+        for result in results[1:]:
+            for name, hist in result.items():
+                filled[name].add( hist )
+        return filled
+
+
+def fill_columnar_chunk(hists, hist_defs, batch, is_mc):
+    """
+    Fill the histograms from one ColumnBatch.
+    Each function is called once per chunk, even if several histograms use it.
+    """
+    results = {}
+    def evaluate(fn):
+        if fn not in results:
+            results[fn] = fn( batch, is_mc )
+        return results[fn]
+
+    for name, hdef in hist_defs.items():
+        if hdef["select_fn"] is None:
+            mask = np.ones( batch.size, dtype=bool )
+        else:
+            mask = np.asarray( evaluate(hdef["select_fn"]), dtype=bool )
+        out = evaluate( hdef["var_fn"] )
+        values = out if isinstance(out,tuple) else (out,)
+        if len(values)!=len(hdef["edges"]):
+            raise ValueError(f"histogram '{name}' has {len(hdef['edges'])} axes, its variable function returned {len(values)} arrays")
+        weights = None
+        if hdef["weight_fn"] is not None:
+            weights = np.broadcast_to( np.asarray(evaluate(hdef["weight_fn"]),dtype=np.float64), (batch.size,) )[mask]
+        hists[name].fill( *[np.asarray(v)[mask] for v in values], weights=weights )
+
+
+def fill_columnar_hists(tree, hist_defs, branches, is_mc, start, stop, chunk_size):
+    """Fill histograms (lantern_ana.utils.hist_filler.Histogram) from entries [start,stop) of a tree."""
+    hists = { name:Histogram(hdef["edges"]) for name,hdef in hist_defs.items() }
+    for batch in read_column_batches( tree, branches, chunk_size=chunk_size, start=start, stop=stop ):
+        fill_columnar_chunk( hists, hist_defs, batch, is_mc )
+    return hists
+
+
+def fill_columnar_hists_from_file(filepath, treename, hist_defs, branches, is_mc, start, stop, chunk_size):
+    """Worker process: open the file and fill the histograms from entries [start,stop)."""
+    rfile = rt.TFile.Open( filepath )
+    try:
+        tree = rfile.Get( treename )
+        return fill_columnar_hists( tree, hist_defs, branches, is_mc, start, stop, chunk_size )
+    finally:
+        rfile.Close()
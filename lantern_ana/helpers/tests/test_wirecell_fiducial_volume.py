@@ -0,0 +1,84 @@
+"""
+Tests of the array fiducial-volume helpers: WCFiducial_insideFV_array (compiled here from
+wirecell_fiducial_volume.cxx) and the isFiducial*Array functions of larflowreco_ana_funcs must
+give the same result as their one-point versions, also for points on the boundaries.
+"""
+
+import ctypes
+import itertools
+import os
+import shutil
+import subprocess
+
+import numpy as np
+import pytest
+
+HELPERS_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# boxes of larflowreco_ana_funcs (detCrds, fidCrds, fidCrdsBig) and of the Wire-Cell FV
+DET_BOUNDS = [[0., 256.35], [-116.5, 116.5], [0, 1036.8]]
+WC_BOUNDS = [[0., 256.], [-116., 117.], [0., 1037.]]
+
+
+def make_points(boxes, num_random=3000, seed=11):
+    """Random points around the boxes, and points on their walls, edges and corners."""
+    rng = np.random.default_rng(seed)
+    lo = np.min([np.asarray(box)[:,0] for box in boxes], axis=0)
+    hi = np.max([np.asarray(box)[:,1] for box in boxes], axis=0)
+    points = [lo-30.0 + rng.random((num_random, 3))*(hi-lo+60.0)]
+    for box in boxes:
+        box = np.asarray(box, dtype=np.float64)
+        steps = np.stack([box[:,0]-1.0, box[:,0], 0.5*(box[:,0]+box[:,1]), box[:,1], box[:,1]+1.0], axis=1)
+        points.append(np.array(list(itertools.product(*steps))))
+    return np.concatenate(points)
+
+
+@pytest.fixture(scope="module")
+def wclib(tmp_path_factory):
+    """lib_wirecell_fiducial_volume.so built from the source in helpers/."""
+    if shutil.which("g++") is None:
+        pytest.skip("g++ is needed to build the Wire-Cell fiducial volume library")
+    libpath = str(tmp_path_factory.mktemp("wcfid") / "lib_wirecell_fiducial_volume.so")
+    subprocess.run(["g++", "-shared", "-fPIC", "-o", libpath,
+                    os.path.join(HELPERS_DIR, "wirecell_fiducial_volume.cxx")], check=True)
+    lib = ctypes.cdll.LoadLibrary(libpath)
+    lib.WCFiducial_new.restype = ctypes.c_void_p
+    lib.WCFiducial_insideFV.argtypes = ctypes.c_void_p, ctypes.c_double, ctypes.c_double, ctypes.c_double
+    lib.WCFiducial_insideFV.restype = ctypes.c_bool
+    lib.WCFiducial_insideFV_array.argtypes = (ctypes.c_void_p, ctypes.POINTER(ctypes.c_double), ctypes.c_int,
+                                              ctypes.POINTER(ctypes.c_ubyte))
+    lib.WCFiducial_insideFV_array.restype = None
+    return lib
+
+
+def test_wcfiducial_array_entry_point(wclib):
+    wcfid = wclib.WCFiducial_new()
+    points = np.ascontiguousarray(make_points([WC_BOUNDS]), dtype=np.float64)
+    inside = np.full(len(points), 7, dtype=np.uint8)
+    wclib.WCFiducial_insideFV_array(wcfid, points.ctypes.data_as(ctypes.POINTER(ctypes.c_double)), len(points),
+                                    inside.ctypes.data_as(ctypes.POINTER(ctypes.c_ubyte)))
+    expected = np.array([wclib.WCFiducial_insideFV(wcfid, *pos) for pos in points])
+    assert expected.any() and not expected.all()
+    np.testing.assert_array_equal(inside, expected.astype(np.uint8))
+
+
+@pytest.fixture(scope="module")
+def anafuncs():
+    pytest.importorskip("larlite")
+    if not os.path.exists(os.path.join(HELPERS_DIR, "lib_wirecell_fiducial_volume.so")):
+        pytest.skip("lib_wirecell_fiducial_volume.so is not built (compile_wirecell_fiducial_volume.sh)")
+    from lantern_ana.helpers import larflowreco_ana_funcs
+    return larflowreco_ana_funcs
+
+
+@pytest.mark.parametrize("array_name, scalar_name", [
+    ("isFiducialArray", "isFiducial"),
+    ("isFiducialBigArray", "isFiducialBig"),
+    ("isInDetectorArray", "isInDetector"),
+    ("isFiducialWCSCEArray", "isFiducialWCSCE"),
+])
+def test_larflowreco_array_helpers(anafuncs, array_name, scalar_name):
+    import ROOT
+    points = make_points([DET_BOUNDS, anafuncs.fidCrds, anafuncs.fidCrdsBig, WC_BOUNDS], num_random=1000)
+    expected = np.array([bool(getattr(anafuncs, scalar_name)(ROOT.TVector3(*pos))) for pos in points])
+    np.testing.assert_array_equal(getattr(anafuncs, array_name)(points), expected)
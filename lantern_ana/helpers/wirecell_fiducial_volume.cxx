@@ -115,6 +115,12 @@ extern "C" {
   bool WCFiducial_insideFV(WCFiducial* wcfid, double x, double y, double z){
     return wcfid->insideFV(x, y, z);
   }
+  // points: n (x,y,z) triplets, one after the other. inside: n values set to 1 or 0
+  void WCFiducial_insideFV_array(WCFiducial* wcfid, const double* points, int n, unsigned char* inside){
+    for (int i = 0; i < n; i++) {
+      inside[i] = wcfid->insideFV(points[3*i], points[3*i+1], points[3*i+2]) ? 1 : 0;
+    }
+  }
 
 }
 
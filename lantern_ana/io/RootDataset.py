@@ -1,6 +1,9 @@
 import os
+import glob
 from .dataset import Dataset
 from .dataset_factory import register_dataset
+from .folder_index import get_folder_index, is_glob_pattern
+from .pot import sum_pot
 from typing import Dict, Any, List, Optional, Type
 
 
@@ -19,18 +22,31 @@ class RootDataset(Dataset):
             name: A unique identifier for this dataset
             config: Dictionary containing configuration parameters:
                 - tree: Name of the TTree to read
-                - filepaths: List of ROOT file paths
+                - filepaths: List of ROOT file paths. Relative paths are looked up in 'folders'.
+                             Wildcards are allowed, e.g. "run1_bnb_nu_*.root"
+                - folders: List of folders to search (recursively) for relative file paths {default: ["./"]}
+                - use_folder_index_cache: Save the list of files in each folder in the cache directory,
+                                          and reuse it while the folder is unchanged {default: False}
+                - folder_index_cache_dir: Cache directory (default: see lantern_ana.utils.cache)
                 - ismc: Whether this is a Monte Carlo dataset, {default: False}
+                - pottree: Name of the tree with the POT of each file (MC only) {default: potTree}
+                - use_pot_cache: Save the POT of each file in the cache directory,
+                                 and reuse it while the file is unchanged {default: True}
+                - pot_cache_dir: Cache directory (default: see lantern_ana.utils.cache)
                 - nspills: Number of spills this data set represents (optional) {default: None}
                 - pot: POT for this data set (optional) {default: None}
-                - friendtrees: A dict with keys being name of the friend tree and value being the file
+                - friendtrees: A dict with keys being name of the friend tree and value being the file (or pattern)
         """
         super().__init__(name, config)
         self._tree_name = config.get('tree')
         self._folders   = config.get('folders',["./"])
         self._filepaths = config.get('filepaths', [])
+        self._use_folder_index_cache = config.get('use_folder_index_cache', False)
+        self._folder_index_cache_dir = config.get('folder_index_cache_dir', None)
         self._ismc = config.get('ismc', False)
-        self._potTreeName = config.get('pottree','potTree')        
+        self._potTreeName = config.get('pottree','potTree')
+        self._use_pot_cache = config.get('use_pot_cache', True)
+        self._pot_cache_dir = config.get('pot_cache_dir', None)
         self._tree = None
         self._num_entries = 0
         self._pot = 0.0
@@ -40,6 +56,7 @@ class RootDataset(Dataset):
         # friend trees
         self._friend_tree_cfg = config.get('friendtrees',{})
         self._friend_trees = []
+        self._friend_filepaths = []
         
     def initialize(self) -> None:
         """
@@ -53,69 +70,105 @@ class RootDataset(Dataset):
         self._pot = 0.0
         self._tree = ROOT.TChain( self._tree_name )
 
+        xfpaths = []
         for fpath in self._filepaths:
-            if len(fpath)>0 and fpath[0]!="/":
-                xfpath = self.find_file_in_folders( fpath, self._folders )
-                if xfpath is None:
-                    raise ValueError(f"Could not find file={fpath} in folders: {self._folders}")
-            else:
-                xfpath = fpath
+            xfpaths += self.resolve_filepath(fpath)
 
+        for xfpath in xfpaths:
             if not os.path.exists(xfpath):
                 raise ValueError(f"could not load filepath for '{self._tree_name}': {xfpath}" )
             print(f'Adding to dataset[{self._tree_name}] to Tree[{self._tree_name}]: {xfpath}')
             self._tree.Add(xfpath)
             self._added_filepaths.append(xfpath)
 
-            # Get POT information for MC datasets
-            if self._ismc:
-                self._rfile = ROOT.TFile(xfpath)
-                pot_tree = self._rfile.Get(self._potTreeName)
-                if pot_tree:
-                    for i in range(pot_tree.GetEntries()):
-                        pot_tree.GetEntry(i)
-                        self._pot += pot_tree.totGoodPOT
+        # Get POT information for MC datasets
+        if self._ismc:
+            self._pot = sum_pot(xfpaths, self._potTreeName,
+                                use_cache=self._use_pot_cache, cache_dir=self._pot_cache_dir)
 
         self._num_entries = self._tree.GetEntries()       
 
         self._friend_trees = []
+        self._friend_filepaths = []
         for friend_tree_name in self._friend_tree_cfg:
             friend_tree = ROOT.TChain( friend_tree_name )
             fpath = self._friend_tree_cfg[friend_tree_name]
-            if len(fpath)>0 and fpath[0]!="/":
-                xfpath = self.find_file_in_folders( fpath, self._folders )
-                if xfpath is None:
-                    raise ValueError(f"Could not find file={fpath} in folders: {self._folders}")
-            else:
-                xfpath = fpath
-            if not os.path.exists(xfpath):
-                raise ValueError(f"could not load filepath for '{self._tree_name}': {xfpath}" )
-            friend_tree.Add( xfpath )
-            print(f'Adding friend tree, {friend_tree_name} to Main Tree[{self._tree_name}]: {xfpath}')
+            for xfpath in self.resolve_filepath(fpath):
+                if not os.path.exists(xfpath):
+                    raise ValueError(f"could not load filepath for '{self._tree_name}': {xfpath}" )
+                friend_tree.Add( xfpath )
+                self._friend_filepaths.append(xfpath)
+                print(f'Adding friend tree, {friend_tree_name} to Main Tree[{self._tree_name}]: {xfpath}')
             friend_nentries = friend_tree.GetEntries()
             if friend_nentries!=self._num_entries:
                 raise ValueError("friend tree does not have the same number of entries: main=%d friend=%d"%(self._num_entries,friend_nentries))
             self._tree.AddFriend(friend_tree)
+            # the main tree does not own its friends: keep them alive as long as the dataset
+            self._friend_trees.append(friend_tree)
 
 
                         
         self._initialized = True
 
+    def resolve_filepath(self, fpath: str) -> List[str]:
+        """
+        Get the full paths of the files for one entry of 'filepaths'.
+
+        Absolute paths are used as they are. Relative paths are looked up in the folders.
+        Paths with wildcards (*, ?, [...]) give all matching files, sorted. For relative
+        patterns, a file name found in several folders is taken from the first folder.
+
+        Raises:
+            ValueError if no file is found
+        """
+        if os.path.isabs(fpath):
+            if not is_glob_pattern(fpath):
+                return [fpath]
+            matches = sorted(glob.glob(fpath))
+        elif not is_glob_pattern(fpath):
+            xfpath = self.find_file_in_folders( fpath, self._folders )
+            matches = [xfpath] if xfpath is not None else []
+        else:
+            matches = []
+            names = set()
+            for folder in self._folders:
+                if not os.path.isdir(folder):
+                    continue
+                for xfpath in self._get_folder_index(folder).glob(fpath):
+                    name = os.path.basename(xfpath)
+                    if name not in names:
+                        names.add(name)
+                        matches.append(xfpath)
+
+        if len(matches)==0:
+            raise ValueError(f"Could not find file={fpath} in folders: {self._folders}")
+        return matches
+
+    def _get_folder_index(self, folder: str):
+        """Index of the files in a folder, scanned once per job (see lantern_ana.io.folder_index)."""
+        return get_folder_index(folder, use_cache=self._use_folder_index_cache,
+                                cache_dir=self._folder_index_cache_dir)
+
     def find_file_in_folders(self, filename, folder_list):
         """
         Looks for a file in a list of folders.
 
+        Each folder is scanned once into an index of its files,
+        so looking up many files costs one scan per folder.
+
         Args:
-            filename: The name of the file to search for.
+            filename: The name of the file to search for (or its path relative to a folder).
             folder_list: A list of folder paths to search in.
 
         Returns:
             The full path to the file if found, otherwise None.
         """
         for folder in folder_list:
-            for root, _, files in os.walk(folder):
-                if filename in files:
-                    return os.path.join(root, filename)
+            if not os.path.isdir(folder):
+                continue
+            xfpath = self._get_folder_index(folder).find(filename)
+            if xfpath is not None:
+                return xfpath
         return None
         
     def get_num_entries(self) -> int:
@@ -130,6 +183,14 @@ class RootDataset(Dataset):
             
         return self._num_entries
         
+    def get_input_files(self) -> List[str]:
+        """
+        Get the files of the main tree and of the friend trees.
+        """
+        if not self._initialized:
+            self.initialize()
+        return self._added_filepaths + self._friend_filepaths
+
     def set_entry(self, entry: int) -> bool:
         """
         Set the current entry in the dataset.
@@ -153,6 +214,38 @@ class RootDataset(Dataset):
         self._current_entry = entry
         return True
         
+    def set_active_branches(self, branches: Optional[List[str]]) -> List[str]:
+        """
+        Only read the given branches when loading an entry.
+
+        The other branches of the tree and of its friend trees are disabled with
+        SetBranchStatus, so GetEntry no longer reads and decompresses them.
+        ROOT also enables the leaf-count branch of an enabled array branch
+        (e.g. nTracks for trackRecoE[nTracks]).
+
+        Args:
+            branches: Branch names. Wildcards like "track*" are allowed. None enables all branches.
+
+        Returns:
+            Names of the requested branches that are not in the tree. They are skipped.
+        """
+        if not self._initialized:
+            self.initialize()
+
+        if branches is None:
+            self._tree.SetBranchStatus("*", 1)
+            return []
+
+        self._tree.SetBranchStatus("*", 0)
+        missing = []
+        for branch in branches:
+            is_pattern = any(c in branch for c in "*?[")
+            if not is_pattern and not self._tree.GetBranch(branch):
+                missing.append(branch)
+                continue
+            self._tree.SetBranchStatus(branch, 1)
+        return missing
+
     def get_data(self) -> Dict[str, Any]:
         """
         Get the data for the current entry.
@@ -175,6 +268,33 @@ class RootDataset(Dataset):
             "pot": self._pot
         }
         
+    def iterate_batches(self, branches: List[str], chunk_size: int = 50000,
+                        start: int = 0, stop: Optional[int] = None):
+        """
+        Iterate over the dataset in chunks of entries, reading branches into NumPy arrays.
+
+        Used by the columnar execution mode of LanternAna.
+
+        Args:
+            branches: Names of the branches to read (branches from friend trees are allowed)
+            chunk_size: Number of entries per chunk
+            start: First entry to read
+            stop: One past the last entry to read (default: all entries)
+
+        Yields:
+            ColumnBatch objects (see lantern_ana.io.columnar)
+        """
+        from .columnar import read_column_batches
+
+        if not self._initialized:
+            self.initialize()
+
+        if stop is None or stop > self._num_entries:
+            stop = self._num_entries
+
+        yield from read_column_batches(self._tree, branches, chunk_size=chunk_size,
+                                       start=start, stop=stop)
+
     @property
     def pot(self) -> float:
         """
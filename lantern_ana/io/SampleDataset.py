@@ -1,5 +1,6 @@
 import os
 import ROOT as rt
+from .pot import get_file_pot
 
 class SampleDataset:
     """
@@ -16,10 +17,7 @@ class SampleDataset:
         self.ismc = ismc
         self.pot = 0.0        
         if ismc:
-            pottree = self.rfile.Get("potTree")
-            for i in range(pottree.GetEntries()):
-                pottree.GetEntry(i)
-                self.pot += pottree.totGoodPOT
+            self.pot = get_file_pot(self.ntuple_path, "potTree")
         else:
             self.pot = 0.0
 
@@ -1,2 +1,3 @@
 from .dataset_factory import *
-from .RootDataset import *
\ No newline at end of file
+from .RootDataset import *
+from .columnar import *
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Record which branches of a ROOT tree are read during the event loop.
+
+Producers, cuts and tags declare the ntuple branches they read, so that only those
+branches are loaded (the prune_branches option of LanternAna). A branch that is
+read but not declared is not loaded from the file, and its value is stale.
+
+To find such reads, the record_branch_access option gives producers, cuts and tags
+a BranchAccessRecorder instead of the tree. It passes every attribute lookup on to
+the tree and remembers the ones that are branch names. At the end of a dataset,
+the branches that were read are compared with the declared ones.
+
+Recording adds a Python call to every branch read, so it is meant for checking
+a configuration on a few events, not for production running. The profiling mode
+(lantern_ana.profiler) also uses it, to count how often each branch is read.
+"""
+
+import fnmatch
+from collections import Counter
+from typing import Any, Iterable, List
+
+
+class BranchAccessRecorder:
+    """
+    Wraps a TTree/TChain and records the names of the branches read through it.
+
+    Example:
+        recorder = BranchAccessRecorder(tree)
+        energy = recorder.trackRecoE[0]   # same as tree.trackRecoE[0]
+        recorder.accessed                  # {'trackRecoE'}
+        recorder.counts                    # Counter({'trackRecoE': 1})
+    """
+
+    def __init__(self, tree: Any):
+        self.tree = tree
+        self.accessed = set()
+        self.counts = Counter()
+        self._is_branch = {}
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for names that are not attributes of the recorder itself
+        is_branch = self._is_branch.get(name)
+        if is_branch is None:
+            is_branch = not name.startswith('_') and bool(self.tree.GetBranch(name))
+            self._is_branch[name] = is_branch
+        if is_branch:
+            self.accessed.add(name)
+            self.counts[name] += 1
+        return getattr(self.tree, name)
+
+
+def find_undeclared_branches(accessed: Iterable[str], declared: Iterable[str]) -> List[str]:
+    """
+    Get the accessed branches that match none of the declared branch names or wildcard patterns.
+    """
+    declared = list(declared)
+    return sorted(name for name in accessed
+                  if not any(fnmatch.fnmatchcase(name, pattern) for pattern in declared))
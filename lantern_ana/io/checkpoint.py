@@ -0,0 +1,116 @@
+"""
+Checkpoints of the event loop, so a job that is stopped (crash, walltime limit) can be resumed.
+
+With 'checkpoint_every: N' in the configuration, every N events LanternAna writes the
+buffered output events to the analysis_tree, saves the tree header to the output file
+(TTree::AutoSave), and then writes a sidecar file next to the output,
+{output_dir}/{dataset_name}.checkpoint, with:
+
+  - the output file and the entry range of the job
+  - the next entry to process and the number of entries in the analysis_tree
+  - the analysis, cut and producer statistics so far
+  - the state of producers that accumulate something over events
+    (ProducerBaseClass.getCheckpointState, e.g. filled histograms)
+
+run_lantern_ana.py --resume continues each dataset that has a sidecar file from its
+next entry, appending to the same output file.
+
+When the dataset is finished, the sidecar file is not removed: it is replaced by a
+marker with 'finished': True, the output file and the final statistics. --resume skips
+the datasets with this marker, so a job stopped after some of its datasets only
+processes the others. A run without --resume processes every dataset again and
+replaces the marker. To process a finished dataset again with --resume, remove its
+sidecar file.
+
+Example:
+    state = {'next_entry': 250000, ...}
+    save_checkpoint(checkpoint_file_path("output", "mc_bnb"), state)
+    ...
+    state = load_checkpoint(checkpoint_file_path("output", "mc_bnb"))   # None if there is none
+"""
+
+import os
+import pickle
+import numpy as np
+from array import array
+from typing import Any, Dict, Optional
+
+# increase when the content of the checkpoint changes
+CHECKPOINT_VERSION = 1
+
+# size of the statistics array of TH1/TH2/TH3 (TH1::kNstat)
+_HIST_NSTAT = 13
+
+
+def checkpoint_file_path(output_dir: str, dataset_name: str) -> str:
+    """Path of the sidecar checkpoint file of a dataset."""
+    return os.path.join(output_dir, f"{dataset_name}.checkpoint")
+
+
+def save_checkpoint(filepath: str, state: Dict[str, Any]):
+    """
+    Write a checkpoint. The previous checkpoint is replaced only once the new one is complete.
+    """
+    state = dict(state)
+    state['version'] = CHECKPOINT_VERSION
+    tmp_path = f"{filepath}.tmp{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, filepath)
+
+
+def load_checkpoint(filepath: str) -> Optional[Dict[str, Any]]:
+    """
+    Read a checkpoint.
+
+    Returns:
+        The checkpoint state, or None if there is no checkpoint file
+    """
+    if not os.path.exists(filepath):
+        return None
+    with open(filepath, 'rb') as f:
+        state = pickle.load(f)
+    if state.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Checkpoint {filepath} was written by another version of lantern_ana "
+                         f"(version {state.get('version')}, expected {CHECKPOINT_VERSION}). "
+                         "Remove it and rerun the dataset.")
+    return state
+
+
+def histogram_state(hist: Any) -> Dict[str, Any]:
+    """
+    Contents of a ROOT histogram (TH1, TH2 or TH3), for getCheckpointState.
+    """
+    ncells = hist.GetNcells()
+    stats = array('d', [0.0]*_HIST_NSTAT)
+    hist.GetStats(stats)
+    state = {
+        'ncells': ncells,
+        'contents': np.array([hist.GetBinContent(i) for i in range(ncells)]),
+        'sumw2': None,
+        'stats': list(stats),
+        'entries': hist.GetEntries()
+    }
+    if hist.GetSumw2N() > 0:
+        sumw2 = hist.GetSumw2()
+        state['sumw2'] = np.array([sumw2.At(i) for i in range(ncells)])
+    return state
+
+
+def restore_histogram_state(hist: Any, state: Dict[str, Any]):
+    """
+    Set a ROOT histogram to the contents saved by histogram_state. The binning must be the same.
+    """
+    if hist.GetNcells() != state['ncells']:
+        raise ValueError(f"Histogram {hist.GetName()} has {hist.GetNcells()} bins, "
+                         f"but the checkpoint has {state['ncells']}")
+    for i, content in enumerate(state['contents']):
+        hist.SetBinContent(i, float(content))
+    if state['sumw2'] is not None:
+        if hist.GetSumw2N() == 0:
+            hist.Sumw2(True)
+        sumw2 = hist.GetSumw2()
+        for i, value in enumerate(state['sumw2']):
+            sumw2.SetAt(float(value), i)
+    hist.PutStats(array('d', state['stats']))
+    hist.SetEntries(state['entries'])
@@ -0,0 +1,267 @@
+"""
+Chunked columnar access to ROOT trees.
+
+Instead of loading one entry at a time with TChain::GetEntry, the functions here
+read blocks of entries for a list of branches into NumPy arrays. Producers and
+cuts that implement a batch version can then work on a whole block at once.
+
+Scalar branches become 1D NumPy arrays. Variable-length branches (std::vector
+or C-arrays like trackRecoE[nTracks]) become a JaggedArray, which stores the
+values of all entries in one flat array plus the offsets where each entry starts.
+Nested vectors (vector<vector<float>>) with inner vectors of the same length become
+a JaggedArray whose content is 2D: one row per inner vector.
+"""
+
+import numpy as np
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+
+class JaggedArray:
+    """
+    Variable-length per-entry arrays stored as flat content plus offsets.
+
+    The values for entry i are content[offsets[i]:offsets[i+1]].
+    """
+
+    def __init__(self, content: np.ndarray, offsets: np.ndarray):
+        self.content = np.asarray(content)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self._entry_index = None
+
+    @classmethod
+    def from_sequences(cls, sequences, dtype=None) -> "JaggedArray":
+        """
+        Build from a sequence of per-entry sequences (e.g. RVec objects from RDataFrame.AsNumpy).
+        """
+        parts = [np.asarray(seq) for seq in sequences]
+        counts = np.fromiter((len(p) for p in parts), dtype=np.int64, count=len(parts))
+        offsets = np.zeros(len(parts)+1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        if len(parts)>0 and offsets[-1]>0:
+            # values of nested vectors (vector<vector<float>>) are rows of a 2D content array
+            first = next(p for p in parts if len(p)>0)
+            empty = np.zeros((0,)+first.shape[1:], dtype=first.dtype)
+            content = np.concatenate([empty if len(p)==0 else p for p in parts])
+        else:
+            content = np.zeros(0, dtype=dtype if dtype is not None else np.float32)
+        if dtype is not None:
+            content = content.astype(dtype, copy=False)
+        return cls(content, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)-1
+
+    def __getitem__(self, ientry: int) -> np.ndarray:
+        return self.content[self.offsets[ientry]:self.offsets[ientry+1]]
+
+    @property
+    def counts(self) -> np.ndarray:
+        """Number of values in each entry."""
+        return np.diff(self.offsets)
+
+    def entry_index(self) -> np.ndarray:
+        """For each value in content, the index of the entry it belongs to."""
+        if self._entry_index is None:
+            self._entry_index = np.repeat(np.arange(len(self), dtype=np.int64), self.counts)
+        return self._entry_index
+
+    def sum(self, where: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Sum the values of each entry.
+
+        Args:
+            where: Optional boolean mask over content selecting which values to include
+
+        Returns:
+            Array with one sum per entry
+        """
+        weights = self.content.astype(np.float64)
+        if where is not None:
+            weights = np.where(where, weights, 0.0)
+        return np.bincount(self.entry_index(), weights=weights, minlength=len(self))
+
+    def count(self, where: Optional[np.ndarray] = None) -> np.ndarray:
+        """Count the values of each entry, optionally only those selected by a mask over content."""
+        if where is None:
+            return self.counts
+        return np.bincount(self.entry_index(), weights=np.asarray(where, dtype=np.float64),
+                           minlength=len(self)).astype(np.int64)
+
+    def max(self, where: Optional[np.ndarray] = None, default: float = 0.0) -> np.ndarray:
+        """Maximum value of each entry. Entries with no (selected) values get the default."""
+        out = np.full(len(self), -np.inf)
+        values = self.content.astype(np.float64)
+        if where is not None:
+            values = np.where(where, values, -np.inf)
+        np.maximum.at(out, self.entry_index(), values)
+        out[np.isneginf(out)] = default
+        return out
+
+    def min(self, where: Optional[np.ndarray] = None, default: float = 0.0) -> np.ndarray:
+        """Minimum value of each entry. Entries with no (selected) values get the default."""
+        out = np.full(len(self), np.inf)
+        values = self.content.astype(np.float64)
+        if where is not None:
+            values = np.where(where, values, np.inf)
+        np.minimum.at(out, self.entry_index(), values)
+        out[np.isposinf(out)] = default
+        return out
+
+
+class ColumnBatch:
+    """
+    A block of consecutive entries [start, stop) read from a tree.
+
+    Branches are accessed by attribute (batch.trackRecoE) or by key (batch['trackRecoE']),
+    so code written against the ntuple (`ntuple.vtxX`) reads the same on a batch.
+    """
+
+    def __init__(self, start: int, stop: int, columns: Dict[str, Any]):
+        self.start = start
+        self.stop = stop
+        self.columns = columns
+
+    @property
+    def size(self) -> int:
+        return self.stop-self.start
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __getattr__(self, name: str):
+        # only called when normal attribute lookup fails
+        columns = self.__dict__.get('columns', {})
+        if name in columns:
+            return columns[name]
+        raise AttributeError(f"ColumnBatch has no branch '{name}'. Was it included in requiredBranches()?")
+
+    def __getitem__(self, name: str):
+        return self.columns[name]
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.columns
+
+    def keys(self) -> List[str]:
+        return list(self.columns.keys())
+
+
+def _to_column(values: np.ndarray):
+    """Convert an AsNumpy output array into a NumPy column or JaggedArray."""
+    if values.dtype == object:
+        return JaggedArray.from_sequences(values)
+    return values
+
+
+def _declare_column_types(rdf, branches: List[str]) -> None:
+    """
+    Make the interpreter generate the classes AsNumpy needs for the columns, e.g.
+    RVec<vector<float>> for vector<vector<float>> branches, which have no dictionary.
+    """
+    import ROOT
+
+    for name in branches:
+        column_type = str(rdf.GetColumnType(name))
+        tclass = ROOT.TClass.GetClass(column_type)
+        if tclass and not tclass.GetClassInfo():
+            ROOT.gInterpreter.Declare(f"#include <vector>\n#include <ROOT/RVec.hxx>\ntemplate class {column_type};")
+
+
+def _tree_files(tree) -> Optional[Tuple[List[str], List[str]]]:
+    """
+    (tree names, file names) of a TChain, or of a TTree read from a file.
+    None for a tree that is not read from files (e.g. a tree in memory).
+    """
+    if tree.InheritsFrom("TChain"):
+        elements = list(tree.GetListOfFiles())
+        if len(elements) == 0:
+            return None
+        return [str(el.GetName()) for el in elements], [str(el.GetTitle()) for el in elements]
+    rfile = tree.GetCurrentFile()
+    if not rfile or tree.GetDirectory() != rfile:
+        return None
+    return [str(tree.GetName())], [str(rfile.GetName())]
+
+
+def _dataset_spec_factory(tree) -> Optional[Callable[[int, int], Any]]:
+    """
+    Function making an RDataFrame over the entries [begin, end) of the tree (and its friend trees).
+
+    The dataframe is made from an RDatasetSpec with a global entry range, so its event loop
+    starts at entry begin. (RDataFrame.Range starts the loop at entry 0 and skips the
+    entries before begin, which makes reading a tree chunk by chunk quadratic.)
+
+    Returns:
+        The function, or None if the tree (or one of its friends) is not read from files,
+        or this ROOT version has no RDatasetSpec
+    """
+    import ROOT
+
+    if not hasattr(ROOT.RDF.Experimental, "RDatasetSpec"):
+        return None
+    sample = _tree_files(tree)
+    if sample is None:
+        return None
+    friends = []
+    for friend in (tree.GetListOfFriends() or []):
+        friend_tree = friend.GetTree()
+        friend_files = _tree_files(friend_tree) if friend_tree else None
+        if friend_files is None:
+            return None
+        friends.append((friend_files, str(friend.GetName())))
+
+    def make_dataframe(begin: int, end: int):
+        spec = ROOT.RDF.Experimental.RDatasetSpec()
+        spec.AddSample(ROOT.RDF.Experimental.RSample("sample", sample[0], sample[1]))
+        for (tree_names, file_names), alias in friends:
+            spec.WithGlobalFriends(tree_names, file_names, alias)
+        spec.WithGlobalRange((begin, end))
+        return ROOT.RDataFrame(spec)
+
+    return make_dataframe
+
+
+def read_column_batches(tree, branches: List[str], chunk_size: int = 50000,
+                        start: int = 0, stop: Optional[int] = None) -> Iterator[ColumnBatch]:
+    """
+    Read branches from a TTree/TChain in chunks of entries using RDataFrame.AsNumpy.
+
+    Each chunk is read by its own RDataFrame over the files of the tree, limited to the
+    entries of the chunk (see _dataset_spec_factory), so reading a chunk costs the same
+    wherever it is in the tree. The C++ code of the AsNumpy actions is compiled for the
+    first chunk only. A tree that is not read from files (e.g. made in memory) is read
+    with RDataFrame.Range, which goes through all the entries before each chunk.
+
+    Args:
+        tree: ROOT TTree or TChain (friend trees are visible through the RDataFrame)
+        branches: Branch names to read
+        chunk_size: Number of entries per chunk
+        start: First entry to read
+        stop: One past the last entry to read (default: all entries)
+
+    Yields:
+        ColumnBatch for each chunk
+    """
+    import ROOT
+
+    if stop is None:
+        stop = tree.GetEntries()
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be positive. Given: {chunk_size}")
+
+    branches = list(dict.fromkeys(branches))  # remove duplicates, keep order
+    make_dataframe = _dataset_spec_factory(tree) if len(branches) > 0 else None
+    rdf = ROOT.RDataFrame(tree) if make_dataframe is None and len(branches) > 0 else None
+    if len(branches) > 0 and start < stop:
+        _declare_column_types(rdf if rdf is not None else make_dataframe(start, stop), branches)
+
+    for chunk_start in range(start, stop, chunk_size):
+        chunk_stop = min(chunk_start+chunk_size, stop)
+        columns = {}
+        if len(branches)>0:
+            if make_dataframe is not None:
+                arrays = make_dataframe(chunk_start, chunk_stop).AsNumpy(branches)
+            else:
+                arrays = rdf.Range(chunk_start, chunk_stop).AsNumpy(branches)
+            for name in branches:
+                columns[name] = _to_column(arrays[name])
+        yield ColumnBatch(chunk_start, chunk_stop, columns)
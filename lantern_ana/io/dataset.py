@@ -80,6 +80,29 @@ class Dataset(ABC):
         """
         return self._current_entry
 
+    def set_active_branches(self, branches: Optional[List[str]]) -> List[str]:
+        """
+        Only read the given branches when loading an entry.
+        Datasets that cannot do this keep reading everything.
+        
+        Args:
+            branches: Branch names (wildcards like "track*" allowed), or None to read all branches
+            
+        Returns:
+            Names of the requested branches that are not in the dataset
+        """
+        return []
+
+    def get_input_files(self) -> List[str]:
+        """
+        Get the paths of the files the entries are read from, e.g. to tag cached products.
+        Datasets that do not read from files return an empty list.
+
+        Returns:
+            List of file paths
+        """
+        return []
+
     def get_name(self) -> str:
         """
         Get the name given to the dataset.
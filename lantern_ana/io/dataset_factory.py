@@ -91,12 +91,13 @@ class DatasetFactory:
         return dataset
         
     @classmethod
-    def create_from_yaml(cls, yaml_file: str) -> Dict[str, Dataset]:
+    def create_from_yaml(cls, yaml_file: str, dataset_names: Optional[List[str]] = None) -> Dict[str, Dataset]:
         """
         Create dataset instances from a YAML configuration file.
         
         Args:
             yaml_file: Path to the YAML configuration file
+            dataset_names: Only create these datasets (default: all datasets in the file)
             
         Returns:
             Dictionary mapping dataset names to dataset instances
@@ -110,6 +111,8 @@ class DatasetFactory:
         for dataset_name, dataset_config in datasets_config.items():
             if dataset_name in ['folders']:
                 continue
+            if dataset_names is not None and dataset_name not in dataset_names:
+                continue
             if 'folders' not in dataset_config:
                 dataset_config['folders'] = folders
             datasets[dataset_name] = cls.create_from_config(dataset_name, dataset_config)
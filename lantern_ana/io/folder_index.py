@@ -0,0 +1,183 @@
+"""
+Index of the files below a folder, used to resolve relative file paths of datasets.
+
+Datasets list their files by name and give folders to look for them in.
+Walking the folders for every file name is slow on shared filesystems with many
+files, so each folder is scanned once into a FolderIndex, which is kept for the
+rest of the job and shared by all datasets.
+
+The index can also be saved in the cache directory (see lantern_ana.utils.cache).
+The saved index records the modification time of every directory it scanned.
+A directory's modification time changes when files or sub-directories are added
+to it, removed or renamed, so the saved index is only reused if none of them
+changed. Checking this costs one stat() per directory instead of listing them all.
+
+Example:
+    index = get_folder_index("/data/ntuples", use_cache=True)
+    index.find("run1_bnb_nu_overlay.root")    # full path, or None
+    index.glob("run1_bnb_*.root")             # sorted list of full paths
+"""
+
+import os
+import json
+import fnmatch
+from typing import Dict, List, Optional
+
+from lantern_ana.utils.cache import get_cache_dir, cache_key
+
+# characters that make a file path a glob pattern
+_GLOB_CHARS = "*?["
+
+# indices built during this job, by absolute folder path
+_FOLDER_INDEXES: Dict[str, "FolderIndex"] = {}
+
+
+def is_glob_pattern(path: str) -> bool:
+    """True if the path contains glob wildcards."""
+    return any(c in path for c in _GLOB_CHARS)
+
+
+class FolderIndex:
+    """
+    The relative paths of all files below a folder, in os.walk order.
+    """
+
+    def __init__(self, folder: str, files: List[str], dir_mtimes: Dict[str, int]):
+        """
+        Args:
+            folder: Absolute path of the folder
+            files: Paths of the files relative to the folder, in os.walk order
+            dir_mtimes: Modification time (ns) of each scanned directory, by path relative to the folder
+        """
+        self.folder = folder
+        self.files = files
+        self.dir_mtimes = dir_mtimes
+        # file name -> relative path of its first occurrence
+        self._by_name: Dict[str, str] = {}
+        for relpath in files:
+            self._by_name.setdefault(os.path.basename(relpath), relpath)
+        self._relpaths = set(files)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    @classmethod
+    def build(cls, folder: str) -> "FolderIndex":
+        """Scan the folder and all its sub-folders."""
+        folder = os.path.abspath(folder)
+        files = []
+        dir_mtimes = {}
+        for root, _, filenames in os.walk(folder):
+            reldir = os.path.relpath(root, folder)
+            try:
+                dir_mtimes[reldir] = os.stat(root).st_mtime_ns
+            except OSError:
+                continue
+            for filename in filenames:
+                files.append(os.path.normpath(os.path.join(reldir, filename)))
+        return cls(folder, files, dir_mtimes)
+
+    def is_current(self) -> bool:
+        """True if no scanned directory has been modified (or removed) since the index was built."""
+        for reldir, mtime_ns in self.dir_mtimes.items():
+            try:
+                if os.stat(os.path.join(self.folder, reldir)).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def save(self, path: str) -> None:
+        """Save the index as a json file."""
+        tmp = f"{path}.tmp{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump({'folder': self.folder, 'files': self.files, 'dir_mtimes': self.dir_mtimes}, f)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, folder: str) -> Optional["FolderIndex"]:
+        """Load an index saved with save(). Returns None if missing, for another folder, or out of date."""
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            if data['folder'] != os.path.abspath(folder):
+                return None
+            index = cls(data['folder'], data['files'], data['dir_mtimes'])
+        except (OSError, ValueError, KeyError):
+            return None
+        if not index.is_current():
+            return None
+        return index
+
+    def find(self, filepath: str) -> Optional[str]:
+        """
+        Find a file in the folder.
+
+        Args:
+            filepath: A file name (matched in any sub-folder, first one in os.walk order)
+                      or a path relative to the folder
+
+        Returns:
+            Full path of the file, or None if not found
+        """
+        if os.sep in filepath:
+            relpath = os.path.normpath(filepath)
+            if relpath not in self._relpaths:
+                return None
+        else:
+            relpath = self._by_name.get(filepath)
+            if relpath is None:
+                return None
+        return os.path.join(self.folder, relpath)
+
+    def glob(self, pattern: str) -> List[str]:
+        """
+        Find the files matching a glob pattern.
+
+        A pattern without a '/' is matched against the file names in all sub-folders,
+        otherwise against the paths relative to the folder.
+
+        Returns:
+            Sorted list of full paths
+        """
+        if os.sep in pattern:
+            pattern = os.path.normpath(pattern)
+            matches = [relpath for relpath in self.files if fnmatch.fnmatchcase(relpath, pattern)]
+        else:
+            matches = [relpath for relpath in self.files
+                       if fnmatch.fnmatchcase(os.path.basename(relpath), pattern)]
+        return sorted(os.path.join(self.folder, relpath) for relpath in matches)
+
+
+def get_folder_index(folder: str, use_cache: bool = False, cache_dir: Optional[str] = None) -> FolderIndex:
+    """
+    Get the index of a folder: built once per job, and optionally saved in the cache directory.
+
+    Args:
+        folder: Folder to index
+        use_cache: Load the index from the cache directory if still current, and save it there after building it
+        cache_dir: Cache directory (default: see lantern_ana.utils.cache.get_cache_dir)
+    """
+    folder = os.path.abspath(folder)
+    index = _FOLDER_INDEXES.get(folder)
+    if index is not None:
+        return index
+
+    cache_path = None
+    if use_cache:
+        cache_path = os.path.join(get_cache_dir('folder_index', cache_dir), cache_key(folder)+".json")
+        index = FolderIndex.load(cache_path, folder)
+        if index is not None:
+            print(f"Folder index: loaded {len(index)} files from cache for {folder}")
+
+    if index is None:
+        index = FolderIndex.build(folder)
+        print(f"Folder index: found {len(index)} files in {folder}")
+        if cache_path is not None:
+            try:
+                index.save(cache_path)
+            except OSError as e:
+                print(f"Folder index: could not save index to cache: {e}")
+
+    _FOLDER_INDEXES[folder] = index
+    return index
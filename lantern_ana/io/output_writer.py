@@ -0,0 +1,265 @@
+"""
+Buffered writer for the analysis_tree.
+
+Producers bind one-element arrays to branches of the output tree in prepareStorage
+(output.Branch(name, array('f',[0]), "name/F")) and set them for every event.
+Instead of the TTree, prepareStorage is given a BufferedTreeWriter. It creates the
+branches as usual and also remembers the buffer bound to each one. For each event
+that is kept, fill() copies the values of all buffers into one row of a preallocated
+NumPy buffer with a single C++ call. Every flush_every events, the rows are written
+to the tree in a C++ loop (copy a row back into the branch buffers, TTree::Fill).
+
+Only branches with a fixed size (leaf lists like "x/F" or "x[3]/F") can be buffered.
+If a producer creates any other kind of branch (e.g. a std::string or a
+variable-length array), the writer falls back to calling TTree::Fill for every event.
+
+The compression of the output file and the basket size of the branches can be set
+in the 'output' block of the configuration:
+
+    output:
+      compression: zstd-5     # algorithm-level: zlib, lzma, lz4 or zstd; or none; or a ROOT settings integer
+      flush_every: 50000      # events kept in the buffer (default: 10000, 0: fill the tree directly)
+      basket_size: 256000     # bytes per branch basket (default: ROOT's choice)
+
+Example:
+    writer = BufferedTreeWriter(ROOT.TTree("analysis_tree", "Processed Events"), flush_every=50000)
+    producer_manager.prepare_storage(writer)
+    ...
+    writer.fill()      # once per kept event
+    writer.close()     # flush the last rows before writing the tree
+"""
+
+import re
+import numpy as np
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+# numpy type of each ROOT leaf-list type code
+_LEAF_DTYPES = {
+    'B': np.int8, 'b': np.uint8, 'S': np.int16, 's': np.uint16,
+    'I': np.int32, 'i': np.uint32, 'L': np.int64, 'l': np.uint64,
+    'F': np.float32, 'D': np.float64, 'O': np.bool_
+}
+
+# "name/F" or "name[3]/F" (one leaf with a fixed size)
+_FIXED_LEAF = re.compile(r'^[^:\[\]/]+(?:\[(\d+)\])?/([BbSsIiLlFDO])$')
+
+# ROOT compression algorithm codes (ROOT::RCompressionSetting::EAlgorithm)
+_COMPRESSION_ALGORITHMS = {'zlib': 1, 'lzma': 2, 'lz4': 4, 'zstd': 5}
+_DEFAULT_COMPRESSION_LEVELS = {'zlib': 1, 'lzma': 7, 'lz4': 4, 'zstd': 5}
+
+_CPP_DECLARED = False
+_CPP_CODE = """
+#include <cstring>
+#include "TTree.h"
+namespace lantern_ana_writer {
+  // copy the current value of every branch buffer into row irow of the row buffer
+  void gather_row(unsigned char* rows, ULong64_t irow, ULong64_t row_nbytes, int ncols,
+                  const ULong64_t* buffers, const ULong64_t* offsets, const ULong64_t* nbytes) {
+    unsigned char* row = rows + irow*row_nbytes;
+    for (int c=0; c<ncols; c++)
+      std::memcpy(row + offsets[c], reinterpret_cast<const void*>(buffers[c]), nbytes[c]);
+  }
+  // copy each row back into the branch buffers and fill the tree
+  void fill_rows(TTree* tree, const unsigned char* rows, ULong64_t nrows, ULong64_t row_nbytes, int ncols,
+                 const ULong64_t* buffers, const ULong64_t* offsets, const ULong64_t* nbytes) {
+    for (ULong64_t irow=0; irow<nrows; irow++) {
+      const unsigned char* row = rows + irow*row_nbytes;
+      for (int c=0; c<ncols; c++)
+        std::memcpy(reinterpret_cast<void*>(buffers[c]), row + offsets[c], nbytes[c]);
+      tree->Fill();
+    }
+  }
+}
+"""
+
+
+def _declare_cpp():
+    global _CPP_DECLARED
+    if not _CPP_DECLARED:
+        import ROOT
+        if not ROOT.gInterpreter.Declare(_CPP_CODE):
+            raise RuntimeError("BufferedTreeWriter: failed to compile the C++ fill functions")
+        _CPP_DECLARED = True
+
+
+def fixed_leaf_layout(leaflist: Any) -> Optional[Tuple[np.dtype, int]]:
+    """
+    NumPy type and number of values of a branch with one fixed-size leaf ("x/F", "x[3]/F").
+
+    Returns:
+        (dtype, count), or None for any other kind of branch
+    """
+    match = _FIXED_LEAF.match(leaflist) if isinstance(leaflist, str) else None
+    if match is None:
+        return None
+    return np.dtype(_LEAF_DTYPES[match.group(2)]), int(match.group(1)) if match.group(1) else 1
+
+
+def parse_compression(compression: Union[None, int, str]) -> Optional[int]:
+    """
+    Convert a compression setting to ROOT's integer form (100*algorithm + level).
+
+    Args:
+        compression: None (keep ROOT's default), an integer, 'none',
+                     or 'algorithm' / 'algorithm-level' with algorithm one of zlib, lzma, lz4, zstd
+
+    Returns:
+        The ROOT compression settings, or None
+    """
+    if compression is None or isinstance(compression, int):
+        return compression
+    text = str(compression).strip().lower()
+    if text.isdigit():
+        return int(text)
+    if text == 'none':
+        return 0
+    name, _, level = text.partition('-')
+    if name not in _COMPRESSION_ALGORITHMS:
+        raise ValueError(f"Unknown compression algorithm '{name}'. Options: {list(_COMPRESSION_ALGORITHMS)}, none")
+    level = int(level) if level else _DEFAULT_COMPRESSION_LEVELS[name]
+    if not 1 <= level <= 9:
+        raise ValueError(f"Compression level must be in [1, 9], got {level}")
+    return 100*_COMPRESSION_ALGORITHMS[name] + level
+
+
+class BufferedTreeWriter:
+    """
+    Collects the values of the output branches of many events and writes them to the tree in bulk.
+
+    Has the Branch method of a TTree, so it can be given to the producers' prepareStorage.
+    Other attributes are looked up on the tree.
+    """
+
+    def __init__(self, tree: Any, flush_every: int = 50000, basket_size: Optional[int] = None,
+                 resume: bool = False):
+        """
+        Args:
+            tree: The output TTree
+            flush_every: Number of events kept in the buffer before writing them. 0 fills the tree directly.
+            basket_size: Basket size (bytes) of every branch. None keeps ROOT's default.
+            resume: The tree was read back from a file to add more entries (see lantern_ana.io.checkpoint).
+                    Branch binds the buffers to the existing branches instead of creating them.
+        """
+        self.tree = tree
+        self.flush_every = flush_every
+        self.basket_size = basket_size
+        self.resume = resume
+        self.num_filled = 0
+        # (name, buffer, numpy dtype, number of values) of each buffered branch
+        self._columns: List[tuple] = []
+        self._unbuffered: List[str] = []
+        self._rows = None
+        self._nrows = 0
+
+    def Branch(self, name: str, buffer: Any, *args):
+        """
+        Create a branch on the tree (same arguments as TTree::Branch) and remember its buffer.
+        """
+        if self._rows is not None:
+            raise RuntimeError(f"BufferedTreeWriter: branch '{name}' created after the first fill")
+        branch = self.tree.GetBranch(name) if self.resume else None
+        if branch:
+            self.tree.SetBranchAddress(name, buffer)
+        else:
+            branch = self.tree.Branch(name, buffer, *args)
+        layout = fixed_leaf_layout(args[0]) if len(args) >= 1 else None
+        column = None
+        if layout is not None:
+            dtype, count = layout
+            try:
+                nbytes = np.frombuffer(buffer, dtype=np.uint8).nbytes
+            except (TypeError, ValueError):
+                nbytes = 0
+            if nbytes >= dtype.itemsize*count:
+                column = (name, buffer, dtype, count)
+        if column is not None:
+            self._columns.append(column)
+        else:
+            self._unbuffered.append(name)
+        return branch
+
+    def __getattr__(self, name: str) -> Any:
+        # only called for names that are not attributes of the writer itself
+        return getattr(self.tree, name)
+
+    @property
+    def is_buffered(self) -> bool:
+        """True if events are collected in the buffer, False if the tree is filled directly."""
+        return self.flush_every > 0 and len(self._unbuffered) == 0 and len(self._columns) > 0
+
+    @property
+    def unbuffered_branches(self) -> List[str]:
+        """Branches that cannot be buffered (they make the writer fill the tree directly)."""
+        return list(self._unbuffered)
+
+    def _allocate(self):
+        """Set the basket size and allocate the row buffer, once all branches exist."""
+        if self.basket_size is not None:
+            self.tree.SetBasketSize("*", int(self.basket_size))
+        if not self.is_buffered:
+            self._rows = np.zeros(0, dtype=np.uint8)
+            return
+        _declare_cpp()
+        row_dtype = np.dtype([(f"f{i}", dtype, (count,)) for i, (_, _, dtype, count) in enumerate(self._columns)])
+        self._rows = np.zeros(self.flush_every, dtype=row_dtype)
+        self._row_bytes = self._rows.view(np.uint8)
+        self._row_nbytes = row_dtype.itemsize
+        # ULong64_t arrays: numpy's uint64 is unsigned long on Linux, which cppyy does not pass as ULong64_t*
+        self._buffer_addresses = np.array([np.frombuffer(buffer, dtype=np.uint8).ctypes.data
+                                           for _, buffer, _, _ in self._columns], dtype=np.ulonglong)
+        self._offsets = np.array([row_dtype.fields[f"f{i}"][1] for i in range(len(self._columns))],
+                                 dtype=np.ulonglong)
+        self._nbytes = np.array([dtype.itemsize*count for _, _, dtype, count in self._columns], dtype=np.ulonglong)
+
+    def fill(self):
+        """Add the current values of the branch buffers as one entry of the tree."""
+        if self._rows is None:
+            self._allocate()
+        self.num_filled += 1
+        if not self.is_buffered:
+            self.tree.Fill()
+            return
+        import ROOT
+        ROOT.lantern_ana_writer.gather_row(self._row_bytes, self._nrows, self._row_nbytes, len(self._columns),
+                                           self._buffer_addresses, self._offsets, self._nbytes)
+        self._nrows += 1
+        if self._nrows == self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered events to the tree."""
+        if self._nrows == 0:
+            return
+        import ROOT
+        ROOT.lantern_ana_writer.fill_rows(self.tree, self._row_bytes, self._nrows, self._row_nbytes, len(self._columns),
+                                          self._buffer_addresses, self._offsets, self._nbytes)
+        self._nrows = 0
+
+    def columns(self) -> Dict[str, np.ndarray]:
+        """
+        NumPy views of the buffered (not yet written) values, by branch name.
+        Branches with more than one value per event have shape (nevents, nvalues).
+        """
+        if self._rows is None or not self.is_buffered:
+            return {}
+        out = {}
+        for i, (name, _, _, count) in enumerate(self._columns):
+            values = self._rows[f"f{i}"][:self._nrows]
+            out[name] = values[:, 0] if count == 1 else values
+        return out
+
+    def checkpoint(self):
+        """
+        Write the buffered events and save the tree header to the file (TTree::AutoSave),
+        so the entries filled so far can be read back if the job stops.
+        """
+        if self._rows is None:
+            self._allocate()
+        self.flush()
+        self.tree.AutoSave("SaveSelf")
+
+    def close(self):
+        """Write the remaining buffered events. Call before writing the tree to the file."""
+        if self._rows is None:
+            self._allocate()
+        self.flush()
@@ -0,0 +1,137 @@
+"""
+POT (protons on target) of ntuple files, cached on disk.
+
+The POT of an MC sample is the sum of the totGoodPOT branch of the potTree in each
+of its files. Looping over the potTree entries in Python and opening every file a
+second time just for this is slow for samples with thousands of files, and was
+repeated at the start of every job. Instead:
+
+  - the POT branch is summed in one column read with RDataFrame
+  - the total of each file is saved in the cache directory (see lantern_ana.utils.cache),
+    tagged with the path, size and modification time of the file.
+    Later jobs use the saved total instead of opening the file again.
+  - totals are also kept in memory for the rest of the job
+
+Example:
+    pot = sum_pot(["run1_a.root", "run1_b.root"], treename="lantern/potTree")
+    pot = get_file_pot("run1_a.root")
+"""
+
+import os
+import json
+from typing import Dict, Iterable, Optional, Tuple
+
+from lantern_ana.utils.cache import get_cache_dir, file_signature, cache_key
+from .rse_index import find_tree_in_file
+
+# totals read during this job, by (file signature, tree name, branch name)
+_FILE_POT: Dict[Tuple, float] = {}
+
+
+def sum_pot_tree(pot_tree, pot_branch: str = 'totGoodPOT') -> float:
+    """
+    Sum the POT branch over all entries of a TTree/TChain, in one column read.
+    """
+    import ROOT as rt
+    if pot_tree.GetEntries() == 0:
+        return 0.0
+    if not pot_tree.GetBranch(pot_branch):
+        raise ValueError(f"POT: tree '{pot_tree.GetName()}' has no branch '{pot_branch}'")
+    return float(rt.RDataFrame(pot_tree).Sum(pot_branch).GetValue())
+
+
+def read_file_pot(filepath: str, treename: str = 'potTree', pot_branch: str = 'totGoodPOT') -> Optional[float]:
+    """
+    Read the POT of a ROOT file (without using the cache).
+
+    Args:
+        filepath: ROOT file with the POT tree
+        treename: Name of the POT tree (it may be inside a top-level directory of the file)
+        pot_branch: Name of the POT branch
+
+    Returns:
+        The POT, or None if the file has no POT tree
+    """
+    import ROOT as rt
+    rfile = rt.TFile.Open(filepath)
+    if not rfile or rfile.IsZombie():
+        raise RuntimeError(f"POT: failed to open file: {filepath}")
+    try:
+        pot_tree = find_tree_in_file(rfile, treename)
+        if not pot_tree:
+            return None
+        return sum_pot_tree(pot_tree, pot_branch)
+    finally:
+        rfile.Close()
+
+
+def get_file_pot(filepath: str, treename: str = 'potTree', pot_branch: str = 'totGoodPOT',
+                 use_cache: bool = True, cache_dir: Optional[str] = None) -> float:
+    """
+    Get the POT of a ROOT file from the cache, or read it and add it to the cache.
+
+    The cache entry is only used if the file still has the same path, size and modification time.
+    A file without a POT tree counts as 0 POT (and a message is printed).
+
+    Args:
+        filepath: ROOT file with the POT tree
+        treename: Name of the POT tree (it may be inside a top-level directory of the file)
+        pot_branch: Name of the POT branch
+        use_cache: If False, always read the file and do not save the total
+        cache_dir: Cache directory (default: see lantern_ana.utils.cache.get_cache_dir)
+    """
+    signature = file_signature(filepath)
+    key = (signature['path'], signature['size'], signature['mtime_ns'], treename, pot_branch)
+    pot = _FILE_POT.get(key)
+    if pot is not None:
+        return pot
+
+    cache_path = None
+    description = {'source': signature, 'tree': treename, 'branch': pot_branch}
+    if use_cache:
+        cache_path = os.path.join(get_cache_dir('pot', cache_dir),
+                                  cache_key(signature['path'], treename, pot_branch)+".json")
+        pot = _load_pot(cache_path, description)
+
+    if pot is None:
+        pot = read_file_pot(filepath, treename, pot_branch)
+        if pot is None:
+            print(f"POT: no tree '{treename}' in {filepath}, counting 0 POT")
+            pot = 0.0
+        if cache_path is not None:
+            try:
+                _save_pot(cache_path, description, pot)
+            except OSError as e:
+                print(f"POT: could not save total to cache: {e}")
+
+    _FILE_POT[key] = pot
+    return pot
+
+
+def sum_pot(filepaths: Iterable[str], treename: str = 'potTree', pot_branch: str = 'totGoodPOT',
+            use_cache: bool = True, cache_dir: Optional[str] = None) -> float:
+    """
+    Get the total POT of a list of ROOT files (see get_file_pot).
+    """
+    return sum(get_file_pot(filepath, treename, pot_branch, use_cache=use_cache, cache_dir=cache_dir)
+               for filepath in filepaths)
+
+
+def _save_pot(path: str, description: Dict, pot: float) -> None:
+    meta = dict(description)
+    meta['pot'] = pot
+    tmp = f"{path}.tmp{os.getpid()}"
+    with open(tmp, 'w') as f:
+        json.dump(meta, f)
+    os.replace(tmp, path)
+
+
+def _load_pot(path: str, description: Dict) -> Optional[float]:
+    try:
+        with open(path) as f:
+            meta = json.load(f)
+        if any(meta.get(key) != value for key, value in description.items()):
+            return None
+        return float(meta['pot'])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
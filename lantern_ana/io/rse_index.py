@@ -0,0 +1,250 @@
+"""
+Run/subrun/event to tree-entry index, cached on disk.
+
+Matching events between trees (e.g. an analysis ntuple and the systematic weight
+tree, or a central-value sample and a detector-variation sample) needs a map
+from (run, subrun, event) to the entry number in the other tree. Building it by
+looping over a large tree is slow, so RSEIndex:
+
+  - reads only the three index branches, in bulk, with RDataFrame.AsNumpy
+  - packs (run, subrun, event) into one int64 key and keeps the keys sorted,
+    so lookups are a vectorized np.searchsorted
+  - saves the index as .npy files in the cache directory (see lantern_ana.utils.cache),
+    tagged with the path, size and modification time of the source file.
+    Later jobs load the index (memory-mapped) instead of re-reading the tree.
+
+If the tree is already stored in RSE order, the entry numbers are the positions
+in the sorted key array and no permutation array is stored. A query that is also
+RSE-sorted then gives increasing entry numbers, so the other tree is read front to back.
+
+Example:
+    index = RSEIndex.load_or_build("weights.root", "eventweight_tree", "run", "sub", "evt")
+    entries = index.lookup(runs, subruns, events)   # -1 for events not in the tree
+"""
+
+import os
+import json
+import time
+import numpy as np
+from typing import Optional, Dict, Any
+
+from lantern_ana.utils.cache import get_cache_dir, file_signature, cache_key
+
+# Number of bits used for each field of the packed key (19+18+26 = 63 bits)
+_RUN_BITS = 19
+_SUBRUN_BITS = 18
+_EVENT_BITS = 26
+
+
+def pack_rse(run, subrun, event) -> np.ndarray:
+    """
+    Pack (run, subrun, event) values into int64 keys that sort in (run, subrun, event) order.
+
+    Args:
+        run, subrun, event: Scalars or arrays of the same length
+    """
+    run = np.asarray(run, dtype=np.int64)
+    subrun = np.asarray(subrun, dtype=np.int64)
+    event = np.asarray(event, dtype=np.int64)
+    for name, values, nbits in [('run', run, _RUN_BITS), ('subrun', subrun, _SUBRUN_BITS), ('event', event, _EVENT_BITS)]:
+        if values.size > 0 and (values.min() < 0 or values.max() >= (1 << nbits)):
+            raise ValueError(f"RSE index: {name} values must be in [0, {1 << nbits}). "
+                             f"Found range [{values.min()}, {values.max()}]")
+    return (run << (_SUBRUN_BITS+_EVENT_BITS)) | (subrun << _EVENT_BITS) | event
+
+
+def find_tree_in_file(rfile, treename: str):
+    """
+    Get a tree from an open TFile, also looking inside its top-level directories.
+    """
+    tree = rfile.Get(treename)
+    if tree:
+        return tree
+    for key in rfile.GetListOfKeys():
+        obj = key.ReadObj()
+        if obj.InheritsFrom("TDirectoryFile"):
+            tree = obj.Get(treename)
+            if tree:
+                return tree
+    return None
+
+
+class RSEIndex:
+    """
+    Sorted (run, subrun, event) keys and the tree entry of each key.
+    """
+
+    def __init__(self, keys: np.ndarray, entries: Optional[np.ndarray] = None):
+        """
+        Args:
+            keys: Sorted packed keys (see pack_rse)
+            entries: Tree entry for each key. None if the tree is RSE-sorted (entry = position in keys).
+        """
+        self.keys = keys
+        self.entries = entries
+
+    @property
+    def tree_is_sorted(self) -> bool:
+        """True if the tree entries are stored in RSE order."""
+        return self.entries is None
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @classmethod
+    def from_arrays(cls, run, subrun, event) -> "RSEIndex":
+        """
+        Build the index from the run, subrun, event values of every tree entry, in tree order.
+
+        If an RSE appears more than once, lookups return its last entry.
+        """
+        keys = pack_rse(run, subrun, event)
+        if len(keys) < 2 or np.all(keys[1:] > keys[:-1]):
+            return cls(keys, None)
+        # stable sort: duplicates keep tree order, and lookup picks the last one
+        order = np.argsort(keys, kind='stable')
+        return cls(keys[order], order.astype(np.int64))
+
+    @classmethod
+    def from_tree(cls, tree, run_branch: str, subrun_branch: str, event_branch: str) -> "RSEIndex":
+        """
+        Build the index by reading the three index branches of a TTree/TChain in bulk.
+        """
+        import ROOT as rt
+        if tree.GetEntries() == 0:
+            empty = np.zeros(0, dtype=np.int64)
+            return cls.from_arrays(empty, empty, empty)
+        arrays = rt.RDataFrame(tree).AsNumpy([run_branch, subrun_branch, event_branch])
+        return cls.from_arrays(arrays[run_branch], arrays[subrun_branch], arrays[event_branch])
+
+    @classmethod
+    def build(cls, filepath: str, treename: str, run_branch: str, subrun_branch: str, event_branch: str) -> "RSEIndex":
+        """
+        Build the index for a tree in a ROOT file (without using the cache).
+        """
+        import ROOT as rt
+        rfile = rt.TFile.Open(filepath)
+        if not rfile or rfile.IsZombie():
+            raise RuntimeError(f"RSE index: failed to open file: {filepath}")
+        try:
+            tree = find_tree_in_file(rfile, treename)
+            if not tree:
+                raise RuntimeError(f"RSE index: failed to find tree '{treename}' in {filepath}")
+            return cls.from_tree(tree, run_branch, subrun_branch, event_branch)
+        finally:
+            rfile.Close()
+
+    @classmethod
+    def load_or_build(cls, filepath: str, treename: str,
+                      run_branch: str, subrun_branch: str, event_branch: str,
+                      cache_dir: Optional[str] = None, use_cache: bool = True) -> "RSEIndex":
+        """
+        Load the index of a tree from the cache, or build it and add it to the cache.
+
+        The cache entry is only used if the file still has the same path, size and modification time.
+
+        Args:
+            filepath: ROOT file with the tree
+            treename: Name of the tree (it may be inside a top-level directory of the file)
+            run_branch, subrun_branch, event_branch: Names of the index branches
+            cache_dir: Cache directory (default: see lantern_ana.utils.cache.get_cache_dir)
+            use_cache: If False, always build the index and do not save it
+        """
+        if not use_cache:
+            return cls.build(filepath, treename, run_branch, subrun_branch, event_branch)
+
+        signature = file_signature(filepath)
+        description = {
+            'source': signature,
+            'tree': treename,
+            'branches': [run_branch, subrun_branch, event_branch]
+        }
+        prefix = os.path.join(get_cache_dir('rse_index', cache_dir),
+                              cache_key(signature['path'], treename, run_branch, subrun_branch, event_branch))
+
+        index = cls.load(prefix, description)
+        if index is not None:
+            print(f"RSE index: loaded {len(index)} entries from cache for {filepath}")
+            return index
+
+        tstart = time.time()
+        index = cls.build(filepath, treename, run_branch, subrun_branch, event_branch)
+        print(f"RSE index: built index of {len(index)} entries for {filepath} in {time.time()-tstart:.2f} secs "
+              f"(tree RSE-sorted: {index.tree_is_sorted})")
+        try:
+            index.save(prefix, description)
+        except OSError as e:
+            print(f"RSE index: could not save index to cache: {e}")
+        return index
+
+    def save(self, prefix: str, description: Dict[str, Any]) -> None:
+        """
+        Save the index as {prefix}.keys.npy, {prefix}.entries.npy (if needed) and {prefix}.json.
+
+        The json file is written last, so an index is only picked up by load() once complete.
+        """
+        def _save_array(suffix, array):
+            tmp = f"{prefix}.{suffix}.tmp{os.getpid()}.npy"
+            np.save(tmp, array)
+            os.replace(tmp, f"{prefix}.{suffix}.npy")
+
+        _save_array('keys', self.keys)
+        if self.entries is not None:
+            _save_array('entries', self.entries)
+
+        meta = dict(description)
+        meta['num_keys'] = len(self.keys)
+        meta['tree_is_sorted'] = self.tree_is_sorted
+        tmp = f"{prefix}.json.tmp{os.getpid()}"
+        with open(tmp, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp, f"{prefix}.json")
+
+    @classmethod
+    def load(cls, prefix: str, description: Dict[str, Any]) -> Optional["RSEIndex"]:
+        """
+        Load an index saved with save(). Returns None if missing or made from a different file version.
+        """
+        try:
+            with open(f"{prefix}.json") as f:
+                meta = json.load(f)
+            if any(meta.get(key) != value for key, value in description.items()):
+                return None
+            keys = np.load(f"{prefix}.keys.npy", mmap_mode='r')
+            entries = None
+            if not meta['tree_is_sorted']:
+                entries = np.load(f"{prefix}.entries.npy", mmap_mode='r')
+        except (OSError, ValueError, KeyError):
+            return None
+        if len(keys) != meta['num_keys']:
+            return None
+        return cls(keys, entries)
+
+    def lookup(self, run, subrun, event) -> np.ndarray:
+        """
+        Find the tree entries of many events at once.
+
+        Args:
+            run, subrun, event: Arrays (or scalars) with the RSE of the events to find
+
+        Returns:
+            int64 array with the tree entry of each event, -1 for events not in the tree
+        """
+        query = np.atleast_1d(pack_rse(run, subrun, event))
+        if len(self.keys) == 0:
+            return np.full(len(query), -1, dtype=np.int64)
+        # the last position with keys[pos] <= query
+        pos = np.searchsorted(self.keys, query, side='right') - 1
+        found = (pos >= 0) & (self.keys[np.maximum(pos, 0)] == query)
+        if self.entries is None:
+            result = pos.astype(np.int64)
+        else:
+            result = np.asarray(self.entries)[np.maximum(pos, 0)].astype(np.int64)
+        result[~found] = -1
+        return result
+
+    def lookup_one(self, run: int, subrun: int, event: int) -> int:
+        """
+        Find the tree entry of one event. Returns -1 if the event is not in the tree.
+        """
+        return int(self.lookup(run, subrun, event)[0])
@@ -0,0 +1,218 @@
+"""
+Tests of checkpoints: saving and loading the sidecar file, histogram_state and
+restore_histogram_state, and a job stopped after a checkpoint and resumed with
+--resume giving the same output as a job that was not stopped.
+"""
+
+import os
+from array import array
+
+import numpy as np
+import pytest
+import yaml
+
+ROOT = pytest.importorskip("ROOT")
+
+from lantern_ana.io.checkpoint import (CHECKPOINT_VERSION, checkpoint_file_path, histogram_state,
+                                       load_checkpoint, restore_histogram_state, save_checkpoint)
+from lantern_ana.producers.producerBaseClass import ProducerBaseClass
+from lantern_ana.producers.producer_factory import ProducerFactory
+
+NEVENTS = 60
+
+
+def test_save_and_load(tmp_path):
+    path = checkpoint_file_path(str(tmp_path), "mc")
+    assert path == str(tmp_path / "mc.checkpoint")
+    assert load_checkpoint(path) is None
+
+    state = {'finished': False, 'next_entry': 30, 'values': np.arange(4)}
+    save_checkpoint(path, state)
+    loaded = load_checkpoint(path)
+    assert loaded['version'] == CHECKPOINT_VERSION
+    assert loaded['next_entry'] == 30
+    np.testing.assert_array_equal(loaded['values'], np.arange(4))
+    # the temporary file was renamed
+    assert os.listdir(tmp_path) == ["mc.checkpoint"]
+
+    save_checkpoint(path, {'finished': True})
+    assert load_checkpoint(path)['finished']
+
+
+def test_load_other_version(tmp_path, monkeypatch):
+    from lantern_ana.io import checkpoint
+    path = checkpoint_file_path(str(tmp_path), "mc")
+    save_checkpoint(path, {'finished': False})
+    monkeypatch.setattr(checkpoint, 'CHECKPOINT_VERSION', CHECKPOINT_VERSION+1)
+    with pytest.raises(ValueError, match="another version"):
+        checkpoint.load_checkpoint(path)
+
+
+def assert_histograms_equal(hist, expected):
+    assert hist.GetNcells() == expected.GetNcells()
+    for i in range(expected.GetNcells()):
+        assert hist.GetBinContent(i) == expected.GetBinContent(i)
+        assert hist.GetBinError(i) == pytest.approx(expected.GetBinError(i))
+    assert hist.GetEntries() == expected.GetEntries()
+    assert hist.GetSumOfWeights() == pytest.approx(expected.GetSumOfWeights())
+    for axis in range(1, expected.GetDimension()+1):
+        assert hist.GetMean(axis) == pytest.approx(expected.GetMean(axis))
+        assert hist.GetStdDev(axis) == pytest.approx(expected.GetStdDev(axis))
+
+
+@pytest.mark.parametrize("weighted", [True, False])
+def test_histogram_state_round_trip(weighted):
+    rng = np.random.default_rng(2)
+    original = ROOT.TH2D("original", "", 8, -1, 1, 5, 0, 10)
+    original.SetDirectory(0)
+    if weighted:
+        original.Sumw2()
+    for x, y, w in zip(rng.normal(0, 0.6, 500), rng.uniform(-1, 11, 500), rng.uniform(0.5, 2.0, 500)):
+        original.Fill(x, y, w if weighted else 1.0)
+
+    state = histogram_state(original)
+    assert (state['sumw2'] is not None) == weighted
+
+    restored = ROOT.TH2D("restored", "", 8, -1, 1, 5, 0, 10)
+    restored.SetDirectory(0)
+    restore_histogram_state(restored, state)
+    assert_histograms_equal(restored, original)
+
+    # filling after the restore continues from the saved contents
+    for hist in (original, restored):
+        hist.Fill(0.1, 3.0, 1.5 if weighted else 1.0)
+    assert_histograms_equal(restored, original)
+
+
+def test_restore_other_binning():
+    hist = ROOT.TH1D("h10", "", 10, 0, 1)
+    hist.SetDirectory(0)
+    other = ROOT.TH1D("h20", "", 20, 0, 1)
+    other.SetDirectory(0)
+    with pytest.raises(ValueError, match="bins"):
+        restore_histogram_state(other, histogram_state(hist))
+
+
+@ProducerFactory.register
+class CheckpointTestHistProducer(ProducerBaseClass):
+    """
+    Fills a weighted histogram of every event and saves it in checkpoints. Stops the job
+    (like a crash) at the entry 'stop_at_entry' of the configuration, if given.
+    """
+
+    def __init__(self, name, config):
+        super().__init__(name, config)
+        self.value = array('f', [0.0])
+        self.hist = ROOT.TH1D(f"{name}_hist", "", 20, 0, 1000)
+        self.hist.SetDirectory(0)
+        self.hist.Sumw2()
+
+    def prepareStorage(self, output):
+        output.Branch(f"{self.name}_value", self.value, f"{self.name}_value/F")
+
+    def setDefaultValues(self):
+        self.value[0] = -1.0
+
+    def requiredInputs(self):
+        return ["gen2ntuple"]
+
+    def requiredBranches(self):
+        return ['event', 'vtxZ']
+
+    def supportsCaching(self):
+        return False
+
+    def processEvent(self, data, params):
+        if params['event_index'] == self.config.get('stop_at_entry', -1):
+            raise RuntimeError("job stopped")
+        ntuple = data["gen2ntuple"]
+        self.value[0] = ntuple.vtxZ
+        self.hist.Fill(ntuple.vtxZ, 1.0 + 0.01*ntuple.event)
+        return {'value': self.value[0]}
+
+    def getCheckpointState(self):
+        return histogram_state(self.hist)
+
+    def restoreCheckpointState(self, state):
+        restore_histogram_state(self.hist, state)
+
+    def finalize(self):
+        return
+
+
+def write_config(tmp_path, output_dir, ntuple, stop_at_entry=None):
+    hist_config = {} if stop_at_entry is None else {'stop_at_entry': stop_at_entry}
+    config = {
+        'output_dir': str(output_dir),
+        'filter_events': True,
+        'checkpoint_every': 10,
+        'output': {'flush_every': 4},
+        'producers': {'hist': {'type': 'CheckpointTestHistProducer', 'config': hist_config}},
+        'cuts': {'has_muon_track': {'ke_threshold': 30.0}},
+        'datasets': {'synthetic': {'type': 'RootDataset', 'tree': 'EventTree', 'ismc': True,
+                                   'filepaths': [ntuple]}},
+    }
+    config_file = str(tmp_path / f"config_{os.path.basename(output_dir)}_{stop_at_entry}.yaml")
+    with open(config_file, 'w') as f:
+        yaml.dump(config, f)
+    return config_file
+
+
+def run(config_file, resume=False):
+    from lantern_ana.lantern_ana_class import LanternAna
+    analysis = LanternAna(config_file, log_level="WARNING", resume=resume)
+    analysis.run(['synthetic'])
+    return analysis
+
+
+def read_output(output_dir):
+    """Values of the analysis_tree of the output file in output_dir."""
+    paths = [name for name in os.listdir(output_dir) if name.endswith(".root")]
+    assert len(paths) == 1
+    rfile = ROOT.TFile(os.path.join(output_dir, paths[0]))
+    tree = rfile.Get("analysis_tree")
+    values = []
+    for ientry in range(tree.GetEntries()):
+        tree.GetEntry(ientry)
+        values.append(tree.hist_value)
+    rfile.Close()
+    return values
+
+
+def test_stopped_job_resumes_to_same_output(tmp_path):
+    from lantern_ana.benchmarks.synthetic_ntuple import write_synthetic_ntuple
+    ntuple = str(tmp_path / "ntuple.root")
+    write_synthetic_ntuple(ntuple, num_events=NEVENTS, seed=8)
+
+    # the job that is not stopped
+    full = run(write_config(tmp_path, tmp_path / "full", ntuple))
+    full_values = read_output(tmp_path / "full")
+    assert 0 < len(full_values) < NEVENTS
+
+    # the job stopped at entry 35: the last checkpoint is at entry 30
+    checkpoint_path = checkpoint_file_path(str(tmp_path / "resumed"), "synthetic")
+    with pytest.raises(SystemExit):
+        run(write_config(tmp_path, tmp_path / "resumed", ntuple, stop_at_entry=35))
+    stopped = load_checkpoint(checkpoint_path)
+    assert not stopped['finished']
+    assert stopped['next_entry'] == 30
+    # the stopped job left its output file open: close it without writing, like a crash would
+    for rfile in list(ROOT.gROOT.GetListOfFiles()):
+        if rfile.GetName().startswith(str(tmp_path / "resumed")):
+            rfile.Close("nodelete")
+
+    resumed = run(write_config(tmp_path, tmp_path / "resumed", ntuple), resume=True)
+    assert read_output(tmp_path / "resumed") == full_values
+    for key in ['total', 'passed', 'failed']:
+        assert resumed.stats['synthetic'][key] == full.stats['synthetic'][key]
+    assert resumed.stats['synthetic']['cut_stats'] == full.stats['synthetic']['cut_stats']
+    assert_histograms_equal(resumed.producer_manager.producers['hist'].hist,
+                            full.producer_manager.producers['hist'].hist)
+
+    # the checkpoint is now the finished marker: --resume skips the dataset
+    finished = load_checkpoint(checkpoint_path)
+    assert finished['finished']
+    assert finished['stats']['passed'] == full.stats['synthetic']['passed']
+    again = run(write_config(tmp_path, tmp_path / "resumed", ntuple), resume=True)
+    assert again.producer_manager.producers['hist'].hist.GetEntries() == 0
+    assert again.stats['synthetic']['passed'] == full.stats['synthetic']['passed']
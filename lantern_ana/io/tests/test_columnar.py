@@ -0,0 +1,134 @@
+"""
+Tests of read_column_batches: reading a chain with a friend tree chunk by chunk must give
+the same columns as reading all entries at once, for chunks anywhere in the chain and
+for trees that are not read from files.
+"""
+
+import gc
+
+import numpy as np
+import pytest
+
+ROOT = pytest.importorskip("ROOT")
+
+from lantern_ana.benchmarks.synthetic_ntuple import write_synthetic_ntuple
+from lantern_ana.io.columnar import JaggedArray, read_column_batches, _dataset_spec_factory
+from lantern_ana.io.RootDataset import RootDataset
+
+NEVENTS = 40
+BRANCHES = ['run', 'event', 'vtxX', 'nTracks', 'trackRecoE', 'showerPID', 'obs_total_pe', 'pred_total_pe_all']
+
+
+@pytest.fixture(scope="module")
+def ntuple_files(tmp_path_factory):
+    tmpdir = tmp_path_factory.mktemp("columnar")
+    paths = [str(tmpdir / f"ntuple{i}.root") for i in range(2)]
+    for i, path in enumerate(paths):
+        write_synthetic_ntuple(path, num_events=NEVENTS//2, seed=i)
+    return paths
+
+
+def make_chain(paths):
+    """EventTree with the FlashPredictionTree as friend, as RootDataset makes it."""
+    chain = ROOT.TChain("EventTree")
+    friend = ROOT.TChain("FlashPredictionTree")
+    for path in paths:
+        chain.Add(path)
+        friend.Add(path)
+    chain.AddFriend(friend)
+    # keep the friend alive as long as the chain
+    chain._friend = friend
+    return chain
+
+
+def read_all(tree, branches):
+    arrays = ROOT.RDataFrame(tree).AsNumpy(branches)
+    return {name: JaggedArray.from_sequences(values) if values.dtype == object else values
+            for name, values in arrays.items()}
+
+
+def assert_column_equal(column, expected):
+    if isinstance(expected, JaggedArray):
+        assert isinstance(column, JaggedArray)
+        np.testing.assert_array_equal(column.offsets-column.offsets[0], expected.offsets-expected.offsets[0])
+        np.testing.assert_array_equal(column.content, expected.content)
+    else:
+        np.testing.assert_array_equal(column, expected)
+
+
+def slice_column(column, start, stop):
+    if isinstance(column, JaggedArray):
+        offsets = column.offsets[start:stop+1]
+        return JaggedArray(column.content[offsets[0]:offsets[-1]], offsets)
+    return column[start:stop]
+
+
+@pytest.mark.parametrize("chunk_size, start, stop", [(7, 0, None), (NEVENTS, 0, None), (6, 13, 31), (100, 5, 8)])
+def test_chunks_match_full_read(ntuple_files, chunk_size, start, stop):
+    chain = make_chain(ntuple_files)
+    assert _dataset_spec_factory(chain) is not None
+    expected = read_all(chain, BRANCHES)
+    stop_entry = NEVENTS if stop is None else stop
+
+    batches = list(read_column_batches(chain, BRANCHES, chunk_size=chunk_size, start=start, stop=stop))
+    assert [(b.start, b.stop) for b in batches] == [(s, min(s+chunk_size, stop_entry))
+                                                   for s in range(start, stop_entry, chunk_size)]
+    for batch in batches:
+        for name in BRANCHES:
+            assert_column_equal(batch[name], slice_column(expected[name], batch.start, batch.stop))
+
+
+def test_tree_from_file(ntuple_files):
+    rfile = ROOT.TFile(ntuple_files[1])
+    tree = rfile.Get("EventTree")
+    assert _dataset_spec_factory(tree) is not None
+    batches = list(read_column_batches(tree, ['event', 'vtxX'], chunk_size=8, start=4))
+    events = np.concatenate([batch.event for batch in batches])
+    np.testing.assert_array_equal(events, read_all(tree, ['event'])['event'][4:])
+    rfile.Close()
+
+
+def test_tree_in_memory():
+    tree = ROOT.TTree("memtree", "")
+    value = np.zeros(1, dtype=np.int32)
+    tree.Branch("value", value, "value/I")
+    for i in range(20):
+        value[0] = 3*i
+        tree.Fill()
+    assert _dataset_spec_factory(tree) is None
+    batches = list(read_column_batches(tree, ['value'], chunk_size=6, start=2))
+    np.testing.assert_array_equal(np.concatenate([batch.value for batch in batches]), 3*np.arange(2, 20))
+
+
+def test_no_branches(ntuple_files):
+    batches = list(read_column_batches(make_chain(ntuple_files), [], chunk_size=15))
+    assert [(b.start, b.stop, b.keys()) for b in batches] == [(0, 15, []), (15, 30, []), (30, 40, [])]
+
+
+def test_dataset_friend_tree(ntuple_files):
+    dataset = RootDataset("friends", {'tree': 'EventTree', 'ismc': False, 'filepaths': [ntuple_files[0]],
+                                      'friendtrees': {'FlashPredictionTree': ntuple_files[0]}})
+    dataset.initialize()
+    gc.collect()
+    # the friend chain made by the dataset is still there, so the chunks are read with a dataset spec
+    assert _dataset_spec_factory(dataset._tree) is not None
+    expected = read_all(make_chain(ntuple_files[:1]), ['pred_total_pe_all'])['pred_total_pe_all']
+    batches = list(dataset.iterate_batches(['pred_total_pe_all'], chunk_size=9))
+    assert batches[-1].stop == NEVENTS//2
+    for batch in batches:
+        assert_column_equal(batch['pred_total_pe_all'], slice_column(expected, batch.start, batch.stop))
+
+
+def test_nested_vectors(ntuple_files):
+    # vector<vector<float>> branch: the values of each entry are rows of a 2D content array
+    chain = make_chain(ntuple_files)
+    batches = list(read_column_batches(chain, ['sinkhorn_div_all'], chunk_size=7))
+    for batch in batches:
+        column = batch['sinkhorn_div_all']
+        assert column.content.dtype == np.float32
+        for ibatch in range(batch.size):
+            chain.GetEntry(batch.start+ibatch)
+            expected = [list(values) for values in chain.sinkhorn_div_all]
+            assert len(column[ibatch]) == len(expected)
+            np.testing.assert_array_equal(column[ibatch],
+                                          np.array(expected, dtype=np.float32).reshape(column[ibatch].shape))
@@ -0,0 +1,208 @@
+"""
+Tests of FolderIndex and of RootDataset.resolve_filepath on small folders made in tmp_path.
+No ROOT file is opened: resolving file paths only looks at the file names.
+"""
+
+import os
+
+import pytest
+
+from lantern_ana.io import folder_index
+from lantern_ana.io.folder_index import FolderIndex, get_folder_index, is_glob_pattern
+from lantern_ana.io.RootDataset import RootDataset
+
+# a fixed modification time for the scanned directories, so that adding a file
+# always changes it, however coarse the filesystem's timestamps are
+OLD_MTIME_NS = 1_000_000_000_000_000_000
+
+
+def make_files(folder, relpaths):
+    for relpath in relpaths:
+        path = folder / relpath
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("")
+    for root, _, _ in os.walk(folder):
+        os.utime(root, ns=(OLD_MTIME_NS, OLD_MTIME_NS))
+    return str(folder)
+
+
+@pytest.fixture(autouse=True)
+def no_shared_indexes(monkeypatch):
+    """Each test starts without the indices built earlier in the job."""
+    monkeypatch.setattr(folder_index, '_FOLDER_INDEXES', {})
+
+
+@pytest.fixture
+def data_folder(tmp_path):
+    return make_files(tmp_path / "data", ["run1_bnb_a.root",
+                                          "run1/run1_bnb_b.root",
+                                          "run1/run1_ext_a.root",
+                                          "run3/run3_bnb_a.root",
+                                          "run3/sub/run1_bnb_a.root",
+                                          "notes.txt"])
+
+
+def test_is_glob_pattern():
+    assert is_glob_pattern("run1_*.root")
+    assert is_glob_pattern("run?_a.root")
+    assert is_glob_pattern("run[13]_a.root")
+    assert not is_glob_pattern("run1/run1_a.root")
+
+
+def test_build(data_folder):
+    index = FolderIndex.build(data_folder)
+    assert index.folder == data_folder
+    assert len(index) == 6
+    assert sorted(index.files) == sorted(["run1_bnb_a.root", "run1/run1_bnb_b.root", "run1/run1_ext_a.root",
+                                          "run3/run3_bnb_a.root", "run3/sub/run1_bnb_a.root", "notes.txt"])
+    assert sorted(index.dir_mtimes) == sorted([".", "run1", "run3", os.path.join("run3", "sub")])
+
+
+def test_find(data_folder):
+    index = FolderIndex.build(data_folder)
+    assert index.find("run1_bnb_b.root") == os.path.join(data_folder, "run1", "run1_bnb_b.root")
+    assert index.find("run3/sub/run1_bnb_a.root") == os.path.join(data_folder, "run3", "sub", "run1_bnb_a.root")
+    assert index.find("./run1/../run1/run1_ext_a.root") == os.path.join(data_folder, "run1", "run1_ext_a.root")
+    # a name in several sub-folders is the first one in os.walk order
+    first = next(relpath for relpath in index.files if os.path.basename(relpath) == "run1_bnb_a.root")
+    assert index.find("run1_bnb_a.root") == os.path.join(data_folder, first)
+    assert index.find("missing.root") is None
+    assert index.find("run3/run1_bnb_b.root") is None
+
+
+def test_glob(data_folder):
+    index = FolderIndex.build(data_folder)
+    join = lambda *parts: os.path.join(data_folder, *parts)
+    # patterns without '/' match file names in all sub-folders
+    assert index.glob("run1_bnb_*.root") == sorted([join("run1_bnb_a.root"), join("run1", "run1_bnb_b.root"),
+                                                    join("run3", "sub", "run1_bnb_a.root")])
+    assert index.glob("*_a.root") == sorted([join("run1_bnb_a.root"), join("run1", "run1_ext_a.root"),
+                                             join("run3", "run3_bnb_a.root"), join("run3", "sub", "run1_bnb_a.root")])
+    # patterns with '/' match the relative paths
+    assert index.glob("run1/*.root") == [join("run1", "run1_bnb_b.root"), join("run1", "run1_ext_a.root")]
+    assert index.glob("run3/*/run1_bnb_?.root") == [join("run3", "sub", "run1_bnb_a.root")]
+    assert index.glob("*.txt") == [join("notes.txt")]
+    assert index.glob("run2_*.root") == []
+
+
+@pytest.mark.parametrize("change", ["add_top", "add_sub", "remove", "remove_dir", "add_dir"])
+def test_is_current(data_folder, change):
+    index = FolderIndex.build(data_folder)
+    assert index.is_current()
+    if change == "add_top":
+        open(os.path.join(data_folder, "run1_bnb_c.root"), "w").close()
+    elif change == "add_sub":
+        open(os.path.join(data_folder, "run3", "sub", "run3_bnb_c.root"), "w").close()
+    elif change == "remove":
+        os.remove(os.path.join(data_folder, "run1", "run1_ext_a.root"))
+    elif change == "remove_dir":
+        os.remove(os.path.join(data_folder, "run3", "sub", "run1_bnb_a.root"))
+        os.rmdir(os.path.join(data_folder, "run3", "sub"))
+    elif change == "add_dir":
+        os.mkdir(os.path.join(data_folder, "run2"))
+    assert not index.is_current()
+
+
+def test_editing_a_file_keeps_index_current(data_folder):
+    index = FolderIndex.build(data_folder)
+    with open(os.path.join(data_folder, "run1", "run1_bnb_b.root"), "w") as f:
+        f.write("new contents")
+    assert index.is_current()
+
+
+def test_save_and_load(data_folder, tmp_path):
+    path = str(tmp_path / "index.json")
+    index = FolderIndex.build(data_folder)
+    index.save(path)
+
+    loaded = FolderIndex.load(path, data_folder)
+    assert loaded is not None
+    assert loaded.files == index.files
+    assert loaded.find("run1_bnb_b.root") == index.find("run1_bnb_b.root")
+    assert FolderIndex.load(path, str(tmp_path)) is None
+    assert FolderIndex.load(str(tmp_path / "missing.json"), data_folder) is None
+
+    open(os.path.join(data_folder, "run1", "run1_bnb_c.root"), "w").close()
+    assert FolderIndex.load(path, data_folder) is None
+
+
+def test_get_folder_index_uses_cache(data_folder, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    index = get_folder_index(data_folder, use_cache=True, cache_dir=cache_dir)
+    assert get_folder_index(data_folder) is index
+
+    # a new job loads the saved index instead of scanning the folder
+    monkeypatch.setattr(folder_index, '_FOLDER_INDEXES', {})
+    monkeypatch.setattr(FolderIndex, 'build', classmethod(lambda cls, folder: pytest.fail("folder scanned again")))
+    loaded = get_folder_index(data_folder, use_cache=True, cache_dir=cache_dir)
+    assert loaded.files == index.files
+
+
+def test_get_folder_index_rescans_changed_folder(data_folder, tmp_path, monkeypatch):
+    cache_dir = str(tmp_path / "cache")
+    get_folder_index(data_folder, use_cache=True, cache_dir=cache_dir)
+    open(os.path.join(data_folder, "run1", "run1_bnb_c.root"), "w").close()
+
+    monkeypatch.setattr(folder_index, '_FOLDER_INDEXES', {})
+    index = get_folder_index(data_folder, use_cache=True, cache_dir=cache_dir)
+    assert index.find("run1_bnb_c.root") == os.path.join(data_folder, "run1", "run1_bnb_c.root")
+
+
+@pytest.fixture
+def two_folders(tmp_path):
+    first = make_files(tmp_path / "first", ["run1_bnb_a.root", "run1_bnb_b.root", "sub/run1_bnb_c.root"])
+    second = make_files(tmp_path / "second", ["run1_bnb_a.root", "run1_bnb_d.root", "run3_bnb_a.root"])
+    return first, second
+
+
+def make_dataset(folders, tmp_path):
+    return RootDataset("test", {'tree': 'analysis_tree', 'filepaths': [],
+                                'folders': list(folders) + [str(tmp_path / "does_not_exist")],
+                                'folder_index_cache_dir': str(tmp_path / "cache")})
+
+
+def test_resolve_filepath_wildcards(two_folders, tmp_path):
+    first, second = two_folders
+    dataset = make_dataset(two_folders, tmp_path)
+    # a name found in both folders is taken from the first one
+    assert dataset.resolve_filepath("run1_bnb_*.root") == [
+        os.path.join(first, "run1_bnb_a.root"),
+        os.path.join(first, "run1_bnb_b.root"),
+        os.path.join(first, "sub", "run1_bnb_c.root"),
+        os.path.join(second, "run1_bnb_d.root"),
+    ]
+    assert dataset.resolve_filepath("run3_bnb_?.root") == [os.path.join(second, "run3_bnb_a.root")]
+    assert dataset.resolve_filepath("sub/*.root") == [os.path.join(first, "sub", "run1_bnb_c.root")]
+    assert dataset.resolve_filepath("run[13]_bnb_a.root") == [os.path.join(first, "run1_bnb_a.root"),
+                                                              os.path.join(second, "run3_bnb_a.root")]
+
+
+def test_resolve_filepath_without_wildcards(two_folders, tmp_path):
+    first, second = two_folders
+    dataset = make_dataset(two_folders, tmp_path)
+    assert dataset.resolve_filepath("run1_bnb_a.root") == [os.path.join(first, "run1_bnb_a.root")]
+    assert dataset.resolve_filepath("run1_bnb_d.root") == [os.path.join(second, "run1_bnb_d.root")]
+    assert dataset.resolve_filepath("sub/run1_bnb_c.root") == [os.path.join(first, "sub", "run1_bnb_c.root")]
+
+
+def test_resolve_absolute_filepath(two_folders, tmp_path):
+    first, second = two_folders
+    dataset = make_dataset(two_folders, tmp_path)
+    # absolute paths are not looked up in the folders
+    missing = os.path.join(str(tmp_path), "elsewhere.root")
+    assert dataset.resolve_filepath(missing) == [missing]
+    assert dataset.resolve_filepath(os.path.join(second, "run*_a.root")) == [os.path.join(second, "run1_bnb_a.root"),
+                                                                            os.path.join(second, "run3_bnb_a.root")]
+
+
+@pytest.mark.parametrize("fpath", ["run2_*.root", "run2_bnb_a.root", "sub/run1_bnb_a.root"])
+def test_resolve_filepath_not_found(two_folders, tmp_path, fpath):
+    dataset = make_dataset(two_folders, tmp_path)
+    with pytest.raises(ValueError, match="Could not find file"):
+        dataset.resolve_filepath(fpath)
+
+
+def test_resolve_absolute_pattern_not_found(tmp_path):
+    dataset = make_dataset([], tmp_path)
+    with pytest.raises(ValueError, match="Could not find file"):
+        dataset.resolve_filepath(os.path.join(str(tmp_path), "*.root"))
@@ -0,0 +1,202 @@
+"""
+Tests of BufferedTreeWriter: the analysis_tree written through the buffer must be the same as
+the tree filled directly with TTree::Fill, also when a branch cannot be buffered (the writer
+then fills the tree directly) and when entries are added to a tree read back from a file.
+"""
+
+from array import array
+
+import numpy as np
+import pytest
+
+ROOT = pytest.importorskip("ROOT")
+
+from lantern_ana.io.output_writer import BufferedTreeWriter, fixed_leaf_layout, parse_compression
+
+NEVENTS = 11
+
+
+class Buffers:
+    """Branch buffers as producers bind them in prepareStorage, and how to set them for event i."""
+
+    def __init__(self, variable_length: bool = False):
+        self.x = array('f', [0.0])
+        self.n = array('i', [0])
+        self.triple = array('i', [0, 0, 0])
+        self.energy = np.zeros(1, dtype=np.float64)
+        self.variable_length = variable_length
+        self.values = array('f', [0.0]*4)
+
+    def create_branches(self, output):
+        output.Branch("x", self.x, "x/F")
+        output.Branch("n", self.n, "n/I")
+        output.Branch("triple", self.triple, "triple[3]/I")
+        output.Branch("energy", self.energy, "energy/D")
+        if self.variable_length:
+            output.Branch("values", self.values, "values[n]/F")
+
+    def set_event(self, i):
+        self.x[0] = 0.5*i
+        self.n[0] = i % 4
+        for j in range(3):
+            self.triple[j] = 10*i+j
+        self.energy[0] = 1000.0 + i
+        for j in range(4):
+            self.values[j] = i + 0.25*j
+
+
+def read_tree(tree):
+    """The values of every entry, by branch name."""
+    names = [branch.GetName() for branch in tree.GetListOfBranches()]
+    entries = []
+    for ientry in range(tree.GetEntries()):
+        tree.GetEntry(ientry)
+        values = {}
+        for name in names:
+            leaf = tree.GetLeaf(name)
+            values[name] = [leaf.GetValue(j) for j in range(leaf.GetLen())]
+        entries.append(values)
+    return entries
+
+
+def write_trees(path, flush_every, variable_length=False, nevents=NEVENTS):
+    """Write the same events to tree 'direct' with TTree::Fill and to 'buffered' with the writer."""
+    rfile = ROOT.TFile(path, "RECREATE")
+    direct_buffers = Buffers(variable_length)
+    direct = ROOT.TTree("direct", "direct")
+    direct_buffers.create_branches(direct)
+
+    buffered_buffers = Buffers(variable_length)
+    writer = BufferedTreeWriter(ROOT.TTree("buffered", "buffered"), flush_every=flush_every)
+    buffered_buffers.create_branches(writer)
+
+    for i in range(nevents):
+        direct_buffers.set_event(i)
+        direct.Fill()
+        buffered_buffers.set_event(i)
+        writer.fill()
+    writer.close()
+    rfile.Write()
+    rfile.Close()
+    return writer
+
+
+def read_trees(path):
+    rfile = ROOT.TFile(path)
+    direct = read_tree(rfile.Get("direct"))
+    buffered = read_tree(rfile.Get("buffered"))
+    rfile.Close()
+    return direct, buffered
+
+
+@pytest.mark.parametrize("flush_every", [1, 4, NEVENTS, 100])
+def test_buffered_matches_direct_fill(tmp_path, flush_every):
+    path = str(tmp_path / "out.root")
+    writer = write_trees(path, flush_every)
+    assert writer.is_buffered
+    assert writer.num_filled == NEVENTS
+    direct, buffered = read_trees(path)
+    assert len(direct) == NEVENTS
+    assert buffered == direct
+    assert direct[3] == {'x': [1.5], 'n': [3.0], 'triple': [30.0, 31.0, 32.0], 'energy': [1003.0]}
+
+
+def test_unbuffered_branch_falls_back_to_direct_fill(tmp_path):
+    path = str(tmp_path / "out.root")
+    writer = write_trees(path, flush_every=4, variable_length=True)
+    assert not writer.is_buffered
+    assert writer.unbuffered_branches == ["values"]
+    direct, buffered = read_trees(path)
+    assert buffered == direct
+    assert direct[2]['values'] == [2.0, 2.25]
+
+
+def test_flush_every_zero_fills_directly(tmp_path):
+    path = str(tmp_path / "out.root")
+    writer = write_trees(path, flush_every=0)
+    assert not writer.is_buffered
+    direct, buffered = read_trees(path)
+    assert buffered == direct
+
+
+def test_columns_are_the_unwritten_events():
+    buffers = Buffers()
+    writer = BufferedTreeWriter(ROOT.TTree("t", "t"), flush_every=4)
+    buffers.create_branches(writer)
+    for i in range(6):
+        buffers.set_event(i)
+        writer.fill()
+    # 4 events were written, 2 are in the buffer
+    assert writer.tree.GetEntries() == 4
+    columns = writer.columns()
+    np.testing.assert_array_equal(columns['x'], [2.0, 2.5])
+    np.testing.assert_array_equal(columns['triple'], [[40, 41, 42], [50, 51, 52]])
+    writer.close()
+    assert writer.tree.GetEntries() == 6
+
+
+def test_branch_after_first_fill_raises():
+    buffers = Buffers()
+    writer = BufferedTreeWriter(ROOT.TTree("t", "t"), flush_every=4)
+    buffers.create_branches(writer)
+    writer.fill()
+    late = array('f', [0.0])
+    with pytest.raises(RuntimeError, match="late"):
+        writer.Branch("late", late, "late/F")
+    # the tree was not given the branch
+    assert not writer.tree.GetBranch("late")
+
+
+def test_resume_adds_entries_to_existing_tree(tmp_path):
+    path = str(tmp_path / "out.root")
+    write_trees(path, flush_every=4, nevents=5)
+
+    # reopen the file and add entries to the buffered tree, binding the buffers to its branches
+    rfile = ROOT.TFile(path, "UPDATE")
+    tree = rfile.Get("buffered")
+    buffers = Buffers()
+    writer = BufferedTreeWriter(tree, flush_every=4, resume=True)
+    buffers.create_branches(writer)
+    assert writer.is_buffered
+    for i in range(5, NEVENTS):
+        buffers.set_event(i)
+        writer.fill()
+    writer.close()
+    tree.Write("", ROOT.TObject.kOverwrite)
+    rfile.Close()
+
+    rfile = ROOT.TFile(path)
+    resumed = read_tree(rfile.Get("buffered"))
+    rfile.Close()
+
+    path_all = str(tmp_path / "all.root")
+    write_trees(path_all, flush_every=4)
+    direct, _ = read_trees(path_all)
+    assert resumed == direct
+
+
+@pytest.mark.parametrize("leaflist, expected", [
+    ("x/F", (np.dtype(np.float32), 1)),
+    ("x[3]/I", (np.dtype(np.int32), 3)),
+    ("x/D", (np.dtype(np.float64), 1)),
+    ("x[n]/F", None),
+    ("x/C", None),
+    ("a/F:b/F", None),
+    (None, None),
+])
+def test_fixed_leaf_layout(leaflist, expected):
+    assert fixed_leaf_layout(leaflist) == expected
+
+
+@pytest.mark.parametrize("setting, expected", [
+    (None, None), (101, 101), ("404", 404), ("none", 0),
+    ("zstd", 505), ("zstd-3", 503), ("lzma", 207), ("ZLIB-9", 109),
+])
+def test_parse_compression(setting, expected):
+    assert parse_compression(setting) == expected
+
+
+@pytest.mark.parametrize("setting", ["gzip", "zstd-0", "zstd-10"])
+def test_parse_compression_invalid(setting):
+    with pytest.raises(ValueError):
+        parse_compression(setting)
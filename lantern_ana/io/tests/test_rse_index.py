@@ -0,0 +1,144 @@
+"""
+Tests of pack_rse and RSEIndex (no ROOT needed: the index is built from arrays).
+"""
+
+import numpy as np
+import pytest
+
+from lantern_ana.io.rse_index import RSEIndex, pack_rse, _RUN_BITS, _SUBRUN_BITS, _EVENT_BITS
+
+
+def unpack_rse(keys):
+    keys = np.asarray(keys, dtype=np.int64)
+    event = keys & ((1 << _EVENT_BITS)-1)
+    subrun = (keys >> _EVENT_BITS) & ((1 << _SUBRUN_BITS)-1)
+    run = keys >> (_SUBRUN_BITS+_EVENT_BITS)
+    return run, subrun, event
+
+
+def random_rse(rng, n):
+    return (rng.integers(0, 1 << _RUN_BITS, n),
+            rng.integers(0, 1 << _SUBRUN_BITS, n),
+            rng.integers(0, 1 << _EVENT_BITS, n))
+
+
+def test_pack_round_trip():
+    rng = np.random.default_rng(1)
+    run, subrun, event = random_rse(rng, 1000)
+    unpacked = unpack_rse(pack_rse(run, subrun, event))
+    for values, expected in zip(unpacked, (run, subrun, event)):
+        np.testing.assert_array_equal(values, expected)
+
+
+def test_pack_limits():
+    largest = pack_rse((1 << _RUN_BITS)-1, (1 << _SUBRUN_BITS)-1, (1 << _EVENT_BITS)-1)
+    assert largest > 0
+    assert int(largest) < 2**63
+    assert pack_rse(0, 0, 0) == 0
+
+
+def test_pack_sorts_in_rse_order():
+    rng = np.random.default_rng(2)
+    # few distinct runs and subruns, so ties on run and subrun are common
+    run = rng.integers(0, 3, 500)
+    subrun = rng.integers(0, 4, 500)
+    event = rng.integers(0, 1 << _EVENT_BITS, 500)
+    order_keys = np.argsort(pack_rse(run, subrun, event), kind='stable')
+    order_lex = np.lexsort((event, subrun, run))
+    np.testing.assert_array_equal(order_keys, order_lex)
+
+
+@pytest.mark.parametrize("run, subrun, event", [
+    (-1, 0, 0),
+    (0, -1, 0),
+    (0, 0, -1),
+    (1 << _RUN_BITS, 0, 0),
+    (0, 1 << _SUBRUN_BITS, 0),
+    (0, 0, 1 << _EVENT_BITS),
+    ([1, 2, 1 << _RUN_BITS], [0, 0, 0], [0, 0, 0]),
+])
+def test_pack_out_of_range_raises(run, subrun, event):
+    with pytest.raises(ValueError):
+        pack_rse(run, subrun, event)
+
+
+def test_pack_empty():
+    assert len(pack_rse([], [], [])) == 0
+
+
+def test_lookup_sorted_tree():
+    run = np.array([1, 1, 1, 2, 2])
+    subrun = np.array([1, 1, 2, 1, 1])
+    event = np.array([5, 9, 1, 3, 4])
+    index = RSEIndex.from_arrays(run, subrun, event)
+    assert index.tree_is_sorted
+    np.testing.assert_array_equal(index.lookup(run, subrun, event), np.arange(5))
+    assert index.lookup_one(2, 1, 3) == 3
+
+
+def test_lookup_unsorted_tree():
+    rng = np.random.default_rng(3)
+    run, subrun, event = random_rse(rng, 2000)
+    index = RSEIndex.from_arrays(run, subrun, event)
+    assert not index.tree_is_sorted
+    # query in another order
+    order = rng.permutation(len(run))
+    np.testing.assert_array_equal(index.lookup(run[order], subrun[order], event[order]), order)
+
+
+def test_lookup_missing_events():
+    index = RSEIndex.from_arrays([1, 1, 3], [1, 2, 1], [10, 20, 30])
+    entries = index.lookup([0, 1, 1, 2, 3, 4, 1], [0, 1, 1, 1, 1, 0, 2], [0, 10, 11, 10, 30, 0, 20])
+    np.testing.assert_array_equal(entries, [-1, 0, -1, -1, 2, -1, 1])
+    assert entries.dtype == np.int64
+    assert index.lookup_one(5, 5, 5) == -1
+
+
+def test_lookup_empty_index():
+    empty = np.zeros(0, dtype=np.int64)
+    index = RSEIndex.from_arrays(empty, empty, empty)
+    assert len(index) == 0
+    np.testing.assert_array_equal(index.lookup([1, 2], [1, 2], [1, 2]), [-1, -1])
+
+
+def test_lookup_out_of_range_query_raises():
+    index = RSEIndex.from_arrays([1], [1], [1])
+    with pytest.raises(ValueError):
+        index.lookup([-1], [1], [1])
+
+
+def test_duplicates_last_entry_wins():
+    # entries 0, 2 and 4 have the same RSE, and so do 1 and 3
+    run = np.array([1, 2, 1, 2, 1, 3])
+    subrun = np.array([1, 1, 1, 1, 1, 1])
+    event = np.array([7, 8, 7, 8, 7, 9])
+    index = RSEIndex.from_arrays(run, subrun, event)
+    np.testing.assert_array_equal(index.lookup([1, 2, 3], [1, 1, 1], [7, 8, 9]), [4, 3, 5])
+
+
+def test_duplicates_in_sorted_tree_last_entry_wins():
+    index = RSEIndex.from_arrays([1, 1, 1, 2], [1, 1, 1, 1], [5, 5, 6, 1])
+    np.testing.assert_array_equal(index.lookup([1, 1, 2], [1, 1, 1], [5, 6, 1]), [1, 2, 3])
+
+
+@pytest.mark.parametrize("sorted_tree", [True, False])
+def test_save_and_load(tmp_path, sorted_tree):
+    run = np.array([1, 1, 2, 3])
+    subrun = np.array([1, 2, 1, 1])
+    event = np.array([1, 1, 1, 1])
+    if not sorted_tree:
+        run, subrun, event = run[::-1].copy(), subrun[::-1].copy(), event[::-1].copy()
+    index = RSEIndex.from_arrays(run, subrun, event)
+    description = {'source': {'path': '/data/weights.root', 'size': 10, 'mtime_ns': 1}, 'tree': 't'}
+    prefix = str(tmp_path / "index")
+    index.save(prefix, description)
+
+    loaded = RSEIndex.load(prefix, description)
+    assert loaded is not None
+    assert loaded.tree_is_sorted == sorted_tree
+    np.testing.assert_array_equal(loaded.lookup(run, subrun, event), np.arange(4))
+
+    # a different version of the source file does not use the saved index
+    changed = dict(description, source={'path': '/data/weights.root', 'size': 11, 'mtime_ns': 1})
+    assert RSEIndex.load(prefix, changed) is None
+    assert RSEIndex.load(str(tmp_path / "missing"), description) is None
@@ -11,12 +11,13 @@ Enhanced LanternAna class with producer-first architecture support
 
 import os
 import sys
+import copy
 import yaml
 import time
 import logging
 import ROOT
 import numpy as np
-from typing import Dict, List, Any, Optional, Union
+from typing import Dict, List, Any, Optional, Union, Tuple
 from datetime import datetime
 from array import array
 
@@ -26,6 +27,12 @@ from lantern_ana.cuts.cut_factory import CutFactory
 from lantern_ana.producers.producer_factory import ProducerFactory
 from lantern_ana.producers.producerManager import ProducerManager
 from lantern_ana.tags.tag_factory import TagFactory
+from lantern_ana.io.branch_access import BranchAccessRecorder, find_undeclared_branches
+from lantern_ana.io.output_writer import BufferedTreeWriter, parse_compression
+from lantern_ana import sharding
+from lantern_ana.profiler import Profiler
+from lantern_ana.io.checkpoint import checkpoint_file_path, save_checkpoint, load_checkpoint
+from lantern_ana.producers.producer_cache import ProducerOutputCache
 
 class LanternAna:
     """
@@ -37,8 +44,17 @@ class LanternAna:
     - Clean separation of feature calculation and selection logic
     """
     
-    def __init__(self, config_file: str, log_level: str = "INFO"):
-        """Initialize the framework."""
+    def __init__(self, config_file: str, log_level: str = "INFO", profile: bool = False,
+                 resume: bool = False):
+        """
+        Initialize the framework.
+
+        Args:
+            config_file: YAML configuration file
+            log_level: Logging level
+            profile: Record detailed timing of producers and cuts (also 'profile: true' in the configuration)
+            resume: Continue datasets from their last checkpoint (see lantern_ana.io.checkpoint)
+        """
         
         # Load configuration
         self.config_file = config_file
@@ -50,6 +66,7 @@ class LanternAna:
         os.makedirs(self.output_dir, exist_ok=True)
         
         # Set up logging
+        self._log_level = log_level
         self._setup_logging(log_level)
         self.logger = logging.getLogger("LanternAna")
 
@@ -58,6 +75,36 @@ class LanternAna:
         # Configuration options
         self._filter_events = self.config.get('filter_events', False)
         self._producer_first = self.config.get('producer_first_mode', True)  # New option
+        self._execution_mode = self.config.get('execution_mode', 'event')  # 'event' or 'columnar'
+        self._columnar_chunk_size = self.config.get('columnar_chunk_size', 50000)
+        # If True, cuts whose result cannot change the selection outcome are skipped.
+        # Faster, but the cut statistics then only count the cuts that were run.
+        self._lazy_cuts = self.config.get('lazy_cuts', False)
+        # If True (with filter_events), only the producers the cuts read run before the cuts,
+        # and the other producers only run for events that pass.
+        self._lazy_producers = self.config.get('lazy_producers', False)
+        self._selection_producers = None
+        self._deferred_producers = None
+        # If True, only the ntuple branches declared by the producers, cuts and tags
+        # (plus extra_branches) are read from the input files.
+        self._prune_branches = self.config.get('prune_branches', False)
+        self._extra_branches = self.config.get('extra_branches', [])
+        # If True, record the ntuple branches read during the event loop and report
+        # the ones that were not declared. Slow: use it to check a configuration.
+        self._record_branch_access = self.config.get('record_branch_access', False)
+        self._branch_recorder = None
+        # Output file settings: compression, and how many events are buffered before
+        # they are written to the analysis_tree (see lantern_ana.io.output_writer)
+        output_config = self.config.get('output', {}) or {}
+        self._output_compression = parse_compression(output_config.get('compression', None))
+        self._output_flush_every = output_config.get('flush_every', 10000)
+        self._output_basket_size = output_config.get('basket_size', None)
+        # Write a checkpoint every N events (0: never), so a stopped job can be resumed
+        # with --resume (see lantern_ana.io.checkpoint)
+        self._checkpoint_every = self.config.get('checkpoint_every', 0)
+        self._resume = resume
+        if self._execution_mode not in ['event', 'columnar']:
+            raise ValueError(f"Unknown execution_mode '{self._execution_mode}'. Options: event, columnar")
         
         # Initialize components
         self._discover_components()
@@ -69,6 +116,22 @@ class LanternAna:
         
         # Configure components from YAML
         self._configure_components()
+
+        # Profiling (see lantern_ana.profiler)
+        self._profile = profile or self.config.get('profile', False)
+        self.profiler = Profiler() if self._profile else None
+        self.producer_manager.profiler = self.profiler
+        self.cut_factory.profiler = self.profiler
+
+        # Cache of producer outputs on disk (see lantern_ana.producers.producer_cache)
+        cache_config = self.config.get('producer_cache', None)
+        if cache_config is not None and cache_config.get('enabled', True):
+            self.producer_manager.output_cache = ProducerOutputCache(
+                cache_dir=cache_config.get('cache_dir', None),
+                max_size_gb=cache_config.get('max_size_gb', None),
+                chunk_size=cache_config.get('chunk_size', 10000),
+                producers=cache_config.get('producers', None),
+                logger=self.logger)
         
         # Initialize dataset
         self.datasets = {}
@@ -138,6 +201,39 @@ class LanternAna:
         for tag_name, tag_params in self.config.get('tags', {}).items():
             self.logger.debug(f"Adding tag: {tag_name}")
             self.tag_factory.add_tag(tag_name, tag_params)
+
+        if self._lazy_producers:
+            self._setup_lazy_producers()
+
+    def _setup_lazy_producers(self):
+        """
+        Split the producers into the ones the cuts need or that are stateful (run on every
+        event) and the rest (run only for events passing the cuts). Needs filter_events,
+        and every cut to declare the producers it reads. Otherwise all producers run on
+        every event.
+        """
+        if not self._filter_events:
+            self.logger.info("lazy_producers: filter_events is off, every event is saved. Running all producers.")
+            return
+        if not self._producer_first:
+            self.logger.info("lazy_producers: producer_first_mode is off. Running all producers.")
+            return
+        requirements = self.cut_factory.get_producer_requirements()
+        if requirements is None:
+            self.logger.warning("lazy_producers: not every cut declares the producers it reads. "
+                                "Running all producers before the cuts.")
+            return
+        self.producer_manager.set_cut_requirements(requirements)
+        self._selection_producers = self.producer_manager.get_selection_producers()
+        self._deferred_producers = [name for name in self.producer_manager.execution_order
+                                    if name not in self._selection_producers]
+        stateful = [name for name, producer in self.producer_manager.producers.items()
+                    if not producer.supportsCaching()]
+        if stateful:
+            self.logger.info(f"lazy_producers: producers run on every event as they do more than "
+                             f"return their outputs (supportsCaching is False): {stateful}")
+        self.logger.info(f"lazy_producers: producers run before the cuts: {self._selection_producers}")
+        self.logger.info(f"lazy_producers: producers run for passing events: {self._deferred_producers}")
     
     def load_datasets(self):
         """Load datasets from configuration."""
@@ -152,8 +248,15 @@ class LanternAna:
             if dataset.ismc:
                 self.logger.info(f"  MC dataset with {dataset.pot} POT")
     
-    def run(self, dataset_names: Optional[List[str]] = None):
-        """Run the analysis on specified datasets."""
+    def run(self, dataset_names: Optional[List[str]] = None, workers: int = 1):
+        """
+        Run the analysis on specified datasets.
+
+        Args:
+            dataset_names: Names of the datasets to process (default: all)
+            workers: Number of worker processes. With more than one, each dataset's entries
+                     are split into shards processed in parallel and merged afterwards.
+        """
         self.logger.info("Starting enhanced analysis run...")
         
         # Load datasets if not already loaded
@@ -169,10 +272,26 @@ class LanternAna:
                 missing = set(dataset_names) - set(datasets_to_process.keys())
                 self.logger.warning(f"Some requested datasets were not found: {missing}")
         
+        use_checkpoints = self._checkpoint_every > 0 or self._resume
+        if use_checkpoints and workers > 1:
+            self.logger.warning("Checkpoints are not written when running with several workers")
+            use_checkpoints = False
+
         # Process each dataset
         for dataset_name, dataset in datasets_to_process.items():
             if dataset.do_we_process():
-                self._process_dataset_enhanced(dataset_name, dataset)
+                checkpoint_path = checkpoint_file_path(self.output_dir, dataset_name) if use_checkpoints else None
+                resume_state = self._load_resume_state(checkpoint_path)
+                if resume_state is not None and resume_state['finished']:
+                    self.logger.info(f"Dataset {dataset_name} was already finished: {resume_state['output_file_path']}")
+                    self.stats[dataset_name] = resume_state['stats']
+                    continue
+                if workers > 1:
+                    self._process_dataset_sharded(dataset_name, dataset, workers)
+                elif self._execution_mode == 'columnar':
+                    self._process_dataset_columnar(dataset_name, dataset, checkpoint_path=checkpoint_path)
+                else:
+                    self._process_dataset_enhanced(dataset_name, dataset, checkpoint_path=checkpoint_path)
         
         # Print statistics
         self._print_statistics()
@@ -194,18 +313,68 @@ class LanternAna:
             yaml.dump(stats_data, f, indent=2)
         
         self.logger.info(f"Statistics saved to: {filename}")
-    
-    def _process_dataset_enhanced(self, dataset_name: str, dataset):
+
+    def save_profile(self, filename: str):
         """
-        Process a single dataset with producer-first architecture.
+        Save the profiling report (json) and, next to it, a collapsed-stack file
+        for flame graphs ({filename without .json}.collapsed). Needs profiling on.
         """
-        self.logger.info(f"Processing dataset with enhanced architecture: {dataset_name}")
-        
-        # Create output file and tree
+        if self.profiler is None:
+            raise ValueError("Profiling is off. Run with --profile or set 'profile: true' in the configuration.")
+        collapsed_file = os.path.splitext(filename)[0] + ".collapsed"
+        self.profiler.write(filename, collapsed_file)
+        self.logger.info(f"Profile written to {filename} and {collapsed_file}")
+    
+    def _default_output_path(self, dataset_name: str) -> str:
+        """Path of the output file for a dataset: {output_dir}/{dataset_name}_{timestamp}.root"""
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output_file_path = os.path.join(self.output_dir, f"{dataset_name}_{timestamp}.root")
-        output_file = ROOT.TFile(output_file_path, "RECREATE")
-        output_tree = ROOT.TTree("analysis_tree", "Processed Events")
+        return os.path.join(self.output_dir, f"{dataset_name}_{timestamp}.root")
+
+    def _open_output(self, dataset_name: str, dataset, output_file_path: Optional[str] = None,
+                     fill_livetime: bool = True, resume_state: Optional[Dict[str, Any]] = None,
+                     checkpoints: bool = False):
+        """
+        Create the output file with the analysis_tree and the livetime_tree for a dataset.
+
+        Args:
+            dataset_name: Name of the dataset
+            dataset: The dataset object
+            output_file_path: Path of the output file (default: timestamped file in output_dir)
+            fill_livetime: Store the POT/nspills entry in the livetime_tree. Only one shard of
+                           a dataset processed in parallel does this, so the merged file has one entry.
+            resume_state: Checkpoint to resume from. The output file of the checkpoint is opened
+                          and new entries are added to its analysis_tree.
+            checkpoints: Checkpoints are written. The tree header is then only saved by the
+                         checkpoints, so the file always matches the last checkpoint.
+
+        Returns:
+            Tuple of (output_file, output_file_path, output_writer, pot_tree).
+            output_writer is a BufferedTreeWriter holding the analysis_tree.
+        """
+        if resume_state is not None:
+            output_file_path = resume_state['output_file_path']
+            output_file = ROOT.TFile(output_file_path, "UPDATE")
+            output_tree = output_file.Get("analysis_tree")
+            if not output_tree:
+                raise ValueError(f"Cannot resume dataset {dataset_name}: no analysis_tree in {output_file_path}")
+            if output_tree.GetEntries() != resume_state['output_entries']:
+                raise ValueError(f"Cannot resume dataset {dataset_name}: {output_file_path} has "
+                                 f"{output_tree.GetEntries()} entries, the checkpoint expects "
+                                 f"{resume_state['output_entries']}. Remove the checkpoint and rerun the dataset.")
+        else:
+            if output_file_path is None:
+                output_file_path = self._default_output_path(dataset_name)
+            output_file = ROOT.TFile(output_file_path, "RECREATE")
+            output_tree = ROOT.TTree("analysis_tree", "Processed Events")
+        if self._output_compression is not None:
+            output_file.SetCompressionSettings(self._output_compression)
+        if checkpoints:
+            # no automatic AutoSave (every 300 MB by default): after a crash, the file
+            # could hold more entries than the last checkpoint, which could then not be resumed
+            output_tree.SetAutoSave(0)
+        output_writer = BufferedTreeWriter(output_tree, flush_every=self._output_flush_every,
+                                           basket_size=self._output_basket_size,
+                                           resume=resume_state is not None)
         
         # Create POT tree for MC datasets
         pot_tree = ROOT.TTree("livetime_tree", "POT and nspills Information")
@@ -220,20 +389,28 @@ class LanternAna:
         ismc[0] = 1 if dataset.ismc else 0
         pot[0] = dataset.pot
         nspills[0] = dataset.nspills
-        pot_tree.Fill()
+        if fill_livetime:
+            pot_tree.Fill()
         
         # Prepare storage for producers
-        self.producer_manager.prepare_storage(output_tree)
-        
-        # Get number of entries to process
+        self.producer_manager.prepare_storage(output_writer)
+        if self._output_flush_every > 0 and not output_writer.is_buffered:
+            self.logger.info(f"Output events are not buffered, because of branches: {output_writer.unbuffered_branches}")
+
+        return output_file, output_file_path, output_writer, pot_tree
+
+    def _get_max_events(self, dataset) -> int:
+        """Number of entries to process, taking the max_events option into account."""
         nentries = dataset.get_num_entries()
         max_events = self.config.get('max_events', nentries)
         if max_events <= 0:
             max_events = nentries
         else:
             max_events = min(max_events, nentries)
-        
-        # Initialize statistics
+        return max_events
+
+    def _init_dataset_stats(self, dataset_name: str, max_events: int):
+        """Initialize statistics for a dataset."""
         self.stats[dataset_name] = {
             'total': max_events,
             'passed': 0,
@@ -241,27 +418,238 @@ class LanternAna:
             'cut_stats': {},
             'processing_time': 0
         }
+
+    def _log_progress(self, i: int, max_events: int, start_time: float):
+        """Log progress through the event loop with a time-remaining estimate."""
+        progress = (i / max_events) * 100
+        elapsed = time.time() - start_time
+        estimated_total = elapsed / (i / max_events)
+        remaining = estimated_total - elapsed
+        self.logger.info(f"Progress: {progress:.1f}% ({i}/{max_events}), Est. time remaining: {remaining:.1f}s")
+
+    def _update_cut_stats(self, dataset_name: str, cut_results: Dict[str, bool]):
+        """Add the cut results of one event to the statistics."""
+        for cut_name, result in cut_results.items():
+            if cut_name not in self.stats[dataset_name]['cut_stats']:
+                self.stats[dataset_name]['cut_stats'][cut_name] = {'pass': 0, 'fail': 0}
+            
+            if result:
+                self.stats[dataset_name]['cut_stats'][cut_name]['pass'] += 1
+            else:
+                self.stats[dataset_name]['cut_stats'][cut_name]['fail'] += 1
+
+    def _close_output(self, dataset_name: str, output_file, output_file_path: str, output_writer, pot_tree):
+        """Write the output trees, finalize producers and close the output file."""
+        output_writer.close()
+        output_file.cd()
+        pot_tree.Write()
+        # overwrite the tree headers saved by checkpoints
+        output_writer.tree.Write("", ROOT.TObject.kOverwrite)
+        
+        # Finalize histogram producers
+        for producer_name, producer in self.producer_manager.producers.items():
+            if hasattr(producer, 'finalize'):
+                producer.finalize()
+        
+        # Close output file
+        output_file.Close()
+        
+        self.logger.info(f"Dataset {dataset_name} processed in {self.stats[dataset_name]['processing_time']:.1f}s")
+        self.logger.info(f"Results written to {output_file_path}")
+
+    def _load_resume_state(self, checkpoint_path: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The checkpoint to resume a dataset from, if resuming and there is one."""
+        if checkpoint_path is None or not self._resume:
+            return None
+        state = load_checkpoint(checkpoint_path)
+        if state is not None and not state['finished']:
+            self.logger.info(f"Resuming from checkpoint {checkpoint_path} at entry {state['next_entry']}")
+        return state
+
+    def _restore_checkpoint(self, dataset_name: str, resume_state: Dict[str, Any]):
+        """Restore the statistics and producer states of a checkpoint. Call after _open_output."""
+        self.stats[dataset_name] = resume_state['stats']
+        self.cut_factory.restore_checkpoint_state(resume_state['cut_factory'])
+        self.producer_manager.restore_checkpoint_state(resume_state['producer_manager'])
+
+    def _write_checkpoint(self, checkpoint_path: str, dataset_name: str, output_file_path: str,
+                          entry_range: Tuple[int, int], next_entry: int, output_writer, processing_time: float):
+        """
+        Write the buffered output events to the file and save the state of the event loop,
+        with entries up to next_entry done.
+        """
+        output_writer.checkpoint()
+        self.stats[dataset_name]['processing_time'] = processing_time
+        save_checkpoint(checkpoint_path, {
+            'finished': False,
+            'dataset_name': dataset_name,
+            'output_file_path': output_file_path,
+            'entry_range': list(entry_range),
+            'next_entry': next_entry,
+            'output_entries': output_writer.tree.GetEntries(),
+            'stats': copy.deepcopy(self.stats[dataset_name]),
+            'cut_factory': self.cut_factory.get_checkpoint_state(),
+            'producer_manager': self.producer_manager.get_checkpoint_state()
+        })
+        self.logger.info(f"Checkpoint written at entry {next_entry} of dataset {dataset_name}")
+
+    def _finish_checkpoint(self, checkpoint_path: str, dataset_name: str, output_file_path: str):
+        """
+        Replace the checkpoint of a finished dataset by the finished marker (output file and
+        final statistics), so --resume does not process it again.
+        """
+        save_checkpoint(checkpoint_path, {
+            'finished': True,
+            'dataset_name': dataset_name,
+            'output_file_path': output_file_path,
+            'stats': copy.deepcopy(self.stats[dataset_name])
+        })
+
+    def _get_required_branches(self) -> Optional[List[str]]:
+        """
+        Union of the ntuple branches declared by the producers, cuts and tags, plus extra_branches.
+        Returns None if some of them do not declare the branches they read.
+        """
+        declared = [self.producer_manager.get_required_branches(),
+                    self.cut_factory.get_required_branches(),
+                    self.tag_factory.get_required_branches(),
+                    self.cut_factory.get_batch_branches()]
+        if any(component_branches is None for component_branches in declared):
+            return None
+        branches = list(self._extra_branches)
+        for component_branches in declared:
+            for branch in component_branches:
+                if branch not in branches:
+                    branches.append(branch)
+        return branches
+
+    def _setup_branch_reading(self, dataset_name: str, dataset):
+        """
+        Before the event loop: enable only the needed branches (prune_branches option)
+        and start recording the branches read (record_branch_access option).
+        """
+        self._branch_recorder = None
+        if not self._prune_branches:
+            return
+
+        branches = self._get_required_branches()
+        if branches is None:
+            self.logger.warning("prune_branches: not every producer, cut and tag declares the branches it reads. "
+                                "Reading all branches.")
+            dataset.set_active_branches(None)
+            return
+
+        missing = dataset.set_active_branches(branches)
+        self.logger.info(f"prune_branches: reading {len(branches)-len(missing)} branches for dataset {dataset_name}")
+        if missing:
+            self.logger.info(f"prune_branches: branches not found in dataset {dataset_name}: {missing}")
+
+    def _record_ntuple(self, ntuple):
+        """With record_branch_access or profiling, wrap the ntuple to record the branches read through it."""
+        if not self._record_branch_access and self.profiler is None:
+            return ntuple
+        if self._branch_recorder is None or self._branch_recorder.tree is not ntuple:
+            self._branch_recorder = BranchAccessRecorder(ntuple)
+        return self._branch_recorder
+
+    def _start_producer_cache(self, dataset_name: str, dataset):
+        """Before the event loop: compute the producer output cache keys for this dataset."""
+        output_cache = self.producer_manager.output_cache
+        if output_cache is None:
+            return
+        output_cache.start_dataset(self.producer_manager, dataset_name, dataset.get_input_files(),
+                                   dataset.get_num_entries(), dataset.ismc)
+
+    def _report_branch_access(self, dataset_name: str):
+        """After the event loop: report the branches that were read but not declared."""
+        if self._branch_recorder is None:
+            return
+        accessed = sorted(self._branch_recorder.accessed)
+        if self.profiler is not None:
+            self.profiler.add_branch_reads(self._branch_recorder.counts)
+        self._branch_recorder = None
+        if not self._record_branch_access:
+            return
+        self.stats[dataset_name]['branches_read'] = accessed
+        self.logger.info(f"record_branch_access: {len(accessed)} branches read in dataset {dataset_name}: {accessed}")
+
+        declared = self._get_required_branches()
+        if declared is None:
+            return
+        undeclared = find_undeclared_branches(accessed, declared)
+        self.stats[dataset_name]['undeclared_branches'] = undeclared
+        if undeclared:
+            self.logger.warning(f"record_branch_access: branches read but not declared in dataset {dataset_name}: "
+                                f"{undeclared}. Add them to requiredBranches/register_cut/register_tag "
+                                "or to extra_branches.")
+
+    def _process_dataset_enhanced(self, dataset_name: str, dataset,
+                                  entry_range: Optional[Tuple[int, int]] = None,
+                                  output_file_path: Optional[str] = None,
+                                  fill_livetime: bool = True,
+                                  checkpoint_path: Optional[str] = None):
+        """
+        Process a single dataset with producer-first architecture.
+
+        Args:
+            dataset_name: Name of the dataset
+            dataset: The dataset object
+            entry_range: (start, stop) entries to process. Default: all entries, up to max_events.
+            output_file_path: Path of the output file (default: timestamped file in output_dir)
+            fill_livetime: Store the POT/nspills entry in the livetime_tree
+            checkpoint_path: Sidecar file for checkpoints (checkpoint_every option). When resuming,
+                             processing continues from the checkpoint in this file, if there is one.
+        """
+        self.logger.info(f"Processing dataset with enhanced architecture: {dataset_name}")
+
+        resume_state = self._load_resume_state(checkpoint_path)
+        if resume_state is not None:
+            entry_range = tuple(resume_state['entry_range'])
+        
+        # Create output file and tree
+        output_file, output_file_path, output_writer, pot_tree = self._open_output(
+            dataset_name, dataset, output_file_path=output_file_path, fill_livetime=fill_livetime,
+            resume_state=resume_state, checkpoints=checkpoint_path is not None)
+        
+        # Get range of entries to process
+        if entry_range is None:
+            entry_range = (0, self._get_max_events(dataset))
+        first_entry, last_entry = entry_range
+        max_events = last_entry - first_entry
+        
+        # Initialize statistics
+        self._init_dataset_stats(dataset_name, max_events)
+        start_entry = first_entry
+        if resume_state is not None:
+            self._restore_checkpoint(dataset_name, resume_state)
+            start_entry = resume_state['next_entry']
+        previous_time = self.stats[dataset_name]['processing_time']
+        checkpoint_every = self._checkpoint_every if checkpoint_path is not None else 0
+
+        # Only read the branches we need
+        self._setup_branch_reading(dataset_name, dataset)
+        self._start_producer_cache(dataset_name, dataset)
         
         # Start timer
         start_time = time.time()
         
         # Show progress every N events
-        progress_step = max(1, max_events // 20)
+        progress_step = max(1, (last_entry - start_entry) // 20)
         
+        profiler = self.profiler
+
         # Event loop with enhanced processing
-        self.logger.info(f"Processing {max_events} events with producer-first architecture...")
-        for i in range(max_events):
-            if i > 0 and i % progress_step == 0:
-                progress = (i / max_events) * 100
-                elapsed = time.time() - start_time
-                estimated_total = elapsed / (i / max_events)
-                remaining = estimated_total - elapsed
-                self.logger.info(f"Progress: {progress:.1f}% ({i}/{max_events}), Est. time remaining: {remaining:.1f}s")
+        self.logger.info(f"Processing {last_entry - start_entry} events with producer-first architecture...")
+        for i in range(start_entry, last_entry):
+            if i > start_entry and (i-start_entry) % progress_step == 0:
+                self._log_progress(i-start_entry, last_entry-start_entry, start_time)
+            if profiler is not None:
+                profiler.start_event()
             
             # Get current entry from dataset
             dataset.set_entry(i)
             data = dataset.get_data()
-            ntuple = data['tree']
+            ntuple = self._record_ntuple(data['tree'])
             
             # ENHANCED PROCESSING: Producer-first architecture
             if self._producer_first:
@@ -271,19 +659,12 @@ class LanternAna:
             else:
                 # Fallback to original architecture
                 passes, cut_results, cut_data = self.cut_factory.apply_cuts(
-                    ntuple, dataset.name, return_on_fail=False, ismc=dataset.ismc
+                    ntuple, dataset.name, return_on_fail=self._lazy_cuts, ismc=dataset.ismc
                 )
                 producer_results = {}
             
             # Update cut statistics
-            for cut_name, result in cut_results.items():
-                if cut_name not in self.stats[dataset_name]['cut_stats']:
-                    self.stats[dataset_name]['cut_stats'][cut_name] = {'pass': 0, 'fail': 0}
-                
-                if result:
-                    self.stats[dataset_name]['cut_stats'][cut_name]['pass'] += 1
-                else:
-                    self.stats[dataset_name]['cut_stats'][cut_name]['fail'] += 1
+            self._update_cut_stats(dataset_name, cut_results)
             
             # Process event if it passes cuts (or if not filtering)
             if passes or not self._filter_events:
@@ -293,30 +674,226 @@ class LanternAna:
                     self.stats[dataset_name]['failed'] += 1
                 
                 # Fill output tree (producer data already filled by producer manager)
-                output_tree.Fill()
+                output_writer.fill()
             else:
                 self.stats[dataset_name]['failed'] += 1
+
+            if profiler is not None:
+                profiler.end_event(f"{dataset_name}:{i}")
+
+            if checkpoint_every > 0 and (i+1-first_entry) % checkpoint_every == 0 and i+1 < last_entry:
+                self._write_checkpoint(checkpoint_path, dataset_name, output_file_path, entry_range, i+1,
+                                       output_writer, previous_time + time.time() - start_time)
         
         # End timer
         end_time = time.time()
-        self.stats[dataset_name]['processing_time'] = end_time - start_time
-        
-        # Write output trees
-        output_file.cd()
-        pot_tree.Write()
-        output_tree.Write()
-        
-        # Finalize histogram producers
-        for producer_name, producer in self.producer_manager.producers.items():
-            if hasattr(producer, 'finalize'):
-                producer.finalize()
-        
-        # Close output file
-        output_file.Close()
-        
+        self.stats[dataset_name]['processing_time'] = previous_time + end_time - start_time
+        self._report_branch_access(dataset_name)
+        if self.producer_manager.output_cache is not None:
+            self.producer_manager.output_cache.finish_dataset()
+        
+        # Write output trees, finalize producers, close file
+        self._close_output(dataset_name, output_file, output_file_path, output_writer, pot_tree)
+        if checkpoint_path is not None:
+            self._finish_checkpoint(checkpoint_path, dataset_name, output_file_path)
+
+    def _process_dataset_columnar(self, dataset_name: str, dataset,
+                                  entry_range: Optional[Tuple[int, int]] = None,
+                                  output_file_path: Optional[str] = None,
+                                  fill_livetime: bool = True,
+                                  checkpoint_path: Optional[str] = None):
+        """
+        Process a single dataset in the columnar execution mode.
+
+        Branches are read in chunks of entries into NumPy arrays. Producers that implement
+        processBatch (and cuts with a registered batch version) run once per chunk.
+        Producers that have not been ported run per event, as in _process_dataset_enhanced,
+        and so do the cuts unless every configured cut has a batch version.
+
+        Takes the same arguments as _process_dataset_enhanced. Checkpoints are written
+        at the end of the first chunk after every checkpoint_every events.
+        """
+        self.logger.info(f"Processing dataset in columnar mode: {dataset_name}")
+
+        resume_state = self._load_resume_state(checkpoint_path)
+        if resume_state is not None:
+            entry_range = tuple(resume_state['entry_range'])
+        output_file, output_file_path, output_writer, pot_tree = self._open_output(
+            dataset_name, dataset, output_file_path=output_file_path, fill_livetime=fill_livetime,
+            resume_state=resume_state, checkpoints=checkpoint_path is not None)
+        if entry_range is None:
+            entry_range = (0, self._get_max_events(dataset))
+        first_entry, last_entry = entry_range
+        self._init_dataset_stats(dataset_name, last_entry - first_entry)
+        start_entry = first_entry
+        if resume_state is not None:
+            self._restore_checkpoint(dataset_name, resume_state)
+            start_entry = resume_state['next_entry']
+        previous_time = self.stats[dataset_name]['processing_time']
+        checkpoint_every = self._checkpoint_every if checkpoint_path is not None else 0
+        next_checkpoint = start_entry + checkpoint_every
+        max_events = last_entry - start_entry
+        self._setup_branch_reading(dataset_name, dataset)
+        self._start_producer_cache(dataset_name, dataset)
+
+        batch_producers = self.producer_manager.get_batch_producers()
+        cuts_in_batch = self.cut_factory.supports_batch()
+        use_tags = hasattr(self, 'tag_factory') and len(self.tag_factory.tags) > 0
+
+        # do we need to load each entry of the ROOT tree?
+        need_entry = (len(batch_producers) < len(self.producer_manager.execution_order)
+                      or not cuts_in_batch or use_tags)
+
+        branches = self.producer_manager.get_batch_branches()
+        if cuts_in_batch:
+            for branch in self.cut_factory.get_batch_branches():
+                if branch not in branches:
+                    branches.append(branch)
+
+        self.logger.info(f"Batch producers: {batch_producers}")
+        self.logger.info(f"Per-event producers: {[name for name in self.producer_manager.execution_order if name not in batch_producers]}")
+        self.logger.info(f"Cuts run in batch mode: {cuts_in_batch}")
+
+        start_time = time.time()
+        batch_params = {'ismc': dataset.ismc, 'dataset_name': dataset.name}
+        nprocessed = 0
+        next_progress = max(1, max_events // 20)
+        profiler = self.profiler
+
+        for batch in dataset.iterate_batches(branches, chunk_size=self._columnar_chunk_size,
+                                             start=start_entry, stop=last_entry):
+
+            batch_outputs = self.producer_manager.process_batch(batch, batch_params)
+
+            if cuts_in_batch:
+                batch_passes, batch_cut_results = self.cut_factory.apply_cuts_batch(
+                    batch, dataset.name, ismc=dataset.ismc, producer_outputs=batch_outputs
+                )
+                for cut_name, result in batch_cut_results.items():
+                    npass = int(result.sum())
+                    cut_stats = self.stats[dataset_name]['cut_stats'].setdefault(cut_name, {'pass': 0, 'fail': 0})
+                    cut_stats['pass'] += npass
+                    cut_stats['fail'] += batch.size - npass
+
+            for ibatch in range(batch.size):
+                ientry = batch.start + ibatch
+                if profiler is not None:
+                    profiler.start_event()
+
+                event_data = {}
+                if need_entry:
+                    dataset.set_entry(ientry)
+                    ntuple = self._record_ntuple(dataset.get_data()['tree'])
+                    event_data["gen2ntuple"] = ntuple
+                    if use_tags:
+                        event_data['event_tags'] = self.tag_factory.apply_tags(ntuple)
+
+                producer_results = self.producer_manager.process_batch_entry(
+                    event_data,
+                    {"event_index": ientry, 'ismc': dataset.ismc, 'dataset_name': dataset.name},
+                    batch_outputs, ibatch
+                )
+
+                if cuts_in_batch:
+                    passes = bool(batch_passes[ibatch])
+                else:
+                    passes, cut_results, cut_data = self.cut_factory.apply_cuts(
+                        event_data["gen2ntuple"], dataset.name, return_on_fail=self._lazy_cuts,
+                        ismc=dataset.ismc, producer_outputs=producer_results
+                    )
+                    self._update_cut_stats(dataset_name, cut_results)
+
+                if passes:
+                    self.stats[dataset_name]['passed'] += 1
+                else:
+                    self.stats[dataset_name]['failed'] += 1
+
+                if passes or not self._filter_events:
+                    output_writer.fill()
+
+                if profiler is not None:
+                    profiler.end_event(f"{dataset_name}:{ientry}")
+
+            nprocessed += batch.size
+            if nprocessed >= next_progress and nprocessed < max_events:
+                self._log_progress(nprocessed, max_events, start_time)
+                next_progress += max(1, max_events // 20)
+
+            batch_end = batch.start + batch.size
+            if checkpoint_every > 0 and batch_end >= next_checkpoint and batch_end < last_entry:
+                self._write_checkpoint(checkpoint_path, dataset_name, output_file_path, entry_range, batch_end,
+                                       output_writer, previous_time + time.time() - start_time)
+                next_checkpoint = batch_end + checkpoint_every
+
+        self.stats[dataset_name]['processing_time'] = previous_time + time.time() - start_time
+        self._report_branch_access(dataset_name)
+        if self.producer_manager.output_cache is not None:
+            self.producer_manager.output_cache.finish_dataset()
+
+        self._close_output(dataset_name, output_file, output_file_path, output_writer, pot_tree)
+        if checkpoint_path is not None:
+            self._finish_checkpoint(checkpoint_path, dataset_name, output_file_path)
+    
+    def _process_dataset_shard(self, dataset_name: str, dataset, entry_range: Tuple[int, int],
+                               output_file_path: str, fill_livetime: bool):
+        """Process one shard of a dataset, in the configured execution mode."""
+        if self._execution_mode == 'columnar':
+            self._process_dataset_columnar(dataset_name, dataset, entry_range=entry_range,
+                                           output_file_path=output_file_path, fill_livetime=fill_livetime)
+        else:
+            self._process_dataset_enhanced(dataset_name, dataset, entry_range=entry_range,
+                                           output_file_path=output_file_path, fill_livetime=fill_livetime)
+
+    def _process_dataset_sharded(self, dataset_name: str, dataset, workers: int):
+        """
+        Process a dataset with several worker processes.
+
+        The entry range is split into contiguous shards. Each worker builds its own LanternAna
+        from the configuration file and writes its shard to a separate file.
+        The shard files are then merged (trees are concatenated, histograms are added)
+        into the usual output file, and the statistics of the shards are combined.
+        """
+        not_shardable = [name for name, producer in self.producer_manager.producers.items()
+                         if not producer.supportsSharding()]
+        if len(not_shardable) > 0:
+            raise ValueError(f"Producers {not_shardable} do not support running with several workers. "
+                             "Run with --workers 1.")
+
+        max_events = self._get_max_events(dataset)
+        shards = sharding.make_shards(max_events, workers)
+        self.logger.info(f"Processing dataset {dataset_name} in {len(shards)} shards: {shards}")
+
+        output_file_path = self._default_output_path(dataset_name)
+        shard_dir = output_file_path.replace(".root", "_shards")
+        os.makedirs(shard_dir, exist_ok=True)
+
+        shard_jobs = []
+        for ishard, entry_range in enumerate(shards):
+            shard_path = os.path.join(shard_dir, f"shard{ishard:04d}.root")
+            shard_jobs.append((self.config_file, self._log_level, dataset_name,
+                               entry_range, shard_path, ishard == 0, self._profile))
+
+        start_time = time.time()
+        shard_results = sharding.run_shards(shard_jobs, workers)
+        self.logger.info(f"Merging {len(shard_results)} shards into {output_file_path}")
+        sharding.merge_root_files([job[4] for job in shard_jobs], output_file_path,
+                                  compression=self._output_compression)
+        for job in shard_jobs:
+            os.remove(job[4])
+        os.rmdir(shard_dir)
+
+        self.stats[dataset_name] = sharding.merge_dataset_stats([res['stats'] for res in shard_results])
+        self.stats[dataset_name]['processing_time'] = time.time() - start_time
+        self.stats[dataset_name]['num_workers'] = len(shards)
+        sharding.merge_producer_statistics(self.producer_manager, shard_results)
+        sharding.merge_cut_statistics(self.cut_factory, shard_results)
+        if self.profiler is not None:
+            for res in shard_results:
+                self.profiler.merge(res['profile'])
+
         self.logger.info(f"Dataset {dataset_name} processed in {self.stats[dataset_name]['processing_time']:.1f}s")
         self.logger.info(f"Results written to {output_file_path}")
-    
+
     def _process_event_producer_first(self, ntuple, dataset, event_index):
         """
         Process a single event using producer-first architecture.
@@ -334,10 +911,10 @@ class LanternAna:
             tags = self.tag_factory.apply_tags(ntuple)
             event_data['event_tags'] = tags
         
-        # Process with producers
+        # Process with producers (with lazy_producers, only the ones the cuts need)
+        producer_params = {"event_index": event_index, 'ismc': dataset.ismc, 'dataset_name':dataset.name}
         producer_results = self.producer_manager.process_event(
-            event_data, 
-            {"event_index": event_index, 'ismc': dataset.ismc, 'dataset_name':dataset.name}
+            event_data, producer_params, producer_names=self._selection_producers
         )
         
         # Step 2: Run cuts with access to producer results
@@ -348,9 +925,13 @@ class LanternAna:
         }
         
         passes, cut_results, cut_data = self.cut_factory.apply_cuts(
-            ntuple, dataset.name, return_on_fail=False, 
+            ntuple, dataset.name, return_on_fail=self._lazy_cuts, 
             ismc=dataset.ismc, producer_outputs=producer_results
         )
+
+        # Step 3: with lazy_producers, run the other producers if the event is kept
+        if self._deferred_producers and passes:
+            self.producer_manager.continue_event(producer_results, producer_params, self._deferred_producers)
         
         return passes, producer_results, cut_results
     
@@ -385,16 +966,34 @@ def run_lantern_ana():
     parser.add_argument('--log-level', default='INFO', 
                       choices=['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL'],
                       help='Set logging level')
+    parser.add_argument('--workers', type=int, default=1,
+                      help='Number of worker processes. Each dataset is split into this many shards.')
+    parser.add_argument('--resume', action='store_true',
+                      help='Continue each dataset from its last checkpoint (checkpoint_every option), '
+                           'appending to the same output file. Datasets already finished are skipped.')
+    parser.add_argument('--profile', action='store_true',
+                      help='Record the time of every producer and cut call. Writes profile.json and '
+                           'profile.collapsed (for flame graphs) next to statistics.yaml.')
+    parser.add_argument('--clear-producer-cache', action='store_true',
+                      help='Remove the cached producer outputs (producer_cache option) before running, '
+                           'e.g. after changing code outside lantern_ana that producers use.')
     
     args = parser.parse_args()
     
     # Create and run analysis
-    analysis = LanternAna(args.config, log_level=args.log_level)
-    analysis.run(args.datasets)
+    analysis = LanternAna(args.config, log_level=args.log_level, profile=args.profile, resume=args.resume)
+    if args.clear_producer_cache:
+        if analysis.producer_manager.output_cache is None:
+            analysis.logger.warning("--clear-producer-cache: the producer_cache option is not set")
+        else:
+            analysis.producer_manager.output_cache.clear()
+    analysis.run(args.datasets, workers=args.workers)
     
     # Save statistics
     stats_file = os.path.join(analysis.output_dir, 'statistics.yaml')
     analysis.save_statistics(stats_file)
+    if analysis.profiler is not None:
+        analysis.save_profile(os.path.join(analysis.output_dir, 'profile.json'))
 
 if __name__=="__main__":
     run_lantern_ana()
\ No newline at end of file
@@ -208,6 +208,9 @@ class oneGxPEventCategorizingProducer(ProducerBaseClass):
             ]
         
 
+    def requiredBranches(self):
+        return ['vtxX', 'vtxY', 'vtxZ']
+
     def processEvent(self, data, params):
         """Get the energy and x, y, z coordinates of each photon."""
         ntuple = data["gen2ntuple"]
@@ -151,6 +151,9 @@ class oneGxPEventSortingProducer(ProducerBaseClass):
         return ["gen2ntuple", "photon_data", "detectable_particle_data", "true_photon_data", "true_detectable_particle_data"]
         
 
+    def requiredBranches(self):
+        return []
+
     def processEvent(self, data, params):
         """Get the energy and x, y, z coordinates of each photon."""
         ntuple = data["gen2ntuple"]
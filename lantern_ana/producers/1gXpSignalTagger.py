@@ -139,6 +139,9 @@ class oneGxPSignalTagProducer(ProducerBaseClass):
         return ["gen2ntuple", "true_photon_data", "true_detectable_particle_data"]
         
 
+    def requiredBranches(self):
+        return []
+
     def processEvent(self, data, params):
         """Get the energy and x, y, z coordinates of each photon."""
         ntuple = data["gen2ntuple"]
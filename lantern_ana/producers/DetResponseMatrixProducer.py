@@ -57,7 +57,8 @@ from array import array
 import ROOT as rt
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
-import re
+from lantern_ana.utils.formulas import CompiledFormula, FormulaSelection
+from lantern_ana.io.checkpoint import histogram_state, restore_histogram_state
 
 # ==========================================
 # OPTIONAL IMPORTS - Add what you need
@@ -101,6 +102,16 @@ class DetResponseMatrixProducer(ProducerBaseClass):
         # event selection criterion
         self.cut_formulas = config.get('cut_formulas',{})
         self.event_selection_critera = config.get('event_selection_critera',[])
+
+        # parse the formulas once, instead of for every event
+        self._x_formula = CompiledFormula(self.x_config['variable_formula'])
+        self._y_formula = CompiledFormula(self.y_config['variable_formula'])
+        if self.event_weight_formula is None:
+          self._weight_formula = None
+        else:
+          self._weight_formula = CompiledFormula(self.event_weight_formula)
+        # every cut formula must pass
+        self._selection = FormulaSelection(self.cut_formulas)
         
         # REQUIRED: Call the parent class constructor
         super().__init__(name, config)
@@ -198,6 +209,17 @@ class DetResponseMatrixProducer(ProducerBaseClass):
         
         return required_inputs
     
+    def requiredBranches(self) -> List[str]:
+        branches = list(self._selection.branches)
+        formulas = [self._x_formula, self._y_formula, self._weight_formula]
+        for formula in formulas:
+            if formula is None:
+                continue
+            for branch in formula.branches:
+                if branch not in branches:
+                    branches.append(branch)
+        return branches
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """
         WHAT THIS DOES:
@@ -245,12 +267,12 @@ class DetResponseMatrixProducer(ProducerBaseClass):
 
 
         # Fill histogram
-        xvariable = eval(self.x_config['variable_formula'])
-        yvariable = eval(self.y_config['variable_formula'])
-        if self.event_weight_formula is None:
+        xvariable = self._x_formula(ntuple)
+        yvariable = self._y_formula(ntuple)
+        if self._weight_formula is None:
           eventweight = 1.0
         else:
-          eventweight = eval(self.event_weight_formula)
+          eventweight = self._weight_formula(ntuple)
 
         #print(xvariable," ",yvariable," ",eventweight)
 
@@ -262,32 +284,19 @@ class DetResponseMatrixProducer(ProducerBaseClass):
     def _process_selection_cut( self, ntuple ):
 
         # in order to decide if this event is something we are going to fill
-        select_results = {}
-        for cutname,cutformula in self.cut_formulas.items():
-            # Extract placeholders from the formula (strings inside {})
-            placeholders = re.findall(r'\{([^}]+)\}', cutformula)
-
-            # Create clean expression and namespace
-            clean_expression = cutformula
-            namespace = {}
-            for placeholder in placeholders:
-                # Create a simple variable name from the placeholder
-                var_name = placeholder.replace('.', '_').replace('[', '_').replace(']', '')
-                clean_expression = clean_expression.replace(f"{{{placeholder}}}", var_name)
-                # Evaluate the placeholder to get the actual value
-                namespace[var_name] = eval(placeholder)
-
-            # Evaluate the clean expression with the namespace
-            select_results[cutname] = eval(clean_expression, namespace)
-
-        #print(select_results)
-        passes = True
-        for cutname,result in select_results.items():
-            if result==False:
-                passes = False
-                break
-
-        return passes
+        return self._selection(ntuple)
+
+    def supportsCaching(self) -> bool:
+      """Fills the response matrices in processEvent."""
+      return False
+
+    def getCheckpointState(self):
+      """Contents of the response matrices filled so far."""
+      return {dataset_name: histogram_state(hist) for dataset_name,hist in self.detresponse_hists.items()}
+
+    def restoreCheckpointState(self, state):
+      for dataset_name,hist_state in state.items():
+        restore_histogram_state(self.detresponse_hists[dataset_name], hist_state)
 
     def finalize(self) -> None:
       for dataset_name,hist in self.detresponse_hists.items():
@@ -4,19 +4,18 @@ Custom Producer: FVtagProducer
 
 Created by: [Your Name Here]
 Date: 2025-06-09
-Purpose: [Describe what this producer calculates - be specific!]
+Purpose: Tag events whose reconstructed vertex is inside the fiducial volume
 
-This producer calculates [YOUR DESCRIPTION HERE] from neutrino event data.
-It takes raw detector information and produces derived quantities that
-can be used by cuts to select interesting events.
+This producer calculates the distance of the reconstructed vertex to the closest
+TPC wall (dwall) and tags the event as in the fiducial volume if a vertex was
+found at least fiducial_distance from every wall.
 
 Example usage in YAML config:
     producers:
-      my_variable:
+      fvtag:
         type: FVtagProducer
         config:
-          parameter1: value1
-          parameter2: value2
+          fiducial_distance: 17.0
 """
 
 # ==========================================
@@ -35,6 +34,7 @@ from lantern_ana.producers.producer_factory import register
 # from math import sqrt, log, exp, sin, cos, pi
 # from lantern_ana.utils.kinematics import calculate_angle
 # from lantern_ana.cuts.fiducial_cuts import fiducial_cut
+from lantern_ana.utils.fiducial_volume import dwall, dwall_array
 
 @register  # This line makes your producer available to the framework!
 class FVtagProducer(ProducerBaseClass):
@@ -104,7 +104,7 @@ class FVtagProducer(ProducerBaseClass):
         # These come from your YAML config file under 'config:'
         # Use .get() with default values for safety
         
-        self.min_energy = config.get('fiducial_distance', 17.0)  # Fiducial Distance (in cm)
+        self.fiducial_distance = config.get('fiducial_distance', 17.0)  # Fiducial Distance (in cm)
 
         
         # ADD YOUR CONFIGURATION PARAMETERS HERE:
@@ -120,7 +120,8 @@ class FVtagProducer(ProducerBaseClass):
         # - array('i', [0])   for integers (whole numbers)
         # - array('d', [0.0]) for double precision (very precise decimals)
         
-        self.is_in_fv = array('i', [0])         
+        self.is_in_fv = array('i', [0])         # 1 if the vertex is in the fiducial volume
+        self.vtx_dwall = array('f', [-999.0])   # distance of the vertex to the closest TPC wall (cm)
 
         
         # ADD YOUR VARIABLES HERE:
@@ -130,11 +131,8 @@ class FVtagProducer(ProducerBaseClass):
         # ==================================================================
         # This makes it easier to manage multiple variables
         self.output_vars = {
-            'total_energy': self.total_energy,
-            'particle_count': self.particle_count,
-            'energy_ratio': self.energy_ratio,
-            'max_angle': self.max_angle,
-            'is_interesting': self.is_interesting,
+            'isinfv': self.is_in_fv,
+            'dwall': self.vtx_dwall,
             # ADD YOUR VARIABLES HERE:
             # 'my_variable': self.my_variable,
         }
@@ -166,12 +164,8 @@ class FVtagProducer(ProducerBaseClass):
         
         # RESET YOUR VARIABLES TO DEFAULTS
         # ================================
-        # Example resets - MODIFY THESE for your variables!
-        self.total_energy[0] = 0.0      # No energy initially
-        self.particle_count[0] = 0       # No particles found
-        self.energy_ratio[0] = -1.0      # Invalid ratio (use -1 to indicate "not calculated")
-        self.max_angle[0] = 0.0          # No angle measured
-        self.is_interesting[0] = 0       # Not interesting by default
+        self.is_in_fv[0] = 0             # Not in the fiducial volume by default
+        self.vtx_dwall[0] = -999.0       # No vertex
         
         # RESET YOUR VARIABLES HERE:
         # self.my_variable[0] = default_value
@@ -204,19 +198,13 @@ class FVtagProducer(ProducerBaseClass):
         # ==================================
         # Format: output_tree.Branch(branch_name, variable_array, "branch_name/TYPE")
         
-        # Example branches - MODIFY THESE for your variables!
-        output_tree.Branch(f"{self.name}_isinfv", self.is_in_fv, f"{self.name}_isinfv/F")
-      
-        # ADD YOUR BRANCHES HERE:
-        # output_tree.Branch(f"{self.name}_my_variable", self.my_variable, f"{self.name}_my_variable/F")
-        
-        # ALTERNATIVE: Use the dictionary approach (cleaner for many variables)
-        # for var_name, var_array in self.output_vars.items():
-        #     if var_array.typecode == 'i':
-        #         branch_type = f"{self.name}_{var_name}/I"
-        #     else:
-        #         branch_type = f"{self.name}_{var_name}/F"
-        #     output_tree.Branch(f"{self.name}_{var_name}", var_array, branch_type)
+        # Use the dictionary approach (cleaner for many variables)
+        for var_name, var_array in self.output_vars.items():
+            if var_array.typecode == 'i':
+                branch_type = f"{self.name}_{var_name}/I"
+            else:
+                branch_type = f"{self.name}_{var_name}/F"
+            output_tree.Branch(f"{self.name}_{var_name}", var_array, branch_type)
     
     def requiredInputs(self) -> List[str]:
         """
@@ -257,6 +245,9 @@ class FVtagProducer(ProducerBaseClass):
         
         return required_inputs
     
+    def requiredBranches(self) -> List[str]:
+        return ['foundVertex', 'vtxX', 'vtxY', 'vtxZ']
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
       
         ntuple = data["gen2ntuple"]  # Raw detector data - ALWAYS available
@@ -276,88 +267,38 @@ class FVtagProducer(ProducerBaseClass):
         # This is where you implement your physics analysis.
         # Use the detector data to calculate interesting quantities.
         
-        # EXAMPLE CALCULATION 1: Count and sum particle energies
-        # =====================================================
-        total_energy = 0.0
-        particle_count = 0
-        
-        # Count and sum track energies
-        for i in range(ntuple.nTracks):
-            if ntuple.trackIsSecondary[i] == 0:  # Only primary tracks
-                if ntuple.trackRecoE[i] > self.min_energy:  # Above threshold
-                    total_energy += ntuple.trackRecoE[i]
-                    particle_count += 1
-        
-        # Count and sum shower energies  
-        for i in range(ntuple.nShowers):
-            if ntuple.showerIsSecondary[i] == 0:  # Only primary showers
-                if ntuple.showerRecoE[i] > self.min_energy:  # Above threshold
-                    total_energy += ntuple.showerRecoE[i]
-                    particle_count += 1
-        
-        # EXAMPLE CALCULATION 2: Calculate energy ratio
-        # ============================================
-        track_energy = sum(ntuple.trackRecoE[i] for i in range(ntuple.nTracks) 
-                          if ntuple.trackIsSecondary[i] == 0)
-        shower_energy = sum(ntuple.showerRecoE[i] for i in range(ntuple.nShowers) 
-                           if ntuple.showerIsSecondary[i] == 0)
-        
-        if shower_energy > 0:
-            energy_ratio = track_energy / shower_energy
-        else:
-            energy_ratio = -1.0  # Invalid - no showers found
-        
-        # EXAMPLE CALCULATION 3: Find maximum opening angle
-        # ================================================
-        max_angle = 0.0
-        # [Add your angle calculation here if needed]
-        
-        # EXAMPLE CALCULATION 4: Interesting event flag
-        # ============================================
-        # Define your own criteria for what makes an event "interesting"
-        is_interesting = 1 if (total_energy > 200.0 and particle_count >= 2) else 0
-        
-        # STEP 4: STORE YOUR RESULTS
-        # ==========================
-        # Put your calculated values into the output variables
-        self.total_energy[0] = total_energy
-        self.particle_count[0] = particle_count
-        self.energy_ratio[0] = energy_ratio
-        self.max_angle[0] = max_angle
-        self.is_interesting[0] = is_interesting
-        
-        # ADD YOUR CALCULATIONS HERE:
-        # ===========================
-        # 1. Access detector data from 'ntuple'
-        # 2. Do your physics calculations
-        # 3. Store results in your variables
-        # 
-        # USEFUL DETECTOR DATA:
-        # ntuple.nTracks, ntuple.nShowers - number of reconstructed objects
-        # ntuple.trackRecoE[i] - energy of track i
-        # ntuple.showerRecoE[i] - energy of shower i  
-        # ntuple.trackIsSecondary[i] - 0 for primary, 1 for secondary
-        # ntuple.vtxX, ntuple.vtxY, ntuple.vtxZ - vertex position
-        # ntuple.foundVertex - 1 if vertex found, 0 otherwise
-        #
-        # EXAMPLE PHYSICS CALCULATIONS:
-        # - Total visible energy: sum all track + shower energies
-        # - Particle multiplicities: count tracks/showers above threshold
-        # - Angular distributions: calculate angles between particles
-        # - Missing energy: compare visible vs. neutrino energy (MC only)
-        # - Quality metrics: completeness, purity of reconstruction
+        # Distance of the reconstructed vertex to the closest TPC wall
+        # (positive inside the TPC, negative outside)
+        if ntuple.foundVertex == 1:
+            self.vtx_dwall[0] = dwall(ntuple.vtxX, ntuple.vtxY, ntuple.vtxZ)
+            self.is_in_fv[0] = 1 if self.vtx_dwall[0] >= self.fiducial_distance else 0
         
         # STEP 5: RETURN SUMMARY (for other producers to use)
         # ===================================================
         # Return a dictionary so other producers can access your results
         return {
-            'total_energy': total_energy,
-            'particle_count': particle_count,
-            'energy_ratio': energy_ratio,
-            'max_angle': max_angle,
-            'is_interesting': is_interesting,
-            # ADD YOUR VARIABLES HERE:
-            # 'my_variable': self.my_variable[0],
+            'isinfv': self.is_in_fv[0],
+            'dwall': self.vtx_dwall[0],
+        }
+
+    def supportsBatch(self) -> bool:
+        return True
+
+    def processBatch(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """ Columnar mode: dwall of the vertices of the whole chunk in one call. """
+        batch = data["gen2ntuple"]
+        found = np.asarray(batch.foundVertex) == 1
+        pos = np.stack([batch.vtxX, batch.vtxY, batch.vtxZ], axis=1)
+        vtx_dwall = np.where(found, dwall_array(pos), -999.0).astype(np.float32)
+        is_in_fv = (found & (vtx_dwall >= self.fiducial_distance)).astype(np.int32)
+        return {'isinfv': is_in_fv, 'dwall': vtx_dwall}
+
+    def storeBatchEntry(self, batch_output: Dict[str, Any], ientry: int) -> Dict[str, Any]:
+        self.is_in_fv[0] = int(batch_output['isinfv'][ientry])
+        self.vtx_dwall[0] = batch_output['dwall'][ientry]
+        return {
+            'isinfv': self.is_in_fv[0],
+            'dwall': self.vtx_dwall[0],
         }
 
     def finalize(self):
@@ -441,18 +382,10 @@ DEBUGGING TIPS:
 # Add this to your analysis configuration:
 
 producers:
-  my_physics_vars:                    # Your chosen name
-    type: FVtagProducer             # Must match your class name
+  fvtag:                              # Your chosen name
+    type: FVtagProducer               # Must match your class name
     config:                           # Your configuration parameters
-      min_energy: 50.0                # Minimum energy threshold (MeV)
-      use_tracks: true                # Include tracks in calculations
-      use_showers: true               # Include showers in calculations
-      # Add your custom parameters here
+      fiducial_distance: 17.0         # Minimum distance of the vertex to the TPC walls (cm)
 
-# Then your cuts can use the calculated variables:
-cuts:
-  high_energy_cut:
-    min_total_energy: 500.0           # Uses my_physics_vars_total_energy
-  interesting_events:
-    require_interesting: true         # Uses my_physics_vars_is_interesting
+# Then the output tree has the branches fvtag_isinfv and fvtag_dwall
 """
@@ -28,9 +28,17 @@ from array import array
 import ROOT
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
+from lantern_ana.utils.flash_matching import vector_to_array, match_candidates, best_candidate, best_candidate_batch
 
 @register  # This line makes your producer available to the framework!
 class FlashPredictionProducer(ProducerBaseClass):
+
+    # largest squared distance between the ntuple vertex and a flash prediction vertex to match them
+    MAX_DIST2 = 1.0e-2
+
+    # pre-selection of the matched vertices: z_test = sinkdiv - Z_SLOPE*(fracerr+1) - Z_OFFSET <= 0
+    Z_SLOPE = 70.0/3.0
+    Z_OFFSET = 70.0
     
     def __init__(self, name: str, config: Dict[str, Any]):
 
@@ -82,6 +90,10 @@ class FlashPredictionProducer(ProducerBaseClass):
         
         return required_inputs
     
+    def requiredBranches(self) -> List[str]:
+        return ['foundVertex', 'vtxX', 'vtxY', 'vtxZ', 'nTracks', 'nShowers', 'obs_total_pe', 'pred_total_pe_all',
+                'reco_vertex_x', 'reco_vertex_y', 'reco_vertex_z', 'n_tracks_all', 'n_showers_all', 'sinkhorn_div_all']
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         
         ntuple = data["gen2ntuple"]  # Raw detector data - ALWAYS available
@@ -90,85 +102,46 @@ class FlashPredictionProducer(ProducerBaseClass):
         
        
         if ntuple.foundVertex==0:
+          self.setDefaultValues()
           out = {}
           for varname,val in self._vars.items():
             out[varname] = val[0]
           return out
 
         # We are trying to match the flashprediction info to the vertex saved by the ntuple maker
-        # We can only do this by matching position (vertex ID was not saved)
+        # We can only do this by matching position and the number of tracks and showers (vertex ID was not saved)
 
-        # which vertex did we save into the ntuple
-        matchedvertices = []
-        vtx = np.array( (ntuple.vtxX,ntuple.vtxY,ntuple.vtxZ) )
+        # which vertices match the one we saved into the ntuple
+        vtx = (ntuple.vtxX,ntuple.vtxY,ntuple.vtxZ)
         obs_total_pe = ntuple.obs_total_pe
         nvertices    = ntuple.pred_total_pe_all.size()
-        mindist = 1.0e9
-
-        m = (70.0/3.0)
-        b = 70.0
-
-        #print("VTX: ",vtx)
-        for ivtx in range(nvertices):
-
-          vtxflash = np.array( (ntuple.reco_vertex_x[ivtx],ntuple.reco_vertex_y[ivtx],ntuple.reco_vertex_z[ivtx]) )
-
-          #print("FlASH VTX: ",vtxflash)
-          dist = vtx-vtxflash
-          dist = (dist*dist).sum()
-
-          if dist < mindist:
-            mindist = dist
-
-          if dist>1.0e-2:
-            # not the right vertex
-            continue
-
-          sinkdiv_all  = ntuple.sinkhorn_div_all[ivtx][1]
-          pred_total_pe_all = ntuple.pred_total_pe_all.at(ivtx)*2.0
-          fracerr = (pred_total_pe_all-obs_total_pe)/(0.1+obs_total_pe)
-          x_fracerr = fracerr+1.0
-
-          # print(sinkdiv_all)
-          # print(x_fracerr)
-
-
-          z_test = sinkdiv_all - m*x_fracerr - b
-
-          matchedvertices.append( {'ivtx':ivtx,'sinkdiv_all':sinkdiv_all,'fracerr':fracerr,'pred':pred_total_pe_all,'z_test':z_test} )
-
-        matched = None
-        if len(matchedvertices)>1:
-          # we have to pick the best match. first, do we have any that passes out pre-selection cut (using z_test)
-          npass = 0
-          min_sink = 1.0e9
-          min_index = -1
-          min_sink_pass = 1.0e9
-          min_index_pass = -1
-          for idx,vertexdata in enumerate(matchedvertices):
-            # get best, from only those passing cut
-            if vertexdata['z_test']<=0:
-              npass += 1
-              if min_sink_pass > vertexdata['sinkdiv_all']:
-                min_sink_pass  = vertexdata['sinkdiv_all']
-                min_index_pass = idx
-            # get best, regardless of passing
-            if min_sink > vertexdata['sinkdiv_all']:
-              min_sink  = vertexdata['sinkdiv_all']
-              min_index = idx
-
-          if npass==0:
-            # just simply pick lowest sinkdiv
-            matched = matchedvertices[min_index]
-          else:
-            # pick from the passing
-            matched = matchedvertices[min_index_pass]
-
-        elif len(matchedvertices)==1:
-          matched = matchedvertices[0]
-        else:
+        matched = match_candidates( vtx, ntuple.reco_vertex_x, ntuple.reco_vertex_y, ntuple.reco_vertex_z,
+                                    self.MAX_DIST2,
+                                    counts=[ (ntuple.nTracks, ntuple.n_tracks_all),
+                                             (ntuple.nShowers, ntuple.n_showers_all) ],
+                                    inclusive=True )[:nvertices]
+        imatched = np.flatnonzero(matched)
+        if len(imatched)==0:
+          dist2 = ( (vector_to_array(ntuple.reco_vertex_x)-vtx[0])**2
+                    + (vector_to_array(ntuple.reco_vertex_y)-vtx[1])**2
+                    + (vector_to_array(ntuple.reco_vertex_z)-vtx[2])**2 )
+          mindist = dist2.min() if len(dist2)>0 else 1.0e9
           raise ValueError(f"DID NOT FIND MATCHED VERTEX: mindist={mindist} nvertices(flash)={nvertices}")
 
+        # only read the flash metrics of the matched vertices
+        sinkdiv_all = np.array( [ntuple.sinkhorn_div_all[int(ivtx)][1] for ivtx in imatched] )
+        pred_total_pe_all = vector_to_array(ntuple.pred_total_pe_all)[imatched]*2.0
+        fracerr, z_test = self._fracerr_ztest( pred_total_pe_all, obs_total_pe, sinkdiv_all )
+
+        # if several vertices match, we pick the lowest sinkdiv among those that pass our pre-selection cut
+        # (using z_test), or among all of them if none pass
+        ibest = best_candidate( sinkdiv_all, np.ones(len(imatched),dtype=bool), z_test<=0 )
+        if ibest<0:
+          # no matched vertex has a finite sinkdiv: keep the last one
+          ibest = len(imatched)-1
+        matched = {'ivtx':imatched[ibest],'sinkdiv_all':sinkdiv_all[ibest],'fracerr':fracerr[ibest],
+                   'pred':pred_total_pe_all[ibest],'z_test':z_test[ibest]}
+
         
         # STEP 4: STORE YOUR RESULTS
         # ==========================
@@ -188,9 +161,80 @@ class FlashPredictionProducer(ProducerBaseClass):
 
         return out
 
+    def _fracerr_ztest(self, pred_total_pe, obs_total_pe, sinkdiv):
+        """Fractional error of the predicted PE and the pre-selection variable, for arrays of vertices."""
+        fracerr = (pred_total_pe-obs_total_pe)/(0.1+obs_total_pe)
+        z_test = sinkdiv - self.Z_SLOPE*(fracerr+1.0) - self.Z_OFFSET
+        return fracerr, z_test
+
+    def supportsBatch(self) -> bool:
+        return True
+
+    def processBatch(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Match the flash predictions for a chunk of events, with the vertices of all events in flat arrays.
+        """
+        batch = data["gen2ntuple"]
+        nentries = batch.size
+
+        entry_index = batch.reco_vertex_x.entry_index()
+        dist2  = (batch.reco_vertex_x.content-np.asarray(batch.vtxX)[entry_index])**2
+        dist2 += (batch.reco_vertex_y.content-np.asarray(batch.vtxY)[entry_index])**2
+        dist2 += (batch.reco_vertex_z.content-np.asarray(batch.vtxZ)[entry_index])**2
+        matched = dist2 <= self.MAX_DIST2
+        matched &= batch.n_tracks_all.content == np.asarray(batch.nTracks)[entry_index]
+        matched &= batch.n_showers_all.content == np.asarray(batch.nShowers)[entry_index]
+
+        obs_total_pe = np.asarray(batch.obs_total_pe, dtype=np.float64)
+        pred_total_pe_all = batch.pred_total_pe_all.content.astype(np.float64)*2.0
+        sinkdiv_all = _candidate_values(batch.sinkhorn_div_all, 1)
+        fracerr, z_test = self._fracerr_ztest( pred_total_pe_all, obs_total_pe[entry_index], sinkdiv_all )
+
+        best = best_candidate_batch( entry_index, nentries, sinkdiv_all, matched, z_test<=0 )
+        # as in processEvent, events whose matched vertices have no finite sinkdiv keep the last one
+        last = np.full(nentries, -1, dtype=np.int64)
+        imatched = np.flatnonzero(matched)
+        np.maximum.at(last, entry_index[imatched], imatched)
+        best = np.where(best<0, last, best)
+        found = np.asarray(batch.foundVertex)!=0
+        missing = np.flatnonzero( found & (best<0) )
+        if len(missing)>0:
+          raise ValueError(f"DID NOT FIND MATCHED VERTEX for entry {batch.start+missing[0]}")
+
+        out = {
+          'predictedpe':  np.zeros(nentries, dtype=np.float32),
+          'observedpe':   np.zeros(nentries, dtype=np.float32),
+          'fracerr':      np.zeros(nentries, dtype=np.float32),
+          'sinkhorn_div': np.full(nentries, 9999.0, dtype=np.float32)
+        }
+        ibest = best[found]
+        out['predictedpe'][found]  = pred_total_pe_all[ibest]
+        out['observedpe'][found]   = obs_total_pe[found]
+        out['fracerr'][found]      = fracerr[ibest]
+        out['sinkhorn_div'][found] = sinkdiv_all[ibest]
+        return out
+
+    def storeBatchEntry(self, batch_output: Dict[str, Any], ientry: int) -> Dict[str, Any]:
+        out = {}
+        for varname,val in self._vars.items():
+          val[0] = batch_output[varname][ientry]
+          out[varname] = val[0]
+        return out
+
     def finalize(self):
         """
         nothing to do after the event loop
         """
         super().finalize()
         return
+
+
+def _candidate_values(column, index):
+    """
+    Value [index] of each vertex of a vector<vector<float>> column, as one flat array over
+    the vertices of all events in the chunk.
+    """
+    content = column.content
+    if content.ndim==2:
+        return content[:,index].astype(np.float64)
+    return np.array( [vals[index] for vals in content], dtype=np.float64 )
@@ -178,6 +178,9 @@ class backgroundClassifyingProducer(ProducerBaseClass):
             ]
         
 
+    def requiredBranches(self):
+        return []
+
     def processEvent(self, data, params):
         """Get the energy and x, y, z coordinates of each photon."""
         ntuple = data["gen2ntuple"]
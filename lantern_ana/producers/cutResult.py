@@ -32,6 +32,9 @@ class CutResultProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple",self.cut_name]
     
+    def requiredBranches(self):
+        return []
+
     def processEvent(self, data, params):
         """Calculate total visible energy from all primary tracks and showers."""
 
@@ -289,6 +289,22 @@ class eventIndexProducer(ProducerBaseClass):
         # Return a dictionary so other producers can access your results
         return self.output_vars
 
+    def requiredBranches(self) -> List[str]:
+        return ["run", "subrun", "event", "fileid"]
+
+    def supportsBatch(self) -> bool:
+        return True
+
+    def processBatch(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """ Columnar mode: the indices are copied straight from the chunk. """
+        batch = data["gen2ntuple"]
+        return {varname: np.asarray(batch[varname], dtype=np.int32) for varname in self.output_vars}
+
+    def storeBatchEntry(self, batch_output: Dict[str, Any], ientry: int) -> Dict[str, Any]:
+        for varname, var in self.output_vars.items():
+            var[0] = int(batch_output[varname][ientry])
+        return self.output_vars
+
     def finalize(self):
         """ Nothing to do after event loop. """
         return
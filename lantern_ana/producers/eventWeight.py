@@ -36,6 +36,9 @@ class eventWeightProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self):
+        return [self.weight_branch]
+
     def processEvent(self, data, params):
         """Calculate total visible energy from all primary tracks and showers."""
         self.setDefaultValues()
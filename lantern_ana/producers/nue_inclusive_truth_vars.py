@@ -4,6 +4,7 @@ from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
 #from lantern_ana.tags.tag_factory import TagFactory
 from lantern_ana.utils import get_true_primary_particle_counts
+from lantern_ana.utils.true_particle_counts import TRUE_PARTICLE_COUNT_BRANCHES
 
 
 @register
@@ -91,6 +92,9 @@ class NueInclusiveTruthSelectionProducer(ProducerBaseClass):
         """
         return ["gen2ntuple"]
     
+    def requiredBranches(self) -> List[str]:
+        return list(TRUE_PARTICLE_COUNT_BRANCHES)
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Any:
         """
         Process a single event using the provided data.
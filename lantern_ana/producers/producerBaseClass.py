@@ -59,6 +59,96 @@ class ProducerBaseClass(ABC):
         """
         return ["gen2ntuple"]
     
+    def requiredBranches(self) -> Optional[List[str]]:
+        """
+        Get a list of the ntuple branches this producer reads.
+
+        Returns:
+            List of branch names, or None if the producer has not declared them
+        """
+        return None
+
+    def supportsBatch(self) -> bool:
+        """
+        Whether this producer implements processBatch for the columnar execution mode.
+
+        Producers that return True must also implement requiredBranches and storeBatchEntry.
+        """
+        return False
+
+    def processBatch(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Process a chunk of events at once (columnar execution mode).
+
+        Args:
+            data: Dictionary mapping producer names to their batch outputs.
+                  data["gen2ntuple"] is a ColumnBatch holding the branches from requiredBranches().
+            params: Additional parameters for this processing step
+
+        Returns:
+            Dictionary mapping output names to arrays with one value per event in the chunk
+        """
+        raise NotImplementedError(f"Producer {type(self).__name__} does not implement processBatch")
+
+    def storeBatchEntry(self, batch_output: Dict[str, Any], ientry: int) -> Any:
+        """
+        Copy one event of a processBatch result into the variables bound to the output tree.
+
+        Args:
+            batch_output: The dictionary returned by processBatch
+            ientry: Index of the event within the chunk
+
+        Returns:
+            The output for this event, in the same form processEvent returns it
+        """
+        raise NotImplementedError(f"Producer {type(self).__name__} does not implement storeBatchEntry")
+
+    def supportsSharding(self) -> bool:
+        """
+        Whether this producer can run with several worker processes (run_lantern_ana --workers N).
+
+        Each worker runs its own copy of the producer on a slice of the entries. Its tree branches
+        and any histograms it writes into the analysis output file are merged afterwards.
+        Producers that write their own output files, or that need to see every event of a
+        dataset in one process, should return False.
+        """
+        return True
+
+    def supportsCaching(self) -> bool:
+        """
+        Whether the outputs of this producer can be saved and loaded from the producer output
+        cache (producer_cache option) instead of calling processEvent.
+
+        The cache restores the values of the producer's branches and the dictionary processEvent
+        returned. Producers that do anything else in processEvent, like filling histograms,
+        should return False. These producers are also run on every event with the
+        lazy_producers option, not only on the events passing the cuts.
+        """
+        return True
+
+    def getCheckpointState(self) -> Any:
+        """
+        Get what this producer has accumulated over the events processed so far, e.g. filled histograms.
+
+        Saved in the checkpoints of the event loop (checkpoint_every option), and given back to
+        restoreCheckpointState when the job is resumed (run_lantern_ana --resume).
+        Producers that only set their output variables for each event return None.
+
+        Returns:
+            A picklable object (see lantern_ana.io.checkpoint.histogram_state for histograms), or None
+        """
+        return None
+
+    def restoreCheckpointState(self, state: Any) -> None:
+        """
+        Restore the state returned by getCheckpointState, when a job is resumed.
+        Called after prepareStorage, before the first event.
+
+        Args:
+            state: The object getCheckpointState returned at the checkpoint
+        """
+        pass
+
     @abstractmethod
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Any:
         """
@@ -32,6 +32,7 @@ import traceback
 
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import ProducerFactory
+from lantern_ana.producers.producer_cache import StorageRecorder
 
 class ProducerManager:
     """
@@ -71,10 +72,20 @@ class ProducerManager:
             "total_time": 0.0,
             "num_calls": 0,
             "num_errors": 0,
-            "average_time": 0.0
+            "average_time": 0.0,
+            "num_cache_hits": 0
         })
         self.total_events_processed = 0
         self.dependency_graph: Optional[nx.DiGraph] = None
+        # Producers read by each cut (cut name -> producer names), see set_cut_requirements.
+        # The cuts are added to the dependency graph as nodes named "cut:<name>".
+        self.cut_requirements: Dict[str, List[str]] = {}
+
+        # Detailed timing of every call (see lantern_ana.profiler). None: profiling off.
+        self.profiler = None
+
+        # Cache of producer outputs on disk (see lantern_ana.producers.producer_cache). None: always run producers.
+        self.output_cache = None
         
         # Set up logging
         self.logger = self._setup_logging(log_level, log_file)
@@ -277,6 +288,14 @@ class ProducerManager:
                     # Meaning 'required' must run before 'name'
                     graph.add_edge(required, name)
                     self.logger.debug(f"Dependency: '{required}' must run before '{name}'")
+
+        # Add the cuts, after the producers they read
+        for cut_name, required_producers in self.cut_requirements.items():
+            cut_node = f"cut:{cut_name}"
+            graph.add_node(cut_node)
+            for required in required_producers:
+                if required in self.producers:
+                    graph.add_edge(required, cut_node)
         
         # Store the graph for later use
         self.dependency_graph = graph
@@ -289,7 +308,7 @@ class ProducerManager:
         
         # Get topological sort (execution order)
         # This gives us an order where all dependencies are satisfied
-        self.execution_order = list(nx.topological_sort(graph))
+        self.execution_order = [name for name in nx.topological_sort(graph) if name in self.producers]
         
         self.logger.info(f"Execution order determined: {' -> '.join(self.execution_order)}")
         self._log_dependency_summary()
@@ -309,6 +328,42 @@ class ProducerManager:
             else:
                 self.logger.debug(f"  {name} has no dependencies (can run first)")
     
+    def set_cut_requirements(self, cut_requirements: Dict[str, List[str]]) -> None:
+        """
+        Add the cuts to the dependency graph, after the producers whose outputs they read.
+
+        Args:
+            cut_requirements: Cut name -> names of the producers it reads
+                              (see CutFactory.get_producer_requirements)
+
+        Raises:
+            ValueError: If a cut reads a producer that is not configured
+        """
+        self.validate_cut_dependencies([name for required in cut_requirements.values() for name in required])
+        self.cut_requirements = {name: list(required) for name, required in cut_requirements.items()}
+        self._determine_execution_order()
+
+    def get_selection_producers(self) -> List[str]:
+        """
+        Get the producers that must run on every event, before the cuts: the ones the cuts
+        read, the ones that do more in processEvent than return their outputs (supportsCaching
+        returns False, e.g. producers filling histograms under their own selection), and
+        everything those depend on.
+
+        Requires set_cut_requirements to have been called.
+
+        Returns:
+            List of producer names, in execution order
+        """
+        needed = set()
+        for cut_name in self.cut_requirements:
+            needed.update(nx.ancestors(self.dependency_graph, f"cut:{cut_name}"))
+        for name, producer in self.producers.items():
+            if not producer.supportsCaching():
+                needed.add(name)
+                needed.update(nx.ancestors(self.dependency_graph, name))
+        return [name for name in self.execution_order if name in needed]
+
     def prepare_storage(self, output_interface: Any) -> None:
         """
         Set up storage for all producer outputs in the output file.
@@ -326,7 +381,13 @@ class ProducerManager:
         for name in self.execution_order:
             try:
                 producer = self.producers[name]
-                producer.prepareStorage(output_interface)
+                if self.output_cache is not None:
+                    # find the buffers of the producer's branches, to save and restore them
+                    recorder = StorageRecorder(output_interface)
+                    producer.prepareStorage(recorder)
+                    self.output_cache.register_storage(name, producer, recorder)
+                else:
+                    producer.prepareStorage(output_interface)
                 self.logger.debug(f"Storage prepared for producer '{name}'")
                 
             except Exception as e:
@@ -335,7 +396,8 @@ class ProducerManager:
         
         self.logger.info(f"Storage prepared for {len(self.execution_order)} producers")
     
-    def process_event(self, event_data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+    def process_event(self, event_data: Dict[str, Any], params: Dict[str, Any],
+                      producer_names: Optional[List[str]] = None) -> Dict[str, Any]:
         """
         Process a single event through all producers in the correct order.
         
@@ -349,43 +411,86 @@ class ProducerManager:
         Args:
             event_data: Initial data for the event (usually includes the ROOT tree)
             params: Additional parameters (like event index, MC flag, etc.)
+            producer_names: Run only these producers (in execution order, with the
+                            producers they depend on included). Default: all producers.
+                            The others can be run later with continue_event.
             
         Returns:
             Dictionary with all producer outputs for this event
         """
-        event_start_time = time.time()
         self.total_events_processed += 1
         
-        self.logger.debug(f"Processing event {self.total_events_processed}")
-        
         # Start with the input data
         results = {}
         results.update(event_data)
+
+        return self._run_producers(results, params, producer_names)
+
+    def continue_event(self, results: Dict[str, Any], params: Dict[str, Any],
+                       producer_names: List[str]) -> Dict[str, Any]:
+        """
+        Run more producers on the event last given to process_event.
+
+        Used to run the producers the cuts do not need only for events that pass them.
+
+        Args:
+            results: Return value of process_event for this event
+            params: Same parameters as given to process_event
+            producer_names: Producers to run, in execution order
+
+        Returns:
+            results, with the outputs of these producers added
+        """
+        return self._run_producers(results, params, producer_names)
+
+    def _run_producers(self, results: Dict[str, Any], params: Dict[str, Any],
+                       producer_names: Optional[List[str]]) -> Dict[str, Any]:
+        """Run producers on the current event, adding their outputs to results."""
+        profiler = self.profiler
+        output_cache = self.output_cache
+        # checked once per event, so the debug messages cost nothing when debug logging is off
+        debug = self.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            event_start_time = time.perf_counter_ns()
+            self.logger.debug(f"Processing event {self.total_events_processed}")
+
+        if producer_names is None:
+            producer_names = self.execution_order
         
         # Process each producer in dependency order
-        for name in self.execution_order:
+        for name in producer_names:
             producer = self.producers[name]
+
+            if output_cache is not None:
+                cached = output_cache.lookup(name, params["event_index"])
+                if cached is not None:
+                    results[name] = cached
+                    self.producer_statistics[name]["num_cache_hits"] += 1
+                    continue
             
             try:
                 # Time this producer
-                producer_start_time = time.time()
-                
-                self.logger.debug(f"Running producer '{name}'")
+                producer_start_time = time.perf_counter_ns()
                 
                 # Actually run the producer
                 result = producer.processEvent(results, params)
                 
                 # Record the result
                 results[name] = result
+                if output_cache is not None:
+                    output_cache.record(name, params["event_index"], result)
                 
                 # Update timing statistics
-                producer_time = time.time() - producer_start_time
+                producer_ns = time.perf_counter_ns() - producer_start_time
                 stats = self.producer_statistics[name]
-                stats["total_time"] += producer_time
+                stats["total_time"] += producer_ns*1e-9
                 stats["num_calls"] += 1
                 stats["average_time"] = stats["total_time"] / stats["num_calls"]
+                if profiler is not None:
+                    profiler.add('producers', name, producer_ns)
                 
-                self.logger.debug(f"Producer '{name}' completed in {producer_time:.4f}s")
+                if debug:
+                    self.logger.debug(f"Producer '{name}' completed in {producer_ns*1e-9:.4f}s")
                 
             except Exception as e:
                 # Handle producer errors
@@ -406,14 +511,163 @@ class ProducerManager:
                 sys.exit(1)
         
         # Cache the producer outputs
-        self.last_outputs = {name: results[name] for name in self.execution_order}
+        self.last_outputs = {name: results[name] for name in self.execution_order if name in results}
         
         # Log event summary
-        total_event_time = time.time() - event_start_time
-        self.logger.debug(f"Event {self.total_events_processed} completed in {total_event_time:.4f}s")
+        if debug:
+            total_event_time = (time.perf_counter_ns() - event_start_time)*1e-9
+            self.logger.debug(f"Event {self.total_events_processed} completed in {total_event_time:.4f}s")
         
         return results
 
+    def get_batch_producers(self) -> List[str]:
+        """
+        Get the producers that can run in the columnar (batch) execution mode.
+
+        A producer runs in batch mode if it supports it and all the producers it depends on
+        also run in batch mode. The rest fall back to processEvent, one event at a time.
+
+        Returns:
+            List of producer names, in execution order
+        """
+        batch_producers = []
+        for name in self.execution_order:
+            producer = self.producers[name]
+            if not producer.supportsBatch():
+                continue
+            upstream = [dep for dep in producer.requiredInputs() if dep in self.producers]
+            if all(dep in batch_producers for dep in upstream):
+                batch_producers.append(name)
+        return batch_producers
+
+    def get_batch_branches(self) -> List[str]:
+        """
+        Get the union of ntuple branches read by the batch producers.
+        """
+        branches = []
+        for name in self.get_batch_producers():
+            for branch in self.producers[name].requiredBranches() or []:
+                if branch not in branches:
+                    branches.append(branch)
+        return branches
+
+    def get_required_branches(self) -> Optional[List[str]]:
+        """
+        Get the union of ntuple branches read by all producers.
+
+        Returns:
+            List of branch names (may contain wildcards), or None if a producer
+            has not declared its branches (requiredBranches returns None)
+        """
+        branches = []
+        undeclared = []
+        for name in self.execution_order:
+            producer_branches = self.producers[name].requiredBranches()
+            if producer_branches is None:
+                undeclared.append(name)
+                continue
+            for branch in producer_branches:
+                if branch not in branches:
+                    branches.append(branch)
+        if undeclared:
+            self.logger.warning(f"Producers {undeclared} do not declare the ntuple branches they read")
+            return None
+        return branches
+
+    def process_batch(self, batch: Any, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run the batch-capable producers over a chunk of events.
+
+        Args:
+            batch: ColumnBatch with the branches from get_batch_branches()
+            params: Additional parameters (like MC flag, dataset name)
+
+        Returns:
+            Dictionary mapping producer names to their batch outputs
+        """
+        results = {"gen2ntuple": batch}
+        batch_outputs = {}
+        for name in self.get_batch_producers():
+            producer = self.producers[name]
+            producer_start_time = time.perf_counter_ns()
+            try:
+                batch_outputs[name] = producer.processBatch(results, params)
+            except Exception as e:
+                self.logger.error(f"Error in producer '{name}' (batch mode): {e}\n"+str(traceback.format_exc()))
+                self.producer_statistics[name]["num_errors"] += 1
+                sys.exit(1)
+            results[name] = batch_outputs[name]
+
+            producer_ns = time.perf_counter_ns() - producer_start_time
+            stats = self.producer_statistics[name]
+            stats["total_time"] += producer_ns*1e-9
+            stats["num_calls"] += batch.size
+            stats["average_time"] = stats["total_time"] / max(1, stats["num_calls"])
+            if self.profiler is not None:
+                self.profiler.add('producer_batches', name, producer_ns)
+
+        return batch_outputs
+
+    def process_batch_entry(self, event_data: Dict[str, Any], params: Dict[str, Any],
+                            batch_outputs: Dict[str, Any], ientry: int) -> Dict[str, Any]:
+        """
+        Finish one event of a chunk processed with process_batch.
+
+        Batch producers copy their result for this event into their output variables.
+        The remaining producers run processEvent as usual, so they can read the outputs
+        of the batch producers.
+
+        Args:
+            event_data: Initial data for the event (the ROOT tree, set to this entry,
+                        if any producer needs it)
+            params: Additional parameters (like event index, MC flag, etc.)
+            batch_outputs: Return value of process_batch for the chunk
+            ientry: Index of the event within the chunk
+
+        Returns:
+            Dictionary with all producer outputs for this event
+        """
+        self.total_events_processed += 1
+        profiler = self.profiler
+        output_cache = self.output_cache
+
+        results = {}
+        results.update(event_data)
+
+        for name in self.execution_order:
+            producer = self.producers[name]
+            if name in batch_outputs:
+                results[name] = producer.storeBatchEntry(batch_outputs[name], ientry)
+                continue
+
+            if output_cache is not None:
+                cached = output_cache.lookup(name, params["event_index"])
+                if cached is not None:
+                    results[name] = cached
+                    self.producer_statistics[name]["num_cache_hits"] += 1
+                    continue
+
+            try:
+                producer_start_time = time.perf_counter_ns()
+                results[name] = producer.processEvent(results, params)
+                if output_cache is not None:
+                    output_cache.record(name, params["event_index"], results[name])
+
+                producer_ns = time.perf_counter_ns() - producer_start_time
+                stats = self.producer_statistics[name]
+                stats["total_time"] += producer_ns*1e-9
+                stats["num_calls"] += 1
+                stats["average_time"] = stats["total_time"] / stats["num_calls"]
+                if profiler is not None:
+                    profiler.add('producers', name, producer_ns)
+            except Exception as e:
+                self.logger.error(f"Error in producer '{name}': {e}\n"+str(traceback.format_exc()))
+                self.producer_statistics[name]["num_errors"] += 1
+                sys.exit(1)
+
+        self.last_outputs = {name: results[name] for name in self.execution_order}
+        return results
+
     def finalize(self) -> None:
         """
         """
@@ -428,6 +682,31 @@ class ProducerManager:
                 self.logger.error(f"finalize() call failed for producer '{name}': {e}")
                 raise
     
+    def get_checkpoint_state(self) -> Dict[str, Any]:
+        """
+        Get the statistics and the accumulated state of every producer, for a checkpoint.
+        """
+        return {
+            'total_events_processed': self.total_events_processed,
+            'producer_statistics': {name: dict(stats) for name, stats in self.producer_statistics.items()},
+            'producer_states': {name: self.producers[name].getCheckpointState() for name in self.execution_order}
+        }
+
+    def restore_checkpoint_state(self, state: Dict[str, Any]) -> None:
+        """
+        Restore the statistics and producer states saved by get_checkpoint_state.
+        Call after prepare_storage.
+        """
+        self.total_events_processed = state['total_events_processed']
+        for name, stats in state['producer_statistics'].items():
+            self.producer_statistics[name].update(stats)
+        for name, producer_state in state['producer_states'].items():
+            if name not in self.producers:
+                raise ValueError(f"Checkpoint has the state of producer '{name}', which is not configured")
+            if producer_state is not None:
+                self.producers[name].restoreCheckpointState(producer_state)
+        self.logger.info(f"Restored producer state after {self.total_events_processed} events")
+
     def get_producer_outputs(self) -> Dict[str, Any]:
         """
         Get the outputs from the last processed event.
@@ -0,0 +1,425 @@
+"""
+On-disk cache of producer outputs.
+
+Changing a cut threshold or adding a plot variable means rerunning every producer over
+the whole dataset, although most of them give the same results as before. With the
+cache on, the ProducerManager saves what each producer computed and, on later runs,
+loads it instead of calling processEvent.
+
+For each event a producer
+  - sets the variables bound to its output branches (prepareStorage), and
+  - returns a dictionary read by other producers and by the cuts.
+Both are saved, for blocks of chunk_size consecutive entries, in one .npz file per
+producer and block. A block is saved only if the producer ran on every entry of it
+(e.g. not with lazy_producers for producers that only run on passing events).
+
+Cache files are keyed by:
+  - the input files of the dataset (path, size and modification time)
+  - the dataset name and whether it is MC
+  - the entry range of the block
+  - the producer type, its configuration, the source code of its module and of the
+    lantern_ana modules that module imports (directly or through other modules)
+  - the same for every producer it depends on
+so any change in these makes a new entry. Code outside lantern_ana (e.g. a helper
+library loaded with ctypes, or ROOT) is not part of the key: after changing it,
+clear the cache with ProducerOutputCache.clear() or run_lantern_ana --clear-producer-cache. Files not used for the longest time
+are removed when the cache is larger than max_size_gb.
+
+Producers can be cached if they only write fixed-size branches ("x/F", "x[3]/F") and
+return a dictionary of numbers, and if they do not accumulate anything over events
+(supportsCaching returns True). Others are always run.
+
+Configuration:
+
+    producer_cache:
+      cache_dir: /path/to/cache     # default: {cache dir}/producer_outputs (see lantern_ana.utils.cache)
+      max_size_gb: 50               # default: no limit
+      chunk_size: 10000             # entries per cache file
+      producers: [recoNuVars, flashpred]   # default: every producer that can be cached
+
+Example:
+    cache = ProducerOutputCache(max_size_gb=50)
+    producer_manager.output_cache = cache
+    producer_manager.prepare_storage(output_tree)
+    cache.start_dataset(producer_manager, "mc_bnb", dataset.get_input_files(), dataset.get_num_entries(), True)
+    ... event loop ...
+    cache.finish_dataset()
+"""
+
+import os
+import ast
+import inspect
+import hashlib
+import logging
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+from lantern_ana.utils.cache import get_cache_dir, file_signature, cache_key
+from lantern_ana.io.output_writer import fixed_leaf_layout
+
+# sha1 of the source files of each producer class and of the lantern_ana modules it imports
+_CODE_VERSIONS = {}
+
+# directory of the lantern_ana package
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# types of the values a cached producer can return
+_NUMBER_TYPES = (bool, int, float, np.number, np.bool_)
+
+
+def _module_source_file(module_name: str) -> Optional[str]:
+    """Source file of a lantern_ana module, found without importing it. None for other modules."""
+    parts = module_name.split('.')
+    if parts[0] != 'lantern_ana':
+        return None
+    base = os.path.join(_PACKAGE_DIR, *parts[1:])
+    for path in (base + '.py', os.path.join(base, '__init__.py')):
+        if os.path.isfile(path):
+            return path
+    return None
+
+
+def _module_name(source_file: str) -> str:
+    """Module name of a source file of the lantern_ana package."""
+    relpath = os.path.relpath(os.path.splitext(source_file)[0], os.path.dirname(_PACKAGE_DIR))
+    parts = relpath.split(os.sep)
+    if parts[-1] == '__init__':
+        parts = parts[:-1]
+    return '.'.join(parts)
+
+
+def _imported_source_files(source_file: str) -> List[str]:
+    """Source files of the lantern_ana modules imported anywhere in a source file."""
+    with open(source_file, 'rb') as f:
+        tree = ast.parse(f.read(), filename=source_file)
+    in_package = source_file.startswith(_PACKAGE_DIR + os.sep)
+    package = _module_name(source_file) if in_package else ''
+    if in_package and not source_file.endswith('__init__.py'):
+        package = package.rpartition('.')[0]
+    names = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level > 0:
+                if not in_package:
+                    continue
+                base = '.'.join(package.split('.')[:len(package.split('.'))-node.level+1])
+                module = base + '.' + node.module if node.module else base
+            else:
+                module = node.module
+            names.append(module)
+            # 'from package import module'
+            names.extend(module + '.' + alias.name for alias in node.names)
+    files = [_module_source_file(name) for name in names]
+    return [path for path in files if path is not None]
+
+
+def producer_code_version(producer: Any) -> str:
+    """
+    Hash of the source file that defines the class of a producer and of the
+    lantern_ana modules it imports, directly or through other lantern_ana modules.
+    """
+    cls = type(producer)
+    if cls not in _CODE_VERSIONS:
+        try:
+            source_file = os.path.abspath(inspect.getsourcefile(cls))
+        except TypeError:
+            source_file = None
+        if source_file is None or not os.path.isfile(source_file):
+            # no source file: use the class name only
+            _CODE_VERSIONS[cls] = cls.__module__ + "." + cls.__qualname__
+            return _CODE_VERSIONS[cls]
+
+        # the producer's file first, then the lantern_ana files it needs, in a fixed order
+        files = [source_file]
+        seen = {source_file}
+        ifile = 0
+        while ifile < len(files):
+            try:
+                imported = _imported_source_files(files[ifile])
+            except (OSError, SyntaxError):
+                imported = []
+            for path in imported:
+                if path not in seen:
+                    seen.add(path)
+                    files.append(path)
+            ifile += 1
+        sha = hashlib.sha1()
+        for path in [source_file] + sorted(files[1:]):
+            with open(path, 'rb') as f:
+                sha.update(os.path.relpath(path, _PACKAGE_DIR).encode('utf-8'))
+                sha.update(f.read())
+        _CODE_VERSIONS[cls] = sha.hexdigest()
+    return _CODE_VERSIONS[cls]
+
+
+class StorageRecorder:
+    """
+    Given to a producer's prepareStorage instead of the output tree, to find the
+    buffers bound to its branches. Other attributes are looked up on the output tree.
+    """
+
+    def __init__(self, output: Any):
+        self.output = output
+        # (branch name, NumPy view of the buffer, number of values)
+        self.columns: List[tuple] = []
+        self.unsupported: List[str] = []
+
+    def Branch(self, name: str, buffer: Any, *args):
+        branch = self.output.Branch(name, buffer, *args)
+        layout = fixed_leaf_layout(args[0]) if len(args) >= 1 else None
+        view = None
+        if layout is not None:
+            dtype, count = layout
+            try:
+                view = np.frombuffer(buffer, dtype=dtype, count=count)
+            except (TypeError, ValueError):
+                view = None
+        if view is not None:
+            self.columns.append((name, view, count))
+        else:
+            self.unsupported.append(name)
+        return branch
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.output, name)
+
+
+class ProducerOutputCache:
+    """
+    Saves and loads the per-event outputs of producers (see the module documentation).
+    """
+
+    def __init__(self, cache_dir: Optional[str] = None, max_size_gb: Optional[float] = None,
+                 chunk_size: int = 10000, producers: Optional[List[str]] = None,
+                 logger: Optional[logging.Logger] = None):
+        """
+        Args:
+            cache_dir: Directory of the cache files (default: 'producer_outputs' in the lantern_ana cache directory)
+            max_size_gb: Remove the least recently used files when the cache is larger than this
+            chunk_size: Number of consecutive entries in each cache file
+            producers: Names of the producers to cache (default: all that can be)
+        """
+        self.cache_dir = cache_dir if cache_dir is not None else get_cache_dir('producer_outputs')
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.max_size_bytes = int(max_size_gb*1e9) if max_size_gb is not None else None
+        self.chunk_size = chunk_size
+        self.producers = producers
+        self.logger = logger if logger is not None else logging.getLogger("ProducerOutputCache")
+
+        # producer name -> output branch columns, from prepare_storage
+        self._storage: Dict[str, List[tuple]] = {}
+        self._uncacheable: Dict[str, str] = {}
+        # per dataset
+        self._keys: Dict[str, str] = {}
+        self._num_entries = 0
+        self._loaded: Dict[str, tuple] = {}      # name -> (chunk index, loaded chunk or None)
+        self._recording: Dict[str, Dict[str, Any]] = {}
+        self.entries_loaded = {}
+        self.entries_saved = {}
+
+    def register_storage(self, name: str, producer: Any, recorder: StorageRecorder):
+        """Remember the output buffers of a producer, after its prepareStorage ran with recorder."""
+        self._uncacheable.pop(name, None)
+        if self.producers is not None and name not in self.producers:
+            self._uncacheable[name] = "not in the producers to cache"
+        elif not producer.supportsCaching():
+            self._uncacheable[name] = "it does not support caching"
+        elif recorder.unsupported:
+            self._uncacheable[name] = f"branches {recorder.unsupported} do not have a fixed size"
+        self._storage[name] = recorder.columns
+
+    def start_dataset(self, producer_manager: Any, dataset_name: str, input_files: List[str],
+                      num_entries: int, ismc: bool):
+        """
+        Compute the cache keys of the producers for a dataset. Call after prepare_storage.
+        """
+        self._keys = {}
+        self._loaded = {}
+        self._recording = {}
+        self.entries_loaded = {}
+        self.entries_saved = {}
+        self._num_entries = num_entries
+        if len(input_files) == 0:
+            self.logger.info(f"Producer cache: dataset {dataset_name} does not list its input files. Not caching.")
+            return
+        dataset_key = [file_signature(f) for f in input_files] + [dataset_name, bool(ismc)]
+        for name in producer_manager.execution_order:
+            producer = producer_manager.producers[name]
+            upstream = [self._keys.get(dep, dep) for dep in producer.requiredInputs()
+                        if dep in producer_manager.producers]
+            self._keys[name] = cache_key(dataset_key, type(producer).__name__, producer.config,
+                                         producer_code_version(producer), upstream)
+        for name, reason in self._uncacheable.items():
+            self.logger.info(f"Producer cache: not caching '{name}': {reason}")
+        self.evict()
+
+    def _chunk_path(self, name: str, ichunk: int) -> str:
+        start = ichunk*self.chunk_size
+        stop = min(start+self.chunk_size, self._num_entries)
+        return os.path.join(self.cache_dir, f"{cache_key(self._keys[name], start, stop)}.npz")
+
+    def _cacheable(self, name: str) -> bool:
+        return name in self._keys and name not in self._uncacheable
+
+    def lookup(self, name: str, entry: int) -> Optional[Dict[str, Any]]:
+        """
+        If the outputs of a producer for this entry are cached, set its output variables
+        and return what processEvent returned. Otherwise return None.
+        """
+        if not self._cacheable(name):
+            return None
+        ichunk = entry // self.chunk_size
+        loaded = self._loaded.get(name)
+        if loaded is None or loaded[0] != ichunk:
+            loaded = (ichunk, self._load_chunk(name, ichunk))
+            self._loaded[name] = loaded
+        chunk = loaded[1]
+        if chunk is None:
+            return None
+        i = entry - ichunk*self.chunk_size
+        for (_, view, _), values in zip(self._storage[name], chunk['branches']):
+            view[:] = values[i]
+        self.entries_loaded[name] = self.entries_loaded.get(name, 0) + 1
+        return {key: values[i].item() for key, values, mask in chunk['outputs'] if mask[i]}
+
+    def _load_chunk(self, name: str, ichunk: int) -> Optional[Dict[str, Any]]:
+        path = self._chunk_path(name, ichunk)
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                branch_names = [str(key) for key in data['branch_names']]
+                if branch_names != [column[0] for column in self._storage[name]]:
+                    return None
+                output_names = [str(key) for key in data['output_names']]
+                chunk = {
+                    'branches': [data[f'b{i}'] for i in range(len(branch_names))],
+                    'outputs': [(key, data[f'o{i}'], data[f'm{i}']) for i, key in enumerate(output_names)]
+                }
+        except (OSError, ValueError, KeyError) as e:
+            self.logger.warning(f"Producer cache: could not read {path}: {e}")
+            return None
+        # mark as recently used, for the eviction
+        os.utime(path)
+        return chunk
+
+    def record(self, name: str, entry: int, result: Any):
+        """
+        Add the outputs of a producer for one entry (after processEvent).
+        A block is written once the producer ran on all of its entries, in order.
+        """
+        if not self._cacheable(name):
+            return
+        if not isinstance(result, dict) or not all(isinstance(v, _NUMBER_TYPES) for v in result.values()):
+            self._uncacheable[name] = "processEvent does not return a dictionary of numbers"
+            self._recording.pop(name, None)
+            self.logger.info(f"Producer cache: not caching '{name}': {self._uncacheable[name]}")
+            return
+        ichunk = entry // self.chunk_size
+        start = ichunk*self.chunk_size
+        stop = min(start+self.chunk_size, self._num_entries)
+        recording = self._recording.get(name)
+        if entry == start:
+            recording = {
+                'chunk': ichunk,
+                'next_entry': start,
+                'branches': [np.zeros((stop-start, count), dtype=view.dtype) for _, view, count in self._storage[name]],
+                'outputs': []
+            }
+            self._recording[name] = recording
+        if recording is None or recording['chunk'] != ichunk or recording['next_entry'] != entry:
+            # entries were skipped: this block cannot be saved
+            self._recording.pop(name, None)
+            return
+        i = entry - start
+        for (_, view, _), values in zip(self._storage[name], recording['branches']):
+            values[i] = view
+        recording['outputs'].append(result)
+        recording['next_entry'] = entry+1
+        if entry+1 == stop:
+            self._save_chunk(name, recording)
+            self._recording.pop(name, None)
+
+    def _save_chunk(self, name: str, recording: Dict[str, Any]):
+        arrays = {
+            'branch_names': np.array([column[0] for column in self._storage[name]], dtype=str),
+        }
+        for i, values in enumerate(recording['branches']):
+            arrays[f'b{i}'] = values
+        output_names = []
+        for result in recording['outputs']:
+            for key in result:
+                if key not in output_names:
+                    output_names.append(key)
+        nentries = len(recording['outputs'])
+        for i, key in enumerate(output_names):
+            mask = np.array([key in result for result in recording['outputs']], dtype=bool)
+            present = np.asarray([result[key] for result in recording['outputs'] if key in result])
+            values = np.zeros(nentries, dtype=present.dtype)
+            values[mask] = present
+            arrays[f'o{i}'] = values
+            arrays[f'm{i}'] = mask
+        arrays['output_names'] = np.array(output_names, dtype=str)
+
+        path = self._chunk_path(name, recording['chunk'])
+        tmp_path = f"{path[:-len('.npz')]}.tmp{os.getpid()}.npz"
+        try:
+            np.savez(tmp_path, **arrays)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.warning(f"Producer cache: could not write {path}: {e}")
+        self.entries_saved[name] = self.entries_saved.get(name, 0) + nentries
+
+    def finish_dataset(self):
+        """Report the entries loaded and saved for each producer, and apply the size limit."""
+        for name in self._keys:
+            if self._cacheable(name):
+                self.logger.info(f"Producer cache: '{name}': {self.entries_loaded.get(name, 0)} entries loaded, "
+                                 f"{self.entries_saved.get(name, 0)} entries saved")
+        self._loaded = {}
+        self._recording = {}
+        self.evict()
+
+    def size_bytes(self) -> int:
+        """Total size of the cache files."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.cache_dir)
+                   if entry.is_file() and entry.name.endswith('.npz'))
+
+    def clear(self):
+        """Remove all the cache files."""
+        nremoved = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.npz'):
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    continue
+                nremoved += 1
+        self.logger.info(f"Producer cache: removed {nremoved} files from {self.cache_dir}")
+
+    def evict(self):
+        """Remove the least recently used cache files until the cache is below max_size_gb."""
+        if self.max_size_bytes is None:
+            return
+        files = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.npz'):
+                stat = entry.stat()
+                files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_size_bytes:
+            return
+        nremoved = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_size_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            nremoved += 1
+        self.logger.info(f"Producer cache: removed {nremoved} least recently used files "
+                         f"({total/1e9:.2f} GB left)")
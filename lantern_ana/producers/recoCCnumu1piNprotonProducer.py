@@ -304,6 +304,12 @@ class recoCCnumu1piNprotonProducer(ProducerBaseClass):
         
         return required_inputs
 
+    def requiredBranches(self) -> List[str]:
+        return ['foundVertex', 'vtxContainment', 'recoNuE', 'nTracks', 'trackIsSecondary',
+                'trackPID', 'trackRecoE', 'trackStartDirX', 'trackStartDirY',
+                'trackStartDirZ', 'nShowers', 'showerIsSecondary', 'showerPID',
+                'showerRecoE', 'showerStartDirX', 'showerStartDirY', 'showerStartDirZ']
+
     def _calc_hadronic_invariant_mass( self, ntuple, proton_idx, pion_idx ):
 
       pdir_p  = np.zeros(3)
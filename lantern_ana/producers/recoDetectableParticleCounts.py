@@ -48,6 +48,9 @@ class recoDetectableParticleCountsProducer(ProducerBaseClass):
 
         return ["gen2ntuple"]
     
+    def requiredBranches(self):
+        return ['nTracks', 'trackPID', 'trackRecoE', 'nShowers', 'showerPID', 'showerRecoE']
+
     def processEvent(self, data, params):
         """Get the energy and x, y, z coordinates of each photon."""
         ntuple = data["gen2ntuple"]
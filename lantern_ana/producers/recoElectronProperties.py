@@ -3,7 +3,7 @@ from typing import Dict, Any, List
 from array import array
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
-from lantern_ana.utils.get_primary_electron_candidates import get_primary_electron_candidates
+from lantern_ana.utils.get_primary_electron_candidates import get_primary_electron_candidates, ELECTRON_CANDIDATE_BRANCHES
 from math import exp
 import ROOT
 
@@ -66,6 +66,13 @@ class RecoElectronPropertiesProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self) -> List[str]:
+        return ELECTRON_CANDIDATE_BRANCHES+['foundVertex', 'nTrueSimParts',
+                                             'trueSimPartTID', 'trueSimPartProcess',
+                                             'showerTrueTID', 'showerTruePID',
+                                             'showerTrueComp', 'trackTrueTID',
+                                             'trackTruePID', 'trackTrueComp']
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate electron candidate properties."""
         ntuple = data["gen2ntuple"]
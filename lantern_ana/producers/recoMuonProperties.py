@@ -55,6 +55,13 @@ class MuonPropertiesProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self):
+        return ['nTracks', 'trackIsSecondary', 'trackClassified', 'trackPID', 'trackMuScore',
+                'trackRecoE', 'trackStartDirX', 'trackStartDirY', 'trackStartDirZ',
+                'trackEndPosX', 'trackEndPosY', 'trackEndPosZ', 'trackTrueTID',
+                'trackTruePID', 'trackTrueComp', 'nTrueSimParts', 'trueSimPartTID',
+                'trueSimPartProcess']
+
     def processEvent(self, data, params):
         """Extract muon properties."""
         ntuple = data["gen2ntuple"]
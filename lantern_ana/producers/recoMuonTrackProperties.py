@@ -46,6 +46,10 @@ class RecoMuonTrackPropertiesProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self) -> List[str]:
+        return ['foundVertex', 'nTracks', 'trackIsSecondary', 'trackClassified', 'trackPID',
+                'trackMuScore', 'trackCharge', 'trackRecoE']
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate muon track properties."""
         ntuple = data["gen2ntuple"]
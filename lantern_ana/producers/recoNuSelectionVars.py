@@ -96,6 +96,9 @@ class RecoNuSelectionVariablesProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple", "recoElectron", "recoMuonTrack"]  # We need the ntuple and producer data
     
+    def requiredBranches(self) -> List[str]:
+        return []
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """Process an event by calculating track energy statistics."""
         # Get input data from producers
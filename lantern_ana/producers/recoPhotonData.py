@@ -93,6 +93,15 @@ class recoPhotonDataProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self):
+        return ['nTracks', 'trackIsSecondary', 'trackPID', 'trackRecoE', 'trackComp',
+                'trackPurity', 'trackFromChargedScore', 'trackStartPosX', 'trackStartPosY',
+                'trackStartPosZ', 'trackTruePID', 'nShowers', 'showerIsSecondary',
+                'showerPID', 'showerRecoE', 'showerComp', 'showerPurity',
+                'showerFromChargedScore', 'showerPhScore', 'showerStartPosX',
+                'showerStartPosY', 'showerStartPosZ', 'showerTrueComp', 'showerTruePID',
+                'showerTruePurity']
+
     def interpretPID(self,ntuplepid):
         """
         output the following categories
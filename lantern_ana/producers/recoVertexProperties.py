@@ -67,6 +67,13 @@ class VertexPropertiesProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self) -> List[str]:
+        # older ntuples do not have the flash-matching branches (fracerrPE, ...): they are skipped
+        return ['foundVertex', 'vtxIsFiducial', 'vtxX', 'vtxY', 'vtxZ', 'vtxScore',
+                'vtxFracHitsOnCosmic', 'recoNuE', 'fracRecoOuttimePixels',
+                'fracUnrecoIntimePixels', 'fracerrPE', 'sinkhorn_div', 'predictedPEtotal',
+                'observedPEtotal', 'vtxKPscore', 'vtxKPtype', 'vtxDistToTrue']
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate vertex properties."""
         ntuple = data["gen2ntuple"]
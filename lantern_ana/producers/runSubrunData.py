@@ -36,6 +36,9 @@ class runSubrunProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self):
+        return ['run', 'subrun', 'event']
+
     def processEvent(self, data, params):        
         """Get the energy and x, y, z coordinates of each photon."""
         ntuple = data["gen2ntuple"]
@@ -5,7 +5,7 @@ from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
 from lantern_ana.utils.get_primary_electron_candidates import get_primary_electron_candidates
 from lantern_ana.cuts.fiducial_cuts import fiducial_cut
-from lantern_ana.utils.true_particle_counts import get_true_primary_particle_counts 
+from lantern_ana.utils.true_particle_counts import get_true_primary_particle_counts, TRUE_PARTICLE_COUNT_BRANCHES
 from lantern_ana.utils.fiducial_volume import dwall
 from math import exp
 import ROOT
@@ -67,6 +67,9 @@ class signalDefNumuCCInclusive(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self) -> List[str]:
+        return ['trueNuCCNC', 'trueNuPDG', 'trueVtxX', 'trueVtxY', 'trueVtxZ']+TRUE_PARTICLE_COUNT_BRANCHES
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """Determine if event is signal nue CC inclusive."""
         ntuple = data["gen2ntuple"]
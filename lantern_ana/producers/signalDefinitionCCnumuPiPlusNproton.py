@@ -4,8 +4,8 @@ from array import array
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
 from lantern_ana.utils.get_primary_electron_candidates import get_primary_electron_candidates
-from lantern_ana.cuts.fiducial_cuts import fiducial_cut
-from lantern_ana.utils.true_particle_counts import get_true_primary_particle_counts 
+from lantern_ana.cuts.fiducial_cuts import fiducial_cut, FIDUCIAL_CUT_BRANCHES
+from lantern_ana.utils.true_particle_counts import get_true_primary_particle_counts, TRUE_PARTICLE_COUNT_BRANCHES
 from lantern_ana.utils.kinematics import KE_from_fourmom
 from lantern_ana.utils import transverse_kinematic_imbalance as tki
 import math
@@ -115,6 +115,11 @@ class signalDefinitionCCnumuPiPlusNProton(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self) -> List[str]:
+        return (['trueNuCCNC', 'trueNuPDG', 'trueNuE', 'trueSimPartContained', 'trueSimPartE',
+                 'trueSimPartPx', 'trueSimPartPy', 'trueSimPartPz']
+                + FIDUCIAL_CUT_BRANCHES + TRUE_PARTICLE_COUNT_BRANCHES)
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """Determine if event is signal numu CC charged pion + N proton"""
         ntuple = data["gen2ntuple"]
@@ -3,6 +3,7 @@ import ROOT
 from array import array
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
+from lantern_ana.io.checkpoint import histogram_state, restore_histogram_state
 
 @register
 class StackedHistProducer(ProducerBaseClass):
@@ -72,6 +73,14 @@ class StackedHistProducer(ProducerBaseClass):
     def prepareStorage(self, output):
         """No tree branches needed for histogram producer."""
         pass
+
+    def supportsSharding(self):
+        """Histograms go to a separate file (output_path), which the shard merging does not handle."""
+        return False
+
+    def supportsCaching(self):
+        """Fills histograms in processEvent."""
+        return False
     
     def setDefaultValues(self):
         return super().setDefaultValues()
@@ -87,6 +96,9 @@ class StackedHistProducer(ProducerBaseClass):
             inputs.append( self.weight_name )
         return inputs
     
+    def requiredBranches(self):
+        return []
+
     def processEvent(self, data, params):
         """Fill histograms with event data."""
         # Extract data
@@ -124,6 +136,14 @@ class StackedHistProducer(ProducerBaseClass):
             self.histograms[self.hname_uncat].Fill(plotvalue)
         
         return {'filledhist':True,"foundcat": False}
+
+    def getCheckpointState(self):
+        """Contents of the histograms filled so far."""
+        return {name: histogram_state(hist) for name, hist in self.histograms.items()}
+
+    def restoreCheckpointState(self, state):
+        for name, hist_state in state.items():
+            restore_histogram_state(self.histograms[name], hist_state)
     
     def finalize(self):
         """Save histograms to file."""
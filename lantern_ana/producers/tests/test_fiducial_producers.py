@@ -0,0 +1,64 @@
+"""
+Tests of the producers using the array fiducial helpers: processBatch (dwall_array over a chunk)
+must give the same outputs as processEvent event by event, on a synthetic ntuple.
+"""
+
+import numpy as np
+import pytest
+
+ROOT = pytest.importorskip("ROOT")
+
+from lantern_ana.benchmarks.synthetic_ntuple import write_synthetic_ntuple
+from lantern_ana.io.columnar import read_column_batches
+from lantern_ana.producers.FVtagProducer import FVtagProducer
+from lantern_ana.producers.trueVertexProperties import TrueVertexPropertiesProducer
+
+NEVENTS = 50
+
+
+@pytest.fixture(scope="module")
+def ntuple_path(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("fiducial") / "ntuple.root")
+    write_synthetic_ntuple(path, num_events=NEVENTS, seed=5)
+    return path
+
+
+def event_and_batch_outputs(producer_class, config, ntuple_path, ismc):
+    params = {'ismc': ismc}
+    chain = ROOT.TChain("EventTree")
+    chain.Add(ntuple_path)
+    producer = producer_class("prod", config)
+    per_event = []
+    for ientry in range(chain.GetEntries()):
+        chain.GetEntry(ientry)
+        per_event.append(dict(producer.processEvent({'gen2ntuple': chain}, params)))
+
+    batch_producer = producer_class("prod", config)
+    per_batch = []
+    for batch in read_column_batches(chain, batch_producer.requiredBranches(), chunk_size=16):
+        outputs = batch_producer.processBatch({'gen2ntuple': batch}, params)
+        per_batch += [dict(batch_producer.storeBatchEntry(outputs, i)) for i in range(batch.size)]
+    return per_event, per_batch
+
+
+def assert_outputs_equal(per_event, per_batch):
+    assert len(per_event) == len(per_batch) == NEVENTS
+    for name in per_event[0]:
+        np.testing.assert_allclose([out[name] for out in per_batch], [out[name] for out in per_event],
+                                   rtol=1e-6, err_msg=name)
+
+
+@pytest.mark.parametrize("fiducial_distance", [0.0, 17.0, 50.0])
+def test_fvtag_batch_matches_events(ntuple_path, fiducial_distance):
+    per_event, per_batch = event_and_batch_outputs(FVtagProducer, {'fiducial_distance': fiducial_distance},
+                                                   ntuple_path, ismc=True)
+    assert_outputs_equal(per_event, per_batch)
+    isinfv = [out['isinfv'] for out in per_event]
+    if fiducial_distance == 17.0:
+        assert 0 < sum(isinfv) < NEVENTS
+
+
+@pytest.mark.parametrize("ismc", [True, False])
+def test_true_vertex_batch_matches_events(ntuple_path, ismc):
+    per_event, per_batch = event_and_batch_outputs(TrueVertexPropertiesProducer, {}, ntuple_path, ismc)
+    assert_outputs_equal(per_event, per_batch)
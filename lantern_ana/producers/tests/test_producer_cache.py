@@ -0,0 +1,244 @@
+"""
+Tests of ProducerOutputCache: outputs saved by one job are loaded by the next, a change of
+the configuration or of the code of a producer, or of a producer it depends on, makes new
+cache entries, and a block the producer did not run on entirely is never saved.
+"""
+
+import importlib.util
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from lantern_ana.producers import producer_cache
+from lantern_ana.producers.producer_cache import ProducerOutputCache, StorageRecorder
+
+NENTRIES = 25
+CHUNK_SIZE = 10
+
+# producers of the tests, written to files so that their code can be changed
+UPSTREAM_SOURCE = '''
+from array import array
+from lantern_ana.producers.producerBaseClass import ProducerBaseClass
+
+
+class CacheTestUpstream(ProducerBaseClass):
+    """value = scale*entry"""
+
+    def __init__(self, name, config):
+        super().__init__(name, config)
+        self.value = array('f', [0.0])
+
+    def prepareStorage(self, output):
+        output.Branch(f"{self.name}_value", self.value, f"{self.name}_value/F")
+
+    def setDefaultValues(self):
+        self.value[0] = -1.0
+
+    def processEvent(self, data, params):
+        self.value[0] = self.config.get('scale', 1.0)*params['event_index'] + OFFSET
+        return {'value': self.value[0]}
+
+    def finalize(self):
+        return
+'''
+
+DOWNSTREAM_SOURCE = '''
+from array import array
+from lantern_ana.producers.producerBaseClass import ProducerBaseClass
+
+
+class CacheTestDownstream(ProducerBaseClass):
+    """twice the value of the upstream producer"""
+
+    def __init__(self, name, config):
+        super().__init__(name, config)
+        self.doubled = array('f', [0.0])
+
+    def prepareStorage(self, output):
+        output.Branch(f"{self.name}_doubled", self.doubled, f"{self.name}_doubled/F")
+
+    def setDefaultValues(self):
+        self.doubled[0] = -1.0
+
+    def requiredInputs(self):
+        return ['up']
+
+    def processEvent(self, data, params):
+        self.doubled[0] = 2.0*data['up']['value']
+        return {'doubled': self.doubled[0], 'positive': self.doubled[0] > 0}
+
+    def finalize(self):
+        return
+'''
+
+
+class FakeOutput:
+    """Output tree that only accepts branches."""
+
+    def Branch(self, name, buffer, *args):
+        return None
+
+
+def load_module(tmp_path, monkeypatch, module_name, source):
+    """Write a module and import it."""
+    path = tmp_path / f"{module_name}.py"
+    path.write_text(source)
+    spec = importlib.util.spec_from_file_location(module_name, str(path))
+    module = importlib.util.module_from_spec(spec)
+    # the cache finds the source file of a producer class through its module
+    monkeypatch.setitem(sys.modules, module_name, module)
+    spec.loader.exec_module(module)
+    return module
+
+
+def load_producers(tmp_path, monkeypatch, offset=0.0):
+    """The producer classes, the upstream one adding OFFSET to its value."""
+    upstream = load_module(tmp_path, monkeypatch, "cache_test_upstream",
+                           UPSTREAM_SOURCE.replace("OFFSET", repr(offset)))
+    downstream = load_module(tmp_path, monkeypatch, "cache_test_downstream", DOWNSTREAM_SOURCE)
+    return SimpleNamespace(CacheTestUpstream=upstream.CacheTestUpstream,
+                           CacheTestDownstream=downstream.CacheTestDownstream)
+
+
+def make_job(module, cache_dir, input_file, up_config=None, down_config=None):
+    """Producers and cache of one job, started on the dataset."""
+    producers = {
+        'up': module.CacheTestUpstream('up', up_config or {}),
+        'down': module.CacheTestDownstream('down', down_config or {}),
+    }
+    manager = SimpleNamespace(producers=producers, execution_order=['up', 'down'])
+    cache = ProducerOutputCache(cache_dir=str(cache_dir), chunk_size=CHUNK_SIZE)
+    for name, producer in producers.items():
+        recorder = StorageRecorder(FakeOutput())
+        producer.prepareStorage(recorder)
+        cache.register_storage(name, producer, recorder)
+    cache.start_dataset(manager, "synthetic", [input_file], NENTRIES, True)
+    return manager, cache
+
+
+def run_job(manager, cache, entries=range(NENTRIES)):
+    """Run the producers like the ProducerManager does. Returns the outputs and the producers that ran."""
+    outputs = []
+    ran = {name: 0 for name in manager.execution_order}
+    for entry in entries:
+        results = {}
+        params = {'event_index': entry}
+        for name in manager.execution_order:
+            producer = manager.producers[name]
+            cached = cache.lookup(name, entry)
+            if cached is None:
+                cached = producer.processEvent(results, params)
+                cache.record(name, entry, cached)
+                ran[name] += 1
+            results[name] = cached
+        outputs.append((results, float(manager.producers['up'].value[0]),
+                        float(manager.producers['down'].doubled[0])))
+    cache.finish_dataset()
+    return outputs, ran
+
+
+@pytest.fixture
+def input_file(tmp_path):
+    path = tmp_path / "input.root"
+    path.write_bytes(b"synthetic input")
+    return str(path)
+
+
+@pytest.fixture(autouse=True)
+def clear_code_versions(monkeypatch):
+    # code versions are computed once per process: each test starts like a new job
+    monkeypatch.setattr(producer_cache, '_CODE_VERSIONS', {})
+
+
+def test_second_job_loads_outputs(tmp_path, monkeypatch, input_file):
+    module = load_producers(tmp_path, monkeypatch)
+    first_outputs, ran = run_job(*make_job(module, tmp_path / "cache", input_file))
+    assert ran == {'up': NENTRIES, 'down': NENTRIES}
+    assert len(os.listdir(tmp_path / "cache")) == 2*3
+
+    manager, cache = make_job(module, tmp_path / "cache", input_file)
+    outputs, ran = run_job(manager, cache)
+    assert ran == {'up': 0, 'down': 0}
+    assert cache.entries_loaded == {'up': NENTRIES, 'down': NENTRIES}
+    assert outputs == first_outputs
+    assert all(isinstance(results['down']['positive'], bool) for results, _, _ in outputs)
+
+
+@pytest.mark.parametrize("changed, expected_ran", [
+    ({'down_config': {'unused': 1}}, {'up': 0, 'down': NENTRIES}),
+    ({'up_config': {'scale': 3.0}}, {'up': NENTRIES, 'down': NENTRIES}),
+])
+def test_config_change_misses(tmp_path, monkeypatch, input_file, changed, expected_ran):
+    module = load_producers(tmp_path, monkeypatch)
+    run_job(*make_job(module, tmp_path / "cache", input_file))
+
+    manager, cache = make_job(module, tmp_path / "cache", input_file, **changed)
+    outputs, ran = run_job(manager, cache)
+    assert ran == expected_ran
+    scale = changed.get('up_config', {}).get('scale', 1.0)
+    for entry, (results, up_value, down_value) in enumerate(outputs):
+        assert up_value == results['up']['value'] == scale*entry
+        assert down_value == results['down']['doubled'] == 2.0*scale*entry
+
+
+def test_upstream_code_change_misses(tmp_path, monkeypatch, input_file):
+    module = load_producers(tmp_path, monkeypatch)
+    run_job(*make_job(module, tmp_path / "cache", input_file))
+
+    # the next job runs with a changed upstream producer: the downstream one must not be loaded
+    # from the cache either, although its own code and configuration are the same
+    producer_cache._CODE_VERSIONS.clear()
+    changed = load_producers(tmp_path, monkeypatch, offset=0.5)
+    manager, cache = make_job(changed, tmp_path / "cache", input_file)
+    outputs, ran = run_job(manager, cache)
+    assert ran == {'up': NENTRIES, 'down': NENTRIES}
+    for entry, (results, up_value, down_value) in enumerate(outputs):
+        assert up_value == entry + 0.5
+        assert down_value == results['down']['doubled'] == 2.0*(entry + 0.5)
+
+
+def test_input_change_misses(tmp_path, monkeypatch, input_file):
+    module = load_producers(tmp_path, monkeypatch)
+    run_job(*make_job(module, tmp_path / "cache", input_file))
+    with open(input_file, 'ab') as f:
+        f.write(b" with more events")
+    _, ran = run_job(*make_job(module, tmp_path / "cache", input_file))
+    assert ran == {'up': NENTRIES, 'down': NENTRIES}
+
+
+def test_partial_blocks_are_not_saved(tmp_path, monkeypatch, input_file):
+    module = load_producers(tmp_path, monkeypatch)
+    manager, cache = make_job(module, tmp_path / "cache", input_file)
+    # like lazy_producers: entry 4 of the first block is skipped, the second block starts
+    # at entry 12 and the job stops at entry 23, before the end of the last block
+    entries = [e for e in range(0, 10) if e != 4] + list(range(12, 23))
+    run_job(manager, cache, entries)
+    assert cache.entries_saved == {}
+    assert os.listdir(tmp_path / "cache") == []
+
+    # only the block run entirely is saved
+    manager, cache = make_job(module, tmp_path / "cache", input_file)
+    run_job(manager, cache, [e for e in range(0, 10) if e != 4] + list(range(10, 20)))
+    assert cache.entries_saved == {'up': CHUNK_SIZE, 'down': CHUNK_SIZE}
+
+    manager, cache = make_job(module, tmp_path / "cache", input_file)
+    outputs, ran = run_job(manager, cache)
+    assert ran == {'up': NENTRIES - CHUNK_SIZE, 'down': NENTRIES - CHUNK_SIZE}
+    assert cache.entries_loaded == {'up': CHUNK_SIZE, 'down': CHUNK_SIZE}
+    for entry, (results, up_value, down_value) in enumerate(outputs):
+        assert up_value == results['up']['value'] == entry
+        assert down_value == 2.0*entry
+
+
+def test_non_numeric_outputs_are_not_saved(tmp_path, monkeypatch, input_file):
+    # a producer that returns something else than a dictionary of numbers is not cached
+    module = load_producers(tmp_path, monkeypatch)
+    manager, cache = make_job(module, tmp_path / "cache", input_file)
+    for entry in range(CHUNK_SIZE):
+        cache.record('up', entry, {'value': float(entry)} if entry < 5 else {'value': "text"})
+    cache.finish_dataset()
+    assert cache.entries_saved == {}
+    assert cache.lookup('up', 0) is None
+    assert os.listdir(tmp_path / "cache") == []
@@ -48,6 +48,9 @@ class TrackEnergyProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]  # We only need the gen2ntuple tree
     
+    def requiredBranches(self) -> List[str]:
+        return ['foundVertex', 'nTracks', 'trackRecoE']
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """Process an event by calculating track energy statistics."""
         # Get gen2ntuple from input data
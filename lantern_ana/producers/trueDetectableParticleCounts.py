@@ -44,6 +44,9 @@ class trueDetectableParticleCountsProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self):
+        return ['nTrueSimParts', 'trueSimPartPDG', 'trueSimPartPx', 'trueSimPartPy', 'trueSimPartPz', 'trueSimPartE']
+
     def processEvent(self, data, params):
         """Get the energy and x, y, z coordinates of each photon."""
         ntuple = data["gen2ntuple"]
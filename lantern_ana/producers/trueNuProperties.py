@@ -30,6 +30,9 @@ class trueNuPropertiesProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self):
+        return ['trueNuE']
+
     def processEvent(self, data, params):
         """Calculate total visible energy from all primary tracks and showers."""
         self.setDefaultValues()
@@ -5,7 +5,7 @@ from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
 from lantern_ana.tags.tag_factory import TagFactory
 from array import array
-from lantern_ana.utils.fiducial_volume import dwall
+from lantern_ana.utils.fiducial_volume import dwall_array
 import sys
 
 @register
@@ -61,6 +61,13 @@ class truePhotonDataProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
 
+    def requiredBranches(self):
+        return ['foundVertex', 'vtxX', 'vtxY', 'vtxZ', 'trueVtxX', 'trueVtxY', 'trueVtxZ',
+                'nTrueSimParts', 'trueSimPartPDG', 'trueSimPartPx', 'trueSimPartPy',
+                'trueSimPartPz', 'trueSimPartEDepX', 'trueSimPartEDepY', 'trueSimPartEDepZ',
+                'trueSimPartPixelSumUplane', 'trueSimPartPixelSumVplane',
+                'trueSimPartPixelSumYplane']
+
     def setDefaultValues(self): #Not clear what to do here?
         self.nTruePhotons[0] = 0
         self.nTrueFiducialPhotons[0] = 0
@@ -118,6 +125,12 @@ class truePhotonDataProducer(ProducerBaseClass):
             tru2vtx_dist = np.sqrt( np.power( (truevtx_pos-recovtx_pos), 2 ).sum() )
             self.recovtxtonuvtx[0] = tru2vtx_dist
 
+        # distance to the TPC walls of the energy deposit of every particle, in one call
+        edep_pos = np.stack([np.asarray(ntuple.trueSimPartEDepX, dtype=np.float64)[:ntuple.nTrueSimParts],
+                             np.asarray(ntuple.trueSimPartEDepY, dtype=np.float64)[:ntuple.nTrueSimParts],
+                             np.asarray(ntuple.trueSimPartEDepZ, dtype=np.float64)[:ntuple.nTrueSimParts]], axis=1)
+        edep_dwall = dwall_array(edep_pos)
+
 
         for i in range(ntuple.nTrueSimParts):
             #Make sure reco thinks we have a photon
@@ -163,7 +176,7 @@ class truePhotonDataProducer(ProducerBaseClass):
 
             if self.MaxPlaneList[numPhotons]>maxEdep:
                 maxEdep = self.MaxPlaneList[numPhotons]
-                self.LeadingEDepDwall[0] = dwall(ntuple.trueSimPartEDepX[i],ntuple.trueSimPartEDepY[i],ntuple.trueSimPartEDepZ[i])
+                self.LeadingEDepDwall[0] = edep_dwall[i]
                 self.EDepSumU[0] = pixelList[0]
                 self.EDepSumV[0] = pixelList[1]
                 self.EDepSumY[0] = pixelList[2]
@@ -51,6 +51,14 @@ class truePhotonEnergyProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
 
+    def requiredBranches(self):
+        return ['nTracks', 'trackRecoE', 'trackComp', 'trackPurity', 'trackTruePID',
+                'trackTruePurity', 'trackTrueTID', 'nShowers', 'showerRecoE', 'showerComp',
+                'showerPurity', 'showerTruePID', 'showerTruePurity', 'showerTrueTID',
+                'showerStartPosX', 'showerStartPosY', 'showerStartPosZ', 'nTrueSimParts',
+                'trueSimPartTID', 'trueSimPartE', 'trueSimPartPixelSumUplane',
+                'trueSimPartPixelSumVplane', 'trueSimPartPixelSumYplane']
+
     def setDefaultValues(self): #Not clear what to do here?
         self.nMatchedPhotons[0] = 0
         self.nMatchedFiducialPhotons[0] = 0
@@ -4,7 +4,7 @@ from array import array
 from typing import Dict, Any, List
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
-from lantern_ana.utils.fiducial_volume import dwall
+from lantern_ana.utils.fiducial_volume import dwall, dwall_array
 
 @register
 class TrueVertexPropertiesProducer(ProducerBaseClass):
@@ -55,6 +55,9 @@ class TrueVertexPropertiesProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self) -> List[str]:
+        return ['trueVtxX', 'trueVtxY', 'trueVtxZ']
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """Calculate true vertex properties."""
         ntuple = data["gen2ntuple"]
@@ -73,6 +76,29 @@ class TrueVertexPropertiesProducer(ProducerBaseClass):
         
         return self._get_results()
     
+    def supportsBatch(self) -> bool:
+        return True
+
+    def processBatch(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
+        """True vertex properties for a chunk of events, with dwall of all the vertices in one call."""
+        batch = data["gen2ntuple"]
+        if not params.get('ismc', False):
+            return {var_name: np.full(batch.size, var_array[0]) for var_name, var_array in self.vertex_vars.items()}
+
+        self.setDefaultValues()
+        outputs = {var_name: np.full(batch.size, var_array[0]) for var_name, var_array in self.vertex_vars.items()}
+        pos = np.stack([batch.trueVtxX, batch.trueVtxY, batch.trueVtxZ], axis=1)
+        outputs['dwall'] = dwall_array(pos)
+        outputs['x'] = pos[:,0]
+        outputs['y'] = pos[:,1]
+        outputs['z'] = pos[:,2]
+        return outputs
+
+    def storeBatchEntry(self, batch_output: Dict[str, Any], ientry: int) -> Dict[str, Any]:
+        for var_name, var_array in self.vertex_vars.items():
+            var_array[0] = batch_output[var_name][ientry]
+        return self._get_results()
+
     def _get_results(self) -> Dict[str, Any]:
         """Convert array values to a results dictionary."""
         results = {}
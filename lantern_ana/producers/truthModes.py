@@ -34,6 +34,9 @@ class TruthModeProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
     
+    def requiredBranches(self):
+        return self.tag_factory.get_required_branches()
+
     def processEvent(self, data, params):
         """Apply truth mode tagging."""
         self.setDefaultValues()
@@ -47,6 +47,25 @@ class VisibleEnergyProducer(ProducerBaseClass):
         
         return {"evis":self.total_visible_energy[0]}
 
+    def requiredBranches(self):
+        return ["nTracks", "trackIsSecondary", "trackRecoE", "nShowers", "showerIsSecondary", "showerRecoE"]
+
+    def supportsBatch(self):
+        return True
+
+    def processBatch(self, data, params):
+        """Visible energy for a chunk of events: sum of primary track and shower energies."""
+        batch = data["gen2ntuple"]
+
+        evis  = batch.trackRecoE.sum(where=batch.trackIsSecondary.content==0)
+        evis += batch.showerRecoE.sum(where=batch.showerIsSecondary.content==0)
+
+        return {"evis": evis.astype(np.float32)}
+
+    def storeBatchEntry(self, batch_output, ientry):
+        self.total_visible_energy[0] = batch_output["evis"][ientry]
+        return {"evis":self.total_visible_energy[0]}
+
     def finalize(self):
         super().finalize()
         """
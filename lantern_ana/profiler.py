@@ -0,0 +1,260 @@
+"""
+Profiler for the event loop, turned on with --profile (or 'profile: true' in the configuration).
+
+The ProducerManager and CutFactory always keep total times per producer and cut
+(statistics.yaml). This does not tell whether a producer is slow on every event or
+very slow on a few. With profiling on, they also give the Profiler the time of every
+producer and cut call, measured with time.perf_counter_ns, and the profiler keeps:
+
+  - the distribution of the call times of each producer and cut (p50/p95/p99/max)
+  - the time of each event and the change in resident memory over each event
+  - how many times each ntuple branch is read through PyROOT
+
+When profiling is off, the producers, cuts and event loop only check that their
+profiler is None.
+
+Call times are not stored one by one: a 1M-event job with 30 producers and cuts
+would need hundreds of MB. They are counted in logarithmic bins (64 bins per factor
+of two), so percentiles are accurate to about 1.5% and memory use does not grow with
+the number of events.
+
+The report is written as json, plus a "collapsed stack" file: one line per
+producer/cut with its total time in microseconds, e.g.
+
+    event;producers;visibleEnergy 1520334
+    event;cuts;nue_cc_selection 80211
+
+which flamegraph.pl (or speedscope) turns into a flame graph.
+
+Example:
+    profiler = Profiler()
+    producer_manager.profiler = profiler
+    cut_factory.profiler = profiler
+    ...
+    profiler.write("profile.json", "profile.collapsed")
+"""
+
+import os
+import json
+import heapq
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# call-time bins: below 128 ns one bin per ns, then 64 bins per factor of two
+_SUB_BINS = 64
+
+# number of events with the largest memory growth to report
+_NUM_TOP_MEMORY_EVENTS = 10
+
+
+def _bin_index(ns: int) -> int:
+    """Logarithmic bin of a time in ns."""
+    if ns < 2*_SUB_BINS:
+        return max(ns, 0)
+    shift = ns.bit_length() - 7
+    return shift*_SUB_BINS + (ns >> shift)
+
+
+def _bin_value(index: int) -> float:
+    """Center of a bin (ns)."""
+    if index < 2*_SUB_BINS:
+        return float(index)
+    shift = index // _SUB_BINS - 1
+    mantissa = index - shift*_SUB_BINS
+    return ((mantissa << shift) + (1 << shift)/2.0)
+
+
+class TimingHistogram:
+    """
+    Distribution of the call times of one producer or cut.
+    """
+
+    def __init__(self):
+        self.bins = Counter()
+        self.count = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def add(self, ns: int):
+        self.bins[_bin_index(ns)] += 1
+        self.count += 1
+        self.total_ns += ns
+        if ns > self.max_ns:
+            self.max_ns = ns
+
+    def merge(self, other: "TimingHistogram"):
+        self.bins.update(other.bins)
+        self.count += other.count
+        self.total_ns += other.total_ns
+        self.max_ns = max(self.max_ns, other.max_ns)
+
+    def percentiles(self, fractions: Iterable[float]) -> List[float]:
+        """Approximate call times (ns) below which the given fractions of the calls are."""
+        fractions = list(fractions)
+        if self.count == 0:
+            return [0.0 for _ in fractions]
+        out = []
+        indices = sorted(self.bins)
+        cumulative = 0
+        ibin = 0
+        for fraction in fractions:
+            target = fraction*self.count
+            while ibin < len(indices)-1 and cumulative + self.bins[indices[ibin]] < target:
+                cumulative += self.bins[indices[ibin]]
+                ibin += 1
+            out.append(min(_bin_value(indices[ibin]), float(self.max_ns)))
+        return out
+
+    def summary(self) -> Dict[str, float]:
+        """Call count, total (ms) and mean/p50/p95/p99/max (us)."""
+        p50, p95, p99 = self.percentiles([0.50, 0.95, 0.99])
+        return {
+            'calls': self.count,
+            'total_ms': self.total_ns*1e-6,
+            'mean_us': self.total_ns*1e-3/max(1, self.count),
+            'p50_us': p50*1e-3,
+            'p95_us': p95*1e-3,
+            'p99_us': p99*1e-3,
+            'max_us': self.max_ns*1e-3
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'bins': dict(self.bins), 'count': self.count, 'total_ns': self.total_ns, 'max_ns': self.max_ns}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TimingHistogram":
+        hist = cls()
+        hist.bins.update({int(index): n for index, n in data['bins'].items()})
+        hist.count = data['count']
+        hist.total_ns = data['total_ns']
+        hist.max_ns = data['max_ns']
+        return hist
+
+
+def _current_rss() -> int:
+    """Resident memory of this process in bytes (0 if not available)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class Profiler:
+    """
+    Collects call times of producers and cuts, event times, memory changes and branch reads.
+    """
+
+    def __init__(self):
+        # (section, name) -> TimingHistogram. Sections: 'event', 'producers', 'cuts',
+        # and 'producer_batches', 'cut_batches' for chunks in the columnar mode.
+        self.timings: Dict[Tuple[str, str], TimingHistogram] = {}
+        self.branch_reads = Counter()
+        self.memory_growth = 0
+        self.memory_events_grown = 0
+        self.memory_max_event_growth = 0
+        # (growth in bytes, event label), smallest first
+        self._top_memory_events: List[Tuple[int, str]] = []
+        self._event_start_ns = 0
+        self._event_start_rss = 0
+
+    def add(self, section: str, name: str, ns: int):
+        """Record one call of a producer or cut that took ns nanoseconds."""
+        hist = self.timings.get((section, name))
+        if hist is None:
+            hist = self.timings[(section, name)] = TimingHistogram()
+        hist.add(ns)
+
+    def start_event(self):
+        """Call at the start of each event."""
+        self._event_start_rss = _current_rss()
+        self._event_start_ns = time.perf_counter_ns()
+
+    def end_event(self, label: Any):
+        """Call at the end of each event. label identifies the event in the report (e.g. dataset:entry)."""
+        self.add('event', 'total', time.perf_counter_ns() - self._event_start_ns)
+        growth = _current_rss() - self._event_start_rss
+        self.memory_growth += growth
+        if growth > 0:
+            self.memory_events_grown += 1
+            self.memory_max_event_growth = max(self.memory_max_event_growth, growth)
+            item = (growth, str(label))
+            if len(self._top_memory_events) < _NUM_TOP_MEMORY_EVENTS:
+                heapq.heappush(self._top_memory_events, item)
+            elif item > self._top_memory_events[0]:
+                heapq.heapreplace(self._top_memory_events, item)
+
+    def add_branch_reads(self, counts: Dict[str, int]):
+        """Add the number of times each ntuple branch was read (see BranchAccessRecorder.counts)."""
+        self.branch_reads.update(counts)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Raw data, e.g. to send the profile of a worker process to the parent."""
+        return {
+            'timings': [[section, name, hist.to_dict()] for (section, name), hist in self.timings.items()],
+            'branch_reads': dict(self.branch_reads),
+            'memory': [self.memory_growth, self.memory_events_grown, self.memory_max_event_growth,
+                       list(self._top_memory_events)]
+        }
+
+    def merge(self, data: Dict[str, Any]):
+        """Add the raw data of another profiler (from to_dict)."""
+        for section, name, hist_data in data['timings']:
+            hist = self.timings.setdefault((section, name), TimingHistogram())
+            hist.merge(TimingHistogram.from_dict(hist_data))
+        self.branch_reads.update(data['branch_reads'])
+        growth, grown, max_growth, top = data['memory']
+        self.memory_growth += growth
+        self.memory_events_grown += grown
+        self.memory_max_event_growth = max(self.memory_max_event_growth, max_growth)
+        merged = self._top_memory_events + [tuple(item) for item in top]
+        self._top_memory_events = heapq.nlargest(_NUM_TOP_MEMORY_EVENTS, merged)
+        heapq.heapify(self._top_memory_events)
+
+    def report(self) -> Dict[str, Any]:
+        """The profile as a json-compatible dictionary."""
+        sections = {}
+        for (section, name), hist in sorted(self.timings.items()):
+            sections.setdefault(section, {})[name] = hist.summary()
+        return {
+            'timings': sections,
+            'memory': {
+                'total_growth_mb': self.memory_growth/1e6,
+                'events_with_growth': self.memory_events_grown,
+                'max_event_growth_mb': self.memory_max_event_growth/1e6,
+                'top_events': [{'event': label, 'growth_mb': growth/1e6}
+                               for growth, label in sorted(self._top_memory_events, reverse=True)]
+            },
+            'branch_reads': dict(self.branch_reads.most_common())
+        }
+
+    def collapsed_stacks(self) -> List[str]:
+        """
+        Lines of a collapsed-stack file: "event;producers;name total_us".
+        Time of the event loop not spent in producers or cuts is reported as "event;other".
+        """
+        lines = []
+        inside_events_us = 0
+        for (section, name), hist in sorted(self.timings.items()):
+            if section == 'event':
+                continue
+            total_us = hist.total_ns // 1000
+            if section in ('producers', 'cuts'):
+                inside_events_us += total_us
+                lines.append(f"event;{section};{name} {total_us}")
+            else:
+                lines.append(f"batch;{section};{name} {total_us}")
+        event_hist = self.timings.get(('event', 'total'))
+        if event_hist is not None and event_hist.total_ns // 1000 > inside_events_us:
+            lines.append(f"event;other {event_hist.total_ns // 1000 - inside_events_us}")
+        return lines
+
+    def write(self, json_path: str, collapsed_path: Optional[str] = None):
+        """Write the report (json) and, optionally, the collapsed-stack file."""
+        with open(json_path, 'w') as f:
+            json.dump(self.report(), f, indent=2)
+        if collapsed_path is not None:
+            with open(collapsed_path, 'w') as f:
+                for line in self.collapsed_stacks():
+                    f.write(line+"\n")
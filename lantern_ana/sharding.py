@@ -0,0 +1,163 @@
+"""
+Helpers to process a dataset with several worker processes.
+
+LanternAna.run(..., workers=N) splits the entries of each dataset into N contiguous shards.
+Each shard is processed in its own process by a fresh LanternAna built from the same
+configuration file, and written to its own ROOT file. The shard files are merged with
+TFileMerger: the analysis_tree and livetime_tree are concatenated and histograms written by
+producers (e.g. the TH2Ds of DetResponseMatrixProducer) are added.
+The statistics of the shards are combined into the usual statistics.yaml layout.
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple
+
+
+def make_shards(num_entries: int, num_shards: int) -> List[Tuple[int, int]]:
+    """
+    Split [0, num_entries) into contiguous (start, stop) ranges of nearly equal size.
+
+    Never returns empty shards, so fewer than num_shards ranges come back for small datasets.
+    """
+    num_shards = max(1, min(num_shards, num_entries))
+    base, extra = divmod(num_entries, num_shards)
+    shards = []
+    start = 0
+    for ishard in range(num_shards):
+        stop = start + base + (1 if ishard < extra else 0)
+        shards.append((start, stop))
+        start = stop
+    return shards
+
+
+def run_shard(config_file: str, log_level: str, dataset_name: str,
+              entry_range: Tuple[int, int], output_file_path: str,
+              fill_livetime: bool, profile: bool = False) -> Dict[str, Any]:
+    """
+    Worker process: process one shard of a dataset.
+
+    Returns:
+        Dictionary with the dataset statistics, the producer statistics and the CutFactory
+        statistics of the shard (and the raw profile data, with profile=True)
+    """
+    from lantern_ana.lantern_ana_class import LanternAna
+    from lantern_ana.io.dataset_factory import DatasetFactory
+
+    analysis = LanternAna(config_file, log_level=log_level, profile=profile)
+    analysis.datasets = DatasetFactory.create_from_yaml(config_file, dataset_names=[dataset_name])
+    dataset = analysis.datasets[dataset_name]
+
+    try:
+        analysis._process_dataset_shard(dataset_name, dataset, entry_range, output_file_path, fill_livetime)
+    except SystemExit as e:
+        # the ProducerManager exits on producer errors. SystemExit would only kill this worker,
+        # so raise an exception that is passed back to the parent process.
+        raise RuntimeError(f"Shard {entry_range} of dataset {dataset_name} stopped with exit code {e.code}")
+
+    manager = analysis.producer_manager
+    result = {
+        'stats': analysis.stats[dataset_name],
+        'producer_statistics': {name: dict(stats) for name, stats in manager.producer_statistics.items()},
+        'total_events_processed': manager.total_events_processed,
+        'cut_factory': analysis.cut_factory.get_checkpoint_state()
+    }
+    if analysis.profiler is not None:
+        result['profile'] = analysis.profiler.to_dict()
+    return result
+
+
+def run_shards(shard_jobs: List[Tuple], workers: int) -> List[Dict[str, Any]]:
+    """
+    Run run_shard for each job (tuple of its arguments) in a pool of worker processes.
+
+    We use the 'spawn' start method so each worker starts with a clean ROOT session.
+    An exception in a worker is raised again here. If a worker dies (e.g. a crash in ROOT),
+    ProcessPoolExecutor raises BrokenProcessPool instead of waiting for its result forever.
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=min(workers, len(shard_jobs)), mp_context=context) as executor:
+        futures = [executor.submit(run_shard, *job) for job in shard_jobs]
+        return [future.result() for future in futures]
+
+
+def merge_root_files(input_paths: List[str], output_path: str, compression: Optional[int] = None) -> None:
+    """
+    Merge ROOT files with TFileMerger (trees are concatenated, histograms are added).
+
+    Args:
+        compression: ROOT compression settings of the merged file. Use the settings of
+                     the input files, so their compressed baskets are copied as they are.
+    """
+    import ROOT
+
+    merger = ROOT.TFileMerger(False)
+    merger.SetFastMethod(True)
+    if compression is None:
+        opened = merger.OutputFile(output_path, "RECREATE")
+    else:
+        opened = merger.OutputFile(output_path, "RECREATE", compression)
+    if not opened:
+        raise RuntimeError(f"Could not open merged output file: {output_path}")
+    for path in input_paths:
+        if not merger.AddFile(path):
+            raise RuntimeError(f"Could not add shard file to merge: {path}")
+    if not merger.Merge():
+        raise RuntimeError(f"Merging shard files into {output_path} failed")
+
+
+def merge_dataset_stats(shard_stats: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Combine the per-dataset statistics (LanternAna.stats[dataset_name]) of several shards.
+    """
+    merged = {
+        'total': 0,
+        'passed': 0,
+        'failed': 0,
+        'cut_stats': {},
+        'processing_time': 0
+    }
+    for stats in shard_stats:
+        merged['total'] += stats['total']
+        merged['passed'] += stats['passed']
+        merged['failed'] += stats['failed']
+        for cut_name, cut_stats in stats['cut_stats'].items():
+            if cut_name not in merged['cut_stats']:
+                merged['cut_stats'][cut_name] = {'pass': 0, 'fail': 0}
+            merged['cut_stats'][cut_name]['pass'] += cut_stats['pass']
+            merged['cut_stats'][cut_name]['fail'] += cut_stats['fail']
+        # branch lists from the record_branch_access option
+        for key in ['branches_read', 'undeclared_branches']:
+            if key in stats:
+                merged[key] = sorted(set(merged.get(key, [])) | set(stats[key]))
+    return merged
+
+
+def merge_producer_statistics(producer_manager, shard_results: List[Dict[str, Any]]) -> None:
+    """
+    Add the producer timing statistics of the shards into the parent's ProducerManager.
+    """
+    for result in shard_results:
+        producer_manager.total_events_processed += result['total_events_processed']
+        for name, shard_stats in result['producer_statistics'].items():
+            stats = producer_manager.producer_statistics[name]
+            stats["total_time"] += shard_stats["total_time"]
+            stats["num_calls"] += shard_stats["num_calls"]
+            stats["num_errors"] += shard_stats["num_errors"]
+            stats["num_cache_hits"] += shard_stats.get("num_cache_hits", 0)
+            stats["average_time"] = stats["total_time"] / max(1, stats["num_calls"])
+
+
+def merge_cut_statistics(cut_factory, shard_results: List[Dict[str, Any]]) -> None:
+    """
+    Add the cut statistics of the shards into the parent's CutFactory.
+    """
+    for result in shard_results:
+        shard_state = result['cut_factory']
+        cut_factory.total_events_processed += shard_state['total_events_processed']
+        cut_factory.total_events_passed += shard_state['total_events_passed']
+        for name, shard_stats in shard_state['cut_statistics'].items():
+            stats = cut_factory.cut_statistics[name]
+            stats["pass"] += shard_stats["pass"]
+            stats["fail"] += shard_stats["fail"]
+            stats["total_time"] += shard_stats["total_time"]
@@ -8,16 +8,29 @@ from functools import wraps
 # Dictionary to store all registered tag functions
 _REGISTERED_TAGS = {}
 
-def register_tag(func):
+# Ntuple branches read by each registered tag function, for tags that declare them
+_TAG_BRANCHES = {}
+
+def register_tag(func=None, *, branches=None):
     """
     Decorator to register a tag function with the tagFactory.
     The function name is used as the tag identifier.
+
+    The ntuple branches the tag reads can be declared with
+    @register_tag(branches=[...]) (wildcards like "trueSimPart*" are allowed).
     """
-    if func.__name__ in _REGISTERED_TAGS:
-        raise ValueError("Registering a tag function with a name already registered: ",func.__name__)
+    def decorator(func):
+        if func.__name__ in _REGISTERED_TAGS:
+            raise ValueError("Registering a tag function with a name already registered: ",func.__name__)
 
-    _REGISTERED_TAGS[func.__name__] = func
-    return func
+        _REGISTERED_TAGS[func.__name__] = func
+        if branches is not None:
+            _TAG_BRANCHES[func.__name__] = list(branches)
+        return func
+
+    if func is None:
+        return decorator
+    return decorator(func)
 
 class TagFactory:
     """
@@ -80,6 +93,22 @@ class TagFactory:
             'params': params
         })
         
+    def get_required_branches(self):
+        """
+        Return the union of the ntuple branches read by the added tags,
+        or None if one of them has not declared its branches.
+        """
+        branches = []
+        for tag in self.tags:
+            tag_branches = _TAG_BRANCHES.get(tag['name'])
+            if tag_branches is None:
+                print(f"Warning: tag '{tag['name']}' does not declare the ntuple branches it reads")
+                return None
+            for branch in tag_branches:
+                if branch not in branches:
+                    branches.append(branch)
+        return branches
+
     def apply_tags(self, ntuple):
         """
         Apply all registered tags in order.
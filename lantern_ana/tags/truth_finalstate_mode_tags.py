@@ -1,7 +1,8 @@
 from lantern_ana.tags.tag_factory import register_tag
 from lantern_ana.utils import get_true_primary_particle_counts
+from lantern_ana.utils.true_particle_counts import TRUE_PARTICLE_COUNT_BRANCHES
 
-@register_tag
+@register_tag(branches=['trueNuCCNC', 'trueNuPDG']+TRUE_PARTICLE_COUNT_BRANCHES)
 def tag_truth_finalstate_mode(ntuple,params):
     """
     Tag event by 
@@ -0,0 +1,134 @@
+"""
+Tests of the lazy_producers option on a synthetic ntuple: producers the cuts do not read
+only run for the events passing the cuts, but a producer filling a histogram under its
+own selection (supportsCaching is False) and the producers it reads see every event.
+"""
+
+import os
+from array import array
+
+import pytest
+import yaml
+
+ROOT = pytest.importorskip("ROOT")
+
+from lantern_ana.producers.producerBaseClass import ProducerBaseClass
+from lantern_ana.producers.producer_factory import ProducerFactory
+
+NEVENTS = 60
+
+
+class _CountingProducer(ProducerBaseClass):
+    """Counts the events it is run on and stores the event number."""
+
+    def __init__(self, name, config):
+        super().__init__(name, config)
+        self.value = array('i', [0])
+        self.num_events = 0
+
+    def prepareStorage(self, output):
+        output.Branch(f"{self.name}_value", self.value, f"{self.name}_value/I")
+
+    def setDefaultValues(self):
+        self.value[0] = -1
+
+    def requiredInputs(self):
+        return ["gen2ntuple"]
+
+    def requiredBranches(self):
+        return ['event']
+
+    def processEvent(self, data, params):
+        self.num_events += 1
+        self.value[0] = data["gen2ntuple"].event
+        return {'value': self.value[0]}
+
+    def finalize(self):
+        return
+
+
+@ProducerFactory.register
+class LazyTestInputProducer(_CountingProducer):
+    """Read by the histogram producer, not by any cut."""
+    pass
+
+
+@ProducerFactory.register
+class LazyTestDeferredProducer(_CountingProducer):
+    """Read by nothing: runs only for passing events."""
+    pass
+
+
+@ProducerFactory.register
+class LazyTestHistProducer(_CountingProducer):
+    """Fills a histogram of every event, whether the event passes the cuts or not."""
+
+    def __init__(self, name, config):
+        super().__init__(name, config)
+        self.hist = ROOT.TH1D(f"{name}_hist", "", 10, 0, 10)
+        self.hist.SetDirectory(0)
+
+    def requiredInputs(self):
+        return ["gen2ntuple", self.config['input']]
+
+    def supportsCaching(self):
+        return False
+
+    def processEvent(self, data, params):
+        self.hist.Fill(data[self.config['input']]['value'] % 10)
+        return super().processEvent(data, params)
+
+
+def run_analysis(tmp_path, lazy_producers):
+    from lantern_ana.benchmarks.synthetic_ntuple import write_synthetic_ntuple
+    from lantern_ana.lantern_ana_class import LanternAna
+
+    ntuple = str(tmp_path / "ntuple.root")
+    if not os.path.exists(ntuple):
+        write_synthetic_ntuple(ntuple, num_events=NEVENTS, seed=3)
+    config = {
+        'output_dir': str(tmp_path / f"output_{lazy_producers}"),
+        'filter_events': True,
+        'producer_first_mode': True,
+        'lazy_producers': lazy_producers,
+        'producers': {
+            'input': {'type': 'LazyTestInputProducer', 'config': {}},
+            'hist': {'type': 'LazyTestHistProducer', 'config': {'input': 'input'}},
+            'deferred': {'type': 'LazyTestDeferredProducer', 'config': {}},
+        },
+        'cuts': {'has_muon_track': {'ke_threshold': 30.0}},
+        'datasets': {'synthetic': {'type': 'RootDataset', 'tree': 'EventTree', 'ismc': True,
+                                   'filepaths': [ntuple]}},
+    }
+    config_file = str(tmp_path / f"config_{lazy_producers}.yaml")
+    with open(config_file, 'w') as f:
+        yaml.dump(config, f)
+    analysis = LanternAna(config_file, log_level="WARNING")
+    analysis.run(['synthetic'])
+    return analysis
+
+
+def test_selection_producers_include_stateful_producers(tmp_path):
+    analysis = run_analysis(tmp_path, lazy_producers=True)
+    assert analysis._selection_producers == ['input', 'hist']
+    assert analysis._deferred_producers == ['deferred']
+
+
+def test_stateful_producer_sees_failing_events(tmp_path):
+    lazy = run_analysis(tmp_path, lazy_producers=True)
+    stats = lazy.stats['synthetic']
+    assert stats['total'] == NEVENTS
+    # the selection must remove some events for the test to mean anything
+    assert 0 < stats['passed'] < NEVENTS
+
+    producers = lazy.producer_manager.producers
+    assert producers['deferred'].num_events == stats['passed']
+    assert producers['input'].num_events == NEVENTS
+    assert producers['hist'].num_events == NEVENTS
+    assert producers['hist'].hist.GetEntries() == NEVENTS
+
+    # the histogram is the same as without lazy_producers
+    eager = run_analysis(tmp_path, lazy_producers=False)
+    eager_hist = eager.producer_manager.producers['hist'].hist
+    for ibin in range(eager_hist.GetNbinsX()+2):
+        assert producers['hist'].hist.GetBinContent(ibin) == eager_hist.GetBinContent(ibin)
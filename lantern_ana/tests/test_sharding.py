@@ -0,0 +1,143 @@
+"""
+Tests of running with several workers (LanternAna.run(workers=N), run_lantern_ana --workers N):
+the merged output file and the statistics must be the same as with a single process, and
+producers that cannot be sharded must stop the job before any worker starts.
+"""
+
+import os
+
+import numpy as np
+import pytest
+import yaml
+
+ROOT = pytest.importorskip("ROOT")
+
+from lantern_ana.producers.producerBaseClass import ProducerBaseClass
+from lantern_ana.producers.producer_factory import ProducerFactory
+from lantern_ana.sharding import make_shards
+
+NEVENTS = 90
+
+# producers of the lantern_ana package, so the worker processes find them too
+PRODUCERS = {
+    'trueNu': {'type': 'trueNuPropertiesProducer', 'config': {}},
+    'vertex_properties': {'type': 'VertexPropertiesProducer', 'config': {}},
+    'recoMuonTrack': {'type': 'RecoMuonTrackPropertiesProducer', 'config': {'track_min_energy': 25.0}},
+    'fvtag': {'type': 'FVtagProducer', 'config': {'fiducial_distance': 17.0}},
+    'flashpred': {'type': 'FlashPredictionProducer', 'config': {}},
+}
+
+
+@pytest.fixture(scope="module")
+def ntuple(tmp_path_factory):
+    from lantern_ana.benchmarks.synthetic_ntuple import write_synthetic_ntuple
+    path = str(tmp_path_factory.mktemp("sharding") / "ntuple.root")
+    write_synthetic_ntuple(path, num_events=NEVENTS, seed=4)
+    return path
+
+
+def write_config(tmp_path, name, ntuple, producers, execution_mode='event'):
+    config = {
+        'output_dir': str(tmp_path / name),
+        'filter_events': True,
+        'execution_mode': execution_mode,
+        'columnar_chunk_size': 40,
+        'producers': producers,
+        'cuts': {'has_muon_track': {'ke_threshold': 30.0}},
+        'datasets': {'synthetic': {'type': 'RootDataset', 'tree': 'EventTree', 'ismc': True,
+                                   'filepaths': [ntuple],
+                                   'friendtrees': {'FlashPredictionTree': ntuple}}},
+    }
+    config_file = str(tmp_path / f"config_{name}.yaml")
+    with open(config_file, 'w') as f:
+        yaml.dump(config, f)
+    return config_file
+
+
+def run(config_file, workers):
+    from lantern_ana.lantern_ana_class import LanternAna
+    analysis = LanternAna(config_file, log_level="WARNING")
+    analysis.run(['synthetic'], workers=workers)
+    return analysis
+
+
+def read_tree(output_dir, treename):
+    """All columns of a tree of the output file in output_dir."""
+    paths = [name for name in os.listdir(output_dir) if name.endswith(".root")]
+    assert len(paths) == 1
+    rfile = ROOT.TFile(os.path.join(output_dir, paths[0]))
+    tree = rfile.Get(treename)
+    columns = [str(branch.GetName()) for branch in tree.GetListOfBranches()]
+    arrays = ROOT.RDataFrame(tree).AsNumpy(columns)
+    rfile.Close()
+    return arrays
+
+
+def test_make_shards():
+    assert make_shards(10, 3) == [(0, 4), (4, 7), (7, 10)]
+    assert make_shards(2, 5) == [(0, 1), (1, 2)]
+    assert make_shards(7, 1) == [(0, 7)]
+
+
+@pytest.mark.parametrize("execution_mode", ["event", "columnar"])
+def test_workers_match_single_process(tmp_path, ntuple, execution_mode):
+    single = run(write_config(tmp_path, "single", ntuple, PRODUCERS, execution_mode), workers=1)
+    sharded = run(write_config(tmp_path, "sharded", ntuple, PRODUCERS, execution_mode), workers=3)
+
+    expected = read_tree(tmp_path / "single", "analysis_tree")
+    arrays = read_tree(tmp_path / "sharded", "analysis_tree")
+    assert 0 < len(expected['trueNu_Enu']) < NEVENTS
+    assert sorted(arrays) == sorted(expected)
+    for name in expected:
+        np.testing.assert_array_equal(arrays[name], expected[name], err_msg=name)
+
+    # one livetime entry, from the first shard
+    expected_livetime = read_tree(tmp_path / "single", "livetime_tree")
+    livetime = read_tree(tmp_path / "sharded", "livetime_tree")
+    for name in expected_livetime:
+        np.testing.assert_array_equal(livetime[name], expected_livetime[name], err_msg=name)
+
+    single_stats = single.stats['synthetic']
+    sharded_stats = sharded.stats['synthetic']
+    assert sharded_stats['num_workers'] == 3
+    for key in ['total', 'passed', 'failed', 'cut_stats']:
+        assert sharded_stats[key] == single_stats[key], key
+    for name in PRODUCERS:
+        assert (sharded.producer_manager.producer_statistics[name]['num_calls']
+                == single.producer_manager.producer_statistics[name]['num_calls'])
+    # the shard files were removed
+    assert [name for name in os.listdir(tmp_path / "sharded") if name.endswith("_shards")] == []
+
+
+@ProducerFactory.register
+class ShardingTestUnshardableProducer(ProducerBaseClass):
+    """Needs to see every event of a dataset in one process."""
+
+    def prepareStorage(self, output):
+        pass
+
+    def setDefaultValues(self):
+        pass
+
+    def supportsSharding(self):
+        return False
+
+    def processEvent(self, data, params):
+        return {}
+
+    def finalize(self):
+        return
+
+
+def test_unshardable_producer_stops_before_workers(tmp_path, ntuple):
+    producers = dict(PRODUCERS, unshardable={'type': 'ShardingTestUnshardableProducer', 'config': {}})
+    config_file = write_config(tmp_path, "unshardable", ntuple, producers)
+    with pytest.raises(ValueError, match="unshardable"):
+        run(config_file, workers=2)
+    # no worker ran: no shard files or output file
+    assert [name for name in os.listdir(tmp_path / "unshardable") if name != "lantern_ana.log"] == []
+
+    # a single process runs it
+    analysis = run(config_file, workers=1)
+    assert analysis.stats['synthetic']['total'] == NEVENTS
+    assert analysis.producer_manager.producer_statistics['unshardable']['num_calls'] == NEVENTS
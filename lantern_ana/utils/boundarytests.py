@@ -1,3 +1,5 @@
+import numpy as np
+
 
 def get_uboone_tpc_bounds():
     return ((0, 256), (-116.5, 116.5), (0, 1036))
@@ -18,4 +20,16 @@ def is_inside_tpc(pos):
         pos[2] >= zMax):
         return False
     else:
-        return True
\ No newline at end of file
+        return True
+
+def is_inside_tpc_array(pos):
+    """
+    Test if many points are inside the canonical uboone TPC boundary.
+    Same test as is_inside_tpc, for an (N,3) array of positions.
+
+    Returns:
+    - boolean array of length N
+    """
+    pos = np.asarray(pos, dtype=np.float64).reshape(-1,3)
+    bounds = np.asarray(get_uboone_tpc_bounds(), dtype=np.float64)
+    return np.all( (pos>bounds[:,0]) & (pos<bounds[:,1]), axis=1 )
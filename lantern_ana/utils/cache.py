@@ -0,0 +1,53 @@
+"""
+Helpers for files lantern_ana caches on disk between jobs.
+
+Cached products (e.g. run/subrun/event indices of large trees) are stored under
+a cache directory and tagged with the signature of the file they were made from,
+so a cache entry is rebuilt automatically when that file changes.
+
+The cache directory is, in order of preference:
+  - the directory given explicitly (e.g. a 'cache_dir' config parameter)
+  - the LANTERN_ANA_CACHE_DIR environment variable
+  - ~/.cache/lantern_ana
+"""
+
+import os
+import hashlib
+import json
+from typing import Dict, Any, Optional
+
+
+def get_cache_dir(subdir: str = "", cache_dir: Optional[str] = None) -> str:
+    """
+    Get (and create if needed) the directory used to store cached products.
+
+    Args:
+        subdir: Sub-directory for one kind of cached product, e.g. 'rse_index'
+        cache_dir: Explicit top-level cache directory. If None, use LANTERN_ANA_CACHE_DIR or ~/.cache/lantern_ana.
+    """
+    if cache_dir is None:
+        cache_dir = os.environ.get('LANTERN_ANA_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'lantern_ana'))
+    path = os.path.join(cache_dir, subdir) if subdir else cache_dir
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def file_signature(filepath: str) -> Dict[str, Any]:
+    """
+    Identify the current version of a file by its absolute path, size and modification time.
+    """
+    stat = os.stat(filepath)
+    return {
+        'path': os.path.abspath(filepath),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns
+    }
+
+
+def cache_key(*parts: Any) -> str:
+    """
+    Make a file-name-safe key from the parts that define a cached product.
+    """
+    text = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
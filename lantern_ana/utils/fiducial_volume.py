@@ -1,5 +1,6 @@
 import os,sys
-from lantern_ana.utils.boundarytests import get_uboone_tpc_bounds, is_inside_tpc
+import numpy as np
+from lantern_ana.utils.boundarytests import get_uboone_tpc_bounds, is_inside_tpc, is_inside_tpc_array
 
 def dwall_inside( x, y, z, return_dim_dists=False ):
     """
@@ -76,7 +77,7 @@ def dwall( x, y, z, return_dim_dists=False):
             mindist, dimdists = dwall_outside( x, y, z, return_dim_dists=True )
             # by convention, the distances outside are negnative
             mindist *= -1.0
-            for i in len(dimdists):
+            for i in range(len(dimdists)):
                 dimdists[i] *= -1.0
     else:
         if is_inside_tpc( vtx ):
@@ -86,6 +87,44 @@ def dwall( x, y, z, return_dim_dists=False):
             # by convention, the distances outside are negnative
             mindist *= -1.0
 
+    if return_dim_dists:
+        return mindist, dimdists
+    return mindist
+
+
+def dwall_array( pos, return_dim_dists=False ):
+    """
+    Signed distance to the closest TPC boundary for many points at once.
+    Same convention as dwall: positive inside the TPC, negative outside.
+
+    Parameters:
+    - pos: (N,3) array of (x,y,z) positions
+
+    Returns:
+    - array of N distances, and if return_dim_dists is True, the (N,3) array
+      of distances along each dimension (1e9 where not set, as in dwall_inside and dwall_outside)
+    """
+    pos = np.asarray(pos, dtype=np.float64).reshape(-1,3)
+    tpcwall = np.asarray(get_uboone_tpc_bounds(), dtype=np.float64)
+    inside = is_inside_tpc_array(pos)
+
+    # distances to the low and high wall of each dimension, positive on the side of the point
+    distlo = pos-tpcwall[:,0]
+    disthi = tpcwall[:,1]-pos
+    distlo[~inside] *= -1.0
+    disthi[~inside] *= -1.0
+
+    # only positive values are valid, as in dwall_inside and dwall_outside
+    dimdists = np.full( pos.shape, 1e9 )
+    for dist in (distlo, disthi):
+        valid = (dist>=0) & (dist<dimdists)
+        dimdists[valid] = dist[valid]
+
+    mindist = np.minimum( dimdists.min(axis=1), 1e8 )
+    # by convention, the distances outside are negative
+    mindist[~inside] *= -1.0
+    if return_dim_dists:
+        dimdists[~inside] *= -1.0
+        return mindist, dimdists
     return mindist
-    
 
@@ -0,0 +1,95 @@
+"""
+Match the neutrino candidate saved in the ntuple to its flash prediction.
+
+The FlashPredictionTree stores a flash prediction for every neutrino candidate vertex
+of an event, with a copy of the candidate's reco position and track/shower counts.
+The ntuple only stores the chosen candidate, so the prediction is found by matching
+the position (and counts), then taking the candidate with the lowest sinkhorn divergence.
+
+The functions here work on whole candidate arrays at once, for one event
+(match_candidates, best_candidate) or for a chunk of events in columnar mode
+(best_candidate_batch).
+"""
+
+import numpy as np
+from typing import Optional, Sequence, Tuple
+
+
+def vector_to_array(vec, dtype=np.float64) -> np.ndarray:
+    """NumPy copy of a std::vector (or RVec, list, array) of numbers."""
+    return np.asarray(vec, dtype=dtype)
+
+
+def match_candidates(vtx, cand_x, cand_y, cand_z, max_dist2: float,
+                     counts: Sequence[Tuple[int, Sequence[int]]] = (), inclusive: bool = False) -> np.ndarray:
+    """
+    Find the candidates at the position of a vertex.
+
+    Args:
+        vtx: (x,y,z) of the vertex saved in the ntuple
+        cand_x, cand_y, cand_z: positions of the candidates
+        max_dist2: squared distance for a match: candidates closer than this match
+        counts: (value, per-candidate values) pairs that must also be equal, e.g. (nTracks, n_tracks_all)
+        inclusive: Also match candidates at exactly max_dist2
+
+    Returns:
+        Boolean array with one value per candidate
+    """
+    cand_x = vector_to_array(cand_x)
+    dist2 = (cand_x-vtx[0])**2
+    dist2 += (vector_to_array(cand_y)-vtx[1])**2
+    dist2 += (vector_to_array(cand_z)-vtx[2])**2
+    matched = dist2 <= max_dist2 if inclusive else dist2 < max_dist2
+    for value, cand_values in counts:
+        matched &= vector_to_array(cand_values, dtype=np.int64)[:len(matched)] == value
+    return matched
+
+
+def best_candidate(divergence: np.ndarray, matched: np.ndarray, preselected: Optional[np.ndarray] = None) -> int:
+    """
+    Index of the matched candidate with the lowest divergence, or -1 if none matched.
+
+    If preselected is given and any matched candidate passes it, only those are considered.
+    As in a loop keeping the candidate with a strictly lower divergence, ties go to the
+    first candidate, and candidates with a NaN or infinite divergence are never chosen.
+    """
+    matched = matched & np.isfinite(divergence)
+    eligible = matched
+    if preselected is not None and np.any(matched & preselected):
+        eligible = matched & preselected
+    if not np.any(eligible):
+        return -1
+    return int(np.argmin(np.where(eligible, divergence, np.inf)))
+
+
+def best_candidate_batch(entry_index: np.ndarray, nentries: int, divergence: np.ndarray,
+                         matched: np.ndarray, preselected: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    best_candidate for a chunk of events, with the candidates of all events in flat arrays.
+
+    Args:
+        entry_index: event of each candidate (JaggedArray.entry_index())
+        nentries: number of events in the chunk
+        divergence, matched, preselected: flat per-candidate arrays, as in best_candidate
+
+    Returns:
+        For each event, the index in the flat arrays of the chosen candidate, or -1
+    """
+    matched = matched & np.isfinite(divergence)
+    eligible = matched
+    if preselected is not None:
+        passing = matched & preselected
+        has_passing = np.bincount(entry_index, weights=passing, minlength=nentries) > 0
+        eligible = np.where(has_passing[entry_index], passing, matched)
+    key = np.where(eligible, divergence, np.inf)
+    # sort by event, then divergence, then position: the first candidate of each event is the best
+    order = np.lexsort((np.arange(len(key)), key, entry_index))
+    first = np.full(nentries, -1, dtype=np.int64)
+    if len(order) > 0:
+        sorted_entries = entry_index[order]
+        is_first = np.ones(len(order), dtype=bool)
+        is_first[1:] = sorted_entries[1:] != sorted_entries[:-1]
+        first[sorted_entries[is_first]] = order[is_first]
+    valid = first >= 0
+    valid[valid] = eligible[first[valid]]
+    return np.where(valid, first, -1)
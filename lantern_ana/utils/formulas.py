@@ -0,0 +1,188 @@
+"""
+Compiled formulas for producers configured with expressions in the YAML file.
+
+Several producers take formulas from their configuration, e.g.
+
+    cut_formulas:
+      pass_vertex: "{ntuple.vertex_properties_found}==1 and {ntuple.vertex_properties_infiducial}==1"
+    variable_formula: (ntuple.numuCC1piNp_pN)*1000.0
+    bin_config:
+      visible_energy:
+        formula: visible_energy     # branch name, read as ntuple.visible_energy
+
+Instead of parsing these strings with regular expressions and calling eval() for
+every event, a CompiledFormula is parsed and compiled once into a Python function
+of the ntuple. The same formula can also be evaluated on a ColumnBatch
+(lantern_ana.io.columnar), giving one value per event of the batch.
+"""
+
+import ast
+import math
+import re
+from typing import Dict, List, Any, Optional
+
+import numpy as np
+
+# {expression} placeholders used in cut_formulas
+_PLACEHOLDER = re.compile(r'\{([^}]+)\}')
+
+# names available inside formulas, besides 'ntuple'
+_FORMULA_GLOBALS = {'np': np, 'math': math}
+
+
+class _VectorizeTransformer(ast.NodeTransformer):
+    """
+    Rewrite the parts of an expression that only work on scalars into NumPy calls:
+    and/or/not, chained comparisons (a < b < c) and conditional expressions.
+    """
+
+    @staticmethod
+    def _np_call(func: str, args: List[ast.AST]) -> ast.Call:
+        return ast.Call(func=ast.Attribute(value=ast.Name(id='np', ctx=ast.Load()), attr=func, ctx=ast.Load()),
+                        args=args, keywords=[])
+
+    def _reduce(self, func: str, values: List[ast.AST]) -> ast.AST:
+        result = values[0]
+        for value in values[1:]:
+            result = self._np_call(func, [result, value])
+        return result
+
+    def visit_BoolOp(self, node):
+        self.generic_visit(node)
+        func = 'logical_and' if isinstance(node.op, ast.And) else 'logical_or'
+        return self._reduce(func, node.values)
+
+    def visit_UnaryOp(self, node):
+        self.generic_visit(node)
+        if isinstance(node.op, ast.Not):
+            return self._np_call('logical_not', [node.operand])
+        return node
+
+    def visit_Compare(self, node):
+        self.generic_visit(node)
+        if len(node.ops) == 1:
+            return node
+        # a < b < c  ->  (a < b) and (b < c)
+        operands = [node.left] + node.comparators
+        pairs = [ast.Compare(left=operands[i], ops=[op], comparators=[operands[i+1]])
+                 for i, op in enumerate(node.ops)]
+        return self._reduce('logical_and', pairs)
+
+    def visit_IfExp(self, node):
+        self.generic_visit(node)
+        return self._np_call('where', [node.test, node.body, node.orelse])
+
+
+class CompiledFormula:
+    """
+    A formula of the ntuple, compiled once.
+
+    Args:
+        formula: Python expression using 'ntuple', e.g. "ntuple.vtxX > 0".
+                 Placeholders "{ntuple.vtxX}" (as used by cut_formulas) are accepted.
+        prefix: Text put in front of the formula, e.g. "ntuple." for formulas
+                that are just a branch name
+
+    Example:
+        f = CompiledFormula("{ntuple.vertex_properties_found}==1")
+        f(ntuple)              # value for the current entry
+        f.evaluate_batch(batch)  # array of values for a ColumnBatch
+    """
+
+    def __init__(self, formula: str, prefix: str = ""):
+        self.formula = formula
+        self.expression = prefix + _PLACEHOLDER.sub(r'(\1)', str(formula)).strip()
+
+        try:
+            tree = ast.parse(f"lambda ntuple: ({self.expression})", mode='eval')
+        except SyntaxError as e:
+            raise ValueError(f"Cannot parse formula '{formula}': {e.msg}")
+
+        self.branches = self._find_branches(tree)
+        self._function = eval(compile(tree, f"<formula: {formula}>", 'eval'), dict(_FORMULA_GLOBALS))
+        self._tree = tree
+        self._batch_function = None
+
+    @staticmethod
+    def _find_branches(tree) -> List[str]:
+        """Names read as ntuple.<name> in the formula."""
+        branches = []
+        for node in ast.walk(tree):
+            if (isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name)
+                    and node.value.id == 'ntuple' and node.attr not in branches):
+                branches.append(node.attr)
+        return branches
+
+    def __call__(self, ntuple: Any) -> Any:
+        return self._function(ntuple)
+
+    def evaluate_batch(self, batch: Any) -> np.ndarray:
+        """
+        Evaluate the formula for every event of a ColumnBatch.
+
+        Branches are read as whole columns, so formulas that index into
+        variable-length branches (e.g. ntuple.trackRecoE[0]) are not supported here.
+        """
+        if self._batch_function is None:
+            tree = ast.parse(f"lambda ntuple: ({self.expression})", mode='eval')
+            tree.body.body = _VectorizeTransformer().visit(tree.body.body)
+            ast.fix_missing_locations(tree)
+            self._batch_function = eval(compile(tree, f"<batch formula: {self.formula}>", 'eval'),
+                                        dict(_FORMULA_GLOBALS))
+        values = np.asarray(self._batch_function(batch))
+        if values.ndim == 0:
+            values = np.full(batch.size, values)
+        return values
+
+    def __repr__(self) -> str:
+        return f"CompiledFormula({self.formula!r})"
+
+
+class FormulaSelection:
+    """
+    A set of named cut formulas, compiled once, and the criteria an event must pass.
+
+    Args:
+        cut_formulas: Dictionary of cut name -> formula (the cut_formulas config block)
+        criteria: Names of the cuts that must all be True for an event to pass
+                  (the event_selection_critera config entry). Default: all cuts.
+
+    Example:
+        selection = FormulaSelection(config.get('cut_formulas',{}), config.get('event_selection_critera',None))
+        if selection(ntuple):
+            ...
+    """
+
+    def __init__(self, cut_formulas: Dict[str, str], criteria: Optional[List[str]] = None):
+        self.formulas = {name: CompiledFormula(formula) for name, formula in cut_formulas.items()}
+        if criteria is None:
+            criteria = list(self.formulas.keys())
+        missing = [name for name in criteria if name not in self.formulas]
+        if missing:
+            raise ValueError(f"Selection criteria {missing} are not defined in cut_formulas")
+        self.criteria = list(criteria)
+        self._criteria_formulas = [self.formulas[name] for name in self.criteria]
+
+    @property
+    def branches(self) -> List[str]:
+        """Names of the ntuple branches read by the selection criteria."""
+        branches = []
+        for formula in self._criteria_formulas:
+            for branch in formula.branches:
+                if branch not in branches:
+                    branches.append(branch)
+        return branches
+
+    def __call__(self, ntuple: Any) -> bool:
+        """True if the entry passes all criteria. Stops at the first failing criterion."""
+        for formula in self._criteria_formulas:
+            if not formula(ntuple):
+                return False
+        return True
+
+    def evaluate_batch(self, batch: Any) -> np.ndarray:
+        """Boolean array, True for the events of the ColumnBatch passing all criteria."""
+        passes = np.ones(batch.size, dtype=bool)
+        for formula in self._criteria_formulas:
+            passes &= formula.evaluate_batch(batch).astype(bool)
+        return passes
@@ -1,5 +1,17 @@
 import os,sys
 
+# ntuple branches read by get_primary_electron_candidates
+ELECTRON_CANDIDATE_BRANCHES = [
+    'nShowers', 'showerIsSecondary', 'showerClassified', 'showerPID', 'showerCharge',
+    'showerElScore', 'showerPhScore', 'showerPiScore', 'showerMuScore', 'showerPrScore',
+    'showerPrimaryScore', 'showerFromNeutralScore', 'showerFromChargedScore',
+    'showerProcess', 'showerCosTheta', 'showerDistToVtx', 'showerPurity', 'showerComp',
+    'nTracks', 'trackIsSecondary', 'trackClassified', 'trackPID', 'trackCharge',
+    'trackElScore', 'trackPhScore', 'trackPiScore', 'trackMuScore', 'trackPrScore',
+    'trackPrimaryScore', 'trackFromNeutralScore', 'trackFromChargedScore',
+    'trackProcess', 'trackCosTheta', 'trackDistToVtx', 'trackPurity', 'trackComp'
+]
+
 def get_primary_electron_candidates( ntuple, params ):
     """
     Get a list of possible primary electron candidates.
@@ -1,5 +1,13 @@
 import os,sys
 
+# ntuple branches read by get_primary_muon_candidates
+MUON_CANDIDATE_BRANCHES = [
+    'nTracks', 'trackIsSecondary', 'trackClassified', 'trackPID', 'trackCharge',
+    'trackElScore', 'trackPhScore', 'trackPiScore', 'trackMuScore', 'trackPrScore',
+    'trackPrimaryScore', 'trackFromNeutralScore', 'trackFromChargedScore',
+    'trackProcess', 'trackCosTheta', 'trackDistToVtx', 'trackPurity', 'trackComp'
+]
+
 def get_primary_muon_candidates( ntuple, params ):
     """
     Get a list of possible primary muon candidates.
@@ -0,0 +1,431 @@
+"""
+Fill many histograms from an analysis output file in one pass.
+
+Study plot scripts used to call TTree::Draw once per (variable, sample):
+
+    trees[sample].Draw(f"{var}>>{hname}", f"({cut})*eventweight_weight")
+
+Each call reads and parses the whole analysis_tree again, so 20 variables for 4 samples
+meant 80 passes over the files. Here the histograms are described up front with HistSpec,
+the branches they need are read once per chunk of entries (lantern_ana.io.columnar), and
+all histograms are filled with NumPy. Each distinct selection, weight and variable
+expression is evaluated once per chunk, however many histograms use it.
+
+Expressions can be written as for TTree::Draw, with bare branch names and &&, || and !:
+
+    "vertex_properties_found==1 && muon_properties_pid_score>-0.9"
+
+or as lantern_ana formulas using ntuple.<branch> (see lantern_ana.utils.formulas).
+
+The POT and spills of a file are read from its livetime_tree, to scale the histograms
+to a target POT (MC) or number of beam spills (EXT).
+
+Example:
+    cut = "vertex_properties_found==1 && vertex_properties_infiducial==1"
+    specs = [
+        HistSpec('visible_energy', 'visible_energy', (30, 0, 3000), selection=cut, weight='eventweight_weight',
+                 categories={'numu_cc': 'sigdef_numuccinc_is_target_numucc_inclusive_nofvcut==1',
+                             'numu_bg': 'sigdef_numuccinc_is_target_numucc_inclusive_nofvcut==0'}),
+        HistSpec('enu_vs_evis', ('trueNu_Enu', 'visible_energy'), [(50, 0, 5), (30, 0, 3000)], selection=cut),
+    ]
+    hists = MultiHistFiller(specs).fill_file("bnb_nu_overlay.root", target_pot=4.4e19)
+    th1 = hists['visible_energy_numu_cc'].to_root('hvisible_energy_numu_cc')
+"""
+
+import ast
+import builtins
+import re
+from array import array
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from lantern_ana.io.columnar import JaggedArray, read_column_batches
+from lantern_ana.utils.formulas import CompiledFormula, _FORMULA_GLOBALS
+
+# names in expressions that are not branches
+_RESERVED_NAMES = set(_FORMULA_GLOBALS.keys()) | {'ntuple'} | set(dir(builtins))
+
+# (nbins, xmin, xmax) or a sequence of bin edges
+Binning = Union[Tuple[int, float, float], Sequence[float], np.ndarray]
+
+
+class _BranchNameTransformer(ast.NodeTransformer):
+    """Turn bare names into ntuple.<name>, leaving np, math and builtins alone."""
+
+    def visit_Name(self, node):
+        if node.id in _RESERVED_NAMES:
+            return node
+        return ast.copy_location(ast.Attribute(value=ast.Name(id='ntuple', ctx=ast.Load()),
+                                               attr=node.id, ctx=ast.Load()), node)
+
+
+def draw_expression_to_formula(expression: str) -> str:
+    """
+    Convert a TTree::Draw style expression into a formula of the ntuple.
+
+    &&, || and ! become and, or and not, and bare branch names become ntuple.<name>.
+    Note that, as in Python, 'not' binds more loosely than comparisons: !a==1 means !(a==1).
+    """
+    text = str(expression).replace('&&', ' and ').replace('||', ' or ')
+    text = re.sub(r'!(?!=)', ' not ', text)
+    try:
+        tree = ast.parse(text.strip(), mode='eval')
+    except SyntaxError as e:
+        raise ValueError(f"Cannot parse expression '{expression}': {e.msg}")
+    tree = ast.fix_missing_locations(_BranchNameTransformer().visit(tree))
+    return ast.unparse(tree.body)
+
+
+def make_edges(binning: Binning) -> np.ndarray:
+    """Bin edges from (nbins, xmin, xmax) or from a sequence of edges."""
+    if isinstance(binning, tuple) and len(binning) == 3 and isinstance(binning[0], (int, np.integer)):
+        nbins, xmin, xmax = binning
+        if nbins <= 0 or not xmax > xmin:
+            raise ValueError(f"Invalid binning {binning}: need nbins>0 and xmax>xmin")
+        return np.linspace(float(xmin), float(xmax), int(nbins)+1)
+    edges = np.asarray(binning, dtype=np.float64)
+    if edges.ndim != 1 or len(edges) < 2 or np.any(np.diff(edges) <= 0):
+        raise ValueError(f"Invalid binning {binning}: bin edges must be increasing")
+    return edges
+
+
+class Histogram:
+    """
+    A 1D or 2D histogram of weighted entries, with underflow and overflow bins.
+
+    Contents are stored in ROOT's global bin order (x fastest, bin 0 is the underflow),
+    so sumw[ibin] is what TH1::GetBinContent(ibin) of the ROOT histogram returns.
+
+    Args:
+        edges: One array of bin edges per axis
+    """
+
+    def __init__(self, edges: Sequence[np.ndarray]):
+        self.edges = [np.asarray(e, dtype=np.float64) for e in edges]
+        if len(self.edges) not in (1, 2):
+            raise ValueError(f"Histogram: only 1D and 2D histograms are supported, given {len(self.edges)} axes")
+        self.shape = tuple(len(e)+1 for e in self.edges)  # number of bins + 2 flow bins, per axis
+        self.ncells = int(np.prod(self.shape))
+        self.sumw = np.zeros(self.ncells, dtype=np.float64)
+        self.sumw2 = np.zeros(self.ncells, dtype=np.float64)
+        self.entries = 0
+
+    @property
+    def ndim(self) -> int:
+        return len(self.edges)
+
+    def _inner(self, flat: np.ndarray) -> np.ndarray:
+        """Drop the flow bins. 2D results are indexed [ix, iy], as numpy.histogram2d."""
+        if self.ndim == 1:
+            return flat[1:-1].copy()
+        return flat.reshape(self.shape[1], self.shape[0])[1:-1, 1:-1].T.copy()
+
+    @property
+    def values(self) -> np.ndarray:
+        """Bin contents without underflow/overflow."""
+        return self._inner(self.sumw)
+
+    @property
+    def errors(self) -> np.ndarray:
+        """Bin errors, sqrt(sum of weights squared), without underflow/overflow."""
+        return np.sqrt(self._inner(self.sumw2))
+
+    def bin_indices(self, *values: np.ndarray) -> np.ndarray:
+        """Global bin of each value (or each (x,y) pair), with TTree::Draw's rules for the edges."""
+        # searchsorted(side='right') gives 0 below the first edge, nbins+1 at or above the last
+        index = np.searchsorted(self.edges[0], values[0], side='right')
+        if self.ndim == 2:
+            index = index + self.shape[0]*np.searchsorted(self.edges[1], values[1], side='right')
+        return index
+
+    def fill(self, *values: np.ndarray, weights: Optional[np.ndarray] = None) -> None:
+        """Fill arrays of values (x, or x and y), with optional weights."""
+        index = self.bin_indices(*[np.asarray(v, dtype=np.float64) for v in values])
+        if weights is None:
+            counts = np.bincount(index, minlength=self.ncells)
+            self.sumw += counts
+            self.sumw2 += counts
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+            self.sumw += np.bincount(index, weights=weights, minlength=self.ncells)
+            self.sumw2 += np.bincount(index, weights=weights*weights, minlength=self.ncells)
+        self.entries += len(index)
+
+    def scale(self, factor: float) -> None:
+        self.sumw *= factor
+        self.sumw2 *= factor*factor
+
+    def add(self, other: "Histogram") -> None:
+        if other.shape != self.shape or any(not np.array_equal(a, b) for a, b in zip(self.edges, other.edges)):
+            raise ValueError("Histogram.add: histograms have different binning")
+        self.sumw += other.sumw
+        self.sumw2 += other.sumw2
+        self.entries += other.entries
+
+    @classmethod
+    def from_root(cls, hist) -> "Histogram":
+        """An empty Histogram with the binning of a ROOT TH1/TH2."""
+        axes = [hist.GetXaxis()] if hist.GetDimension() == 1 else [hist.GetXaxis(), hist.GetYaxis()]
+        return cls([np.array([axis.GetBinLowEdge(ibin) for ibin in range(1, axis.GetNbins()+2)])
+                    for axis in axes])
+
+    def copy_to_root(self, hist) -> None:
+        """Set the contents, errors and entries of a ROOT histogram with the same binning."""
+        if hist.GetNcells() != self.ncells:
+            raise ValueError(f"Histogram.copy_to_root: '{hist.GetName()}' has a different number of bins")
+        if hist.GetSumw2N() == 0:
+            hist.Sumw2()
+        hist.SetContent(array('d', self.sumw))
+        hist.SetError(array('d', np.sqrt(self.sumw2)))
+        hist.SetEntries(self.entries)
+
+    def to_root(self, name: str, title: str = ""):
+        """Make a ROOT TH1D/TH2D with the same bins, contents and errors."""
+        import ROOT as rt
+        xedges = array('d', self.edges[0])
+        if self.ndim == 1:
+            hist = rt.TH1D(name, title, len(xedges)-1, xedges)
+        else:
+            yedges = array('d', self.edges[1])
+            hist = rt.TH2D(name, title, len(xedges)-1, xedges, len(yedges)-1, yedges)
+        self.copy_to_root(hist)
+        return hist
+
+
+class HistSpec:
+    """
+    Description of a histogram to fill.
+
+    Args:
+        name: Name of the histogram
+        variable: Expression to histogram, or a pair of expressions (x, y) for a 2D histogram.
+                  A variable-length branch on its own fills every element, as TTree::Draw does.
+        binning: (nbins, xmin, xmax) or bin edges; a pair of those for a 2D histogram
+        selection: Expression that must be true for the entry to be filled (default: all entries)
+        weight: Expression for the weight of each entry (default: 1)
+        categories: Optional dictionary of label -> extra selection. One histogram is filled per
+                    label, named "<name>_<label>", e.g. signal and background of an MC sample.
+        title: Title given to the ROOT histograms
+    """
+
+    def __init__(self, name: str, variable: Union[str, Sequence[str]], binning,
+                 selection: Optional[str] = None, weight: Optional[str] = None,
+                 categories: Optional[Dict[str, str]] = None, title: str = ""):
+        self.name = name
+        self.variables = [variable] if isinstance(variable, str) else list(variable)
+        if len(self.variables) not in (1, 2):
+            raise ValueError(f"HistSpec '{name}': give one variable, or two for a 2D histogram")
+        if len(self.variables) == 1:
+            binning = [binning]
+        if len(binning) != len(self.variables):
+            raise ValueError(f"HistSpec '{name}': give one binning per variable")
+        self.edges = [make_edges(b) for b in binning]
+        self.selection = selection
+        self.weight = weight
+        self.categories = dict(categories) if categories else None
+        self.title = title
+
+    def output_names(self) -> List[str]:
+        """Names of the histograms this spec fills."""
+        if self.categories is None:
+            return [self.name]
+        return [f"{self.name}_{label}" for label in self.categories]
+
+    def __repr__(self) -> str:
+        return f"HistSpec({self.name!r}, {self.variables!r})"
+
+
+class MultiHistFiller:
+    """
+    Fill all the histograms of a list of HistSpec in one pass over a tree.
+
+    Args:
+        specs: The histograms to fill
+        chunk_size: Number of entries read at once
+    """
+
+    def __init__(self, specs: Sequence[HistSpec], chunk_size: int = 50000):
+        self.specs = list(specs)
+        self.chunk_size = chunk_size
+        names = [name for spec in self.specs for name in spec.output_names()]
+        duplicates = sorted(set(name for name in names if names.count(name) > 1))
+        if duplicates:
+            raise ValueError(f"MultiHistFiller: histogram names used more than once: {duplicates}")
+
+        # each distinct expression is compiled (and evaluated per chunk) once
+        self._formulas: Dict[str, CompiledFormula] = {}
+        for spec in self.specs:
+            for expression in self._spec_expressions(spec):
+                if expression not in self._formulas:
+                    self._formulas[expression] = CompiledFormula(draw_expression_to_formula(expression))
+
+    @staticmethod
+    def _spec_expressions(spec: HistSpec) -> List[str]:
+        expressions = list(spec.variables)
+        for expression in [spec.selection, spec.weight] + list((spec.categories or {}).values()):
+            if expression is not None:
+                expressions.append(expression)
+        return expressions
+
+    @property
+    def branches(self) -> List[str]:
+        """The branches read to fill the histograms."""
+        branches = []
+        for formula in self._formulas.values():
+            for branch in formula.branches:
+                if branch not in branches:
+                    branches.append(branch)
+        return branches
+
+    def _evaluate(self, expression: str, batch, values: Dict[str, Any]):
+        """Value of an expression for the chunk, a NumPy array or a JaggedArray. Computed once per chunk."""
+        if expression not in values:
+            formula = self._formulas[expression]
+            column = batch.columns.get(formula.branches[0]) if len(formula.branches) == 1 else None
+            if isinstance(column, JaggedArray) and formula.expression == f"ntuple.{formula.branches[0]}":
+                values[expression] = column
+            else:
+                values[expression] = formula.evaluate_batch(batch)
+        return values[expression]
+
+    def _mask(self, expressions: List[Optional[str]], batch, values: Dict[str, Any]) -> np.ndarray:
+        mask = np.ones(batch.size, dtype=bool)
+        for expression in expressions:
+            if expression is not None:
+                mask &= np.asarray(self._evaluate(expression, batch, values)).astype(bool)
+        return mask
+
+    def _fill_chunk(self, hists: Dict[str, Histogram], batch) -> None:
+        values = {}
+        for spec in self.specs:
+            variables = [self._evaluate(v, batch, values) for v in spec.variables]
+            weight = None
+            if spec.weight is not None:
+                weight = np.asarray(self._evaluate(spec.weight, batch, values), dtype=np.float64)
+
+            # a variable-length branch is filled element by element: event values are repeated
+            jagged = [v for v in variables if isinstance(v, JaggedArray)]
+            entry_index = jagged[0].entry_index() if jagged else None
+            if any(len(v.content) != len(jagged[0].content) for v in jagged):
+                raise ValueError(f"HistSpec '{spec.name}': variable-length variables have different lengths")
+
+            categories = spec.categories if spec.categories is not None else {None: None}
+            for label, category in categories.items():
+                mask = self._mask([spec.selection, category], batch, values)
+                if entry_index is not None:
+                    mask = mask[entry_index]
+                fill_values = [v.content[mask] if isinstance(v, JaggedArray)
+                               else (v[entry_index] if entry_index is not None else v)[mask]
+                               for v in variables]
+                fill_weight = None
+                if weight is not None:
+                    fill_weight = (weight[entry_index] if entry_index is not None else weight)[mask]
+                name = spec.name if label is None else f"{spec.name}_{label}"
+                hists[name].fill(*fill_values, weights=fill_weight)
+
+    def new_histograms(self) -> Dict[str, Histogram]:
+        """Empty histograms for all specs."""
+        hists = {}
+        for spec in self.specs:
+            for name in spec.output_names():
+                hists[name] = Histogram(spec.edges)
+        return hists
+
+    def fill(self, tree, start: int = 0, stop: Optional[int] = None) -> Dict[str, Histogram]:
+        """
+        Fill the histograms from a TTree/TChain.
+
+        Returns:
+            Dictionary of histogram name -> Histogram
+        """
+        hists = self.new_histograms()
+        for batch in read_column_batches(tree, self.branches, chunk_size=self.chunk_size, start=start, stop=stop):
+            self._fill_chunk(hists, batch)
+        return hists
+
+    def fill_file(self, filepath: str, treename: str = 'analysis_tree', scale: Optional[float] = None,
+                  target_pot: Optional[float] = None, target_nspills: Optional[float] = None) -> Dict[str, Histogram]:
+        """
+        Fill the histograms from an analysis output file, and scale them.
+
+        Args:
+            filepath: Output file of lantern_ana
+            treename: Name of the tree to read
+            scale: Scale factor for the histograms. If not given, it is computed from the
+                   livetime_tree of the file and the target (see livetime_scale).
+            target_pot: POT to scale MC samples to
+            target_nspills: Number of spills to scale non-MC samples (e.g. EXT) to
+
+        Returns:
+            Dictionary of histogram name -> Histogram
+        """
+        import ROOT as rt
+        rfile = rt.TFile.Open(filepath)
+        if not rfile or rfile.IsZombie():
+            raise FileNotFoundError(f"MultiHistFiller: cannot open {filepath}")
+        try:
+            tree = rfile.Get(treename)
+            if not tree:
+                raise ValueError(f"MultiHistFiller: no tree '{treename}' in {filepath}")
+            hists = self.fill(tree)
+            if scale is None and (target_pot is not None or target_nspills is not None):
+                scale = livetime_scale(read_livetime(rfile), target_pot, target_nspills)
+        finally:
+            rfile.Close()
+        if scale is not None and scale != 1.0:
+            for hist in hists.values():
+                hist.scale(scale)
+        return hists
+
+
+def read_livetime(rfile, treename: str = 'livetime_tree') -> Dict[str, Any]:
+    """
+    Sum the POT and spills in the livetime_tree of an analysis output file.
+
+    Args:
+        rfile: Path of the file, or an open TFile
+
+    Returns:
+        Dictionary with 'pot', 'nspills' and 'ismc'
+    """
+    import ROOT as rt
+    opened = isinstance(rfile, str)
+    if opened:
+        path = rfile
+        rfile = rt.TFile.Open(path)
+        if not rfile or rfile.IsZombie():
+            raise FileNotFoundError(f"read_livetime: cannot open {path}")
+    try:
+        tree = rfile.Get(treename)
+        if not tree:
+            raise ValueError(f"read_livetime: no tree '{treename}' in {rfile.GetName()}")
+        livetime = {'pot': 0.0, 'nspills': 0.0, 'ismc': False}
+        for ientry in range(tree.GetEntries()):
+            tree.GetEntry(ientry)
+            livetime['pot'] += tree.pot
+            livetime['nspills'] += tree.nspills
+            livetime['ismc'] = livetime['ismc'] or tree.ismc == 1
+        return livetime
+    finally:
+        if opened:
+            rfile.Close()
+
+
+def livetime_scale(livetime: Dict[str, Any], target_pot: Optional[float] = None,
+                   target_nspills: Optional[float] = None) -> float:
+    """
+    Scale factor of a sample from its livetime (read_livetime).
+
+    MC samples are scaled to target_pot, non-MC samples to target_nspills.
+    A sample without a target is not scaled.
+    """
+    if livetime['ismc']:
+        target, denominator, what = target_pot, livetime['pot'], 'POT'
+    else:
+        target, denominator, what = target_nspills, livetime['nspills'], 'spills'
+    if target is None:
+        return 1.0
+    if denominator <= 0:
+        raise ValueError(f"livetime_scale: the livetime_tree has no {what}. Give the scale factor instead.")
+    return target/denominator
@@ -0,0 +1,44 @@
+"""
+Make the grid of reverse space-charge offsets used by apply_sce_correction_array.
+
+Samples larutil.SpaceChargeMicroBooNE (kMCC9_Backward) once on a regular grid, then
+compares the interpolated corrections with the tool at random points. The exit code
+is 1 if the largest difference is above the tolerance.
+
+Example:
+    python -m lantern_ana.utils.make_sce_grid --spacing 5.0 --check 10000 --tolerance 0.5
+"""
+
+import sys
+import numpy as np
+from typing import List, Optional
+
+from lantern_ana.utils.spacecharge import make_sce_grid, check_sce_grid, default_sce_grid_path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sample the reverse SCE map onto a grid for apply_sce_correction_array")
+    parser.add_argument('--output', default=None, help='Output .npy file (default: LANTERN_ANA_SCE_GRID or the lantern_ana cache directory)')
+    parser.add_argument('--spacing', type=float, default=5.0, help='Distance between grid points (cm)')
+    parser.add_argument('--check', type=int, default=10000, help='Number of random points to compare with the SCE tool (0: no check)')
+    parser.add_argument('--tolerance', type=float, default=0.5, help='Largest allowed difference with the SCE tool (cm)')
+    args = parser.parse_args(argv)
+
+    output = args.output if args.output is not None else default_sce_grid_path()
+    print(f"Sampling the reverse SCE map every {args.spacing} cm into {output}")
+    make_sce_grid(output, spacing=args.spacing)
+
+    if args.check > 0:
+        diffs = check_sce_grid(output, npoints=args.check)
+        print(f"Difference with the SCE tool at {args.check} points: mean {diffs.mean():.4f} cm, "
+              f"p99 {np.percentile(diffs, 99):.4f} cm, max {diffs.max():.4f} cm")
+        if diffs.max() > args.tolerance:
+            print(f"Largest difference is above the tolerance of {args.tolerance} cm: use a smaller --spacing")
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
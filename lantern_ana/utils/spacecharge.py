@@ -1,5 +1,26 @@
+import os
+import json
+import numpy as np
+
+__all__ = ['get_reverse_scetool', 'apply_sce_correction', 'default_sce_grid_path', 'make_sce_grid',
+           'load_sce_grid', 'sce_offsets_array', 'apply_sce_correction_array', 'check_sce_grid']
+
 _uboone_reverse_scetool = None
 
+# grids loaded by load_sce_grid, by file path
+_sce_grids = {}
+
+def get_reverse_scetool():
+    """
+    The MicroBooNE reverse SCE tool (larutil.SpaceChargeMicroBooNE, kMCC9_Backward), made on first use.
+    """
+    global _uboone_reverse_scetool
+    if _uboone_reverse_scetool is None:
+        from larlite import larlite
+        from larlite import larutil
+        _uboone_reverse_scetool = larutil.SpaceChargeMicroBooNE( larutil.SpaceChargeMicroBooNE.kMCC9_Backward )
+    return _uboone_reverse_scetool
+
 def apply_sce_correction( pos ):
     """
     Remove the space-charge effect using MicroBooNE reverse SCE tool
@@ -10,12 +31,134 @@ def apply_sce_correction( pos ):
     Returns:
     - tuple with (x,y,z) values
     """
-    global _uboone_reverse_scetool
-    if _uboone_reverse_scetool is None:
-        from larlite import larlite
-        from larlite import larutil
-        _uboone_reverse_scetool = larutil.SpaceChargeMicroBooNE( larutil.SpaceChargeMicroBooNE.kMCC9_Backward )
+    offset_v = get_reverse_scetool().GetPosOffsets( pos[0], pos[1], pos[2] )
+
+    return (pos[0]+offset_v[0], pos[1]+offset_v[1], pos[2]+offset_v[2])
+
+def default_sce_grid_path():
+    """
+    Path of the SCE grid file used when none is given: the LANTERN_ANA_SCE_GRID environment
+    variable, or uboone_sce_backward_grid.npy in the lantern_ana cache directory.
+    """
+    if 'LANTERN_ANA_SCE_GRID' in os.environ:
+        return os.environ['LANTERN_ANA_SCE_GRID']
+    from lantern_ana.utils.cache import get_cache_dir
+    return os.path.join(get_cache_dir('sce'), 'uboone_sce_backward_grid.npy')
+
+def make_sce_grid( filepath, spacing=5.0, bounds=((0, 256), (-116.5, 116.5), (0, 1036)) ):
+    """
+    Sample the offsets of the reverse SCE tool on a regular 3D grid and save them.
+
+    Writes the offsets, an (nx,ny,nz,3) float32 array, to filepath (.npy) and the
+    grid definition to filepath with .json appended. Needs larlite.
+
+    Parameters:
+    - filepath: output .npy file
+    - spacing: distance between grid points in cm
+    - bounds: ((xmin,xmax),(ymin,ymax),(zmin,zmax)) covered by the grid (default: the TPC)
+    """
+    tool = get_reverse_scetool()
+    lo = np.array([b[0] for b in bounds], dtype=np.float64)
+    hi = np.array([b[1] for b in bounds], dtype=np.float64)
+    shape = tuple( int(np.ceil((hi[i]-lo[i])/spacing))+1 for i in range(3) )
+
+    offsets = np.lib.format.open_memmap( filepath, mode='w+', dtype=np.float32, shape=shape+(3,) )
+    for ix in range(shape[0]):
+        x = lo[0] + ix*spacing
+        for iy in range(shape[1]):
+            y = lo[1] + iy*spacing
+            for iz in range(shape[2]):
+                offset_v = tool.GetPosOffsets( x, y, lo[2] + iz*spacing )
+                offsets[ix,iy,iz,:] = (offset_v[0], offset_v[1], offset_v[2])
+    offsets.flush()
+    del offsets
+
+    with open(filepath+'.json','w') as f:
+        json.dump( {'origin':lo.tolist(), 'spacing':[spacing]*3, 'shape':list(shape)}, f )
+
+def load_sce_grid( filepath=None ):
+    """
+    Load an SCE grid written by make_sce_grid. The offsets are memory-mapped, and
+    the grid is kept for later calls.
+
+    Returns:
+    - dictionary with 'origin', 'spacing' and 'shape' of the grid and the 'offsets' array
+    """
+    if filepath is None:
+        filepath = default_sce_grid_path()
+    if filepath not in _sce_grids:
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"SCE grid {filepath} not found. Make it with "
+                                    f"'python -m lantern_ana.utils.make_sce_grid --output {filepath}'")
+        with open(filepath+'.json') as f:
+            grid = json.load(f)
+        grid['origin'] = np.array(grid['origin'], dtype=np.float64)
+        grid['spacing'] = np.array(grid['spacing'], dtype=np.float64)
+        grid['offsets'] = np.load( filepath, mmap_mode='r' )
+        if tuple(grid['offsets'].shape) != tuple(grid['shape'])+(3,):
+            raise ValueError(f"SCE grid {filepath} has shape {grid['offsets'].shape}, expected {tuple(grid['shape'])+(3,)}")
+        _sce_grids[filepath] = grid
+    return _sce_grids[filepath]
+
+def sce_offsets_array( points, grid_file=None ):
+    """
+    Reverse SCE offsets for an (N,3) array of positions, trilinearly interpolated from the grid
+    made by make_sce_grid. Points outside the grid get the offsets of the closest grid edge.
+    Does not need larlite.
+
+    Returns:
+    - (N,3) array of offsets
+    """
+    grid = load_sce_grid( grid_file )
+    points = np.asarray(points, dtype=np.float64).reshape(-1,3)
+    shape = np.array(grid['shape'])
+    offsets = grid['offsets']
 
-    offset_v = _uboone_reverse_scetool.GetPosOffsets( pos[0], pos[1], pos[2] )
+    # position in grid units, the cell below it, and the fraction across the cell
+    u = np.clip( (points-grid['origin'])/grid['spacing'], 0, shape-1 )
+    i0 = np.minimum( np.floor(u).astype(np.int64), np.maximum(shape-2, 0) )
+    i1 = np.minimum( i0+1, shape-1 )
+    t = (u-i0)[:,:,np.newaxis]
 
-    return (pos[0]+offset_v[0], pos[1]+offset_v[1], pos[2]+offset_v[2])
\ No newline at end of file
+    result = np.zeros( points.shape, dtype=np.float64 )
+    for cx in (0,1):
+        ix = i1[:,0] if cx else i0[:,0]
+        wx = t[:,0] if cx else 1.0-t[:,0]
+        for cy in (0,1):
+            iy = i1[:,1] if cy else i0[:,1]
+            wy = t[:,1] if cy else 1.0-t[:,1]
+            for cz in (0,1):
+                iz = i1[:,2] if cz else i0[:,2]
+                wz = t[:,2] if cz else 1.0-t[:,2]
+                result += wx*wy*wz*offsets[ix,iy,iz]
+    return result
+
+def apply_sce_correction_array( points, grid_file=None ):
+    """
+    Remove the space-charge effect for many points at once, using the grid made by make_sce_grid.
+    Batch version of apply_sce_correction.
+
+    Parameters:
+    - points: (N,3) array of reconstructed (x,y,z) positions
+
+    Returns:
+    - (N,3) array of corrected positions
+    """
+    points = np.asarray(points, dtype=np.float64).reshape(-1,3)
+    return points + sce_offsets_array( points, grid_file )
+
+def check_sce_grid( grid_file=None, npoints=10000, seed=0 ):
+    """
+    Compare the grid interpolation with the reverse SCE tool at random points inside the grid. Needs larlite.
+
+    Returns:
+    - array with the distance (cm) between the two corrected positions for each point
+    """
+    grid = load_sce_grid( grid_file )
+    lo = grid['origin']
+    hi = lo + grid['spacing']*(np.array(grid['shape'])-1)
+    rng = np.random.default_rng(seed)
+    points = rng.uniform( lo, hi, size=(npoints,3) )
+    corrected = apply_sce_correction_array( points, grid_file )
+    expected = np.array([ apply_sce_correction(p) for p in points ])
+    return np.sqrt( ((corrected-expected)**2).sum(axis=1) )
@@ -0,0 +1,62 @@
+"""
+Tests of the array versions of the TPC geometry helpers: dwall_array and is_inside_tpc_array
+must give the same result as dwall and is_inside_tpc point by point, also for points on
+the TPC walls, edges and corners.
+"""
+
+import itertools
+
+import numpy as np
+import pytest
+
+from lantern_ana.utils.boundarytests import get_uboone_tpc_bounds, is_inside_tpc, is_inside_tpc_array
+from lantern_ana.utils.fiducial_volume import dwall, dwall_array
+
+
+def make_points():
+    """Random points in and around the TPC, and points on its walls, edges and corners."""
+    rng = np.random.default_rng(17)
+    bounds = np.asarray(get_uboone_tpc_bounds(), dtype=np.float64)
+    lo, hi = bounds[:,0], bounds[:,1]
+    points = [lo-50.0 + rng.random((2000, 3))*(hi-lo+100.0)]
+
+    # every combination of below, on the low wall, inside, on the high wall and above, in each dimension
+    steps = np.stack([lo-5.0, lo, 0.5*(lo+hi), hi, hi+5.0], axis=1)
+    points.append(np.array(list(itertools.product(*steps))))
+
+    # random points moved onto one wall
+    on_wall = lo + rng.random((300, 3))*(hi-lo)
+    dims = rng.integers(0, 3, len(on_wall))
+    sides = rng.integers(0, 2, len(on_wall))
+    on_wall[np.arange(len(on_wall)), dims] = bounds[dims, sides]
+    points.append(on_wall)
+    return np.concatenate(points)
+
+
+POINTS = make_points()
+
+
+def test_is_inside_tpc_array():
+    expected = np.array([is_inside_tpc(pos) for pos in POINTS])
+    assert expected.any() and not expected.all()
+    np.testing.assert_array_equal(is_inside_tpc_array(POINTS), expected)
+
+
+def test_dwall_array():
+    expected = np.array([dwall(*pos) for pos in POINTS])
+    np.testing.assert_array_equal(dwall_array(POINTS), expected)
+
+
+def test_dwall_array_dim_dists():
+    mindist, dimdists = dwall_array(POINTS, return_dim_dists=True)
+    for pos, dist, dims in zip(POINTS, mindist, dimdists):
+        expected_dist, expected_dims = dwall(*pos, return_dim_dists=True)
+        assert dist == expected_dist
+        np.testing.assert_array_equal(dims, expected_dims)
+
+
+@pytest.mark.parametrize("pos", [[], [[10.0, 0.0, 100.0]], [10.0, 0.0, 100.0]])
+def test_shapes(pos):
+    npoints = len(np.asarray(pos).reshape(-1, 3))
+    assert dwall_array(pos).shape == (npoints,)
+    assert is_inside_tpc_array(pos).shape == (npoints,)
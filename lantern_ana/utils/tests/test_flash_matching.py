@@ -0,0 +1,173 @@
+"""
+Tests of the flash-prediction matching: match_candidates and best_candidate against the
+loops they replaced, and FlashPredictionProducer giving the same values event by event
+(processEvent) and for a chunk of events (processBatch).
+"""
+
+import numpy as np
+import pytest
+
+from lantern_ana.io.columnar import ColumnBatch, JaggedArray
+from lantern_ana.utils.flash_matching import match_candidates, best_candidate, best_candidate_batch
+
+
+def loop_best(divergence, matched, preselected=None):
+    """The loop best_candidate replaced: keep a candidate with a strictly lower divergence."""
+    if preselected is not None and np.any(matched & preselected):
+        matched = matched & preselected
+    ibest, best = -1, float('inf')
+    for i, (value, ok) in enumerate(zip(divergence, matched)):
+        if ok and value < best:
+            ibest, best = i, value
+    return ibest
+
+
+def test_match_candidates_threshold():
+    x = [0.5, 0.0, 0.25, 3.0]
+    y = [0.0, 0.0, 0.0, 0.0]
+    z = [0.0, 0.0, 0.0, 0.0]
+    # candidate 0 is exactly at the squared distance 0.25
+    np.testing.assert_array_equal(match_candidates((0.0, 0.0, 0.0), x, y, z, 0.25), [False, True, True, False])
+    np.testing.assert_array_equal(match_candidates((0.0, 0.0, 0.0), x, y, z, 0.25, inclusive=True),
+                                  [True, True, True, False])
+
+
+def test_match_candidates_counts():
+    x = y = z = [1.0, 1.0, 1.0, 1.0]
+    matched = match_candidates((1.0, 1.0, 1.0), x, y, z, 1.0e-3,
+                               counts=[(2, [2, 2, 1, 2]), (1, [1, 0, 1, 1])])
+    np.testing.assert_array_equal(matched, [True, False, False, True])
+
+
+@pytest.mark.parametrize("divergence, matched, expected", [
+    ([3.0, 1.0, 2.0], [True, True, True], 1),
+    ([3.0, 1.0, 1.0], [True, True, True], 1),
+    ([3.0, 1.0, 2.0], [True, False, True], 2),
+    ([np.nan, 2.0, 5.0], [True, True, True], 1),
+    ([np.inf, 2.0, np.inf], [True, True, True], 1),
+    ([np.nan, np.inf], [True, True], -1),
+    ([1.0, 2.0], [False, False], -1),
+])
+def test_best_candidate(divergence, matched, expected):
+    divergence = np.array(divergence)
+    matched = np.array(matched)
+    assert best_candidate(divergence, matched) == expected
+    assert loop_best(divergence, matched) == expected
+
+
+def test_best_candidate_preselection():
+    divergence = np.array([1.0, 5.0, 3.0, np.nan])
+    matched = np.array([True, True, True, True])
+    assert best_candidate(divergence, matched, np.array([False, True, True, False])) == 2
+    assert best_candidate(divergence, matched, np.array([False, False, False, False])) == 0
+    # a preselected candidate without a finite divergence is not a passing candidate
+    assert best_candidate(divergence, matched, np.array([False, False, False, True])) == 0
+
+
+def test_best_candidate_batch_matches_single_events():
+    rng = np.random.default_rng(4)
+    counts = rng.integers(0, 6, 300)
+    offsets = np.concatenate([[0], np.cumsum(counts)])
+    entry_index = np.repeat(np.arange(len(counts)), counts)
+    divergence = rng.exponential(10.0, offsets[-1])
+    special = rng.random(len(divergence))
+    divergence[special < 0.1] = np.nan
+    divergence[(special >= 0.1) & (special < 0.2)] = np.inf
+    divergence[(special >= 0.2) & (special < 0.3)] = 1.0  # ties
+    matched = rng.random(len(divergence)) < 0.7
+    preselected = rng.random(len(divergence)) < 0.4
+
+    best = best_candidate_batch(entry_index, len(counts), divergence, matched, preselected)
+    for i in range(len(counts)):
+        start, stop = offsets[i], offsets[i+1]
+        expected = loop_best(divergence[start:stop], matched[start:stop] & np.isfinite(divergence[start:stop]),
+                             preselected[start:stop])
+        assert best[i] == (start+expected if expected >= 0 else -1)
+
+
+# flash predictions of three events: the first vertex of each event is the saved one
+EVENTS = [
+    {'foundVertex': 1, 'vtx': (10.0, 0.0, 100.0), 'nTracks': 2, 'nShowers': 1, 'obs_total_pe': 200.0,
+     'reco_vertex': [(10.0, 0.0, 100.0), (10.0, 0.0, 100.0), (50.0, 5.0, 300.0)],
+     'n_tracks_all': [2, 1, 2], 'n_showers_all': [1, 1, 1],
+     'pred_total_pe_all': [90.0, 120.0, 60.0],
+     'sinkhorn_div_all': [[0.0, 12.0, 0.0], [0.0, 3.0, 0.0], [0.0, 1.0, 0.0]]},
+    # two matched vertices, the one with the lower divergence has a NaN
+    {'foundVertex': 1, 'vtx': (20.0, 1.0, 200.0), 'nTracks': 1, 'nShowers': 0, 'obs_total_pe': 50.0,
+     'reco_vertex': [(20.0, 1.0, 200.0), (20.0, 1.0, 200.0)],
+     'n_tracks_all': [1, 1], 'n_showers_all': [0, 0],
+     'pred_total_pe_all': [30.0, 20.0],
+     'sinkhorn_div_all': [[0.0, 40.0, 0.0], [0.0, np.nan, 0.0]]},
+    # no vertex: the outputs go back to the defaults
+    {'foundVertex': 0, 'vtx': (0.0, 0.0, 0.0), 'nTracks': 0, 'nShowers': 0, 'obs_total_pe': 10.0,
+     'reco_vertex': [], 'n_tracks_all': [], 'n_showers_all': [],
+     'pred_total_pe_all': [], 'sinkhorn_div_all': []},
+]
+
+
+def make_producer():
+    from lantern_ana.producers.FlashPredictionProducer import FlashPredictionProducer
+    producer = FlashPredictionProducer('flashpred', {})
+    producer.setDefaultValues()
+    return producer
+
+
+def event_ntuple(event):
+    """The event as the ntuple gives it, with std::vector branches."""
+    from types import SimpleNamespace
+    import ROOT as rt
+
+    def vector(values, typename='float'):
+        vec = rt.std.vector(typename)()
+        for value in values:
+            vec.push_back(value)
+        return vec
+
+    nested = rt.std.vector('std::vector<float>')()
+    for row in event['sinkhorn_div_all']:
+        nested.push_back(vector(row))
+    return SimpleNamespace(
+        foundVertex=event['foundVertex'], vtxX=event['vtx'][0], vtxY=event['vtx'][1], vtxZ=event['vtx'][2],
+        nTracks=event['nTracks'], nShowers=event['nShowers'], obs_total_pe=event['obs_total_pe'],
+        reco_vertex_x=vector([v[0] for v in event['reco_vertex']]),
+        reco_vertex_y=vector([v[1] for v in event['reco_vertex']]),
+        reco_vertex_z=vector([v[2] for v in event['reco_vertex']]),
+        n_tracks_all=vector(event['n_tracks_all'], 'int'), n_showers_all=vector(event['n_showers_all'], 'int'),
+        pred_total_pe_all=vector(event['pred_total_pe_all']), sinkhorn_div_all=nested)
+
+
+def events_batch():
+    columns = {
+        'foundVertex': np.array([ev['foundVertex'] for ev in EVENTS], dtype=np.int32),
+        'nTracks': np.array([ev['nTracks'] for ev in EVENTS], dtype=np.int32),
+        'nShowers': np.array([ev['nShowers'] for ev in EVENTS], dtype=np.int32),
+        'obs_total_pe': np.array([ev['obs_total_pe'] for ev in EVENTS], dtype=np.float32),
+    }
+    for i, axis in enumerate('XYZ'):
+        columns['vtx'+axis] = np.array([ev['vtx'][i] for ev in EVENTS], dtype=np.float32)
+        columns['reco_vertex_'+axis.lower()] = JaggedArray.from_sequences(
+            [[v[i] for v in ev['reco_vertex']] for ev in EVENTS], dtype=np.float32)
+    for name in ['n_tracks_all', 'n_showers_all']:
+        columns[name] = JaggedArray.from_sequences([ev[name] for ev in EVENTS], dtype=np.int32)
+    columns['pred_total_pe_all'] = JaggedArray.from_sequences([ev['pred_total_pe_all'] for ev in EVENTS],
+                                                              dtype=np.float32)
+    columns['sinkhorn_div_all'] = JaggedArray.from_sequences(
+        [np.array(ev['sinkhorn_div_all'], dtype=np.float32).reshape(-1, 3) for ev in EVENTS], dtype=np.float32)
+    return ColumnBatch(0, len(EVENTS), columns)
+
+
+def test_producer_event_and_batch_agree():
+    producer = make_producer()
+    per_event = [producer.processEvent({'gen2ntuple': event_ntuple(ev)}, {'ismc': True}) for ev in EVENTS]
+    batch_out = make_producer().processBatch({'gen2ntuple': events_batch()}, {'ismc': True})
+
+    # first event: vertex 1 has the same position but another track count; vertex 0 is chosen
+    assert per_event[0]['sinkhorn_div'] == pytest.approx(12.0)
+    assert per_event[0]['predictedpe'] == pytest.approx(180.0)
+    # second event: the NaN divergence is never chosen
+    assert per_event[1]['sinkhorn_div'] == pytest.approx(40.0)
+    # third event: defaults, not the values of the previous event
+    assert per_event[2] == {'predictedpe': 0.0, 'observedpe': 0.0, 'fracerr': 0.0, 'sinkhorn_div': 9999.0}
+
+    for name in ['predictedpe', 'observedpe', 'fracerr', 'sinkhorn_div']:
+        np.testing.assert_allclose(batch_out[name], [out[name] for out in per_event], rtol=1e-6)
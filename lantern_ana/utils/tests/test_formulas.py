@@ -0,0 +1,105 @@
+"""
+Tests of CompiledFormula and FormulaSelection: evaluating a formula entry by entry and on
+a whole batch (where and/or/not and chained comparisons are rewritten into NumPy calls)
+must give the same values.
+"""
+
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from lantern_ana.utils.formulas import CompiledFormula, FormulaSelection
+
+COLUMNS = {
+    'vtxX':  np.array([-5.0, 10.0, 120.0, 250.0, 30.0, 0.0]),
+    'found': np.array([1, 0, 1, 1, 1, 0], dtype=np.int32),
+    'nTracks': np.array([0, 2, 1, 3, 0, 1], dtype=np.int32),
+    'energy': np.array([0.5, 1.5, 2.5, 0.0, 3.0, 1.0]),
+}
+
+
+def make_batch():
+    """A stand-in for ColumnBatch: branches as attributes, plus the number of events."""
+    return SimpleNamespace(size=len(COLUMNS['vtxX']), **COLUMNS)
+
+
+def make_entries():
+    """One ntuple-like object per entry, with scalar branch values."""
+    nentries = len(COLUMNS['vtxX'])
+    return [SimpleNamespace(**{name: values[i].item() for name, values in COLUMNS.items()})
+            for i in range(nentries)]
+
+
+FORMULAS = [
+    "ntuple.vtxX > 0",
+    "ntuple.found==1 and ntuple.nTracks>0",
+    "ntuple.found==1 or ntuple.energy>2.0",
+    "not ntuple.found==1",
+    "not (ntuple.found==1 and ntuple.nTracks>0) or ntuple.energy<1.0",
+    "ntuple.found==1 and (ntuple.nTracks==0 or ntuple.nTracks>2)",
+    "0 < ntuple.vtxX < 200",
+    "0 <= ntuple.vtxX < 200 and ntuple.found==1",
+    "-10 < ntuple.vtxX <= 30 < 100",
+    "ntuple.energy*1000.0 if ntuple.found==1 else -1.0",
+    "{ntuple.found}==1 and {ntuple.vtxX}>0",
+    "np.sqrt(ntuple.energy) + abs(ntuple.vtxX)",
+]
+
+
+@pytest.mark.parametrize("formula", FORMULAS)
+def test_batch_matches_entries(formula):
+    f = CompiledFormula(formula)
+    expected = np.array([f(entry) for entry in make_entries()], dtype=np.float64)
+    values = f.evaluate_batch(make_batch())
+    assert values.shape == (len(expected),)
+    np.testing.assert_allclose(values.astype(np.float64), expected)
+
+
+def test_prefix():
+    f = CompiledFormula("energy", prefix="ntuple.")
+    assert f.branches == ['energy']
+    np.testing.assert_array_equal(f.evaluate_batch(make_batch()), COLUMNS['energy'])
+
+
+def test_constant_formula_is_broadcast():
+    values = CompiledFormula("1.0").evaluate_batch(make_batch())
+    np.testing.assert_array_equal(values, np.ones(len(COLUMNS['vtxX'])))
+
+
+@pytest.mark.parametrize("formula, branches", [
+    ("ntuple.vtxX > 0", ['vtxX']),
+    ("{ntuple.found}==1 and {ntuple.vtxX}>0 and ntuple.found<2", ['found', 'vtxX']),
+    ("0 < ntuple.vtxX < ntuple.energy*100", ['vtxX', 'energy']),
+    ("np.sum(ntuple.energy) > math.pi", ['energy']),
+    ("1.0", []),
+])
+def test_branches(formula, branches):
+    assert sorted(CompiledFormula(formula).branches) == sorted(branches)
+
+
+def test_invalid_formula_raises():
+    with pytest.raises(ValueError):
+        CompiledFormula("ntuple.vtxX >")
+
+
+def test_selection_matches_entries():
+    selection = FormulaSelection({'has_vertex': "{ntuple.found}==1",
+                                  'in_x': "0 < ntuple.vtxX < 200",
+                                  'unused': "ntuple.nTracks > 100"},
+                                 ['has_vertex', 'in_x'])
+    expected = np.array([selection(entry) for entry in make_entries()])
+    np.testing.assert_array_equal(selection.evaluate_batch(make_batch()), expected)
+    np.testing.assert_array_equal(expected, [False, False, True, False, True, False])
+    assert selection.branches == ['found', 'vtxX']
+
+
+def test_selection_default_criteria_are_all_cuts():
+    selection = FormulaSelection({'a': "ntuple.found==1", 'b': "ntuple.energy>0"})
+    assert selection.criteria == ['a', 'b']
+    assert selection.branches == ['found', 'energy']
+
+
+def test_selection_unknown_criterion_raises():
+    with pytest.raises(ValueError):
+        FormulaSelection({'a': "ntuple.found==1"}, ['a', 'b'])
@@ -0,0 +1,230 @@
+"""
+Tests of the NumPy histogramming in hist_filler: Histogram binning and filling against
+np.histogram/np.histogram2d, copying into a ROOT histogram, the conversion of TTree::Draw
+expressions, and filling variable-length branches element by element. No ROOT file is read: MultiHistFiller.fill
+is given ColumnBatch objects built from arrays.
+"""
+
+import warnings
+
+import numpy as np
+import pytest
+
+from lantern_ana.io.columnar import ColumnBatch, JaggedArray
+from lantern_ana.utils import hist_filler
+from lantern_ana.utils.hist_filler import (Histogram, HistSpec, MultiHistFiller,
+                                           draw_expression_to_formula, make_edges)
+
+EDGES = make_edges((5, 0.0, 10.0))
+YEDGES = np.array([-1.0, 0.0, 0.5, 2.0])
+
+
+def sample_values(rng, n=1000):
+    """Values spread over the range and beyond, plus values exactly on every edge."""
+    values = rng.uniform(-3.0, 13.0, n)
+    return np.concatenate([values, EDGES, EDGES])
+
+
+def test_make_edges():
+    np.testing.assert_allclose(EDGES, [0, 2, 4, 6, 8, 10])
+    np.testing.assert_array_equal(make_edges([0, 1, 3]), [0, 1, 3])
+    for binning in [(0, 0, 1), (5, 1, 1), [0, 2, 1], [1.0]]:
+        with pytest.raises(ValueError):
+            make_edges(binning)
+
+
+def test_bin_indices_1d():
+    values = np.array([-1.0, 0.0, 1.9, 2.0, 9.99, 10.0, 11.0])
+    hist = Histogram([EDGES])
+    # a value on a lower edge goes in that bin; xmax itself is overflow, as in ROOT
+    np.testing.assert_array_equal(hist.bin_indices(values), [0, 1, 1, 2, 5, 6, 6])
+
+
+def test_bin_indices_2d():
+    hist = Histogram([EDGES, YEDGES])
+    nx = len(EDGES)+1
+    x = np.array([-1.0, 0.0, 5.0, 10.0, 3.0])
+    y = np.array([-2.0, -1.0, 0.5, 2.0, 1.0])
+    expected = [0 + nx*0, 1 + nx*1, 3 + nx*3, 6 + nx*4, 2 + nx*3]
+    np.testing.assert_array_equal(hist.bin_indices(x, y), expected)
+
+
+@pytest.mark.parametrize("weighted", [False, True])
+def test_fill_1d_matches_numpy(weighted):
+    rng = np.random.default_rng(1)
+    values = sample_values(rng)
+    weights = rng.uniform(0.0, 2.0, len(values)) if weighted else None
+    hist = Histogram([EDGES])
+    # fill in two parts, as MultiHistFiller does with chunks
+    half = len(values)//2
+    hist.fill(values[:half], weights=None if weights is None else weights[:half])
+    hist.fill(values[half:], weights=None if weights is None else weights[half:])
+
+    w = np.ones(len(values)) if weights is None else weights
+    # np.histogram puts xmax in the last bin; ROOT (and Histogram) put it in the overflow
+    inside = values < EDGES[-1]
+    expected, _ = np.histogram(values[inside], bins=EDGES, weights=w[inside])
+    expected_w2, _ = np.histogram(values[inside], bins=EDGES, weights=w[inside]**2)
+    np.testing.assert_allclose(hist.values, expected)
+    np.testing.assert_allclose(hist.errors, np.sqrt(expected_w2))
+    np.testing.assert_allclose(hist.sumw[0], w[values < EDGES[0]].sum())
+    np.testing.assert_allclose(hist.sumw[-1], w[values >= EDGES[-1]].sum())
+    np.testing.assert_allclose(hist.sumw.sum(), w.sum())
+    assert hist.entries == len(values)
+
+
+def test_fill_2d_matches_numpy():
+    rng = np.random.default_rng(2)
+    x = sample_values(rng)
+    y = rng.uniform(-1.5, 2.5, len(x))
+    y[:len(YEDGES)] = YEDGES
+    weights = rng.uniform(0.0, 2.0, len(x))
+    hist = Histogram([EDGES, YEDGES])
+    hist.fill(x, y, weights=weights)
+
+    inside = (x >= EDGES[0]) & (x < EDGES[-1]) & (y >= YEDGES[0]) & (y < YEDGES[-1])
+    expected, _, _ = np.histogram2d(x[inside], y[inside], bins=[EDGES, YEDGES], weights=weights[inside])
+    assert hist.values.shape == expected.shape
+    np.testing.assert_allclose(hist.values, expected)
+
+    # flow cells, in ROOT's global bin order (x fastest)
+    flat = hist.sumw.reshape(hist.shape[1], hist.shape[0])
+    np.testing.assert_allclose(flat[0, :].sum(), weights[y < YEDGES[0]].sum())
+    np.testing.assert_allclose(flat[-1, :].sum(), weights[y >= YEDGES[-1]].sum())
+    np.testing.assert_allclose(flat[:, 0].sum(), weights[x < EDGES[0]].sum())
+    np.testing.assert_allclose(flat[:, -1].sum(), weights[x >= EDGES[-1]].sum())
+    np.testing.assert_allclose(hist.sumw.sum(), weights.sum())
+
+
+def test_scale_and_add():
+    a = Histogram([EDGES])
+    a.fill([1.0, 3.0], weights=[1.0, 2.0])
+    b = Histogram([EDGES])
+    b.fill([1.0])
+    a.add(b)
+    a.scale(2.0)
+    np.testing.assert_allclose(a.values, [4.0, 4.0, 0.0, 0.0, 0.0])
+    np.testing.assert_allclose(a.errors, [2.0*np.sqrt(2.0), 4.0, 0.0, 0.0, 0.0])
+    assert a.entries == 3
+    with pytest.raises(ValueError):
+        a.add(Histogram([YEDGES]))
+
+
+def test_copy_to_root():
+    ROOT = pytest.importorskip("ROOT")
+    filled = Histogram([EDGES])
+    filled.fill([1.0, 3.0, 3.5, 20.0], weights=[1.0, 2.0, 0.5, 1.0])
+    hist = ROOT.TH1D("hcopy", "", len(EDGES)-1, EDGES)
+    hist.SetDirectory(0)
+    hist.Sumw2()
+    # a second copy into the same histogram (as plotmaker does for each tree) keeps the errors,
+    # without ROOT warning that the sum of squares of weights already exists
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always")
+        for _ in range(2):
+            filled.copy_to_root(hist)
+    assert [str(w.message) for w in caught if "already created" in str(w.message)] == []
+    np.testing.assert_allclose([hist.GetBinContent(i) for i in range(1, 6)], filled.values)
+    np.testing.assert_allclose([hist.GetBinError(i) for i in range(1, 6)], filled.errors)
+    assert hist.GetBinContent(6) == 1.0
+    assert hist.GetEntries() == 4
+
+
+@pytest.mark.parametrize("expression, formula", [
+    ("visible_energy", "ntuple.visible_energy"),
+    ("a==1 && b>0.5", "ntuple.a == 1 and ntuple.b > 0.5"),
+    ("a==1 || !(b>2)", "ntuple.a == 1 or not ntuple.b > 2"),
+    ("!flag", "not ntuple.flag"),
+    ("a!=1", "ntuple.a != 1"),
+    ("np.sqrt(x*x+y*y)", "np.sqrt(ntuple.x * ntuple.x + ntuple.y * ntuple.y)"),
+    ("np.abs(x) < 5 && abs(y) < 2", "np.abs(ntuple.x) < 5 and abs(ntuple.y) < 2"),
+    ("ntuple.x > 0 && y", "ntuple.x > 0 and ntuple.y"),
+])
+def test_draw_expression_to_formula(expression, formula):
+    assert draw_expression_to_formula(expression) == formula
+
+
+def test_draw_expression_invalid():
+    with pytest.raises(ValueError):
+        draw_expression_to_formula("a && ")
+
+
+# an event-level selection and weight, and a variable-length branch
+TRACK_LENGTHS = [[1.0, 5.0], [], [3.0, 9.5, 10.0, -1.0], [7.0], [2.0, 2.0]]
+COLUMNS = {
+    'found': np.array([1, 1, 1, 0, 1], dtype=np.int32),
+    'evis': np.array([0.1, 0.6, 1.5, 0.2, -0.5]),
+    'w': np.array([1.0, 2.0, 0.5, 3.0, 1.5]),
+}
+
+
+def make_batches(chunk_size):
+    """ColumnBatch objects as read_column_batches would give them."""
+    nentries = len(TRACK_LENGTHS)
+    for start in range(0, nentries, chunk_size):
+        stop = min(start+chunk_size, nentries)
+        columns = {name: values[start:stop] for name, values in COLUMNS.items()}
+        columns['trk_len'] = JaggedArray.from_sequences(TRACK_LENGTHS[start:stop], dtype=np.float64)
+        yield ColumnBatch(start, stop, columns)
+
+
+def fill_from_arrays(filler, monkeypatch):
+    def fake_read(tree, branches, chunk_size=50000, start=0, stop=None):
+        assert set(branches) <= set(COLUMNS) | {'trk_len'}
+        return make_batches(2)
+    monkeypatch.setattr(hist_filler, 'read_column_batches', fake_read)
+    return filler.fill(tree=None)
+
+
+def flattened(selected):
+    """Elements of trk_len, with the event's evis and weight repeated, for selected events."""
+    lengths, evis, w = [], [], []
+    for i, values in enumerate(TRACK_LENGTHS):
+        if selected[i]:
+            lengths += values
+            evis += [COLUMNS['evis'][i]]*len(values)
+            w += [COLUMNS['w'][i]]*len(values)
+    return np.array(lengths), np.array(evis), np.array(w)
+
+
+def test_jagged_variable_fills_every_element(monkeypatch):
+    spec = HistSpec('trk_len', 'trk_len', (5, 0.0, 10.0), selection='found==1', weight='w',
+                    categories={'high': 'evis>0.5', 'low': '!(evis>0.5)'})
+    hists = fill_from_arrays(MultiHistFiller([spec]), monkeypatch)
+
+    found = COLUMNS['found'] == 1
+    for label, category in [('high', COLUMNS['evis'] > 0.5), ('low', ~(COLUMNS['evis'] > 0.5))]:
+        lengths, _, w = flattened(found & category)
+        hist = hists[f'trk_len_{label}']
+        inside = lengths < EDGES[-1]
+        expected, _ = np.histogram(lengths[inside], bins=EDGES, weights=w[inside])
+        np.testing.assert_allclose(hist.values, expected)
+        np.testing.assert_allclose(hist.sumw[0], w[lengths < EDGES[0]].sum())
+        np.testing.assert_allclose(hist.sumw[-1], w[lengths >= EDGES[-1]].sum())
+        assert hist.entries == len(lengths)
+
+
+def test_jagged_variable_against_event_variable(monkeypatch):
+    spec = HistSpec('len_vs_evis', ('trk_len', 'evis'), [(5, 0.0, 10.0), list(YEDGES)], selection='found==1')
+    scalar = HistSpec('evis', 'evis', list(YEDGES), selection='found==1', weight='w')
+    hists = fill_from_arrays(MultiHistFiller([spec, scalar]), monkeypatch)
+
+    lengths, evis, _ = flattened(COLUMNS['found'] == 1)
+    inside = (lengths < EDGES[-1]) & (evis >= YEDGES[0]) & (evis < YEDGES[-1])
+    expected, _, _ = np.histogram2d(lengths[inside], evis[inside], bins=[EDGES, YEDGES])
+    np.testing.assert_allclose(hists['len_vs_evis'].values, expected)
+    assert hists['len_vs_evis'].entries == len(lengths)
+
+    # the event-level histogram is filled once per event
+    found = COLUMNS['found'] == 1
+    expected, _ = np.histogram(COLUMNS['evis'][found], bins=YEDGES, weights=COLUMNS['w'][found])
+    np.testing.assert_allclose(hists['evis'].values, expected)
+    assert hists['evis'].entries == found.sum()
+
+
+def test_branches_and_duplicate_names():
+    filler = MultiHistFiller([HistSpec('a', 'trk_len', (5, 0, 10), selection='found==1 && evis>0', weight='w'),
+                              HistSpec('b', 'evis', (5, 0, 10), selection='found==1')])
+    assert filler.branches == ['trk_len', 'found', 'evis', 'w']
+    with pytest.raises(ValueError):
+        MultiHistFiller([HistSpec('a', 'evis', (5, 0, 10)), HistSpec('a', 'w', (5, 0, 10))])
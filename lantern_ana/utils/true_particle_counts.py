@@ -1,5 +1,12 @@
 from lantern_ana.utils import KE_from_fourmom
 
+# ntuple branches read by get_true_primary_particle_counts
+TRUE_PARTICLE_COUNT_BRANCHES = [
+    'nTrueSimParts', 'trueSimPartProcess', 'trueSimPartPDG',
+    'trueSimPartPx', 'trueSimPartPy', 'trueSimPartPz', 'trueSimPartE',
+    'nTruePrimParts', 'truePrimPartPDG'
+]
+
 def get_true_primary_particle_counts(ntuple,params):
     """
     Count number of each type of true primary particles.
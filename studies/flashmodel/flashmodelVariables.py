@@ -4,6 +4,7 @@ from typing import Dict, Any, List, Optional, Type
 from array import array
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
+from lantern_ana.utils.flash_matching import match_candidates, best_candidate
 import numpy as np
 
 # Example implementation of a ROOT-based dataset
@@ -194,7 +195,7 @@ class FlashmodelVariablesProducer(ProducerBaseClass):
 
             # valid matches must match the reco vertex position and nshowers and number of tracks
             # get this information from the primary EventTree tree
-            reco_vtx_pos = np.array( (ntuple.vtxX, ntuple.vtxY, ntuple.vtxZ) )
+            reco_vtx_pos = (ntuple.vtxX, ntuple.vtxY, ntuple.vtxZ)
             nshowers     = ntuple.nShowers
             ntracks      = ntuple.nTracks
             nprim_tracks = 0
@@ -206,39 +207,16 @@ class FlashmodelVariablesProducer(ProducerBaseClass):
                 if ntuple.showerIsSecondary[i]==0:
                     nprim_showers += 1
 
+            # vertices with the same reco position and number of tracks and showers, checked for all vertices at once
+            matched = match_candidates( reco_vtx_pos, ntuple.reco_vertex_x, ntuple.reco_vertex_y, ntuple.reco_vertex_z, 1.0e-3,
+                                        counts=[ (nshowers, ntuple.n_showers_all),
+                                                 (ntracks, ntuple.n_tracks_all),
+                                                 (nprim_tracks, ntuple.n_primary_tracks),
+                                                 (nprim_showers, ntuple.n_primary_showers) ] )
+
             # Find best matching vertex for UB and SIREN model based on lowest unbalanced sinkhorn divergence
-            min_ub_div    = float('inf')
-            for i in range(flashtree.ub_unbalanced_sinkhorn_div_all.size()):
-                # get the copy of the reco vertex positions in the friend FlashPredictionTree TTree
-                vtxpos = np.array( (ntuple.reco_vertex_x[i], ntuple.reco_vertex_y[i], ntuple.reco_vertex_z[i]))
-                dist = np.power(vtxpos-reco_vtx_pos,2).sum()
-                if (dist<1.0e-3 
-                      and nshowers==ntuple.n_showers_all[i] 
-                      and ntracks==ntuple.n_tracks_all[i]
-                      and nprim_tracks==ntuple.n_primary_tracks[i]
-                      and nprim_showers==ntuple.n_primary_showers[i]
-                      and flashtree.ub_unbalanced_sinkhorn_div_all[i].size() > 0):
-                    div_val = flashtree.ub_unbalanced_sinkhorn_div_all[i][0]
-                    if div_val < min_ub_div:
-                        min_ub_div = div_val
-                        nucand_ubmodel_vertex_index = i
-
-            # Find best matching vertex for SIREN model based on lowest unbalanced sinkhorn divergence
-            min_siren_div = float('inf')
-            for i in range(flashtree.siren_unbalanced_sinkhorn_div_all.size()):
-                # get the copy of the reco vertex positions in the friend FlashPredictionTree TTree
-                vtxpos = np.array( (ntuple.reco_vertex_x[i], ntuple.reco_vertex_y[i], ntuple.reco_vertex_z[i]))
-                dist = np.power(vtxpos-reco_vtx_pos,2).sum()
-                if (dist<1.0e-3 
-                      and nshowers==ntuple.n_showers_all[i] 
-                      and ntracks==ntuple.n_tracks_all[i]
-                      and nprim_tracks==ntuple.n_primary_tracks[i]
-                      and nprim_showers==ntuple.n_primary_showers[i]
-                      and flashtree.siren_unbalanced_sinkhorn_div_all[i].size() > 0):
-                    div_val = flashtree.siren_unbalanced_sinkhorn_div_all[i][0]
-                    if div_val < min_siren_div:
-                        min_siren_div = div_val
-                        nucand_siren_vertex_index = i
+            nucand_ubmodel_vertex_index = self._lowest_divergence_vertex( matched, flashtree.ub_unbalanced_sinkhorn_div_all )
+            nucand_siren_vertex_index   = self._lowest_divergence_vertex( matched, flashtree.siren_unbalanced_sinkhorn_div_all )
 
         # Now we can copy over nu candidate flash predictions
         if nucand_siren_vertex_index>=0 and nucand_siren_vertex_index<flashtree.siren_pe_per_pmt_all.size():
@@ -281,6 +259,19 @@ class FlashmodelVariablesProducer(ProducerBaseClass):
 
         return self.return_variables()
 
+    def _lowest_divergence_vertex(self, matched, divergences_all) -> int:
+        """
+        Index of the matched vertex with the lowest (first) divergence, or -1.
+        Vertices without a divergence value are skipped. Only the matched vertices are read from the tree.
+        """
+        nvertices = min(len(matched), divergences_all.size())
+        imatched = [ int(i) for i in np.flatnonzero(matched[:nvertices]) if divergences_all[int(i)].size() > 0 ]
+        if len(imatched)==0:
+            return -1
+        divergence = np.array( [divergences_all[i][0] for i in imatched] )
+        ibest = best_candidate( divergence, np.ones(len(imatched), dtype=bool) )
+        return int(imatched[ibest])
+
     def finalize(self):
         """
         nothing to do
@@ -1,5 +1,6 @@
 import os,sys
 import ROOT as rt
+from lantern_ana.utils.hist_filler import HistSpec, MultiHistFiller
 
 """
 """
@@ -37,7 +38,6 @@ mcc9_v29e_dl_run3_combined_extbnb    150523663.0
 
 
 targetpot = 8.806e+18
-bnbnu_pot = 1.346689484233034e+21
 beam_numspills=2263559.0 
 extbnb_numspills=150523663.0 # combined
 
@@ -45,30 +45,26 @@ plot_folder="./output_plots_numu_run3_1mil/"
 os.system(f"mkdir -p {plot_folder}")
 
 samples = ['numu_cc','data','numu_bg','extbnb']
-scaling = {"numu_cc":targetpot/bnbnu_pot,
-           "numu_bg":targetpot/bnbnu_pot,
-           "extbnb":beam_numspills/extbnb_numspills,
-           "data":1.0
-}
 
+# numu_cc and numu_bg are categories of the same bnbnu file, filled in one pass.
+# the bnbnu POT is read from the livetime_tree of the file.
+# the livetime_tree of the EXT and data files has no spill counts, so their scale factors are given.
 files = {
-    "numu_cc":"./output_numu_run3b_1mil/mcc9_v29e_dl_run3b_bnb_nu_overlay_1mil_20260118_150324.root",
-    "numu_bg":"./output_numu_run3b_1mil/mcc9_v29e_dl_run3b_bnb_nu_overlay_1mil_20260118_150324.root",
+    "bnbnu":"./output_numu_run3b_1mil/mcc9_v29e_dl_run3b_bnb_nu_overlay_1mil_20260118_150324.root",
     "extbnb":"./output_numu_run3b_extbnb/mcc9_v29e_dl_run3_combined_extbnb.root",
     "data":"./output_numu_run3b_beamon/mcc9_v28_wctagger_run3_bnb1e19_20260126_174528.root"
 }
-
-tfiles = {}
-trees = {}
+scaling = {"bnbnu":None,
+           "extbnb":beam_numspills/extbnb_numspills,
+           "data":1.0
+}
+mc_categories = {
+    "numu_cc":"sigdef_numuccinc_is_target_numucc_inclusive_nofvcut==1 && sigdef_numuccinc_dwalltrue>=5.0",
+    "numu_bg":"sigdef_numuccinc_is_target_numucc_inclusive_nofvcut==0 || sigdef_numuccinc_dwalltrue<5.0",
+}
 
 rt.gStyle.SetOptStat(0)
 
-for sample in samples:
-    tfiles[sample] = rt.TFile( files[sample] )
-    trees[sample] = tfiles[sample].Get("analysis_tree")
-    nentries = trees[sample].GetEntries()
-    print(f"sample={sample} has {nentries} entries")
-
 out = rt.TFile("temp.root","recreate")
 
 vars = [
@@ -98,6 +94,24 @@ cut += " && muon_properties_pid_score>-0.9"
 cut += " && vertex_properties_infiducial==1"
 cut += " && muon_properties_energy>0.0"
 
+# fill the histograms of all variables with one pass over each file
+filled = {}
+for fname in files:
+    specs = [ HistSpec( var, var, (nbins,xmin,xmax), selection=cut, weight="eventweight_weight",
+                        categories=(mc_categories if fname=="bnbnu" else None) )
+              for var, nbins, xmin, xmax, htitle, setlogy, ismc in vars ]
+    print("fill ",fname)
+    filled[fname] = MultiHistFiller(specs).fill_file( files[fname], scale=scaling[fname], target_pot=targetpot )
+
+for var, nbins, xmin, xmax, htitle, setlogy, ismc in vars:
+    for sample in samples:
+        if sample in mc_categories:
+            h = filled["bnbnu"][f"{var}_{sample}"]
+        else:
+            h = filled[sample][var]
+        hists[(var,sample)] = h.to_root( f'h{var}_{sample}', "" )
+        print(f"{var}-{sample}: ",hists[(var,sample)].Integral())
+
 for var, nbins, xmin, xmax, htitle, setlogy, ismc in vars:
 
     cname = f"c{var}"
@@ -109,21 +123,6 @@ for var, nbins, xmin, xmax, htitle, setlogy, ismc in vars:
     canvs[var].cd(1).SetGridx(1)
     canvs[var].cd(1).SetGridy(1)
 
-    for sample in samples:
-        hname = f'h{var}_{sample}'
-        hists[(var,sample)] = rt.TH1D( hname, "", nbins, xmin, xmax )
-        print("fill ",hname)
-
-        samplecut = cut
-        if sample in ['numu_cc']:
-            samplecut += " && (sigdef_numuccinc_is_target_numucc_inclusive_nofvcut==1 && sigdef_numuccinc_dwalltrue>=5.0)"
-        elif sample in ['numu_bg']:
-            samplecut += " && (sigdef_numuccinc_is_target_numucc_inclusive_nofvcut==0 || sigdef_numuccinc_dwalltrue<5.0)"
-
-        trees[sample].Draw(f"{var}>>{hname}",f"({samplecut})*eventweight_weight")
-        hists[(var,sample)].Scale( scaling[sample] )
-        print(f"{var}-{sample}: ",hists[(var,sample)].Integral())
-    
     hists[(var,"numu_cc")].SetFillColor(rt.kRed-3)
     hists[(var,"numu_cc")].SetFillStyle(3003)
     if (var,'numu_bg') in hists:
@@ -7,6 +7,7 @@
 // STL containers
 #pragma link C++ class std::vector<double>+;
 #pragma link C++ class std::vector<int>+;
+#pragma link C++ class std::vector<Long64_t>+;
 #pragma link C++ class std::vector<std::vector<int>>+;
 #pragma link C++ class std::vector<std::string>+;
 #pragma link C++ class std::map<std::string, std::vector<double> >+;
@@ -1,9 +1,12 @@
 import os,sys,time
-import re
 from typing import Dict, Any, List, Optional, Type
 from array import array
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
+from lantern_ana.utils.formulas import CompiledFormula, FormulaSelection
+from lantern_ana.io.rse_index import RSEIndex
+from lantern_ana.io.checkpoint import histogram_state, restore_histogram_state
+from dense_weight_store import DenseWeightStore, default_store_dir
 import numpy as np
 
 try:
@@ -15,6 +18,61 @@ except:
     print("Error loading ROOT and/or libMapDict.so. Run 'make' to build. (Needs ROOT)")
     sys.exit(1)
 
+class PassingEventBuffer:
+    """
+    The passing events of one sample, in NumPy arrays that grow by doubling their capacity.
+
+    Rows [0,size) hold the run, subrun, event (int32), the bin index of each variable (int32)
+    and the central weight (float64) of each passing event. The arrays are handed to the
+    C++ accumulator as they are, instead of being converted element by element to std::vector.
+    """
+
+    def __init__(self, num_variables: int, capacity: int = 4096):
+        self.size = 0
+        self.rse = np.empty((capacity, 3), dtype=np.int32)
+        self.bin_indices = np.empty((capacity, num_variables), dtype=np.int32)
+        self.weights = np.empty(capacity, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _grow(self):
+        capacity = max(2*len(self.weights), 1)
+        for attr in ['rse', 'bin_indices', 'weights']:
+            old = getattr(self, attr)
+            new = np.empty((capacity,)+old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            setattr(self, attr, new)
+
+    def append(self, run: int, subrun: int, event: int, bin_indices: List[int], weight: float):
+        if self.size == len(self.weights):
+            self._grow()
+        i = self.size
+        self.rse[i] = (run, subrun, event)
+        self.bin_indices[i] = bin_indices
+        self.weights[i] = weight
+        self.size += 1
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        """Views of the filled rows."""
+        return {'rse': self.rse[:self.size],
+                'bin_indices': self.bin_indices[:self.size],
+                'weights': self.weights[:self.size]}
+
+    @classmethod
+    def from_arrays(cls, rse, bin_indices, weights) -> "PassingEventBuffer":
+        """Rebuild a buffer from arrays (or lists) of rows, e.g. from a checkpoint."""
+        weights = np.asarray(weights, dtype=np.float64)
+        rse = np.asarray(rse, dtype=np.int32)
+        bin_indices = np.asarray(bin_indices, dtype=np.int32)
+        buffer = cls(bin_indices.shape[1], capacity=max(len(weights), 1))
+        buffer.rse[:len(weights)] = rse
+        buffer.bin_indices[:len(weights)] = bin_indices
+        buffer.weights[:len(weights)] = weights
+        buffer.size = len(weights)
+        return buffer
+
+
 # Example implementation of a ROOT-based dataset
 @register
 class ArboristXsecFluxSysProducer(ProducerBaseClass):
@@ -84,12 +142,24 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
         self.run_branch    = config.get('run','run')
         self.subrun_branch = config.get('subrun','subrun')
         self.event_branch  = config.get('event','event')
+        self._run_formula    = CompiledFormula(self.run_branch, prefix='ntuple.')
+        self._subrun_formula = CompiledFormula(self.subrun_branch, prefix='ntuple.')
+        self._event_formula  = CompiledFormula(self.event_branch, prefix='ntuple.')
 
         # name of the run, subrun, event branches in the weight tree
         self.weighttree_run_branch    = config.get('weight_tree_run','run')
         self.weighttree_subrun_branch = config.get('weight_tree_subrun','sub')
         self.weighttree_event_branch  = config.get('weight_tree_event','evt')
         self.sysweight_treename       = config.get('weight_tree_name', 'weights')
+
+        # the RSE -> entry index of each weight tree is saved and reused by later jobs
+        self.use_rse_index_cache = config.get('use_rse_index_cache', True)
+        self.rse_index_cache_dir = config.get('rse_index_cache_dir', None)
+        # weights read from dense stores made by dense_weight_store.py, instead of the weight tree:
+        # explicit store directory per sample, or the default location in the cache directory
+        self.dense_weight_stores = config.get('dense_weight_stores', {})
+        self.use_dense_weight_store = config.get('use_dense_weight_store', False)
+        self.dense_weight_cache_dir = config.get('dense_weight_cache_dir', None)
         self.weight_branch_type       = config.get('weight_branch_type',-1)
         if self.weight_branch_type==-1:
             raise ValueError("Must set config parameter 'weight_branch_type'. Options: 0=arborist file, 1=surprise file.")
@@ -100,9 +170,10 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
         # save selection criteria
         self.cut_formulas = config.get('cut_formulas',{})
         self.event_selection_critera = config.get('event_selection_critera',[])
+        self._selection = FormulaSelection(self.cut_formulas, self.event_selection_critera)
 
         # Storage for passing events per sample
-        # Format: { sample_name: { 'rse': [...], 'bin_indices': [...], 'weights': [...] } }
+        # Format: { sample_name: PassingEventBuffer }
         self._passing_events = {}
 
         # xsec
@@ -111,6 +182,10 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
         # C++ accumulator instance
         self.accumulator = XsecFluxAccumulator()        
 
+        # number of threads the C++ accumulator uses in finalize()
+        self.num_threads = config.get('num_threads',1)
+        self.accumulator.setNumThreads(self.num_threads)
+
     def setDefaultValues(self):
         super().setDefaultValues()
         return
@@ -139,6 +214,7 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
 
             var_bin_info = {
                 'formula':vardict['formula'],
+                'compiled_formula':CompiledFormula(vardict['formula'], prefix='ntuple.'),
                 'samples':vardict['apply_to_datasets'],
                 'criteria':vardict['criteria'],
                 'numbins':vardict['numbins'],
@@ -198,6 +274,14 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
 
+    def supportsSharding(self) -> bool:
+        """Writes its own output file, so it cannot be split across worker processes."""
+        return False
+
+    def supportsCaching(self) -> bool:
+        """Records the passing events and fills histograms in processEvent."""
+        return False
+
     def processEvent(self, data: Dict[str, Any], params: Dict[str, Any]) -> Dict[str, Any]:
         """
         First pass: determine if event passes selection and record bin assignments.
@@ -209,33 +293,14 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
         ismc = params.get('ismc', False)
         datasetname = params.get('dataset_name')
 
-        # Evaluate all the selection formulas
-        select_results = {}
-        for cutname,cutformula in self.cut_formulas.items():
-            placeholders = re.findall(r'\{([^}]+)\}', cutformula)
-            clean_expression = cutformula
-            namespace = {}
-
-            for placeholder in placeholders:
-                var_name = placeholder.replace('.', '_').replace('[', '_').replace(']', '')
-                clean_expression = clean_expression.replace(f"{{{placeholder}}}", var_name)
-                namespace[var_name] = eval(placeholder)
-
-            select_results[cutname] = eval(clean_expression, namespace)
-
-        passes = True
-        for cutname in self.event_selection_critera:
-            if select_results[cutname]==False:
-                passes = False
-                break
-
-        if passes==False:
+        # Evaluate the selection criteria (formulas compiled in the constructor)
+        if not self._selection(ntuple):
             return {}
 
         # Get RSE
-        run    = eval(f'ntuple.{self.run_branch}')
-        subrun = eval(f'ntuple.{self.subrun_branch}')
-        event  = eval(f'ntuple.{self.event_branch}')
+        run    = self._run_formula(ntuple)
+        subrun = self._subrun_formula(ntuple)
+        event  = self._event_formula(ntuple)
 
         # Get central event weight
         evweight = ntuple.eventweight_weight
@@ -251,8 +316,7 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
                 continue
 
             # Get observable value and find bin
-            varformula = varinfo['formula']
-            x = eval(f'ntuple.{varformula}')
+            x = varinfo['compiled_formula'](ntuple)
 
             hists = varinfo['sample_hists'][datasetname]
 
@@ -266,19 +330,65 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
 
         # Initialize storage for this sample if needed
         if datasetname not in self._passing_events:
-            self._passing_events[datasetname] = {
-                'rse': [],
-                'bin_indices': [],
-                'weights': []
-            }
+            self._passing_events[datasetname] = PassingEventBuffer(len(self.variable_list))
 
         # Store this event's info for later C++ processing
-        self._passing_events[datasetname]['rse'].append([run, subrun, event])
-        self._passing_events[datasetname]['bin_indices'].append(bin_indices)
-        self._passing_events[datasetname]['weights'].append(evweight)
+        self._passing_events[datasetname].append(run, subrun, event, bin_indices, evweight)
 
         return {}
 
+    def getCheckpointState(self):
+        """The passing events recorded so far, and the CV and N histograms."""
+        hists = {}
+        for varname in self.variable_list:
+            for sample, sample_hists in self.var_bininfo[varname]['sample_hists'].items():
+                for x, h in sample_hists.items():
+                    hists[(varname, sample, x)] = histogram_state(h)
+        passing_events = {sample: buffer.arrays() for sample, buffer in self._passing_events.items()}
+        return {'passing_events': passing_events, 'hists': hists}
+
+    def restoreCheckpointState(self, state):
+        self._passing_events = {sample: PassingEventBuffer.from_arrays(events['rse'], events['bin_indices'], events['weights'])
+                                for sample, events in state['passing_events'].items()}
+        for (varname, sample, x), hist_state in state['hists'].items():
+            restore_histogram_state(self.var_bininfo[varname]['sample_hists'][sample][x], hist_state)
+
+    def _open_dense_store(self, datasetname: str, weight_file_path: str) -> Optional[DenseWeightStore]:
+        """
+        The dense weight store of a sample, or None to read the weight tree.
+        Only the included parameters are read from the store.
+        """
+        if datasetname in self.dense_weight_stores:
+            store_dir = self.dense_weight_stores[datasetname]
+        elif self.use_dense_weight_store:
+            store_dir = default_store_dir(weight_file_path, self._tree_name, self.sysweight_treename,
+                                          self.dense_weight_cache_dir)
+        else:
+            return None
+        # copy-on-write maps: writable buffers for the C++ pointers, the files are never changed
+        store = DenseWeightStore.open_if_current(store_dir, weight_file_path, self._tree_name,
+                                                 self.sysweight_treename, self.weight_branch_type,
+                                                 params=self._params_to_include, mmap_mode='c')
+        if store is None:
+            print(f"  No up-to-date dense weight store in {store_dir}, reading the weight tree. "
+                  f"Make it with: python dense_weight_store.py convert -i {weight_file_path} ...")
+        else:
+            print(f"  Reading weights from the dense weight store in {store_dir}")
+        return store
+
+    def _process_dense_store(self, store: DenseWeightStore, rows: np.ndarray,
+                             bin_indices: np.ndarray, weights: np.ndarray) -> int:
+        """Accumulate the weights of the passing events (sorted by store row) from a dense weight store."""
+        self.accumulator.clearDenseWeights()
+        for par in store.params:
+            # the memory-mapped arrays are read in place by C++, and stay open in the store
+            param_weights = store.weights(par)
+            self.accumulator.addDenseWeights(par, param_weights, store.counts(par), param_weights.shape[1])
+        processed = self.accumulator.processDenseEvents(rows, store.tune_weights, bin_indices,
+                                                        bin_indices.shape[1], weights, len(weights))
+        self.accumulator.clearDenseWeights()
+        return processed
+
     def finalize(self):
         """
         Second pass: process all passing events through C++ accumulator.
@@ -291,13 +401,13 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
         self.outfile.cd()
 
         # Process each sample
-        for datasetname, event_data in self._passing_events.items():
+        for datasetname, buffer in self._passing_events.items():
             if datasetname not in self._sample_filepaths:
                 print(f"Warning: No weight file path for sample {datasetname}, skipping")
                 continue
 
             weight_file_path = self._sample_filepaths[datasetname]
-            num_events = len(event_data['rse'])
+            num_events = len(buffer)
 
             print(f"Processing sample {datasetname}: {num_events} passing events")
 
@@ -307,38 +417,46 @@ class ArboristXsecFluxSysProducer(ProducerBaseClass):
             # Reset accumulator for this sample
             self.accumulator.reset()
 
-            # Convert Python lists to std::vector for C++
-            rse_vec = std.vector("std::vector<int>")()
-            for rse in event_data['rse']:
-                inner = std.vector("int")()
-                for val in rse:
-                    inner.push_back(int(val))
-                rse_vec.push_back(inner)
-
-            bin_indices_vec = std.vector("std::vector<int>")()
-            for bins in event_data['bin_indices']:
-                inner = std.vector("int")()
-                for val in bins:
-                    inner.push_back(int(val))
-                bin_indices_vec.push_back(inner)
-
-            weights_vec = std.vector("double")()
-            for w in event_data['weights']:
-                weights_vec.push_back(float(w))
+            event_data = buffer.arrays()
+            rse = event_data['rse']
+            store = self._open_dense_store(datasetname, weight_file_path)
+
+            # Find the weight tree entry (or store row) of each passing event using the (cached) RSE index
+            tstart = time.time()
+            if store is not None:
+                entries = store.lookup(rse[:,0], rse[:,1], rse[:,2])
+            else:
+                rse_index = RSEIndex.load_or_build(weight_file_path, self._tree_name,
+                                                   self.weighttree_run_branch,
+                                                   self.weighttree_subrun_branch,
+                                                   self.weighttree_event_branch,
+                                                   cache_dir=self.rse_index_cache_dir,
+                                                   use_cache=self.use_rse_index_cache)
+                entries = rse_index.lookup(rse[:,0], rse[:,1], rse[:,2])
+            print(f"  RSE lookup took {time.time()-tstart:.2f}s")
+
+            # Pass the events in weight tree order, so C++ reads the weight tree front to back.
+            # The C++ accumulator reads these contiguous arrays in place through their pointers.
+            order = np.argsort(entries, kind='stable')
+            entries_sorted = np.ascontiguousarray(entries[order], dtype=np.int64)
+            bin_indices_sorted = np.ascontiguousarray(event_data['bin_indices'][order], dtype=np.int32)
+            weights_sorted = np.ascontiguousarray(event_data['weights'][order], dtype=np.float64)
 
             # Call C++ to process all events
             tstart = time.time()
-            processed = self.accumulator.processAllEvents(
-                weight_file_path,
-                self._tree_name,
-                self.sysweight_treename,
-                self.weighttree_run_branch,
-                self.weighttree_subrun_branch,
-                self.weighttree_event_branch,
-                rse_vec,
-                bin_indices_vec,
-                weights_vec
-            )
+            if store is not None:
+                processed = self._process_dense_store(store, entries_sorted, bin_indices_sorted, weights_sorted)
+            else:
+                processed = self.accumulator.processEventsFromBuffers(
+                    weight_file_path,
+                    self._tree_name,
+                    self.sysweight_treename,
+                    entries_sorted,
+                    bin_indices_sorted,
+                    weights_sorted,
+                    num_events,
+                    bin_indices_sorted.shape[1]
+                )
             dt = time.time() - tstart
             print(f"  C++ processed {processed} events in {dt:.2f}s")
             print(f"  Missing events: {self.accumulator.getMissingEventCount()}")
@@ -0,0 +1,306 @@
+"""
+Dense, memory-mapped store of the universe weights of a sample.
+
+The arborist and surprise weight files keep, for every event, a
+std::map<std::string, std::vector<double>> with the weights of each parameter.
+Reading that map back is the slowest part of ArboristXsecFluxSysProducer.finalize(),
+and it is repeated by every job and every analysis of the same sample.
+
+convert_weight_file() reads the weight tree once and writes a directory with:
+
+  metadata.json        what the store was made from, and the parameters it holds (written last)
+  keys.npy             packed (run, subrun, event) of each row, sorted (see lantern_ana.io.rse_index.pack_rse)
+  entries.npy          entry of each row in the weight tree
+  tune_weights.npy     UB tune weight of each row (float64)
+  param_NNN.weights.npy  float32 (rows x universes) weights of one parameter
+  param_NNN.counts.npy   int32 number of valid universes of each row, 0 if the event has no weights for it
+
+The rows are sorted by RSE. DenseWeightStore memory-maps these arrays, so only the
+parameters that are used are read from disk. The C++ XsecFluxAccumulator reads them
+in place through addDenseWeights and processDenseEvents.
+
+Convert a file once:
+
+    python dense_weight_store.py convert -i arborist_v55_bnb_nu_run3.root --tree eventweight_tree \\
+        --weight-branch sys_weights --weight-branch-type 0 --run run --subrun subrun --event event
+
+The store goes to the lantern_ana cache directory (see default_store_dir), where the producer
+finds it with use_dense_weight_store: true. Use --output to put it somewhere else.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from lantern_ana.io.rse_index import RSEIndex, find_tree_in_file
+from lantern_ana.utils.cache import get_cache_dir, file_signature, cache_key
+
+# increase when the layout of the store changes
+STORE_VERSION = 1
+
+# name of the UB tune weight branch, for each weight branch type (0=arborist file, 1=surprise file)
+TUNE_BRANCHES = {0: 'ub_tune_weight', 1: 'weightTune'}
+
+
+def store_description(weight_file_path: str, tree_name: str, weight_branch: str, weight_branch_type: int) -> Dict:
+    """What a store is made from. A store is only used if its metadata matches."""
+    return {
+        'version': STORE_VERSION,
+        'source': file_signature(weight_file_path),
+        'tree': tree_name,
+        'weight_branch': weight_branch,
+        'weight_branch_type': int(weight_branch_type),
+    }
+
+
+def default_store_dir(weight_file_path: str, tree_name: str, weight_branch: str,
+                      cache_dir: Optional[str] = None) -> str:
+    """Location of the store of a weight file in the cache directory."""
+    path = os.path.abspath(os.path.expanduser(weight_file_path))
+    return os.path.join(get_cache_dir('dense_weights', cache_dir), cache_key(path, tree_name, weight_branch))
+
+
+def convert_weight_file(weight_file_path: str, store_dir: str, tree_name: str, weight_branch: str,
+                        weight_branch_type: int, run_branch: str, subrun_branch: str, event_branch: str,
+                        params: Optional[List[str]] = None, max_variations: int = 1000) -> Dict:
+    """
+    Write the dense store of a weight file.
+
+    The number of universes stored for a parameter is set by the first entry that has it
+    (at most max_variations), as XsecFluxAccumulator does when reading the tree.
+
+    Args:
+        weight_file_path: arborist or surprise weight file
+        store_dir: Directory of the store. Replaced if it exists.
+        tree_name: Name of the weight tree (it may be inside a top-level directory of the file)
+        weight_branch: Name of the branch with the map of weights
+        weight_branch_type: 0=arborist file, 1=surprise file
+        run_branch, subrun_branch, event_branch: Names of the RSE branches of the weight tree
+        params: Only store these parameters (default: all)
+        max_variations: Largest number of universes stored per parameter
+
+    Returns:
+        The metadata of the store
+    """
+    import ROOT as rt
+
+    if weight_branch_type not in TUNE_BRANCHES:
+        raise ValueError(f"Invalid weight_branch_type {weight_branch_type}. Options: 0=arborist file, 1=surprise file.")
+
+    tstart = time.time()
+    index = RSEIndex.build(weight_file_path, tree_name, run_branch, subrun_branch, event_branch)
+    num_rows = len(index)
+    row_entries = np.arange(num_rows, dtype=np.int64) if index.tree_is_sorted else np.asarray(index.entries)
+    row_of_entry = np.empty(num_rows, dtype=np.int64)
+    row_of_entry[row_entries] = np.arange(num_rows, dtype=np.int64)
+
+    # write into a temporary directory, renamed to store_dir once complete
+    tmp_dir = f"{store_dir.rstrip(os.sep)}.tmp{os.getpid()}"
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+    os.makedirs(tmp_dir)
+    np.save(os.path.join(tmp_dir, 'keys.npy'), np.asarray(index.keys, dtype=np.int64))
+    np.save(os.path.join(tmp_dir, 'entries.npy'), row_entries)
+
+    tune_weights = np.zeros(num_rows, dtype=np.float64)
+    param_info = {}
+    weights = {}
+    counts = {}
+    wanted = set(params) if params else None
+
+    rfile = rt.TFile.Open(weight_file_path)
+    if not rfile or rfile.IsZombie():
+        raise RuntimeError(f"Dense weight store: failed to open file: {weight_file_path}")
+    try:
+        tree = find_tree_in_file(rfile, tree_name)
+        if not tree:
+            raise RuntimeError(f"Dense weight store: failed to find tree '{tree_name}' in {weight_file_path}")
+        tune_branch = TUNE_BRANCHES[weight_branch_type]
+        tree.SetBranchStatus("*", 0)
+        tree.SetBranchStatus(weight_branch, 1)
+        tree.SetBranchStatus(tune_branch, 1)
+
+        for entry in range(tree.GetEntries()):
+            if entry % 10000 == 0:
+                print(f"  converting entry {entry} / {num_rows}")
+            tree.GetEntry(entry)
+            row = row_of_entry[entry]
+            tune_weights[row] = getattr(tree, tune_branch)
+            for key, values in getattr(tree, weight_branch):
+                parname = str(key)
+                if wanted is not None and parname not in wanted:
+                    continue
+                values = np.asarray(values, dtype=np.float64)
+                if parname not in weights:
+                    # the first entry with this parameter sets its number of universes
+                    width = max(1, min(len(values), max_variations))
+                    ipar = len(param_info)
+                    param_info[parname] = {'file': f"param_{ipar:03d}", 'num_variations': width}
+                    prefix = os.path.join(tmp_dir, param_info[parname]['file'])
+                    weights[parname] = np.lib.format.open_memmap(f"{prefix}.weights.npy", mode='w+',
+                                                                 dtype=np.float32, shape=(num_rows, width))
+                    counts[parname] = np.lib.format.open_memmap(f"{prefix}.counts.npy", mode='w+',
+                                                                dtype=np.int32, shape=(num_rows,))
+                n = min(len(values), weights[parname].shape[1])
+                weights[parname][row, :n] = values[:n]
+                counts[parname][row] = n
+    finally:
+        rfile.Close()
+
+    for parname in weights:
+        weights[parname].flush()
+        counts[parname].flush()
+    del weights, counts
+    np.save(os.path.join(tmp_dir, 'tune_weights.npy'), tune_weights)
+
+    meta = store_description(weight_file_path, tree_name, weight_branch, weight_branch_type)
+    meta.update({'rse_branches': [run_branch, subrun_branch, event_branch],
+                 'num_rows': num_rows,
+                 'max_variations': max_variations,
+                 'params': param_info})
+    with open(os.path.join(tmp_dir, 'metadata.json'), 'w') as f:
+        json.dump(meta, f, indent=1)
+
+    if os.path.exists(store_dir):
+        shutil.rmtree(store_dir)
+    os.replace(tmp_dir, store_dir)
+    print(f"Dense weight store: wrote {len(param_info)} parameters for {num_rows} events to {store_dir} "
+          f"in {time.time()-tstart:.1f} secs")
+    return meta
+
+
+class DenseWeightStore:
+    """
+    Read a store written by convert_weight_file.
+
+    Args:
+        store_dir: Directory of the store
+        params: Only give access to these parameters (default: all in the store)
+        mmap_mode: numpy.load memory-map mode of the arrays. The default 'r' maps them read-only;
+                   'c' (copy-on-write) gives writable arrays that never change the files.
+
+    Example:
+        store = DenseWeightStore(store_dir, params=['All_UBGenie'])
+        rows = store.lookup(runs, subruns, events)      # -1 for events not in the store
+        w = store.weights('All_UBGenie')[rows[rows>=0]]  # float32 (events x universes)
+    """
+
+    def __init__(self, store_dir: str, params: Optional[List[str]] = None, mmap_mode: str = 'r'):
+        self.store_dir = store_dir
+        self.mmap_mode = mmap_mode
+        metadata_path = os.path.join(store_dir, 'metadata.json')
+        if not os.path.exists(metadata_path):
+            raise FileNotFoundError(f"No dense weight store in {store_dir}")
+        with open(metadata_path) as f:
+            self.metadata = json.load(f)
+        if self.metadata.get('version') != STORE_VERSION:
+            raise ValueError(f"Dense weight store {store_dir} has version {self.metadata.get('version')}, "
+                             f"expected {STORE_VERSION}. Convert the weight file again.")
+
+        self._param_info = self.metadata['params']
+        if params is not None:
+            self._param_info = {name: info for name, info in self._param_info.items() if name in params}
+        self.index = RSEIndex(np.load(os.path.join(store_dir, 'keys.npy'), mmap_mode='r'), None)
+        self.tune_weights = np.load(os.path.join(store_dir, 'tune_weights.npy'), mmap_mode=mmap_mode)
+        self._arrays = {}
+
+    @classmethod
+    def open_if_current(cls, store_dir: str, weight_file_path: str, tree_name: str, weight_branch: str,
+                        weight_branch_type: int, params: Optional[List[str]] = None,
+                        mmap_mode: str = 'r') -> Optional["DenseWeightStore"]:
+        """
+        Open the store if it exists and was made from the current version of the weight file, else None.
+        """
+        try:
+            store = cls(store_dir, params=params, mmap_mode=mmap_mode)
+        except (OSError, ValueError, KeyError):
+            return None
+        description = store_description(weight_file_path, tree_name, weight_branch, weight_branch_type)
+        if any(store.metadata.get(key) != value for key, value in description.items()):
+            return None
+        return store
+
+    def __len__(self) -> int:
+        return self.metadata['num_rows']
+
+    @property
+    def params(self) -> List[str]:
+        """The parameters available from this store."""
+        return list(self._param_info.keys())
+
+    def num_variations(self, param: str) -> int:
+        return self._param_info[param]['num_variations']
+
+    def _load(self, param: str, kind: str) -> np.ndarray:
+        if param not in self._param_info:
+            raise KeyError(f"Parameter '{param}' is not in the dense weight store {self.store_dir}")
+        key = (param, kind)
+        if key not in self._arrays:
+            path = os.path.join(self.store_dir, f"{self._param_info[param]['file']}.{kind}.npy")
+            self._arrays[key] = np.load(path, mmap_mode=self.mmap_mode)
+        return self._arrays[key]
+
+    def weights(self, param: str) -> np.ndarray:
+        """float32 (rows x universes) weights of a parameter, memory-mapped."""
+        return self._load(param, 'weights')
+
+    def counts(self, param: str) -> np.ndarray:
+        """Number of valid universes of each row for a parameter, 0 if the event has no weights for it."""
+        return self._load(param, 'counts')
+
+    def lookup(self, run, subrun, event) -> np.ndarray:
+        """Rows of many events at once, -1 for events not in the store."""
+        return self.index.lookup(run, subrun, event)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Dense memory-mapped store of the universe weights of a weight file")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help='convert a weight file into a dense store')
+    convert.add_argument('-i', '--input', required=True, help='arborist or surprise weight file')
+    convert.add_argument('-o', '--output', default=None, help='store directory (default: in the lantern_ana cache directory)')
+    convert.add_argument('--tree', required=True, help='name of the weight tree')
+    convert.add_argument('--weight-branch', required=True, help='name of the branch with the map of weights')
+    convert.add_argument('--weight-branch-type', required=True, type=int, choices=[0, 1],
+                         help='0=arborist file, 1=surprise file')
+    convert.add_argument('--run', default='run', help='run branch of the weight tree')
+    convert.add_argument('--subrun', default='subrun', help='subrun branch of the weight tree')
+    convert.add_argument('--event', default='event', help='event branch of the weight tree')
+    convert.add_argument('--params', nargs='+', default=None, help='only store these parameters')
+    convert.add_argument('--max-variations', type=int, default=1000, help='largest number of universes stored per parameter')
+    convert.add_argument('--cache-dir', default=None, help='cache directory (default: see lantern_ana.utils.cache)')
+
+    info = subparsers.add_parser('info', help='print the contents of a store')
+    info.add_argument('store_dir')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'convert':
+        import ROOT as rt
+        if args.weight_branch_type == 0:
+            # the arborist weight map needs the dictionary of MapStringVecDouble
+            rt.gSystem.Load("libMapDict.so")
+        store_dir = args.output
+        if store_dir is None:
+            store_dir = default_store_dir(args.input, args.tree, args.weight_branch, args.cache_dir)
+        convert_weight_file(args.input, store_dir, args.tree, args.weight_branch, args.weight_branch_type,
+                            args.run, args.subrun, args.event, params=args.params,
+                            max_variations=args.max_variations)
+    else:
+        store = DenseWeightStore(args.store_dir)
+        print(f"source: {store.metadata['source']['path']}")
+        print(f"rows: {len(store)}")
+        for param in store.params:
+            print(f"  {param}: {store.num_variations(param)} universes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
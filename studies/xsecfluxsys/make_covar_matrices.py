@@ -1,4 +1,5 @@
 import os,sys
+import numpy as np
 import ROOT as rt
 
 def load_xsecflux_file( input_rootfile ):
@@ -13,6 +14,10 @@ def load_xsecflux_file( input_rootfile ):
   KEY: TH1D	hvisible_energy__run4a4c4d5_v10_04_07_13_BNB_nu_overlay_surprise__AxFFCCQEshape_UBGenie_mean;1	
   KEY: TH1D	hvisible_energy__run4a4c4d5_v10_04_07_13_BNB_nu_overlay_surprise__AxFFCCQEshape_UBGenie_variance;1	
   KEY: TH1D	hvisible_energy__run4a4c4d5_v10_04_07_13_BNB_nu_overlay_surprise__AxFFCCQEshape_UBGenie_badweights;1	
+
+  Only the names of the variation histograms are collected here; the file must stay open,
+  and form_covariance_matrices reads the universe histograms of one parameter at a time.
+  The CV and MC num histograms are read.
   """
 
   rfile = input_rootfile
@@ -52,18 +57,12 @@ def load_xsecflux_file( input_rootfile ):
         histtype = "variance"
       else:
         histtype = "universes"
-      h = rfile.Get(histname)
       print("  variable name: ",varname)
       print("  sample name: ",samplename)
       print("  par name: ",parname)
       print("  hist type: ",histtype)
-      print("  hist: ",h)
-      print("  type(h): ",type(h))
 
-      hists[(varname,samplename,parname,histtype)] = {"name":histname,"h":h}
-      if histtype=="universes":
-        param_nuniverses[parname] = h.GetYaxis().GetNbins()
-        var_nbins[varname] = h.GetXaxis().GetNbins()
+      hists[(varname,samplename,parname,histtype)] = {"name":histname}
 
       if varname not in varlist:
         varlist.append(varname)
@@ -81,11 +80,12 @@ def load_xsecflux_file( input_rootfile ):
   for var in varlist:
     for sample in samplelist:
       hname_cv  = f"h{var}_{sample}_cv"
-      hcv = rinput.Get(hname_cv)
+      hcv = rfile.Get(hname_cv)
       if hcv is not None:
         cvhists[(var,sample)] = hcv
+        var_nbins[var] = hcv.GetXaxis().GetNbins()
       hname_n  = f"h{var}_{sample}_N"
-      hN = rinput.Get(hname_n)
+      hN = rfile.Get(hname_n)
       if hN is not None:
         mcNhists[(var,sample)] = hN
 
@@ -94,14 +94,93 @@ def load_xsecflux_file( input_rootfile ):
   varlist.sort()
   parlist.sort()
 
-  hist_dict = {"samples":samplelist,"params":parlist,"variables":varlist,"num_universe":param_nuniverses,"num_bins":var_nbins,"hists":hists,"cvhists":cvhists,"mcNhists":mcNhists}
+  # num_universe is filled by form_covariance_matrices, as the universe histograms are read
+  hist_dict = {"rfile":rfile,"samples":samplelist,"params":parlist,"variables":varlist,"num_universe":param_nuniverses,"num_bins":var_nbins,"hists":hists,"cvhists":cvhists,"mcNhists":mcNhists}
   return hist_dict
 
+def hist_contents( h ):
+  """
+  Get the bin contents of a TH1D/TH2D as a NumPy array, including under/overflow bins.
+  For a TH2D the array has shape (nbinsx+2, nbinsy+2), indexed as [xbin, ybin].
+  """
+  ncells = h.GetNcells()
+  contents = np.frombuffer( h.GetArray(), dtype=np.float64, count=ncells ).copy()
+  if h.GetDimension()==1:
+    return contents
+  nx = h.GetXaxis().GetNbins()+2
+  ny = h.GetYaxis().GetNbins()+2
+  # ROOT global bin = xbin + nx*ybin
+  return contents.reshape( ny, nx ).T
+
+def set_hist2d_contents( h, matrix ):
+  """
+  Set the contents of the (non-flow) bins of a square TH2D from a NumPy matrix, indexed as [xbin-1, ybin-1].
+  """
+  n = matrix.shape[0]
+  contents = np.zeros( (n+2, n+2), dtype=np.float64 )
+  contents[1:-1,1:-1] = matrix.T   # rows are y-bins, columns are x-bins
+  h.SetContent( np.ascontiguousarray(contents).ravel() )
+  h.SetEntries( n*n )
+
+def get_universe_matrix( rfile, hists, bin_blocks, par, nbins_per_variable ):
+  """
+  Stack the universe histograms h[var]__[sample]__[par] of all (sample,var) blocks into a
+  (num_global_bins, num_universes) matrix. Blocks without a histogram for this parameter
+  (no events there) have no variation and are left at zero.
+  Each histogram is read from rfile and deleted once its contents are copied.
+  """
+  blocks = []
+  nuniverses = None
+  for (sample,var) in bin_blocks:
+    key = (var,sample,par,"universes")
+    if key not in hists:
+      blocks.append( None )
+      continue
+    h = rfile.Get( hists[key]['name'] )
+    nuniv = h.GetYaxis().GetNbins()
+    # local bins 1..numbins and universes in y-bins 1..nuniv
+    numbins = nbins_per_variable[var]
+    contents = hist_contents(h)[1:numbins+1, 1:nuniv+1]
+    h.Delete()
+    if nuniverses is None:
+      nuniverses = nuniv
+    elif nuniv!=nuniverses:
+      raise ValueError(f"num universes for parameter {par} do not match: {nuniv} and {nuniverses}")
+    blocks.append( contents )
+
+  if nuniverses is None:
+    return None
+  for iblock,(sample,var) in enumerate(bin_blocks):
+    if blocks[iblock] is None:
+      blocks[iblock] = np.zeros( (nbins_per_variable[var], nuniverses) )
+  return np.concatenate( blocks, axis=0 )
+
+def covariance_from_universes( universes ):
+  """
+  Covariance between bins from a (num_bins, num_universes) matrix.
+    - 2 universes (e.g. +/- 1 sigma): outer product of the difference
+    - more: covariance over universes, normalized by the number of universes
+  """
+  nbins, nuniverses = universes.shape
+  if nuniverses==2:
+    diff = universes[:,0]-universes[:,1]
+    return np.outer( diff, diff )
+  elif nuniverses>2:
+    deviations = universes - universes.mean(axis=1, keepdims=True)
+    return (deviations @ deviations.T)/float(nuniverses)
+  return np.zeros( (nbins,nbins) )
+
 def form_covariance_matrices( hist_dict, root_outputfile ):
 
   """
   We use the histograms we've formed and stored in self.var_bininfo to form covariance matrice
   We make a covariance matrix for observable bins between (sample,parameter) combinations 
+
+  For each parameter, the universe histograms of all (sample,variable) blocks are stacked into a
+  NumPy (bins x universes) matrix and the covariance is computed with a matrix product.
+  Parameters are processed one at a time: their universe histograms are read from the
+  input file and deleted before the next parameter, so only one parameter's universes
+  are in memory. The total xsec+flux covariance is a running sum.
   """
 
   root_outputfile.cd()
@@ -112,113 +191,71 @@ def form_covariance_matrices( hist_dict, root_outputfile ):
   par_list = hist_dict['params']
   var_list = hist_dict['variables']
   nbins_per_variable = hist_dict['num_bins']
+  rfile = hist_dict["rfile"]
   hists = hist_dict["hists"]
   cvhists = hist_dict["cvhists"]
         
   # index all observable bins
   globalindex = 0
   bin_list = []
+  bin_blocks = []
+  ncv_blocks = []
   for sample in sample_list:
     for var in var_list:
       numbins = nbins_per_variable[var]
+      bin_blocks.append( (sample,var) )
+      ncv_blocks.append( hist_contents( cvhists[(var,sample)] )[1:numbins+1] )
       for ii in range(numbins):
           bin_list.append( (globalindex,sample,var,ii) )
           globalindex += 1
   num_global_bins = globalindex
 
+  # central value number of events in each global bin, and their products
+  Ncv = np.concatenate( ncv_blocks ) if len(ncv_blocks)>0 else np.zeros(0)
+  NN = np.outer( Ncv, Ncv )
+  frac_valid = np.outer( Ncv>0.0, Ncv!=0.0 )
+  NN_safe = np.where( frac_valid, NN, 1.0 )
+
   # make covariances between bins for each parameter
-  covar_hists = {}
-  frac_covar_hists = {}
+  covar_total = np.zeros( (num_global_bins,num_global_bins) )
 
   for par in par_list:
+    universes = get_universe_matrix( rfile, hists, bin_blocks, par, nbins_per_variable )
+    if universes is None:
+      print(f"  no universe histograms for parameter {par}, skipping")
+      continue
+    hist_dict["num_universe"][par] = universes.shape[1]
+
+    covar = covariance_from_universes( universes )
+    frac_covar = np.where( frac_valid, covar/NN_safe, 0.0 )
+    covar_total += covar
+
     hcovar_name = f"hcovar_{par}"
     hcovar = rt.TH2D(hcovar_name,f"covar for {par}",num_global_bins,0,num_global_bins,num_global_bins,0,num_global_bins)
     hfrac_covar_name = f"hfrac_covar_{par}"
     hfrac_covar = rt.TH2D(hfrac_covar_name,f"fractional covar for {par}",num_global_bins,0,num_global_bins,num_global_bins,0,num_global_bins)
-    for ibin in range(num_global_bins):
-      for jbin in range(ibin,num_global_bins):
-        ibin_info = bin_list[ibin]
-        jbin_info = bin_list[jbin]
-        # if par not in ibin_info[-1]:
-        #   continue
-        # if par not in jbin_info[-1]:
-        #   continue
-
-        ilocalindex = ibin_info[-1]
-        jlocalindex = jbin_info[-1]
-        isample = ibin_info[1]
-        jsample = jbin_info[1]
-        ivariable = ibin_info[2]
-        jvariable = jbin_info[2]
-        ihout = hists[(ivariable,isample,par,"universes")]['h']
-        jhout = hists[(jvariable,jsample,par,"universes")]['h']
-        ihmean = hists[(ivariable,isample,par,"mean")]['h']
-        jhmean = hists[(jvariable,jsample,par,"mean")]['h']
-
-        iNcv = cvhists[(ivariable,isample)].GetBinContent(ilocalindex+1)
-        jNcv = cvhists[(jvariable,jsample)].GetBinContent(jlocalindex+1)
-
-        i_nvariations = ihout.GetYaxis().GetNbins()
-        j_nvariations = jhout.GetYaxis().GetNbins()
-        if i_nvariations!=j_nvariations:
-          raise ValueError(f"num universes for i and j bin do not match: {i_nvariations} and {j_nvariations}")
-
-        covar = 0.0
-        if i_nvariations==2:
-            var_i = ihout.GetBinContent(ibin+1,1)-ihout.GetBinContent(ibin+1,2)
-            var_j = jhout.GetBinContent(jbin+1,1)-jhout.GetBinContent(jbin+1,2)
-            covar = var_i*var_j
-        elif i_nvariations>2:
-            for ii in range(i_nvariations):
-                var_i = ihout.GetBinContent(ibin+1,ii)-ihmean.GetBinContent(ibin+1)
-                var_j = jhout.GetBinContent(jbin+1,ii)-jhmean.GetBinContent(jbin+1)
-                covar += (var_i*var_j)/float(i_nvariations)
-
-        frac_covar = 0.0
-        if iNcv>0.0 and jNcv:
-          frac_covar = covar/(iNcv*jNcv)
-        
-        hcovar.SetBinContent( ibin+1, jbin+1, covar )
-        hfrac_covar.SetBinContent( ibin+1, jbin+1, frac_covar )
-        if ibin!=jbin:
-            hcovar.SetBinContent(jbin+1,ibin+1,covar)
-            hfrac_covar.SetBinContent(jbin+1,ibin+1,frac_covar)
-
-        i_label = f"{ivariable},{isample}"
-        j_label = f"{jvariable},{jsample}"
-        hcovar.GetXaxis().SetBinLabel(ibin+1,i_label)
-        hcovar.GetYaxis().SetBinLabel(jbin+1,j_label)
-    covar_hists[par] = hcovar
-    frac_covar_hists[par] = hfrac_covar
+    set_hist2d_contents( hcovar, covar )
+    set_hist2d_contents( hfrac_covar, frac_covar )
+
+    for (ibin,sample,var,ii) in bin_list:
+      label = f"{var},{sample}"
+      hcovar.GetXaxis().SetBinLabel(ibin+1,label)
+      hcovar.GetYaxis().SetBinLabel(ibin+1,label)
+
     hcovar.Write()
     hfrac_covar.Write()
+    # free the histograms before moving to the next parameter
+    del hcovar
+    del hfrac_covar
 
   hNN = rt.TH2D("hNN",f"num in i-bin x num in j-bin",num_global_bins,0,num_global_bins,num_global_bins,0,num_global_bins)
-  for ibin in range(num_global_bins):
-    for jbin in range(ibin,num_global_bins):
-      ibin_info = bin_list[ibin]
-      jbin_info = bin_list[jbin]
-      ilocalindex = ibin_info[-1]
-      jlocalindex = jbin_info[-1]
-      isample = ibin_info[1]
-      jsample = jbin_info[1]
-      ivariable = ibin_info[2]
-      jvariable = jbin_info[2]
-      iNcv = cvhists[(ivariable,isample)].GetBinContent(ilocalindex+1)
-      jNcv = cvhists[(jvariable,jsample)].GetBinContent(jlocalindex+1)
-      binBB = iNcv*jNcv
-      if binBB==0.0:
-        binBB = 1.0
-      hNN.SetBinContent( ibin+1, jbin+1, binBB )
-      hNN.SetBinContent( jbin+1, ibin+1, binBB )
+  set_hist2d_contents( hNN, np.where( NN==0.0, 1.0, NN ) )
 
   # lets total things up
   hcovar_total_xsecflux = rt.TH2D("hcovar_total_xsecflux",f"covar for all xsec and flux",num_global_bins,0,num_global_bins,num_global_bins,0,num_global_bins)
   hfrac_covar_total_xsecflux = rt.TH2D("hfrac_covar_total_xsecflux",f"frac_covar for all xsec and flux",num_global_bins,0,num_global_bins,num_global_bins,0,num_global_bins)
-  for par,hcovar in covar_hists.items():
-    hcovar_total_xsecflux.Add( hcovar )
-    hfrac_covar_total_xsecflux.Add( hcovar )
-  hfrac_covar_total_xsecflux.Divide( hNN )
+  set_hist2d_contents( hcovar_total_xsecflux, covar_total )
+  set_hist2d_contents( hfrac_covar_total_xsecflux, covar_total/np.where( NN==0.0, 1.0, NN ) )
   hcovar_total_xsecflux.Write()
   hfrac_covar_total_xsecflux.Write()
   hNN.Write()
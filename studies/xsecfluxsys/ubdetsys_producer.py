@@ -1,9 +1,10 @@
 import os,sys,time
-import re
 from typing import Dict, Any, List, Optional, Type
 from array import array
 from lantern_ana.producers.producerBaseClass import ProducerBaseClass
 from lantern_ana.producers.producer_factory import register
+from lantern_ana.utils.formulas import CompiledFormula, FormulaSelection
+from lantern_ana.io.rse_index import RSEIndex
 import numpy as np
 import ROOT as rt
 
@@ -66,10 +67,16 @@ class UBDetSysProducer(ProducerBaseClass):
             'subrun':self.subrun_branchname,
             'event':self.event_branchname
         }
+        self._rse_formulas = [ CompiledFormula(self.index_branchnames[x], prefix='ntuple.')
+                               for x in ['run','subrun','event'] ]
 
         # get tree name in variation files
         self.var_treename = config.get('variation_treename')
 
+        # the RSE -> entry index of each variation tree is saved and reused by later jobs
+        self.use_rse_index_cache = config.get('use_rse_index_cache', True)
+        self.rse_index_cache_dir = config.get('rse_index_cache_dir', None)
+
         # for each variation we need some info
         var_rootfile_dict = config.get('variation_rootfiles',{})
         self.var_info = {}
@@ -77,12 +84,12 @@ class UBDetSysProducer(ProducerBaseClass):
             if var not in var_rootfile_dict:
                 raise ValueError(f"Variation[{var}] does not have a rootfile")
             var_rootfile = var_rootfile_dict[var]
-            var_rsemap   = self._build_sample_entry_index(var_rootfile, self.var_treename,self.index_branchnames)
+            var_rseindex = self._build_sample_entry_index(var_rootfile, self.var_treename,self.index_branchnames)
             var_tfile    = rt.TFile( var_rootfile )
             var_ttree    = var_tfile.Get(self.var_treename)
             self.var_info[var] = {
                 "rootfile":var_rootfile_dict[var],
-                "rsemap":var_rsemap,
+                "rseindex":var_rseindex,
                 "nunion":0,
                 "tfile":var_tfile,
                 "ttree":var_ttree
@@ -101,45 +108,35 @@ class UBDetSysProducer(ProducerBaseClass):
         # event selection criterion
         self.cut_formulas = config.get('cut_formulas',{})
         self.event_selection_critera = config.get('event_selection_critera',[])
+        # every cut formula must pass
+        self._selection = FormulaSelection(self.cut_formulas)
+
+        # observable formulas (branch names) of each histogram
+        self._variable_formulas = {}
+        for histname in self._bin_config_list:
+            formula = self._bin_config_list[histname]['formula']
+            self._variable_formulas[formula] = CompiledFormula(formula, prefix='ntuple.')
 
     def _build_sample_entry_index(self,rootfile,treename,index_branchnames):
         """
-        Open file and make (run,subrun,event) --> index dictionary
-        """
-        try:
-            # open file
-            rfile = rt.TFile( rootfile )
-            # get ttree
-            ttree = rfile.Get(treename)
-            # disable all but run, subrun, event branches to speed up read through file
-            ttree.SetBranchStatus("*", 0)
-            ttree.SetBranchStatus(index_branchnames['run'], 1)
-            ttree.SetBranchStatus(index_branchnames['subrun'], 1)
-            ttree.SetBranchStatus(index_branchnames['event'], 1)            
-            nentries = ttree.GetEntries()
-            print(f"Loaded variation tree '{treename}' with {nentries} entries: {rootfile}")
-        except:
-            raise RuntimeError(f'Failed to make RSE to index map for variation file"{rootfile}".')
+        Get the (run,subrun,event) --> entry index of the variation tree.
 
+        The index is loaded from the cache if it was made before for this file, see lantern_ana.io.rse_index.
+        """
         tstart = time.time()
-        rsedict = {}
-        # TODO: use a tqdm loop here?
-        for iientry in range(nentries):
-            #if (iientry%100000==0):
-            #    print("  building index. entry ",iientry)
-            ttree.GetEntry(iientry)
-            run    = eval(f"ttree.{index_branchnames['run']}")
-            subrun = eval(f"ttree.{index_branchnames['subrun']}")
-            event  = eval(f"ttree.{index_branchnames['event']}")
-            rse = (run,subrun,event)
-            rsedict[rse] = iientry
-            if iientry%100000==0:
-                print("  building RSE-entry map. entry ",iientry," rse=",rse)
+        try:
+            rseindex = RSEIndex.load_or_build( rootfile, treename,
+                                               index_branchnames['run'],
+                                               index_branchnames['subrun'],
+                                               index_branchnames['event'],
+                                               cache_dir=self.rse_index_cache_dir,
+                                               use_cache=self.use_rse_index_cache )
+        except Exception as e:
+            raise RuntimeError(f'Failed to make RSE to index map for variation file"{rootfile}": {e}')
 
         dt_index = time.time()-tstart
-        print(f'  Time to make variation index: {dt_index:.2f}. Number of entries: {nentries}')
-        rfile.Close()
-        return rsedict
+        print(f'  Time to get variation index: {dt_index:.2f}. Number of entries: {len(rseindex)}')
+        return rseindex
 
 
     def setDefaultValues(self):
@@ -200,6 +197,14 @@ class UBDetSysProducer(ProducerBaseClass):
         """Specify required inputs."""
         return ["gen2ntuple"]
 
+    def supportsSharding(self) -> bool:
+        """Writes its own output file, so it cannot be split across worker processes."""
+        return False
+
+    def supportsCaching(self) -> bool:
+        """Fills histograms in processEvent."""
+        return False
+
     # def _load_sample_weight_tree(self, datasetname ):
     #     if self._current_sample_tchain is not None:
     #         if datasetname != self._current_sample_name:
@@ -257,15 +262,12 @@ class UBDetSysProducer(ProducerBaseClass):
 
         var_cut_result = {}
         var_has_entry = {}
+        rse = tuple( f(ntuple) for f in self._rse_formulas )
         for var in self.variation_names:
             var_info = self.var_info[var]
-            run    = eval(f"ntuple.{self.index_branchnames['run']}")
-            subrun = eval(f"ntuple.{self.index_branchnames['subrun']}")
-            event  = eval(f"ntuple.{self.index_branchnames['event']}") 
-            rse = (run,subrun,event)
-            if rse in var_info['rsemap']:
+            var_entry = var_info['rseindex'].lookup_one(*rse)
+            if var_entry>=0:
                 var_has_entry[var] = True
-                var_entry = var_info['rsemap'][rse]
                 nbytes = var_info['ttree'].GetEntry(var_entry)
                 if nbytes>0:
                     var_passes = self._process_selection_cut( var_info['ttree'] )
@@ -314,36 +316,11 @@ class UBDetSysProducer(ProducerBaseClass):
     def _process_selection_cut( self, ntuple ):
 
         # in order to decide if this event is something we are going to fill
-        select_results = {}
-        for cutname,cutformula in self.cut_formulas.items():
-            # Extract placeholders from the formula (strings inside {})
-            placeholders = re.findall(r'\{([^}]+)\}', cutformula)
-
-            # Create clean expression and namespace
-            clean_expression = cutformula
-            namespace = {}
-            for placeholder in placeholders:
-                # Create a simple variable name from the placeholder
-                var_name = placeholder.replace('.', '_').replace('[', '_').replace(']', '')
-                clean_expression = clean_expression.replace(f"{{{placeholder}}}", var_name)
-                # Evaluate the placeholder to get the actual value
-                namespace[var_name] = eval(placeholder)
-
-            # Evaluate the clean expression with the namespace
-            select_results[cutname] = eval(clean_expression, namespace)
-
-        passes = True
-        for cutname,result in select_results.items():
-            if result==False:
-                passes = False
-                break
-
-        return passes
+        return self._selection(ntuple)
 
     def _process_variable_formula( self, ntuple, varformula ):
         # sample does apply to this variable, so we get the observable variable value
-        x = eval(f'ntuple.{varformula}')   
-        return x
+        return self._variable_formulas[varformula](ntuple)
 
 
     def finalize(self):
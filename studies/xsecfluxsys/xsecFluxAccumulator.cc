@@ -8,6 +8,10 @@
 #include "TDirectory.h"
 #include "TBranch.h"
 #include "TTreeReader.h"
+#include "TROOT.h"
+#include <thread>
+#include <exception>
+#include <functional>
 
 XsecFluxAccumulator::XsecFluxAccumulator()
     : numVariables_(0),
@@ -15,7 +19,8 @@ XsecFluxAccumulator::XsecFluxAccumulator()
       maxValidWeight_(1000.0),
       configured_(false),
       kWeightBranchType(XsecFluxAccumulator::kArborist),
-      missingEventCount_(0)
+      missingEventCount_(0),
+      numThreads_(1)
 {
 }
 
@@ -54,6 +59,17 @@ void XsecFluxAccumulator::configure(int numVariables,
       xsecParamNames_[xsecparname] = 1;
     }
 
+    // Dense slot tables: each included parameter gets an index, used instead of
+    // looking up the parameter name in maps inside the accumulation loop
+    paramSlotNames_.clear();
+    paramSlots_.clear();
+    xsecParamSlot_.clear();
+    for (const auto& p : includedParams_) {
+        paramSlots_[p] = static_cast<int>(paramSlotNames_.size());
+        paramSlotNames_.push_back(p);
+        xsecParamSlot_.push_back( xsecParamNames_.find(p) != xsecParamNames_.end() ? 1 : 0 );
+    }
+
     // Clear any existing arrays
     arrays_.clear();
     variationsPerParam_.clear();
@@ -66,6 +82,11 @@ void XsecFluxAccumulator::configure(int numVariables,
               << maxVariations << " max variations" << std::endl;
 }
 
+void XsecFluxAccumulator::setNumThreads(int numThreads)
+{
+    numThreads_ = std::max(1, numThreads);
+}
+
 void XsecFluxAccumulator::reset()
 {
     for (auto& kv : arrays_) {
@@ -135,6 +156,298 @@ int XsecFluxAccumulator::processAllEvents(
     std::cout << "  Building RSE index map for weight tree..." << std::endl;
     std::map<std::tuple<int,int,int>, Long64_t> rseToEntry = makeRSEmap( weightFilePath, weightTreeName, runBranch, subrunBranch, eventBranch );
 
+    // Convert the RSE of each event into its weight tree entry (-1 if missing)
+    std::vector<Long64_t> entries(numEvents, -1);
+    for (size_t iEvt = 0; iEvt < numEvents; iEvt++) {
+        const auto& rse = rseList[iEvt];
+        if (rse.size() < 3) continue;
+        auto it = rseToEntry.find(std::make_tuple(rse[0], rse[1], rse[2]));
+        if (it != rseToEntry.end()) {
+            entries[iEvt] = it->second;
+        }
+    }
+
+    return processEventsAtEntries( weightFilePath, weightTreeName, weightBranchName,
+                                   entries, binIndicesList, centralWeights );
+}
+
+int XsecFluxAccumulator::processEventsAtEntries(
+    const std::string& weightFilePath,
+    const std::string& weightTreeName,
+    const std::string& weightBranchName,
+    const std::vector<Long64_t>& entries,
+    const std::vector<std::vector<int>>& binIndicesList,
+    const std::vector<double>& centralWeights)
+{
+    size_t numEvents = entries.size();
+    if (binIndicesList.size() != numEvents || centralWeights.size() != numEvents) {
+        throw std::runtime_error("Mismatch in input vector sizes");
+    }
+
+    // Copy the inputs into flat buffers: bin indices row-major, padded with -1
+    std::vector<std::int64_t> entryBuffer(entries.begin(), entries.end());
+    std::vector<int> binBuffer(numEvents * numVariables_, -1);
+    for (size_t iEvt = 0; iEvt < numEvents; iEvt++) {
+        const auto& binIndices = binIndicesList[iEvt];
+        size_t n = std::min(binIndices.size(), static_cast<size_t>(numVariables_));
+        std::copy(binIndices.begin(), binIndices.begin() + n, binBuffer.begin() + iEvt * numVariables_);
+    }
+
+    return processEventsFromBuffers( weightFilePath, weightTreeName, weightBranchName,
+                                     entryBuffer.data(), binBuffer.data(), centralWeights.data(),
+                                     numEvents, numVariables_ );
+}
+
+int XsecFluxAccumulator::processEventsFromBuffers(
+    const std::string& weightFilePath,
+    const std::string& weightTreeName,
+    const std::string& weightBranchName,
+    const std::int64_t* entries,
+    const int* binIndices,
+    const double* centralWeights,
+    size_t numEvents,
+    int numBinIndices)
+{
+    if (!configured_) {
+        throw std::runtime_error("XsecFluxAccumulator not configured. Call configure() first.");
+    }
+
+    if (numEvents == 0) {
+        std::cout << "XsecFluxAccumulator: No events to process." << std::endl;
+        return 0;
+    }
+
+    if (!entries || !centralWeights || (numBinIndices > 0 && !binIndices) || numBinIndices < 0) {
+        throw std::runtime_error("XsecFluxAccumulator: invalid input buffers");
+    }
+
+    // The number of universes of a parameter is only known event by event here,
+    // so every thread stores up to maxVariations_ universes per bin.
+    slotStrides_.assign(paramSlotNames_.size(), maxVariations_);
+
+    // Each thread reads the weight tree with its own TFile and accumulates into its own partial sums.
+    return runAccumulation(numEvents, [&](size_t begin, size_t end, PartialSums& sums) {
+        accumulateRange(weightFilePath, weightTreeName, weightBranchName,
+                        entries, binIndices, numBinIndices, centralWeights, begin, end, sums);
+    });
+}
+
+void XsecFluxAccumulator::clearDenseWeights()
+{
+    denseParams_.clear();
+}
+
+void XsecFluxAccumulator::addDenseWeights(const std::string& paramName,
+                                          const float* weights,
+                                          const int* counts,
+                                          int numVariations)
+{
+    if (!configured_) {
+        throw std::runtime_error("XsecFluxAccumulator not configured. Call configure() first.");
+    }
+    auto it = paramSlots_.find(paramName);
+    if (it == paramSlots_.end()) {
+        return;  // not one of the included parameters
+    }
+    if (!weights || !counts || numVariations <= 0) {
+        throw std::runtime_error("XsecFluxAccumulator: invalid dense weight buffers for parameter " + paramName);
+    }
+    DenseParam param;
+    param.slot = it->second;
+    param.weights = weights;
+    param.counts = counts;
+    param.numVariations = numVariations;
+    denseParams_.push_back(param);
+}
+
+int XsecFluxAccumulator::processDenseEvents(
+    const std::int64_t* rows,
+    const double* tuneWeights,
+    const int* binIndices,
+    int numBinIndices,
+    const double* centralWeights,
+    size_t numEvents)
+{
+    if (!configured_) {
+        throw std::runtime_error("XsecFluxAccumulator not configured. Call configure() first.");
+    }
+
+    if (numEvents == 0) {
+        std::cout << "XsecFluxAccumulator: No events to process." << std::endl;
+        return 0;
+    }
+
+    if (!rows || !tuneWeights || !centralWeights || (numBinIndices > 0 && !binIndices) || numBinIndices < 0) {
+        throw std::runtime_error("XsecFluxAccumulator: invalid input buffers");
+    }
+
+    std::cout << "  Reading weights of " << denseParams_.size() << " parameter(s) from the dense weight store" << std::endl;
+
+    // The store gives the number of universes of each parameter
+    slotStrides_.assign(paramSlotNames_.size(), maxVariations_);
+    for (const auto& param : denseParams_) {
+        slotStrides_[param.slot] = std::min(param.numVariations, maxVariations_);
+    }
+
+    return runAccumulation(numEvents, [&](size_t begin, size_t end, PartialSums& sums) {
+        accumulateDenseRange(rows, tuneWeights, binIndices, numBinIndices, centralWeights, begin, end, sums);
+    });
+}
+
+int XsecFluxAccumulator::runAccumulation(size_t numEvents,
+                                         const std::function<void(size_t, size_t, PartialSums&)>& accumulate)
+{
+    // Split the events into contiguous ranges, one per thread.
+    int nthreads = std::max(1, std::min<int>(numThreads_, static_cast<int>(numEvents)));
+    std::vector<PartialSums> partials(nthreads);
+    std::cout << "  Accumulating weights using " << nthreads << " thread(s)..." << std::endl;
+
+    if (nthreads == 1) {
+        accumulate(0, numEvents, partials[0]);
+    }
+    else {
+        ROOT::EnableThreadSafety();
+        std::vector<std::thread> threads;
+        std::vector<std::exception_ptr> errors(nthreads);
+        size_t chunk = (numEvents + nthreads - 1) / nthreads;
+        for (int ithread = 0; ithread < nthreads; ithread++) {
+            size_t begin = std::min(numEvents, ithread * chunk);
+            size_t end   = std::min(numEvents, begin + chunk);
+            threads.emplace_back([&, ithread, begin, end]() {
+                try {
+                    accumulate(begin, end, partials[ithread]);
+                }
+                catch (...) {
+                    errors[ithread] = std::current_exception();
+                }
+            });
+        }
+        for (auto& t : threads) {
+            t.join();
+        }
+        for (auto& err : errors) {
+            if (err) std::rethrow_exception(err);
+        }
+    }
+
+    // Reduce the per-thread partial sums into arrays_ and the bad weight counters
+    int processedCount = mergePartialSums(partials);
+
+    std::cout << "  Processed " << processedCount << " events, "
+              << missingEventCount_ << " missing from weight tree" << std::endl;
+
+    return processedCount;
+}
+
+void XsecFluxAccumulator::initPartialSums(PartialSums& sums) const
+{
+    int nslots = static_cast<int>(paramSlotNames_.size());
+    sums.arrays.assign(nslots * numVariables_, std::vector<double>());
+    sums.badWeightsPerBin.assign(nslots * numVariables_, std::vector<int>());
+    sums.nvariations.assign(nslots, 0);
+    sums.badWeightsPerUniverse.assign(maxVariations_, 0);
+    sums.processed = 0;
+    sums.missing = 0;
+    sums.badWeights = 0;
+}
+
+template <typename T>
+void XsecFluxAccumulator::accumulateVariations(PartialSums& sums, int slot,
+                                               const T* variations, int numValues,
+                                               double eventWeight,
+                                               const int* eventBinIndices, int numBinIndices) const
+{
+    // Track variations per parameter. The stride is the same in every thread.
+    int stride = slotStrides_[slot];
+    int nvariations = std::min(numValues, stride);
+    sums.nvariations[slot] = std::max(sums.nvariations[slot], nvariations);
+
+    // Accumulate into each variable's bins
+    for (int varIdx = 0; varIdx < numVariables_ && varIdx < numBinIndices; varIdx++) {
+        int ibin = eventBinIndices[varIdx];
+        if (ibin < 0) continue;  // Variable doesn't apply to this event
+
+        int nbins = binsPerVariable_[varIdx];
+        if (ibin >= nbins) continue;
+
+        // Get or create array for this (param, var) slot
+        int islot = slot * numVariables_ + varIdx;
+        auto& arr = sums.arrays[islot];
+        auto& badweights = sums.badWeightsPerBin[islot];
+        if (arr.empty()) {
+            arr.assign(nbins * stride, 0.0);
+            badweights.assign(nbins, 0);
+        }
+
+        // Fast inner loop - the core optimization
+        // Row-major: arr[ibin, iUniv] = arr[ibin * nvariations + iUniv]
+        double* row = arr.data() + ibin * stride;
+        for (int iUniv = 0; iUniv < nvariations; iUniv++) {
+            double w = variations[iUniv];
+            if (w < maxValidWeight_) {
+                row[iUniv] += w * eventWeight;
+            } else {
+                // bad weight: either larger than max weight or NAN. set to 1.0.
+                sums.badWeights++;
+                sums.badWeightsPerUniverse[iUniv]++;
+                badweights[ibin]++;
+                row[iUniv] += eventWeight;
+            }
+        }
+    }
+}
+
+void XsecFluxAccumulator::accumulateDenseRange(
+    const std::int64_t* rows,
+    const double* tuneWeights,
+    const int* binIndices,
+    int numBinIndices,
+    const double* centralWeights,
+    size_t begin, size_t end,
+    PartialSums& sums)
+{
+    initPartialSums(sums);
+
+    for (size_t iEvt = begin; iEvt < end; iEvt++) {
+        // Row of the event in the store, -1 if this event's RSE was not found
+        std::int64_t row = rows[iEvt];
+        if (row < 0) {
+            sums.missing++;
+            continue;
+        }
+
+        double centralWeight = centralWeights[iEvt];
+        const int* eventBinIndices = binIndices + iEvt * numBinIndices;
+
+        // For xsec parameters, we reweight the event back to genie nominal by removing the UB tune
+        double ub_tune = tuneWeights[row];
+        double xsec_reweight = ( ub_tune>0.0 ) ? 1.0/ub_tune : 1.0;
+
+        for (const auto& param : denseParams_) {
+            int count = param.counts[row];
+            if (count <= 0) continue;  // parameter not in this event's weight map
+            const float* variations = param.weights + row * param.numVariations;
+            double eventWeight = centralWeight * ( xsecParamSlot_[param.slot] ? xsec_reweight : 1.0 );
+            accumulateVariations(sums, param.slot, variations, std::min(count, param.numVariations),
+                                 eventWeight, eventBinIndices, numBinIndices);
+        }
+        sums.processed++;
+    }
+}
+
+void XsecFluxAccumulator::accumulateRange(
+    const std::string& weightFilePath,
+    const std::string& weightTreeName,
+    const std::string& weightBranchName,
+    const std::int64_t* entries,
+    const int* binIndices,
+    int numBinIndices,
+    const double* centralWeights,
+    size_t begin, size_t end,
+    PartialSums& sums)
+{
+    initPartialSums(sums);
+
     // Open weight file
     TFile* weightFile = TFile::Open(weightFilePath.c_str(), "READ");
     if (!weightFile || weightFile->IsZombie()) {
@@ -150,7 +463,9 @@ int XsecFluxAccumulator::processAllEvents(
 
     // Get number of entries in weight tree
     Long64_t nWeightEntries = weightTree->GetEntries();
-    std::cout << "  Weight tree has " << nWeightEntries << " entries" << std::endl;
+    if (begin == 0) {
+        std::cout << "  Weight tree has " << nWeightEntries << " entries" << std::endl;
+    }
 
     // The weight map branch - need to handle as pointer
     // Now activating weightBranch, which is expensive.
@@ -175,135 +490,156 @@ int XsecFluxAccumulator::processAllEvents(
       std::string ub_tune_branchname = "weightTune";
       weightTree->SetBranchAddress(ub_tune_branchname.c_str(), &ub_tune_weight_surprise );
     }
-    
-    // Process all events
-    int processedCount = 0;
-    std::cout << "  Accumulating weights..." << std::endl;
 
-    for (size_t iEvt = 0; iEvt < numEvents; iEvt++) {
-        if (iEvt % 10000 == 0) {
-            std::cout << "    Processing event " << iEvt << " / " << numEvents << std::endl;
+    // The keys of the weight map are (almost always) the same from entry to entry.
+    // We remember the slot of each key position, so the parameter name only has to be
+    // compared with the one at the same position in the previous entry instead of looked up.
+    std::vector<std::string> keyNames;
+    std::vector<int> keySlots;
+
+    for (size_t iEvt = begin; iEvt < end; iEvt++) {
+        if (begin == 0 && iEvt % 10000 == 0) {
+            std::cout << "    Processing event " << iEvt << " / " << end << std::endl;
         }
 
-        ub_tune_weight = 0.0
+        ub_tune_weight = 0.0;
         ub_tune_weight_surprise = 0.0;
 
-        // Get RSE for this event
-        const auto& rse = rseList[iEvt];
-        if (rse.size() < 3) continue;
-
-        auto rseTuple = std::make_tuple(rse[0], rse[1], rse[2]);
-
-        // Find entry in weight tree
-        auto it = rseToEntry.find(rseTuple);
-        if (it == rseToEntry.end()) {
-            missingEventCount_++;
+        // Entry in weight tree, -1 if this event's RSE was not found
+        Long64_t entry = static_cast<Long64_t>(entries[iEvt]);
+        if (entry < 0 || entry >= nWeightEntries) {
+            sums.missing++;
             continue;
         }
 
         // Load the weight entry
-        size_t nbytes = weightTree->GetEntry(it->second);
+        size_t nbytes = weightTree->GetEntry(entry);
 
         if (nbytes==0) {
-            missingEventCount_++;
+            sums.missing++;
             continue;
         }
 
         const MapStringVecDouble* weights = weightsPtr;
 
-        // std::cout << "try to read surprise branches" << std::endl;
-        // for ( const auto& pair : *weights ) {
-        //   std::cout << " parname=" << pair.first << std::endl;
-        // }
-
         double centralWeight = centralWeights[iEvt];
-        const auto& binIndices = binIndicesList[iEvt];
+        const int* eventBinIndices = binIndices + iEvt * numBinIndices;
+
+        // For xsec parameters, we reweight the event back to genie nominal by removing the UB tune
+        double ub_tune = ( kWeightBranchType==kArborist ) ? ub_tune_weight : ub_tune_weight_surprise;
+        double xsec_reweight = ( ub_tune>0.0 ) ? 1.0/ub_tune : 1.0;
 
         // Iterate over all parameters in the weight map
+        size_t ikey = 0;
         for (const auto& paramPair : *weights) {
             const std::string& parname = paramPair.first;
             const std::vector<double>& variations = paramPair.second;
 
-            // Skip if not in our included list
-            if (includedParams_.find(parname) == includedParams_.end()) {
-                continue;
-            }
-
-            int nvariations = static_cast<int>(variations.size());
-            if (nvariations > maxVariations_) {
-                nvariations = maxVariations_;
+            // Find the slot of this parameter (-1 if not in our included list)
+            int slot;
+            if (ikey < keyNames.size() && keyNames[ikey] == parname) {
+                slot = keySlots[ikey];
             }
-
-            // Track variations per parameter
-            if (variationsPerParam_.find(parname) == variationsPerParam_.end()) {
-                variationsPerParam_[parname] = nvariations;
-            }
-
-            // For xsec parameters, we reweight the event back to genie nominal by removing the UB tune
-            double xsec_weight = 1.0;
-            if ( xsecParamNames_.find(parname) != xsecParamNames_.end() ) {
-	            if ( kWeightBranchType==kArborist ) {
-                    if ( ub_tune_weight>0.0 )
-                        xsec_weight = 1.0/ub_tune_weight;
+            else {
+                auto it = paramSlots_.find(parname);
+                slot = (it == paramSlots_.end()) ? -1 : it->second;
+                if (ikey < keyNames.size()) {
+                    keyNames[ikey] = parname;
+                    keySlots[ikey] = slot;
                 }
                 else {
-                    if ( ub_tune_weight_surprise>0.0 )
-                        xsec_weight = 1.0/ub_tune_weight_surprise;
+                    keyNames.push_back(parname);
+                    keySlots.push_back(slot);
                 }
             }
+            ikey++;
+
+            if (slot < 0) {
+                continue;
+            }
 
-            // Accumulate into each variable's bins
-            for (int varIdx = 0; varIdx < numVariables_; varIdx++) {
-                if (varIdx >= static_cast<int>(binIndices.size())) continue;
+            double eventWeight = centralWeight * ( xsecParamSlot_[slot] ? xsec_reweight : 1.0 );
+            int nvalues = static_cast<int>(variations.size());
+            accumulateVariations(sums, slot, variations.data(), nvalues,
+                                 eventWeight, eventBinIndices, numBinIndices);
+        }
+        sums.processed++;
+    }
 
-                int ibin = binIndices[varIdx];
-                if (ibin < 0) continue;  // Variable doesn't apply to this event
+    weightFile->Close();
+    delete weightFile;
+}
 
-                // Get or create array for this (var, param) combination
-                auto key = std::make_pair(varIdx, parname);
-                if (arrays_.find(key) == arrays_.end()) {
-                    int nbins = binsPerVariable_[varIdx];
-                    arrays_[key].assign(nbins * nvariations, 0.0);
+int XsecFluxAccumulator::mergePartialSums(const std::vector<PartialSums>& partials)
+{
+    int processedCount = 0;
+    long badWeightCount = 0;
+    for (const auto& sums : partials) {
+        processedCount     += sums.processed;
+        missingEventCount_ += sums.missing;
+        badWeightCount     += sums.badWeights;
+        for (size_t iUniv = 0; iUniv < badWeightsPerUniverse_.size() && iUniv < sums.badWeightsPerUniverse.size(); iUniv++) {
+            badWeightsPerUniverse_[iUniv] += sums.badWeightsPerUniverse[iUniv];
+        }
+    }
+    if (badWeightCount > 0) {
+        std::cout << "  Found " << badWeightCount << " bad weights (>= " << maxValidWeight_
+                  << " or NaN), replaced by 1.0" << std::endl;
+    }
+
+    for (int slot = 0; slot < static_cast<int>(paramSlotNames_.size()); slot++) {
+        const std::string& parname = paramSlotNames_[slot];
+
+        // The number of variations of a parameter is the largest number seen in any thread,
+        // or the number set by an earlier call
+        int nvariations = 0;
+        for (const auto& sums : partials) {
+            nvariations = std::max(nvariations, sums.nvariations[slot]);
+        }
+        if (nvariations == 0) continue;  // parameter not found in the weight tree
+        if (variationsPerParam_.find(parname) == variationsPerParam_.end()) {
+            variationsPerParam_[parname] = nvariations;
+        }
+        nvariations = variationsPerParam_[parname];
+        int stride = slotStrides_[slot];
+
+        for (int varIdx = 0; varIdx < numVariables_; varIdx++) {
+            int islot = slot * numVariables_ + varIdx;
+            auto key = std::make_pair(varIdx, parname);
+            for (const auto& sums : partials) {
+                const auto& partArr = sums.arrays[islot];
+                if (partArr.empty()) continue;
+
+                // the partial sums have stride universes per bin, the result has nvariations
+                int nbins = binsPerVariable_[varIdx];
+                auto& arr = arrays_[key];
+                if (arr.empty()) {
+                    arr.assign(static_cast<size_t>(nbins) * nvariations, 0.0);
                 }
-                if (badWeightsPerVariableBins_.find(key) == badWeightsPerVariableBins_.end()) {
-                    int nbins = binsPerVariable_[varIdx];
-                    badWeightsPerVariableBins_[key].assign(nbins, 0);
+                if (arr.size() != static_cast<size_t>(nbins) * nvariations) {
+                    throw std::runtime_error("Accumulated array size mismatch for parameter " + parname);
+                }
+                int ncopy = std::min(nvariations, stride);
+                for (int ibin = 0; ibin < nbins; ibin++) {
+                    const double* partRow = partArr.data() + static_cast<size_t>(ibin) * stride;
+                    double* row = arr.data() + static_cast<size_t>(ibin) * nvariations;
+                    for (int iUniv = 0; iUniv < ncopy; iUniv++) {
+                        row[iUniv] += partRow[iUniv];
+                    }
                 }
 
-                auto& arr = arrays_[key];
+                const auto& partBad = sums.badWeightsPerBin[islot];
                 auto& badweights = badWeightsPerVariableBins_[key];
-                int nbins = binsPerVariable_[varIdx];
-
-                // Fast inner loop - the core optimization
-                for (int iUniv = 0; iUniv < nvariations; iUniv++) {
-                    double w = variations[iUniv];
-		            // Row-major: arr[ibin, iUniv] = arr[ibin * nvariations + iUniv]
-		            int idx = ibin * nvariations + iUniv;		    
-                    if (w < maxValidWeight_) {
-                        if (idx < static_cast<int>(arr.size())) {
-                            arr[idx] += w * centralWeight*xsec_weight;
-                        }
-                    } else {
-		                // bad weight: either larger than max weight or NAN. set to 1.0.
-		                std::cout << "badweight[" << varIdx << " | " << parname << "] weight=" << w << std::endl;
-                        if (iUniv < static_cast<int>(badWeightsPerUniverse_.size())) {
-                            badWeightsPerUniverse_[iUniv]++;
-                        }
-			            badweights[ibin]++;
-			            arr[idx] += centralWeight*xsec_weight;
-                    }
+                if (badweights.empty()) {
+                    badweights.assign(partBad.size(), 0);
+                }
+                for (size_t i = 0; i < badweights.size() && i < partBad.size(); i++) {
+                    badweights[i] += partBad[i];
                 }
             }
         }
-        processedCount++;
     }
 
-    weightFile->Close();
-    delete weightFile;
-
-    std::cout << "  Processed " << processedCount << " events, "
-              << missingEventCount_ << " missing from weight tree" << std::endl;
-
     return processedCount;
 }
 
@@ -4,8 +4,11 @@
 #include <vector>
 #include <string>
 #include <map>
+#include <unordered_map>
 #include <set>
 #include <tuple>
+#include <cstdint>
+#include <functional>
 #include "TFile.h"
 #include "TTree.h"
 #include "TChain.h"
@@ -50,6 +53,19 @@ public:
      */
     void reset();
 
+    /**
+     * @brief Set the number of threads used to accumulate weights (default: 1).
+     *
+     * The events are split into contiguous ranges. Each thread opens the weight file,
+     * reads its range and fills its own partial sums, which are added together at the end.
+     */
+    void setNumThreads(int numThreads);
+
+    /**
+     * @brief Get the number of threads used to accumulate weights.
+     */
+    int getNumThreads() const { return numThreads_; }
+
     /**
      * @brief Process all passing events and accumulate weights.
      *
@@ -80,6 +96,92 @@ public:
                          const std::vector<std::vector<int>>& binIndicesList,
                          const std::vector<double>& centralWeights);
 
+    /**
+     * @brief Process passing events whose weight tree entries are already known.
+     *
+     * Same as processAllEvents, but without building the RSE -> entry map.
+     * The entries typically come from a cached RSE index (lantern_ana.io.rse_index).
+     * Passing the events sorted by entry reads the weight tree front to back.
+     *
+     * @param weightFilePath Path to the ROOT file containing the weight tree
+     * @param weightTreeName Name of the TTree containing systematic weights
+     * @param weightBranchName Name of the branch containing the weight map
+     * @param entries Weight tree entry for each event (-1 if the event is not in the weight tree)
+     * @param binIndicesList Vector of bin indices for each variable, for each event
+     * @param centralWeights Vector of central value weights for each event
+     * @return Number of events successfully processed
+     */
+    int processEventsAtEntries(const std::string& weightFilePath,
+                               const std::string& weightTreeName,
+                               const std::string& weightBranchName,
+                               const std::vector<Long64_t>& entries,
+                               const std::vector<std::vector<int>>& binIndicesList,
+                               const std::vector<double>& centralWeights);
+
+    /**
+     * @brief Process passing events stored in contiguous buffers, e.g. NumPy arrays.
+     *
+     * Same as processEventsAtEntries, but the inputs are read in place through raw pointers,
+     * so nothing is copied per event when calling from Python.
+     *
+     * @param weightFilePath Path to the ROOT file containing the weight tree
+     * @param weightTreeName Name of the TTree containing systematic weights
+     * @param weightBranchName Name of the branch containing the weight map
+     * @param entries Weight tree entry for each event (-1 if the event is not in the weight tree), numEvents values
+     * @param binIndices Bin index of each variable for each event, row-major [iEvt * numBinIndices + varIdx]
+     * @param centralWeights Central value weight of each event, numEvents values
+     * @param numEvents Number of events
+     * @param numBinIndices Number of bin indices stored per event
+     * @return Number of events successfully processed
+     */
+    int processEventsFromBuffers(const std::string& weightFilePath,
+                                 const std::string& weightTreeName,
+                                 const std::string& weightBranchName,
+                                 const std::int64_t* entries,
+                                 const int* binIndices,
+                                 const double* centralWeights,
+                                 size_t numEvents,
+                                 int numBinIndices);
+
+    /**
+     * @brief Forget the parameters given with addDenseWeights.
+     */
+    void clearDenseWeights();
+
+    /**
+     * @brief Give the weights of one parameter from a dense weight store (dense_weight_store.py).
+     *
+     * The buffers are typically memory-mapped NumPy arrays. They are not copied, so they must
+     * stay alive until processDenseEvents returns. Parameters that are not included are ignored.
+     *
+     * @param paramName Name of the systematic parameter
+     * @param weights Weights of every store row, row-major [row * numVariations + iUniv]
+     * @param counts Number of valid variations of each store row (0 if the parameter is not in the event)
+     * @param numVariations Number of universes stored per row
+     */
+    void addDenseWeights(const std::string& paramName,
+                         const float* weights,
+                         const int* counts,
+                         int numVariations);
+
+    /**
+     * @brief Process passing events using the weights given with addDenseWeights, instead of the weight tree.
+     *
+     * @param rows Store row of each event (-1 if the event is not in the store), numEvents values
+     * @param tuneWeights UB tune weight of every store row
+     * @param binIndices Bin index of each variable for each event, row-major [iEvt * numBinIndices + varIdx]
+     * @param numBinIndices Number of bin indices stored per event
+     * @param centralWeights Central value weight of each event, numEvents values
+     * @param numEvents Number of events
+     * @return Number of events successfully processed
+     */
+    int processDenseEvents(const std::int64_t* rows,
+                           const double* tuneWeights,
+                           const int* binIndices,
+                           int numBinIndices,
+                           const double* centralWeights,
+                           size_t numEvents);
+
     /**
      * @brief Get the accumulated weight array for a specific (variable, parameter) combination.
      * @param varIndex Index of the variable (0-based)
@@ -158,6 +260,76 @@ private:
     // Missing event tracking
     int missingEventCount_;
 
+    // Number of threads used by processEventsAtEntries
+    int numThreads_;
+
+    // Dense slot tables, filled in configure():
+    // each included parameter gets a slot index, used in the accumulation loop instead of map lookups
+    std::vector<std::string> paramSlotNames_;          // slot -> parameter name
+    std::unordered_map<std::string, int> paramSlots_;  // parameter name -> slot
+    std::vector<int> xsecParamSlot_;                   // slot -> 1 if xsec parameter (remove UB tune)
+    std::vector<int> slotStrides_;                     // slot -> universes stored per bin while accumulating,
+                                                       //         set before the threads start
+
+    // Sums accumulated by one thread. Arrays are indexed by [slot * numVariables + varIndex].
+    struct PartialSums {
+        std::vector<std::vector<double>> arrays;           // nbins x slotStrides_[slot], row-major
+        std::vector<std::vector<int>> badWeightsPerBin;    // nbins
+        std::vector<int> nvariations;                      // per slot, largest number seen, 0 if not seen
+        std::vector<int> badWeightsPerUniverse;
+        int processed = 0;
+        int missing = 0;
+        long badWeights = 0;
+    };
+
+    // Weights of one parameter from a dense weight store (see addDenseWeights)
+    struct DenseParam {
+        int slot;
+        const float* weights;
+        const int* counts;
+        int numVariations;
+    };
+    std::vector<DenseParam> denseParams_;
+
+    // Split [0,numEvents) across numThreads_ threads, run accumulate on each range and merge the sums.
+    // Returns number of processed events.
+    int runAccumulation(size_t numEvents,
+                        const std::function<void(size_t, size_t, PartialSums&)>& accumulate);
+
+    // Clear the sums before accumulating
+    void initPartialSums(PartialSums& sums) const;
+
+    // Add the variations of one parameter for one event into the bins of each variable.
+    // Up to slotStrides_[slot] universes are stored per bin; the partial sums record the largest number seen.
+    template <typename T>
+    void accumulateVariations(PartialSums& sums, int slot,
+                              const T* variations, int numValues,
+                              double eventWeight,
+                              const int* eventBinIndices, int numBinIndices) const;
+
+    // Accumulate events [begin,end) using the dense weights
+    void accumulateDenseRange(const std::int64_t* rows,
+                              const double* tuneWeights,
+                              const int* binIndices,
+                              int numBinIndices,
+                              const double* centralWeights,
+                              size_t begin, size_t end,
+                              PartialSums& sums);
+
+    // Accumulate events [begin,end) of the input buffers into sums
+    void accumulateRange(const std::string& weightFilePath,
+                         const std::string& weightTreeName,
+                         const std::string& weightBranchName,
+                         const std::int64_t* entries,
+                         const int* binIndices,
+                         int numBinIndices,
+                         const double* centralWeights,
+                         size_t begin, size_t end,
+                         PartialSums& sums);
+
+    // Add the per-thread sums into arrays_ and the bad weight counters. Returns number of processed events.
+    int mergePartialSums(const std::vector<PartialSums>& partials);
+
     // Helper to find tree in file (may be in TDirectoryFile)
     TTree* findTreeInFile(TFile* file, const std::string& treeName);
 };
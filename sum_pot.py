@@ -1,21 +1,11 @@
 #!/bin/env python3
 import os,sys
-
-def sum_pot_tree( pottree ):
-    n = pottree.GetEntries()
-    pot = 0.0
-    for i in range(n):
-        pottree.GetEntry(i)
-        pot += pottree.totGoodPOT
-    return pot
+from lantern_ana.io.pot import sum_pot, sum_pot_tree
 
 if __name__ == "__main__":
 
-    import ROOT as rt
-    fname = sys.argv[1]
-    
-    rfile = rt.TFile(fname,"open")
-    pottree = rfile.Get("lantern/potTree")
+    fnames = sys.argv[1:]
 
-    pot = sum_pot_tree(pottree)
+    # per-file totals are cached, see lantern_ana/io/pot.py
+    pot = sum_pot(fnames, "lantern/potTree")
     print("pot: ",pot)
@@ -11,133 +11,65 @@ import threading
 import time
 import logging
 import json
+import hashlib
 import confDB
 
-def getDataGivenFileList(flist,r):
-    #query SAM for each file in file list and gets run and subrun processed from meta data
-    #puts that into dictionary rslist[run]=list_of_subruns
-    con=sqlite3.connect("%s/run.db"%dbdir)
-    con.row_factory=sqlite3.Row
+_dbconnections=threading.local()
+
+def getConnection():
+    #read-only connection to run.db with the bnb and numi databases attached
+    #opened once per thread and reused by every query of that thread
+    con=getattr(_dbconnections,'con',None)
+    if con is None:
+        con=sqlite3.connect("file:%s/run.db?mode=ro"%dbdir,uri=True)
+        con.row_factory=sqlite3.Row
+        con.execute("ATTACH DATABASE 'file:%s/bnb_v%i.db?mode=ro' AS bnb"%(dbdir,version))
+        con.execute("ATTACH DATABASE 'file:%s/numi_v%i.db?mode=ro' AS numi"%(dbdir,version))
+        con.execute("CREATE TEMP TABLE rsquery (run INTEGER, subrun INTEGER)")
+        _dbconnections.con=con
+    return con
+
+def addMissing(miss,run,subrun):
+    if run not in miss:
+        miss[run]=[subrun]
+    elif subrun not in miss[run]:
+        miss[run].append(subrun)
+
+def getDataGivenRSPairs(rspairs,r):
+    #sums the requested columns over a list of (run,subrun) pairs
+    #the pairs are loaded into a temporary table and joined with runinfo (and the beam tables) in one query
+    #a pair listed twice is counted twice
+    con=getConnection()
     cur=con.cursor()
-    cur.execute("ATTACH DATABASE '%s/bnb_v%i.db' AS bnb"%(dbdir,version))
-    cur.execute("ATTACH DATABASE '%s/numi_v%i.db' AS numi"%(dbdir,version))
+    cur.execute("DELETE FROM temp.rsquery")
+    cur.executemany("INSERT INTO temp.rsquery VALUES (?,?)",rspairs)
+    cur.execute(dbqueryrows)
+    rows=cur.fetchall()
+    cur.execute("DELETE FROM temp.rsquery")
 
     cfgDB=confDB.confDB()
+    pfcache={}
 
     bnbwarn=False
     numiwarn=False
     otherwarn=False
     prescalewarn=False
-    samweb = samweb_cli.SAMWebClient(experiment='uboone')
-    try:
-        meta=samweb.getMetadataIterator(flist)
-    except Exception as e:
-        print("Failed to get metadata from SAM.")
-        print("Make sure to setup sam_web_client v2_1 or higher.")
-        print(e)
-        sys.exit(0)
-
     missbnb={}
     missnumi={}
     missother={}
     missprescale={}
-
-    mcount=0
-    for m in meta:
-        mcount+=1
-        for rs in m['runs']:
-            pf=None
-            if prescaleFactor:
-                pf=cfgDB.getAllPrescaleFactors(int(rs[0]))
-            if pf is not None:
-                for pfkey in pf:
-                    if pfkey not in r:
-                        r[pfkey]=0
-            query="%s WHERE r.run=%i AND r.subrun=%i"%(dbquerybase, int(rs[0]),int(rs[1]))
-            cur.execute(query)
-            row=cur.fetchone()
-            for k in r:
-                if k in row.keys() and row[k] is not None:
-                    if pf is not None:
-                        for pfkey in pf:
-                            if "EXT" in k and "EXT_" in pfkey:
-                                r[pfkey]+=pf[pfkey]*row[k]
-                            elif "Gate1" in k and "NUMI_" in pfkey:
-                                r[pfkey]+=pf[pfkey]*row[k]
-                            elif "Gate2" in k and "BNB_" in pfkey:
-                                r[pfkey]+=pf[pfkey]*row[k]
-                    elif prescaleFactor:
-                        if rs[0] not in missprescale:
-                            missprescale[rs[0]]=[rs[1]]
-                        elif rs[1] not in missprescale[rs[0]]:
-                            missprescale[rs[0]].append(rs[1])
-                        prescalewarn=True
-                    
-                    r[k]+=row[k]
-                elif k in bnbcols:
-                    if rs[0] not in missbnb:
-                        missbnb[rs[0]]=[rs[1]]
-                    elif rs[1] not in missbnb[rs[0]]:
-                        missbnb[rs[0]].append(rs[1])
-                    bnbwarn=True
-                elif k in numicols:
-                    if rs[0] not in missnumi:
-                        missnumi[rs[0]]=[rs[1]]
-                    elif rs[1] not in missnumi[rs[0]]:
-                        missnumi[rs[0]].append(rs[1])
-                    numiwarn=True
-                elif k=="EXT":
-                    if rs[0] not in missother:
-                        missother[rs[0]]=[rs[1]]
-                    elif rs[1] not in missother[rs[0]]:
-                        missother[rs[0]].append(rs[1])
-                    otherwarn=True
-    r['bnbwarn']=bnbwarn
-    r['numiwarn']=numiwarn
-    r['otherwarn']=otherwarn
-    r['prescalewarn']=prescalewarn
-    r['missbnb']=missbnb
-    r['missnumi']=missnumi
-    r['missother']=missother
-    r['missprescale']=missprescale
-    if mcount != len(flist):
-        print("Warning! Did not get metadata for all files. Looped through %i files, but only got metadata for %i. Check list for repeats or bad file names."%(len(flist),mcount))
-        logging.debug("Warning! Did not get metadata for all files.")
-
-    con.close()
-    return 
-
-def getDataGivenRSList(rslist,r):
-    con=sqlite3.connect("%s/run.db"%dbdir)
-    con.row_factory=sqlite3.Row
-    cur=con.cursor()
-    cur.execute("ATTACH DATABASE '%s/bnb_v%i.db' AS bnb"%(dbdir,version))
-    cur.execute("ATTACH DATABASE '%s/numi_v%i.db' AS numi"%(dbdir,version))
-
-    cfgDB=confDB.confDB()
-
-    bnbwarn=False
-    numiwarn=False
-    otherwarn=False
-    prescalewarn=False
-    missbnb={}
-    missnumi={}
-    missother={}
-    missprescale={}
-    mcount=0
-    for rsrow in rslist:
-        rs=rsrow.split(" ")
+    for row in rows:
+        run=row['qrun']
+        subrun=row['qsubrun']
         pf=None
         if prescaleFactor:
-            pf=cfgDB.getAllPrescaleFactors(rs[0])
+            if run not in pfcache:
+                pfcache[run]=cfgDB.getAllPrescaleFactors(run)
+            pf=pfcache[run]
         if pf is not None:
             for pfkey in pf:
                 if pfkey not in r:
                     r[pfkey]=0
-
-        query="%s WHERE r.run=%i AND r.subrun=%i"%(dbquerybase, int(rs[0]),int(rs[1]))
-        cur.execute(query)
-        row=cur.fetchone()
         for k in r:
             if k in row.keys() and row[k] is not None:
                 if pf is not None:
@@ -149,30 +81,18 @@ def getDataGivenRSList(rslist,r):
                         elif "Gate2" in k and "BNB_" in pfkey:
                             r[pfkey]+=pf[pfkey]*row[k]
                 elif prescaleFactor:
-                    if rs[0] not in missprescale:
-                        missprescale[rs[0]]=[rs[1]]
-                    elif rs[1] not in missprescale[rs[0]]:
-                        missprescale[rs[0]].append(rs[1])
+                    addMissing(missprescale,run,subrun)
                     prescalewarn=True
-                    
+
                 r[k]+=row[k]
             elif k in bnbcols:
-                if rs[0] not in missbnb:
-                    missbnb[rs[0]]=[rs[1]]
-                elif rs[1] not in missbnb[rs[0]]:
-                    missbnb[rs[0]].append(rs[1])
+                addMissing(missbnb,run,subrun)
                 bnbwarn=True
             elif k in numicols:
-                if rs[0] not in missnumi:
-                    missnumi[rs[0]]=[rs[1]]
-                elif rs[1] not in missnumi[rs[0]]:
-                    missnumi[rs[0]].append(rs[1])
+                addMissing(missnumi,run,subrun)
                 numiwarn=True
             elif k=="EXT":
-                if rs[0] not in missother:
-                    missother[rs[0]]=[rs[1]]
-                elif rs[1] not in missother[rs[0]]:
-                    missother[rs[0]].append(rs[1])
+                addMissing(missother,run,subrun)
                 otherwarn=True
 
     r['bnbwarn']=bnbwarn
@@ -183,24 +103,51 @@ def getDataGivenRSList(rslist,r):
     r['missnumi']=missnumi
     r['missother']=missother
     r['missprescale']=missprescale
+    return
+
+def getDataGivenFileList(flist,r):
+    #query SAM for each file in file list and gets run and subrun processed from meta data
+    #then sums the data for all of these (run,subrun) with getDataGivenRSPairs
+    samweb = samweb_cli.SAMWebClient(experiment='uboone')
+    try:
+        meta=samweb.getMetadataIterator(flist)
+    except Exception as e:
+        print("Failed to get metadata from SAM.")
+        print("Make sure to setup sam_web_client v2_1 or higher.")
+        print(e)
+        sys.exit(0)
 
-    con.close()
+    rspairs=[]
+    mcount=0
+    for m in meta:
+        mcount+=1
+        for rs in m['runs']:
+            rspairs.append((int(rs[0]),int(rs[1])))
+
+    getDataGivenRSPairs(rspairs,r)
+
+    if mcount != len(flist):
+        print("Warning! Did not get metadata for all files. Looped through %i files, but only got metadata for %i. Check list for repeats or bad file names."%(len(flist),mcount))
+        logging.debug("Warning! Did not get metadata for all files.")
+    return 
+
+def getDataGivenRSList(rslist,r):
+    rspairs=[]
+    for rsrow in rslist:
+        rs=rsrow.split()
+        rspairs.append((int(rs[0]),int(rs[1])))
+    getDataGivenRSPairs(rspairs,r)
     return 
 
 def getDataGivenRunSubrun(run,subrun,r):
     logging.debug("getDataGivenRunSubrun called.")
-    con=sqlite3.connect("%s/run.db"%dbdir)
-    con.row_factory=sqlite3.Row
-    cur=con.cursor()
-    cur.execute("ATTACH DATABASE '%s/bnb_v%i.db' AS bnb"%(dbdir,version))
-    cur.execute("ATTACH DATABASE '%s/numi_v%i.db' AS numi"%(dbdir,version))
+    cur=getConnection().cursor()
             
     cfgDB=confDB.confDB()
 
     query="%s WHERE r.run=%i AND r.subrun=%i"%(dbquerybase,run,subrun)
     cur.execute(query)
     row=cur.fetchone()
-    con.close()
     bnbwarn=False
     numiwarn=False
     otherwarn=False
@@ -241,15 +188,10 @@ def getDataGivenRunSubrun(run,subrun,r):
     return
 
 def getDataGivenRun(run,r):
-    con=sqlite3.connect("%s/run.db"%dbdir)
-    con.row_factory=sqlite3.Row
-    cur=con.cursor()
-    cur.execute("ATTACH DATABASE '%s/bnb_v%i.db' AS bnb"%(dbdir,version))
-    cur.execute("ATTACH DATABASE '%s/numi_v%i.db' AS numi"%(dbdir,version))
+    cur=getConnection().cursor()
     query="%s WHERE r.run=%i"%(dbquerybase,run)
     cur.execute(query)
     row=cur.fetchone()
-    con.close()
     cfgDB=confDB.confDB()
     bnbwarn=False
     numiwarn=False
@@ -290,11 +232,7 @@ def getDataGivenRun(run,r):
     return
 
 def getDataGivenWhere(where,r):
-    con=sqlite3.connect("%s/run.db"%dbdir)
-    con.row_factory=sqlite3.Row
-    cur=con.cursor()
-    cur.execute("ATTACH DATABASE '%s/bnb_v%i.db' AS bnb"%(dbdir,version))
-    cur.execute("ATTACH DATABASE '%s/numi_v%i.db' AS numi"%(dbdir,version))
+    cur=getConnection().cursor()
     cfgDB=confDB.confDB()
 
     wherec=" "+where
@@ -312,7 +250,6 @@ def getDataGivenWhere(where,r):
     missother={}
     missprescale={}
     allrows=cur.fetchall()
-    con.close()
     for row in allrows:
         pf=None
         if prescaleFactor:
@@ -424,56 +361,63 @@ def getListForThreads(flist, nthreads):
                 flist_thread.append([flist.pop()])
     return flist_thread
 
-def getDBQueryBase(cols):
+def getDBQueryBase(cols,rsjoin=False):
+    #with rsjoin, one row per (run,subrun) of the temp.rsquery table instead of the sums
+    agg="%s" if rsjoin else "SUM(%s)"
     dbq="SELECT "
+    if rsjoin:
+        dbq+="q.run AS qrun,q.subrun AS qsubrun,"
     addBNB=False
     addNuMI=False
     for var in cols:
         var=var.lower()
         if "ext" in var:
-            dbq+="SUM(r.EXTTrig) AS EXT,"
+            dbq+=agg%"r.EXTTrig"+" AS EXT,"
         elif "gate1" in var:
-            dbq+="SUM(r.Gate1Trig) AS Gate1,"
+            dbq+=agg%"r.Gate1Trig"+" AS Gate1,"
         elif "gate2" in var:
-            dbq+="SUM(r.Gate2Trig) AS Gate2,"
+            dbq+=agg%"r.Gate2Trig"+" AS Gate2,"
         elif "e1dcnt" in var:
             if "wcut" in var:
-                dbq+="SUM(b.E1DCNT) AS E1DCNT_wcut,"
+                dbq+=agg%"b.E1DCNT"+" AS E1DCNT_wcut,"
                 addBNB=True
             else:
-                dbq+="SUM(r.E1DCNT) AS E1DCNT,"
+                dbq+=agg%"r.E1DCNT"+" AS E1DCNT,"
         elif "tor860" in var:
             if "wcut" in var:
-                dbq+="SUM(b.tor860) AS tor860_wcut,"
+                dbq+=agg%"b.tor860"+" AS tor860_wcut,"
                 addBNB=True
             else:
-                dbq+="SUM(r.tor860) AS tor860,"
+                dbq+=agg%"r.tor860"+" AS tor860,"
         elif "tor875" in var:
             if "wcut" in var:
-                dbq+="SUM(b.tor875) AS tor875_wcut,"
+                dbq+=agg%"b.tor875"+" AS tor875_wcut,"
                 addBNB=True
             else:
-                dbq+="SUM(r.tor875) AS tor875,"
+                dbq+=agg%"r.tor875"+" AS tor875,"
         elif "ea9cnt" in var:
             if "wcut" in var:
-                dbq+="SUM(n.EA9CNT) AS EA9CNT_wcut,"
+                dbq+=agg%"n.EA9CNT"+" AS EA9CNT_wcut,"
                 addNuMI=True
             else:
-                dbq+="SUM(r.EA9CNT) AS EA9CNT,"
+                dbq+=agg%"r.EA9CNT"+" AS EA9CNT,"
         elif "tor101" in var:
             if "wcut" in var:
-                dbq+="SUM(n.tor101) AS tor101_wcut,"
+                dbq+=agg%"n.tor101"+" AS tor101_wcut,"
                 addNuMI=True
             else:
-                dbq+="SUM(r.tor101) AS tor101,"
+                dbq+=agg%"r.tor101"+" AS tor101,"
         elif "tortgt" in var:
             if "wcut" in var:
-                dbq+="SUM(n.tortgt) AS tortgt_wcut,"
+                dbq+=agg%"n.tortgt"+" AS tortgt_wcut,"
                 addNuMI=True
             else:
-                dbq+="SUM(r.tortgt) AS tortgt,"
+                dbq+=agg%"r.tortgt"+" AS tortgt,"
     dbq=dbq[0:-1]
-    dbq+=" FROM runinfo AS r"
+    if rsjoin:
+        dbq+=" FROM temp.rsquery AS q LEFT OUTER JOIN runinfo AS r ON r.run=q.run AND r.subrun=q.subrun"
+    else:
+        dbq+=" FROM runinfo AS r"
     if addBNB:
         dbq+=" LEFT OUTER JOIN bnb.bnb AS b ON r.run=b.run AND r.subrun=b.subrun"
     if addNuMI:
@@ -481,6 +425,46 @@ def getDBQueryBase(cols):
 
     return dbq
 
+def getCacheFile(kind,items):
+    #results are cached per list of files (or runs/subruns), output columns, beam cut version,
+    #prescale option and version of the databases
+    if args.no_cache:
+        return None
+    dbfiles=["%s/run.db"%dbdir,"%s/bnb_v%i.db"%(dbdir,version),"%s/numi_v%i.db"%(dbdir,version)]
+    dbsig=[(f,os.stat(f).st_mtime_ns) if os.path.exists(f) else (f,None) for f in dbfiles]
+    key=json.dumps([kind,sorted(items),sorted(cols),version,prescaleFactor,dbsig])
+    cachedir=args.cache_dir
+    if cachedir is None:
+        cachedir=os.path.join(os.environ.get('LANTERN_ANA_CACHE_DIR',os.path.join(os.path.expanduser('~'),'.cache','lantern_ana')),'getDataInfo')
+    os.makedirs(cachedir,exist_ok=True)
+    return os.path.join(cachedir,"%s.json"%hashlib.sha1(key.encode('utf-8')).hexdigest())
+
+def loadCache(cachefile):
+    if cachefile is None or not os.path.exists(cachefile):
+        return None
+    try:
+        with open(cachefile) as f:
+            cached=json.load(f)
+    except (OSError,ValueError):
+        return None
+    #JSON object keys are strings: make the runs of the missing-data dictionaries ints again
+    for k in ['missbnb','missnumi','missother','missprescale']:
+        if k in cached:
+            cached[k]={int(run):subruns for run,subruns in cached[k].items()}
+    logging.debug("Loaded results from cache %s"%cachefile)
+    return cached
+
+def saveCache(cachefile,res):
+    if cachefile is None:
+        return
+    tmp="%s.tmp%i"%(cachefile,os.getpid())
+    try:
+        with open(tmp,'w') as f:
+            json.dump(res,f)
+        os.replace(tmp,cachefile)
+    except OSError as e:
+        logging.debug("Could not write cache %s: %s"%(cachefile,e))
+
 
 
 parser = argparse.ArgumentParser(description='Run info.',formatter_class=argparse.ArgumentDefaultsHelpFormatter)
@@ -518,6 +502,10 @@ parser.add_argument("--noheader",action="store_true",
                     help="Don't print table header.")
 parser.add_argument("--prescale", action="store_true", 
                     help="Apply prescale factor to trigger count. Specify which factor to apply.")
+parser.add_argument("--cache-dir", type=str, default=None,
+                    help="Directory for cached results of file and run/subrun lists (default: LANTERN_ANA_CACHE_DIR/getDataInfo or ~/.cache/lantern_ana/getDataInfo).")
+parser.add_argument("--no-cache", action="store_true",
+                    help="Do not use or save cached results.")
 
 
 args = parser.parse_args()
@@ -557,6 +545,7 @@ if not set(map(str.lower, cols))<=set(map(str.lower,allowedcols)):
     sys.exit(0)
 
 dbquerybase=getDBQueryBase(cols)
+dbqueryrows=getDBQueryBase(cols,rsjoin=True)
 logging.debug(dbquerybase)
 
 for icol in cols:
@@ -575,41 +564,47 @@ if args.defname is not None or args.file_list is not None:
     else:
         flist=getListFromFile(args.file_list)
 
-    flist_thread=getListForThreads(flist, args.nthreads)
-
-    nthreads=min(len(flist_thread),args.nthreads)
-    logging.debug("Running in %i thread(s)"%nthreads)    
-    threads=[]
-    rthread=[]
-    for ith in range(0,nthreads):
-        rthread.append(res.copy())
-        t=threading.Thread(target=getDataGivenFileList, args=(flist_thread[ith],rthread[ith]))
-        threads.append(t)
-        t.start()
-
-    res['bnbwarn']=False
-    res['numiwarn']=False
-    res['otherwarn']=False
-    res['prescalewarn']=False
-    res['missbnb']={}
-    res['missnumi']={}
-    res['missother']={}
-    res['missprescale']={}
-
-    for ith in range(0,nthreads):
-        threads[ith].join()
-        for k in rthread[0]:
-            if k not in res:
-                res[k]=0
-            if not isinstance(res[k],dict):
-                if k in rthread[ith]:
-                    res[k]+=rthread[ith][k]
-            else:
-                for rk in rthread[ith][k]:
-                    if rk in res[k]:
-                        res[k][rk].extend(rthread[ith][k][rk])
-                    else:
-                        res[k][rk]=rthread[ith][k][rk]
+    cachefile=getCacheFile("files",flist)
+    cached=loadCache(cachefile)
+    if cached is not None:
+        res=cached
+    else:
+        flist_thread=getListForThreads(flist, args.nthreads)
+
+        nthreads=min(len(flist_thread),args.nthreads)
+        logging.debug("Running in %i thread(s)"%nthreads)    
+        threads=[]
+        rthread=[]
+        for ith in range(0,nthreads):
+            rthread.append(res.copy())
+            t=threading.Thread(target=getDataGivenFileList, args=(flist_thread[ith],rthread[ith]))
+            threads.append(t)
+            t.start()
+
+        res['bnbwarn']=False
+        res['numiwarn']=False
+        res['otherwarn']=False
+        res['prescalewarn']=False
+        res['missbnb']={}
+        res['missnumi']={}
+        res['missother']={}
+        res['missprescale']={}
+
+        for ith in range(0,nthreads):
+            threads[ith].join()
+            for k in rthread[0]:
+                if k not in res:
+                    res[k]=0
+                if not isinstance(res[k],dict):
+                    if k in rthread[ith]:
+                        res[k]+=rthread[ith][k]
+                else:
+                    for rk in rthread[ith][k]:
+                        if rk in res[k]:
+                            res[k][rk].extend(rthread[ith][k][rk])
+                        else:
+                            res[k][rk]=rthread[ith][k][rk]
+        saveCache(cachefile,res)
 
 elif args.run_subrun_list or args.json_file:
     while "run" in cols: cols.remove('run')
@@ -619,40 +614,46 @@ elif args.run_subrun_list or args.json_file:
         rslist=getListFromFile(args.run_subrun_list)
     else:
         rslist=getListFromJSON(args.json_file)
-    rslist_thread=getListForThreads(rslist, args.nthreads)
-
-    nthreads=min(len(rslist_thread),args.nthreads)
-    logging.debug("Running in %i thread(s)"%nthreads)    
-    threads=[]
-    rthread=[]
-
-    for ith in range(0,nthreads):
-        rthread.append(res.copy())
-        t=threading.Thread(target=getDataGivenRSList, args=(rslist_thread[ith],rthread[ith]))
-        threads.append(t)
-        t.start()
-
-    res['bnbwarn']=False
-    res['numiwarn']=False
-    res['otherwarn']=False
-    res['prescalewarn']=False
-    res['missbnb']={}
-    res['missnumi']={}
-    res['missother']={}
-    res['missprescale']={}
-    for ith in range(0,nthreads):
-        threads[ith].join()
-        for k in rthread[0]:
-            if k not in res:
-                res[k]=0
-            if not isinstance(res[k],dict):
-                res[k]+=rthread[ith][k]
-            else:
-                for rk in rthread[ith][k]:
-                    if rk in res[k]:
-                        res[k][rk].extend(rthread[ith][k][rk])
-                    else:
-                        res[k][rk]=rthread[ith][k][rk]
+    cachefile=getCacheFile("runsubruns",rslist)
+    cached=loadCache(cachefile)
+    if cached is not None:
+        res=cached
+    else:
+        rslist_thread=getListForThreads(rslist, args.nthreads)
+
+        nthreads=min(len(rslist_thread),args.nthreads)
+        logging.debug("Running in %i thread(s)"%nthreads)    
+        threads=[]
+        rthread=[]
+
+        for ith in range(0,nthreads):
+            rthread.append(res.copy())
+            t=threading.Thread(target=getDataGivenRSList, args=(rslist_thread[ith],rthread[ith]))
+            threads.append(t)
+            t.start()
+
+        res['bnbwarn']=False
+        res['numiwarn']=False
+        res['otherwarn']=False
+        res['prescalewarn']=False
+        res['missbnb']={}
+        res['missnumi']={}
+        res['missother']={}
+        res['missprescale']={}
+        for ith in range(0,nthreads):
+            threads[ith].join()
+            for k in rthread[0]:
+                if k not in res:
+                    res[k]=0
+                if not isinstance(res[k],dict):
+                    res[k]+=rthread[ith][k]
+                else:
+                    for rk in rthread[ith][k]:
+                        if rk in res[k]:
+                            res[k][rk].extend(rthread[ith][k][rk])
+                        else:
+                            res[k][rk]=rthread[ith][k][rk]
+        saveCache(cachefile,res)
 
 elif args.where is not None:
     while "run" in cols: cols.remove('run')